@@ -1,21 +1,24 @@
 """
 Authentication module with JWT support for DocTranscribe.
 """
+import asyncio
 import os
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from typing import Dict, Optional
 import logging
-from uuid import UUID
+from uuid import UUID, uuid4
 
+import bcrypt
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
-from passlib.context import CryptContext
 from pydantic import BaseModel
 from sqlmodel import Session, select
 
 from .database import get_session
-from .models import User
+from .models import User, UserRole
+from .services.user_cache import user_cache
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -26,8 +29,11 @@ SECRET_KEY = os.environ.get("JWT_SECRET_KEY", "your-secret-key-here-make-it-secu
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24 * 7  # 7 days
 
-# Password hashing
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Password hashing. bcrypt is deliberately slow (~250 ms at cost 12), so the
+# async endpoints run it on a small dedicated pool instead of the event loop.
+BCRYPT_ROUNDS = int(os.environ.get("BCRYPT_ROUNDS", "12"))
+AUTH_HASH_WORKERS = int(os.environ.get("AUTH_HASH_WORKERS", "4"))
+_hash_executor = ThreadPoolExecutor(max_workers=AUTH_HASH_WORKERS, thread_name_prefix="bcrypt")
 
 # Token URL
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
@@ -45,14 +51,34 @@ class TokenData(BaseModel):
     user_id: Optional[str] = None
 
 
+def _password_bytes(password: str) -> bytes:
+    # bcrypt only uses the first 72 bytes; older hashes were made the same way
+    return password.encode("utf-8")[:72]
+
+
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verify a password against a hash."""
-    return pwd_context.verify(plain_password, hashed_password)
+    try:
+        return bcrypt.checkpw(_password_bytes(plain_password), hashed_password.encode("utf-8"))
+    except ValueError:
+        return False
 
 
 def get_password_hash(password: str) -> str:
     """Generate a password hash."""
-    return pwd_context.hash(password)
+    return bcrypt.hashpw(_password_bytes(password), bcrypt.gensalt(BCRYPT_ROUNDS)).decode("utf-8")
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """Verify a password on the hashing pool, without blocking the event loop."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_hash_executor, verify_password, plain_password, hashed_password)
+
+
+async def get_password_hash_async(password: str) -> str:
+    """Hash a password on the hashing pool, without blocking the event loop."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_hash_executor, get_password_hash, password)
 
 
 def authenticate_user(db: Session, email: str, password: str) -> Optional[User]:
@@ -65,9 +91,20 @@ def authenticate_user(db: Session, email: str, password: str) -> Optional[User]:
     return user
 
 
+async def authenticate_user_async(db: Session, email: str, password: str) -> Optional[User]:
+    """Authenticate a user with email and password, checking the hash off the event loop."""
+    user = db.exec(select(User).where(User.email == email)).first()
+    if not user:
+        return None
+    if not await verify_password_async(password, user.password):
+        return None
+    return user
+
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     """Create a JWT access token."""
     to_encode = data.copy()
+    to_encode.setdefault("jti", uuid4().hex)  # token ID, keys the user cache
     
     if expires_delta:
         expire = datetime.utcnow() + expires_delta
@@ -82,7 +119,12 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
 async def get_current_user(
     token: str = Depends(oauth2_scheme), db: Session = Depends(get_session)
 ) -> User:
-    """Get the current authenticated user from JWT token."""
+    """
+    Get the current authenticated user from JWT token.
+    
+    The signature and expiry are checked on every request; the user itself
+    comes from the short-lived user cache when this token was seen recently.
+    """
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -94,7 +136,7 @@ async def get_current_user(
         email: str = payload.get("sub")
         user_id: str = payload.get("user_id")
         
-        logger.info(f"Token payload: email={email}, user_id={user_id}")
+        logger.debug(f"Token payload: email={email}, user_id={user_id}")
         
         if email is None or user_id is None:
             logger.warning("Missing email or user_id in token")
@@ -106,12 +148,18 @@ async def get_current_user(
         logger.error(f"JWT decode error: {str(e)}")
         raise credentials_exception
     
+    # Tokens issued before token IDs were added are keyed by their signature
+    token_id = payload.get("jti") or token.rsplit(".", 1)[-1]
+    cached_user = user_cache.get(email, token_id)
+    if cached_user is not None:
+        return cached_user
+    
     try:
         # Properly handle the string user_id - convert to UUID before querying
         try:
             # Convert string user_id to UUID
             user_uuid = UUID(user_id)
-            logger.info(f"Converted user_id to UUID: {user_uuid}")
+            logger.debug(f"Converted user_id to UUID: {user_uuid}")
             
             # Use the UUID object for querying
             user = db.exec(select(User).where(User.id == user_uuid)).first()
@@ -124,8 +172,19 @@ async def get_current_user(
             logger.warning(f"No user found for ID: {user_id} or email: {email}")
             raise credentials_exception
         
-        logger.info(f"Found user: {user.email}")
+        logger.debug(f"Found user: {user.email}")
+        user_cache.put(email, token_id, user)
         return user
     except Exception as e:
         logger.error(f"Unexpected error in get_current_user: {str(e)}")
-        raise credentials_exception 
\ No newline at end of file
+        raise credentials_exception 
+
+
+async def get_current_admin(current_user: User = Depends(get_current_user)) -> User:
+    """Get the current user, who must be an admin."""
+    if current_user.role != UserRole.ADMIN:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not authorized to access this resource"
+        )
+    return current_user
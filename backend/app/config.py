@@ -12,6 +12,8 @@ class Settings(BaseSettings):
     # Default OpenAI model – can be overridden per deployment
     openai_model: str = "gpt-4.1"
     openai_api_key: Optional[str] = None  # Added to fix validation error
+    openai_base_url: str = "https://api.openai.com/v1"  # Any OpenAI-compatible endpoint
+    openai_assistant_id: Optional[str] = None  # Assistant for /extract; skips the lookup on startup
     
     # API configuration
     api_port: Optional[int] = 8080  # Added to fix validation error
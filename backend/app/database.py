@@ -1,11 +1,29 @@
 """
 Database configuration and utilities for DocTranscribe.
+
+Besides the synchronous engine used by the worker and most routes there is
+an asyncio engine for request handlers, so reads don't block the event
+loop. It connects to the same database through an async driver: aiosqlite
+for SQLite, asyncpg for PostgreSQL.
+
+Configuration (environment):
+    DATABASE_URL        synchronous database URL (default sqlite:///./doctranscribe.db)
+    DATABASE_ASYNC_URL  async database URL (default: DATABASE_URL with the async driver)
+    DATABASE_ECHO       log all SQL statements
 """
 import os
+import time
 from pathlib import Path
-from typing import Generator
+from typing import AsyncGenerator, Generator
 
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session as ORMSession
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine as sqlalchemy_create_async_engine
 from sqlmodel import Session, SQLModel, create_engine as sqlmodel_create_engine
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from .services.metrics import DB_COMMIT_SECONDS
 
 # Get database URL from environment or use SQLite default
 DB_URL = os.environ.get("DATABASE_URL", "sqlite:///./doctranscribe.db")
@@ -28,8 +46,47 @@ def create_engine():
         connect_args={"check_same_thread": False} if DB_URL.startswith("sqlite") else {}
     )
 
-# Create SQLAlchemy engine
+# Async drivers for the synchronous URLs we accept
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+    "postgres": "postgresql+asyncpg",
+}
+
+def async_url(url: str) -> str:
+    """Return `url` with its driver replaced by the matching async driver."""
+    parsed = make_url(url)
+    backend = parsed.get_backend_name()
+    if parsed.get_driver_name() in ("aiosqlite", "asyncpg"):
+        return url
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f"No async driver known for {backend} URLs, set DATABASE_ASYNC_URL")
+    return parsed.set(drivername=ASYNC_DRIVERS[backend]).render_as_string(hide_password=False)
+
+ASYNC_DB_URL = os.environ.get("DATABASE_ASYNC_URL") or async_url(DB_URL)
+
+def create_async_engine() -> AsyncEngine:
+    """Create and return a new asyncio engine for the same database."""
+    return sqlalchemy_create_async_engine(ASYNC_DB_URL, echo=DB_ECHO)
+
+# Create SQLAlchemy engines
 engine = create_engine()
+async_engine = create_async_engine()
+
+# Time every session commit (flush included) for the db_commit metric
+@event.listens_for(ORMSession, "before_commit")
+def _start_commit_timer(session) -> None:
+    session.info["commit_started"] = time.perf_counter()
+
+@event.listens_for(ORMSession, "after_commit")
+def _observe_commit(session) -> None:
+    started = session.info.pop("commit_started", None)
+    if started is not None:
+        DB_COMMIT_SECONDS.observe(time.perf_counter() - started)
+
+@event.listens_for(ORMSession, "after_rollback")
+def _drop_commit_timer(session) -> None:
+    session.info.pop("commit_started", None)
 
 def get_engine():
     """Return the database engine."""
@@ -50,18 +107,55 @@ def get_session() -> Generator[Session, None, None]:
     with Session(engine) as session:
         yield session
 
+async def get_async_session() -> AsyncGenerator[AsyncSession, None]:
+    """
+    Create and yield an asyncio database session.
+    
+    Queries are awaited (`await session.exec(...)`, `await session.get(...)`),
+    so the event loop serves other requests while the database works.
+    Sync helpers taking a Session can run through `await session.run_sync(fn, ...)`.
+    """
+    async with AsyncSession(async_engine) as session:
+        yield session
+
 def create_db_and_tables() -> None:
     """Create all database tables."""
     # Import models here to ensure they're registered with SQLModel
     
     SQLModel.metadata.create_all(engine)
 
+# Columns added to existing tables after their first release. create_all only
+# creates missing tables, so migrate_db adds these to older databases.
+ADDED_COLUMNS = {
+    "document": ["trace_context"],
+    "extractionjob": ["batch_id", "trace_context", "cost_usd", "stage_stats", "preprocessing"],
+}
+
+def migrate_db(bind=None) -> None:
+    """Add the ADDED_COLUMNS an existing database is missing (all nullable)."""
+    from . import models  # noqa: F401 - register the tables
+    
+    bind = bind or engine
+    inspector = inspect(bind)
+    with bind.begin() as conn:
+        for table_name, column_names in ADDED_COLUMNS.items():
+            if not inspector.has_table(table_name):
+                continue
+            existing = {column["name"] for column in inspector.get_columns(table_name)}
+            table = SQLModel.metadata.tables[table_name]
+            for name in column_names:
+                if name in existing:
+                    continue
+                column_type = table.c[name].type.compile(dialect=bind.dialect)
+                conn.exec_driver_sql(f"ALTER TABLE {table_name} ADD COLUMN {name} {column_type}")
+
 def init_db(drop_all: bool = False) -> None:
     """Initialize the database with starting data."""
     if drop_all:
         SQLModel.metadata.drop_all(engine)
     
     create_db_and_tables()
+    migrate_db()
     
     # Add any initial data here if needed
     with Session(engine) as session:
@@ -1,4 +1,6 @@
-import boto3
+import threading
+from functools import lru_cache
+
 from .config import settings
 from sqlmodel import Session, create_engine
 import os
@@ -8,15 +10,54 @@ import os
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./test.db")
 engine = create_engine(DATABASE_URL, echo=True)
 
+# One client per AWS service and process. botocore clients are thread-safe
+# and keep a pool of HTTP connections, so sharing them avoids paying for
+# client construction and new TLS connections on every request.
+@lru_cache(maxsize=None)
+def aws_client_config():
+    """Shared botocore client config, built on first use so boto3 isn't imported at startup."""
+    from botocore.config import Config
+
+    return Config(
+        region_name=settings.aws_region,
+        max_pool_connections=int(os.getenv("AWS_MAX_POOL_CONNECTIONS", "50")),
+        retries={"max_attempts": 5, "mode": "adaptive"},
+        tcp_keepalive=True,
+    )
+
+
+_aws_clients = {}
+_aws_clients_lock = threading.Lock()
+
+
+def get_aws_client(service: str, endpoint_url: str | None = None):
+    """Return the shared boto3 client for an AWS service."""
+    key = (service, endpoint_url)
+    client = _aws_clients.get(key)
+    if client is None:
+        with _aws_clients_lock:
+            client = _aws_clients.get(key)
+            if client is None:
+                import boto3
+
+                client = boto3.client(
+                    service,
+                    aws_access_key_id=settings.aws_access_key_id,
+                    aws_secret_access_key=settings.aws_secret_access_key,
+                    endpoint_url=endpoint_url,
+                    config=aws_client_config(),
+                )
+                _aws_clients[key] = client
+    return client
+
+
 def get_session():
     with Session(engine) as session:
         yield session
 
 def get_s3_client():
-    return boto3.client(
-        "s3",
-        region_name=settings.aws_region,
-        aws_access_key_id=settings.aws_access_key_id,
-        aws_secret_access_key=settings.aws_secret_access_key,
-        endpoint_url=settings.s3_endpoint_url,
-    ) 
\ No newline at end of file
+    return get_aws_client("s3", settings.s3_endpoint_url)
+
+
+def get_textract_client():
+    return get_aws_client("textract")
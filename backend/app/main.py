@@ -4,10 +4,11 @@ Simplified FastAPI app with only authentication endpoints and basic file upload
 
 from fastapi import FastAPI, Request, Depends, HTTPException, status
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
 from fastapi.security import OAuth2PasswordRequestForm
 from fastapi.staticfiles import StaticFiles
 from sqlmodel import Session
+import asyncio
 import traceback
 import os
 import uuid
@@ -16,11 +17,12 @@ import sys
 
 # Import database functions
 from .database import init_db, get_session, get_engine, create_engine
-from .auth import authenticate_user, create_access_token, get_current_user
+from .auth import authenticate_user_async, create_access_token, get_current_user
 from .models import User
+from .services.tracing import TracingMiddleware
 
 # Import routers
-from .routers import handwriting, results, extract, jobs, auth, upload
+from .routers import handwriting, results, extract, jobs, auth, upload, admin
 
 # Setup logging
 logging.basicConfig(
@@ -42,9 +44,12 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],  # Allow all methods
     allow_headers=["*"],  # Allow all headers
-    expose_headers=["Content-Disposition", "Content-Type", "Content-Length"],
+    expose_headers=["Content-Disposition", "Content-Type", "Content-Length", "traceparent"],
 )
 
+# One trace span per request; the response carries its traceparent
+app.add_middleware(TracingMiddleware)
+
 # In-memory state for application
 memory_state = {
     "sample_job_id": None
@@ -110,6 +115,59 @@ async def startup_event():
         logger.error(f"CRITICAL ERROR during database setup: {str(e)}")
         logger.error(traceback.format_exc())
     
+    # Check the results bucket once, off the event loop so an unreachable S3
+    # doesn't delay startup; later requests rely on the cached readiness
+    def check_bucket():
+        from .config import settings
+        from .deps import get_s3_client
+        from .services.storage import ensure_bucket
+        try:
+            ensure_bucket(get_s3_client(), settings.s3_bucket, settings.aws_region)
+            logger.info(f"S3 bucket {settings.s3_bucket} is ready")
+        except Exception as e:
+            logger.warning(f"Could not verify S3 bucket at startup, will retry on first use: {str(e)}")
+    asyncio.get_running_loop().run_in_executor(None, check_bucket)
+    
+    # Heavy dependencies (pandas, scikit-learn, openai, ...) are imported on
+    # first use; PREWARM_IMPORTS names modules to load in the background once
+    # the app is already serving, e.g. "pandas,sklearn.ensemble,openai"
+    prewarm_modules = [m.strip() for m in os.environ.get("PREWARM_IMPORTS", "").split(",") if m.strip()]
+    if prewarm_modules:
+        def prewarm_imports():
+            import importlib
+            for module in prewarm_modules:
+                try:
+                    importlib.import_module(module)
+                except Exception as e:
+                    logger.warning(f"Could not prewarm import {module}: {str(e)}")
+            logger.info(f"Prewarmed imports: {', '.join(prewarm_modules)}")
+        asyncio.get_running_loop().run_in_executor(None, prewarm_imports)
+    
+    # Job progress events are published from worker threads and delivered on this loop
+    from .services.events import event_bus
+    event_bus.bind_loop(asyncio.get_running_loop())
+    
+    # Report event loop lag on /metrics
+    from .services.metrics import start_loop_lag_monitor
+    app.state.loop_lag_monitor = start_loop_lag_monitor()
+    
+    # Capture the stacks of callbacks that block the loop, if LOOP_WATCHDOG_MS is set
+    from .services.profiling import start_loop_watchdog
+    app.state.loop_watchdog = start_loop_watchdog()
+    
+    # Export trace spans if TRACING_EXPORTER is set
+    from .services import tracing
+    tracing.configure()
+    
+    # Periodically clean up threads and files left behind by the Assistants extractor
+    from .services.extract import start_assistant_gc
+    start_assistant_gc()
+    
+    # Pick up jobs a crash or restart left unfinished, if RESUME_INTERRUPTED_JOBS is set
+    from .services.pdf_service import RESUME_INTERRUPTED_JOBS, PDFProcessingService
+    if RESUME_INTERRUPTED_JOBS:
+        await PDFProcessingService().resume_interrupted_jobs()
+    
     # Initialize in-memory state
     logger.info("Initializing in-memory state...")
     with Session(get_engine()): # Use get_engine() to ensure it uses the latest engine
@@ -125,6 +183,7 @@ app.include_router(extract.router)
 app.include_router(jobs.router)
 app.include_router(auth.router)
 app.include_router(upload.router)
+app.include_router(admin.router)
 
 # Auth endpoints
 @app.post("/auth/login")
@@ -134,7 +193,7 @@ async def login_for_access_token(
 ):
     """Authenticate user and return JWT token."""
     logger.info(f"Login attempt for user: {form_data.username}")
-    user = authenticate_user(db, form_data.username, form_data.password)
+    user = await authenticate_user_async(db, form_data.username, form_data.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -186,6 +245,12 @@ async def health_check():
     """Health check endpoint."""
     return {"status": "ok", "model": "gpt-4.1", "version": "1.0.0"}
 
+@app.get("/metrics")
+async def metrics():
+    """Pipeline metrics in the Prometheus text format."""
+    from .services.metrics import REGISTRY
+    return Response(REGISTRY.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
 @app.get("/debug-state")
 async def debug_state(request: Request):
     """Debug endpoint to see application state (in development only)."""
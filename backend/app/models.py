@@ -7,7 +7,7 @@ from typing import List, Optional
 from uuid import UUID, uuid4
 
 from sqlmodel import Field, Relationship, SQLModel
-from sqlalchemy import Column, JSON
+from sqlalchemy import Column, JSON, UniqueConstraint
 
 
 class ProcessingStatus(str, Enum):
@@ -17,6 +17,13 @@ class ProcessingStatus(str, Enum):
     FAILED = "failed"
 
 
+class PageStatus(str, Enum):
+    PENDING = "pending"
+    IN_FLIGHT = "in_flight"
+    DONE = "done"
+    FAILED = "failed"
+
+
 class UserRole(str, Enum):
     USER = "user"
     ADMIN = "admin"
@@ -61,6 +68,7 @@ class Document(DocumentBase, table=True):
     id: UUID = Field(default_factory=uuid4, primary_key=True)
     status: ProcessingStatus = Field(default=ProcessingStatus.PENDING)
     user_id: Optional[UUID] = Field(default=None, foreign_key="user.id")
+    trace_context: Optional[str] = None  # W3C traceparent of the upload, see services/tracing.py
     
     # Relationships
     extraction_jobs: List["ExtractionJob"] = Relationship(back_populates="document", sa_relationship_kwargs={"foreign_keys": "[ExtractionJob.document_id]"})
@@ -79,6 +87,9 @@ class ExtractionJobBase(SQLModel):
     total_pages: int = 0
     confidence_score: Optional[float] = None
     error_message: Optional[str] = None
+    batch_id: Optional[str] = None  # OpenAI Batch API id when processed offline
+    trace_context: Optional[str] = None  # W3C traceparent of the span that created the job
+    cost_usd: Optional[float] = None  # estimated model spend across cascade stages
 
 
 class ExtractionJob(ExtractionJobBase, table=True):
@@ -90,6 +101,12 @@ class ExtractionJob(ExtractionJobBase, table=True):
     document_id: UUID = Field(foreign_key="document.id")
     status: ProcessingStatus = Field(default=ProcessingStatus.PENDING)
     
+    # Per-model latency, tokens, cost and escalation counts from the cascade
+    stage_stats: Optional[dict] = Field(default=None, sa_column=Column(JSON))
+    
+    # Page preprocessing steps for this job (see services/preprocessing.py)
+    preprocessing: Optional[dict] = Field(default=None, sa_column=Column(JSON))
+    
     # Relationships
     document: "Document" = Relationship(back_populates="extraction_jobs", sa_relationship_kwargs={"foreign_keys": "[ExtractionJob.document_id]"})
     results: List["ExtractionResult"] = Relationship(back_populates="job", sa_relationship_kwargs={"foreign_keys": "[ExtractionResult.job_id]"})
@@ -136,4 +153,64 @@ class XLSXExport(XLSXExportBase, table=True):
     job_id: UUID = Field(foreign_key="extractionjob.id")
     
     # Relationships
-    job: "ExtractionJob" = Relationship(sa_relationship_kwargs={"foreign_keys": "[XLSXExport.job_id]"}) 
\ No newline at end of file
+    job: "ExtractionJob" = Relationship(sa_relationship_kwargs={"foreign_keys": "[XLSXExport.job_id]"}) 
+
+class ModelCall(SQLModel, table=True):
+    """
+    One model request made while extracting a page, with its token usage and
+    where the page's time went. Page-level timings (queue, render, encode) are
+    recorded on the first call of each page so that sums stay correct.
+    """
+    __tablename__ = "modelcall"
+    __table_args__ = {"extend_existing": True}
+    
+    id: UUID = Field(default_factory=uuid4, primary_key=True)
+    created_at: datetime = Field(default_factory=datetime.utcnow, index=True)
+    job_id: UUID = Field(foreign_key="extractionjob.id", index=True)
+    document_id: Optional[UUID] = Field(default=None, foreign_key="document.id")
+    user_id: Optional[UUID] = Field(default=None, foreign_key="user.id", index=True)
+    page_number: int
+    model: str
+    kind: str = "page"  # "page", "region" (template answer regions) or "batch"
+    prompt_version: Optional[str] = None  # prompt template key, see services/prompts.py
+    
+    input_tokens: int = 0
+    cached_tokens: int = 0
+    output_tokens: int = 0
+    cost_usd: float = 0.0
+    
+    # Milliseconds
+    queue_ms: float = 0.0    # waiting between PDF render and the start of the page
+    render_ms: float = 0.0   # share of the PDF-to-image conversion
+    encode_ms: float = 0.0   # preprocessing and base64 encoding
+    network_ms: float = 0.0  # request until the last streamed chunk
+    parse_ms: float = 0.0    # parsing the model output
+    latency_ms: float = 0.0  # whole call, including continuations
+    
+    error: Optional[str] = None
+
+
+class PageTask(SQLModel, table=True):
+    """
+    Processing state of one page of a job, the checkpoint jobs resume from.
+    
+    The idempotency key identifies the work itself - document, page, model,
+    prompt version and preprocessing/template settings - so a page already extracted with the same settings,
+    in this job or an earlier one of the document, is not paid for again.
+    """
+    __tablename__ = "pagetask"
+    __table_args__ = (UniqueConstraint("job_id", "page_number"), {"extend_existing": True})
+    
+    id: UUID = Field(default_factory=uuid4, primary_key=True)
+    job_id: UUID = Field(foreign_key="extractionjob.id", index=True)
+    document_id: UUID = Field(foreign_key="document.id")
+    page_number: int
+    status: PageStatus = Field(default=PageStatus.PENDING)
+    idempotency_key: str = Field(index=True)
+    model: str  # the cascade's models, e.g. "gpt-4.1-mini>gpt-4.1"
+    prompt_version: str
+    attempts: int = 0
+    error: Optional[str] = None
+    result_id: Optional[UUID] = Field(default=None, foreign_key="extractionresult.id")
+    reused_from: Optional[UUID] = Field(default=None, foreign_key="extractionjob.id")  # job the result was copied from
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
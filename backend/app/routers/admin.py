@@ -0,0 +1,60 @@
+"""
+Admin-only diagnostics: event loop stalls and on-demand profiling.
+"""
+import asyncio
+import logging
+from typing import Any, Dict
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+
+from ..auth import get_current_admin
+from ..services.profiling import ProfilerBusy, get_loop_watchdog, write_profile
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(
+    prefix="/admin",
+    tags=["admin"],
+    dependencies=[Depends(get_current_admin)],
+    responses={401: {"description": "Unauthorized"}, 403: {"description": "Not an admin"}},
+)
+
+
+@router.get("/loop-stalls")
+async def get_loop_stalls() -> Dict[str, Any]:
+    """
+    Recent event loop stalls with the stack of the blocking code.
+
+    Returns:
+        Whether the watchdog is running (LOOP_WATCHDOG_MS), its threshold and the stalls, newest last
+    """
+    watchdog = get_loop_watchdog()
+    if watchdog is None:
+        return {"enabled": False, "threshold_ms": None, "stalls": []}
+    return {
+        "enabled": True,
+        "threshold_ms": watchdog.threshold * 1000,
+        "stalls": list(watchdog.stalls),
+    }
+
+
+@router.post("/profile")
+async def take_profile(
+    seconds: float = Query(10, gt=0, le=120, description="How long to sample"),
+    interval_ms: float = Query(5, ge=1, le=1000, description="Time between samples"),
+    loop_only: bool = Query(False, description="Only sample the event loop thread"),
+) -> Dict[str, Any]:
+    """
+    Sample the stacks of the running process and write them to a file.
+
+    The output in PROFILE_DIR is in collapsed-stack format, for
+    flamegraph.pl or speedscope. Sampling runs on a worker thread, so the
+    event loop keeps serving requests - and is itself profiled - meanwhile.
+
+    Returns:
+        The file path, sample count and the most frequent innermost frames
+    """
+    try:
+        return await asyncio.to_thread(write_profile, seconds, interval_ms / 1000, loop_only)
+    except ProfilerBusy as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
@@ -9,8 +9,8 @@ from fastapi.security import OAuth2PasswordRequestForm
 from pydantic import BaseModel, EmailStr
 from sqlmodel import Session, select
 
-from ..auth import (authenticate_user, create_access_token, get_current_user,
-                   get_password_hash)
+from ..auth import (authenticate_user_async, create_access_token, get_current_user,
+                   get_password_hash_async)
 from ..database import get_session
 from ..models import User, UserRole
 
@@ -61,7 +61,7 @@ async def register_user(user_data: UserCreate, db: Session = Depends(get_session
         )
     
     # Create new user
-    hashed_password = get_password_hash(user_data.password)
+    hashed_password = await get_password_hash_async(user_data.password)
     new_user = User(
         email=user_data.email,
         password=hashed_password,
@@ -98,7 +98,7 @@ async def login_for_access_token(
     db: Session = Depends(get_session)
 ) -> LoginResponse:
     """Authenticate user and return JWT token."""
-    user = authenticate_user(db, form_data.username, form_data.password)
+    user = await authenticate_user_async(db, form_data.username, form_data.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -1,17 +1,19 @@
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from uuid import uuid4
 from io import BytesIO
 
-from fastapi import APIRouter, UploadFile, File, Depends, status, Request, BackgroundTasks
-import pandas as pd
-import botocore.exceptions
+from fastapi import APIRouter, UploadFile, File, Depends, status, Request, BackgroundTasks, HTTPException
 import random
 
-from ..services.extract import extract
-from ..schemas import JobResult, BatchJobRequest, BatchJobResult
+from ..services.extract import IN_FLIGHT_STATUSES, extract
+from ..schemas import ExtractJobAccepted, ExtractJobStatus, BatchJobRequest, BatchJobResult
 from ..deps import get_s3_client
 from ..config import settings
 from ..services.xlsx import to_xlsx_bytes
+from ..services.storage import upload_bytes, with_bucket
 from ..services.anomaly import detect_anomalies
 
 router = APIRouter(prefix="/extract", tags=["extraction"])
@@ -62,91 +64,135 @@ async def test_openai():
         return {"status": "error", "message": f"Setup error: {str(e)}"}
 
 
-@router.post("/", response_model=JobResult, status_code=status.HTTP_201_CREATED)
+# Extraction, S3 uploads and pandas work are blocking; they run here instead
+# of on the event loop.
+EXTRACT_WORKERS = int(os.environ.get("EXTRACT_WORKERS", "4"))
+_extract_executor = ThreadPoolExecutor(max_workers=EXTRACT_WORKERS, thread_name_prefix="extract")
+# Keep references to running jobs so they aren't garbage-collected mid-flight
+_running_jobs: set = set()
+# Finished jobs kept in app.state.jobs; queued and processing jobs are never evicted
+MAX_FINISHED_JOBS = 20
+
+
+def _remember_job(app, job: dict) -> None:
+    """Add a job to app.state.jobs, evicting the oldest finished jobs beyond MAX_FINISHED_JOBS."""
+    kept, finished = [], 0
+    for existing in [job] + getattr(app.state, "jobs", []):
+        if existing.get("status") not in IN_FLIGHT_STATUSES:
+            finished += 1
+            if finished > MAX_FINISHED_JOBS:
+                continue
+        kept.append(existing)
+    app.state.jobs = kept
+
+
+def _run_extraction(file_bytes: bytes, s3) -> dict:
+    """Blocking part of an /extract job: extract, store JSON/XLSX and count anomalies."""
+    print('--- [extract job] Calling extract() ---')
+    result = extract(file_bytes)
+    print('--- [extract job] Extraction complete ---')
+
+    # Store JSON and XLSX (bucket readiness is cached, see services/storage.py)
+    prefix = f"results/{datetime.utcnow().strftime('%Y/%m/%d')}/{uuid4()}"
+    json_key = f"{prefix}.json"
+    xlsx_key = f"{prefix}.xlsx"
+    with_bucket(s3, settings.s3_bucket, settings.aws_region, lambda: upload_bytes(
+        s3,
+        settings.s3_bucket,
+        json_key,
+        result.model_dump_json(indent=None).encode(),
+        content_type="application/json",
+        extra_args={"ServerSideEncryption": "AES256"},
+    ))
+
+    xlsx_bytes = to_xlsx_bytes(result)
+    with_bucket(s3, settings.s3_bucket, settings.aws_region, lambda: upload_bytes(
+        s3,
+        settings.s3_bucket,
+        xlsx_key,
+        xlsx_bytes,
+        content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        extra_args={"ServerSideEncryption": "AES256"},
+    ))
+    print('--- [extract job] JSON and XLSX stored to S3 ---')
+
+    # Detect anomalies for numeric columns
+    import pandas as pd
+    df = pd.read_excel(BytesIO(xlsx_bytes))
+    annotated = detect_anomalies(df, numeric_cols=["measurement"])
+    anomaly_count = int(annotated["is_anomaly"].sum())
+    print(f'--- [extract job] Anomaly detection complete: {anomaly_count} anomalies ---')
+
+    return {
+        "sheet_name": result.sheet_name,
+        "anomalies": anomaly_count,
+        "xlsx_s3_key": xlsx_key,
+    }
+
+
+async def _run_extract_job(job: dict, file_bytes: bytes, s3) -> None:
+    """Run an /extract job in the executor and record the outcome on the job."""
+    job["status"] = "processing"
+    try:
+        loop = asyncio.get_running_loop()
+        outcome = await loop.run_in_executor(_extract_executor, _run_extraction, file_bytes, s3)
+        job.update(outcome)
+        job["status"] = "completed"
+    except Exception as e:
+        import traceback
+        print(f"Extract job {job['job_id']} failed: {str(e)}")
+        print(traceback.format_exc())
+        job["status"] = "failed"
+        job["error"] = f"Extraction failed: {str(e)}"
+
+
+@router.post("/", response_model=ExtractJobAccepted, status_code=status.HTTP_202_ACCEPTED)
 async def extract_route(
     request: Request,
     file: UploadFile = File(...),
     s3=Depends(get_s3_client),
 ):
-    try:
-        print('--- [extract_route] Start file read ---')
-        file_bytes = await file.read()
-        print('--- [extract_route] File read complete, calling extract() ---')
-        result = extract(file_bytes)
-        print('--- [extract_route] Extraction complete ---')
-
-        # Ensure bucket exists
-        print('--- [extract_route] Ensuring S3 bucket exists ---')
-        _ensure_bucket(s3, settings.s3_bucket, settings.aws_region)
-        print('--- [extract_route] S3 bucket check complete ---')
-
-        # Store JSON and XLSX
-        prefix = f"results/{datetime.utcnow().strftime('%Y/%m/%d')}/{uuid4()}"
-        json_key = f"{prefix}.json"
-        xlsx_key = f"{prefix}.xlsx"
-        try:
-            print('--- [extract_route] Storing JSON to S3 ---')
-            s3.put_object(
-                Bucket=settings.s3_bucket,
-                Key=json_key,
-                Body=result.model_dump_json(indent=None).encode(),
-                ContentType="application/json",
-                ServerSideEncryption="AES256",
-            )
-            print('--- [extract_route] JSON stored to S3 ---')
-        except Exception as e:
-            print(f"Error storing JSON: {str(e)}")
-            raise
+    """Queue a lab sheet for extraction and return a job id to poll."""
+    file_bytes = await file.read()
 
-        # XLSX upload
-        print('--- [extract_route] Generating XLSX bytes ---')
-        xlsx_bytes = to_xlsx_bytes(result)
-        print('--- [extract_route] XLSX bytes generated, storing to S3 ---')
-        try:
-            s3.put_object(
-                Bucket=settings.s3_bucket,
-                Key=xlsx_key,
-                Body=xlsx_bytes,
-                ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                ServerSideEncryption="AES256",
-            )
-            print('--- [extract_route] XLSX stored to S3 ---')
-        except Exception as e:
-            print(f"Error storing XLSX: {str(e)}")
-            raise
-
-        # Detect anomalies for numeric columns
-        print('--- [extract_route] Reading XLSX for anomaly detection ---')
-        df = pd.read_excel(BytesIO(xlsx_bytes))
-        print('--- [extract_route] Running anomaly detection ---')
-        annotated = detect_anomalies(df, numeric_cols=["measurement"])
-        anomaly_count = int(annotated["is_anomaly"].sum())
-        print(f'--- [extract_route] Anomaly detection complete: {anomaly_count} anomalies ---')
-
-        # push into in-memory store (simple)
-        job_id = str(uuid4())
-        job = {
-            "job_id": job_id,
-            "sheet_name": result.sheet_name,
-            "anomalies": anomaly_count,
-            "xlsx_s3_key": xlsx_key,
-        }
-        jobs: list = request.app.state.jobs  # type: ignore
-        jobs.insert(0, job)
-        request.app.state.jobs = jobs[:20]
-        print('--- [extract_route] Job added to app.state.jobs ---')
+    job = {
+        "job_id": str(uuid4()),
+        "status": "queued",
+        "created_at": datetime.utcnow().isoformat(),
+        "sheet_name": None,
+        "anomalies": None,
+        "xlsx_s3_key": None,
+    }
+    _remember_job(request.app, job)
+
+    task = asyncio.create_task(_run_extract_job(job, file_bytes, s3))
+    _running_jobs.add(task)
+    task.add_done_callback(_running_jobs.discard)
+
+    return ExtractJobAccepted(
+        job_id=job["job_id"],
+        status=job["status"],
+        status_url=str(request.url_for("get_extract_job", job_id=job["job_id"])),
+    )
 
-        return JobResult(sheet_name=result.sheet_name, anomalies=anomaly_count)
-    except Exception as e:
-        import traceback
-        print(f"Extract route error: {str(e)}")
-        print(traceback.format_exc())
-        # Return a more helpful error response
-        from fastapi.responses import JSONResponse
-        return JSONResponse(
-            status_code=500,
-            content={"error": f"Upload failed: {str(e)}"}
-        )
+
+@router.get("/jobs/{job_id}", response_model=ExtractJobStatus, name="get_extract_job")
+async def get_extract_job(job_id: str, request: Request):
+    """Get the status (and, once completed, the result) of an /extract job."""
+    jobs = getattr(request.app.state, "jobs", [])
+    job = next((j for j in jobs if j.get("job_id") == job_id), None)
+    if not job:
+        raise HTTPException(status_code=404, detail=f"Extract job {job_id} not found")
+    # Jobs recorded by /results (sample data) have no status or creation time
+    return ExtractJobStatus(
+        job_id=job_id,
+        status=job.get("status", "completed"),
+        created_at=job.get("created_at"),
+        sheet_name=job.get("sheet_name"),
+        anomalies=job.get("anomalies"),
+        xlsx_s3_key=job.get("xlsx_s3_key"),
+        error=job.get("error"),
+    )
 
 
 @router.post("/batch", response_model=BatchJobResult, status_code=status.HTTP_202_ACCEPTED)
@@ -327,29 +373,3 @@ def simulate_survey_extraction():
             "confidence": random.uniform(0.5, 0.95)
         }
     }
-
-
-# ---------------------------------------------------------------------------
-# S3 helpers
-# ---------------------------------------------------------------------------
-
-
-def _ensure_bucket(s3_client, bucket: str, region: str | None = None) -> None:
-    """Idempotently create the bucket if it doesn't exist.
-
-    Works for both real AWS S3 and LocalStack. If the bucket already exists
-    or we lack permission, the original error is re-raised so we don't mask
-    credentials issues.
-    """
-    try:
-        s3_client.head_bucket(Bucket=bucket)
-    except botocore.exceptions.ClientError as err:  # bucket missing or forbidden
-        error_code = err.response.get("Error", {}).get("Code", "")
-        if error_code in ("404", "NoSuchBucket"):  # create only if truly missing
-            create_kwargs = {"Bucket": bucket}
-            if region and region != "us-east-1":
-                create_kwargs["CreateBucketConfiguration"] = {"LocationConstraint": region}
-            s3_client.create_bucket(**create_kwargs)
-        else:
-            # Any other error (e.g., invalid credentials) should bubble up
-            raise 
\ No newline at end of file
@@ -2,20 +2,30 @@
 Router for handwriting recognition functionality.
 """
 import os
+from datetime import datetime
 from pathlib import Path
 from typing import List, Dict, Any, Optional
 from uuid import UUID
 import traceback
 import logging
 import json
+import asyncio
 
-from fastapi import APIRouter, UploadFile, File, Form, Depends, HTTPException, BackgroundTasks, Query, Response
-from fastapi.responses import FileResponse, Response
-from sqlmodel import Session
+from fastapi import APIRouter, UploadFile, File, Form, Depends, HTTPException, BackgroundTasks, Query, Header, WebSocket, WebSocketDisconnect
+from fastapi.responses import FileResponse, JSONResponse, Response, StreamingResponse
+from sqlmodel import Session, select
+from sqlmodel.ext.asyncio.session import AsyncSession
 
-from ..database import get_session
-from ..models import ExtractionJob, XLSXExport, Document
-from ..services.pdf_service import PDFProcessingService
+from ..database import async_engine, get_async_session, get_session
+from ..models import ExtractionJob, XLSXExport, Document, PageStatus, ProcessingStatus
+from ..services.events import job_event_stream
+from ..services.page_tasks import page_states
+from ..services.pdf_service import PDFProcessingService, is_job_running
+from ..services.preprocessing import PreprocessOptions
+from ..services.results_cache import results_cache
+from ..services.tracing import trace_id_of
+from ..services.usage import job_usage, usage_rollup
+from ..services.status_cache import MAX_LONG_POLL_WAIT, document_key, document_status_key, etag_matches, job_key, status_cache
 
 # Configure logging
 logger = logging.getLogger(__name__)
@@ -26,6 +36,49 @@ router = APIRouter(prefix="/handwriting", tags=["handwriting"])
 # Create service
 pdf_service = PDFProcessingService()
 
+async def _cached_status(key: str, load, version=None):
+    """Return (etag, payload) from the status cache, loading it on a miss."""
+    cached = status_cache.get(key)
+    if cached:
+        return cached
+    payload = await load()
+    return status_cache.put(key, payload, version(payload) if version else None), payload
+
+async def _conditional_status(key: str, load, if_none_match: Optional[str], wait: float, version=None) -> Response:
+    """
+    Answer a status poll with ETag support and optional long-polling.
+    
+    If the client's If-None-Match still matches, wait up to `wait` seconds
+    for the job to change before answering 304 Not Modified.
+    
+    Args:
+        key: Status cache key
+        load: Coroutine function building the payload from the database
+        if_none_match: The request's If-None-Match header
+        wait: Seconds to hold the request open while nothing changes
+        version: Optional function picking the fields the ETag is built from
+    """
+    etag, payload = await _cached_status(key, load, version)
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + min(max(wait, 0.0), MAX_LONG_POLL_WAIT)
+    while etag_matches(if_none_match, etag):
+        remaining = deadline - loop.time()
+        if remaining <= 0:
+            return Response(status_code=304, headers={"ETag": etag, "Cache-Control": "no-cache"})
+        # Re-check at least once per TTL in case a change bypassed the event bus
+        await status_cache.wait_for_change(key, min(remaining, status_cache.ttl))
+        etag, payload = await _cached_status(key, load, version)
+    return JSONResponse(payload, headers={"ETag": etag, "Cache-Control": "no-cache"})
+
+def _document_version(doc_info: Dict[str, Any]) -> Dict[str, Any]:
+    """Fields of a document response that change with processing progress."""
+    job = doc_info.get("latest_job") or {}
+    return {
+        "status": doc_info.get("status"),
+        "total_pages": doc_info.get("total_pages"),
+        "job": [job.get("id"), job.get("status"), job.get("pages_processed"), job.get("total_pages")],
+    }
+
 @router.post("/upload")
 async def upload_document(
     file: UploadFile = File(...),
@@ -65,22 +118,26 @@ async def upload_document(
 @router.get("/documents/{document_id}")
 async def get_document(
     document_id: str,
-    response: Response
-):
+    wait: float = Query(0, ge=0, description="Seconds to wait for a change when If-None-Match matches"),
+    if_none_match: Optional[str] = Header(None)
+) -> Response:
     """
     Get document information.
     
     Args:
         document_id: The document ID
+        wait: Long-poll timeout in seconds
+        if_none_match: ETag from a previous response
         
     Returns:
-        Document information
+        Document information, or 304 if unchanged
     """
-    # Add caching headers for improved performance
-    response.headers["Cache-Control"] = "max-age=60, stale-while-revalidate=300"
-    doc_info = await pdf_service.get_document_by_id(document_id)
-    logger.info(f"[API] /documents/{document_id} returns status={doc_info.get('status')}, latest_job={doc_info.get('latest_job', {}).get('status') if doc_info.get('latest_job') else None}")
-    return doc_info
+    async def load():
+        doc_info = await pdf_service.get_document_by_id(document_id)
+        logger.debug(f"[API] /documents/{document_id} returns status={doc_info.get('status')}, latest_job={doc_info.get('latest_job', {}).get('status') if doc_info.get('latest_job') else None}")
+        return doc_info
+    
+    return await _conditional_status(document_key(document_id), load, if_none_match, wait, _document_version)
 
 @router.get("/documents/{document_id}/pdf", response_class=FileResponse)
 async def get_document_pdf(
@@ -132,6 +189,7 @@ async def process_document(
     document_id: str,
     background_tasks: BackgroundTasks,
     api_key: Optional[str] = Query(None),
+    preprocess: Optional[str] = Query(None, description="Page preprocessing steps, e.g. 'sauvola,deskew,crop' or 'none'"),
     session: Session = Depends(get_session)
 ) -> Dict[str, Any]:
     """
@@ -141,6 +199,7 @@ async def process_document(
         document_id: The document ID
         background_tasks: Background tasks
         api_key: Optional API key for OpenAI
+        preprocess: Optional preprocessing steps for this job (defaults to PAGE_PREPROCESS)
         session: Database session
         
     Returns:
@@ -149,6 +208,11 @@ async def process_document(
     # Set API key from environment or query parameter
     service = PDFProcessingService(api_key or os.environ.get("OPENAI_API_KEY"))
     
+    try:
+        preprocess_options = PreprocessOptions.parse(preprocess) if preprocess is not None else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
     try:
         # Get document
         try:
@@ -157,7 +221,9 @@ async def process_document(
             raise HTTPException(status_code=400, detail="Invalid document ID")
         
         # Use the service's process_document method directly
-        job = await service.process_document(document_uuid, session)
+        job = await service.process_document(document_uuid, session, preprocess=preprocess_options)
+        status_cache.invalidate(document_key(document_uuid), document_status_key(document_uuid), job_key(job.id))
+        results_cache.invalidate_document(document_uuid)
         
         # Return job information
         return {
@@ -174,62 +240,237 @@ async def process_document(
 @router.get("/jobs/{job_id}")
 async def get_job_status(
     job_id: str,
-    session: Session = Depends(get_session)
-) -> Dict[str, Any]:
+    wait: float = Query(0, ge=0, description="Seconds to wait for a change when If-None-Match matches"),
+    if_none_match: Optional[str] = Header(None)
+) -> Response:
     """
     Get job status.
     
     Args:
         job_id: The job ID
-        session: Database session
+        wait: Long-poll timeout in seconds
+        if_none_match: ETag from a previous response
         
     Returns:
-        Job status
+        Job status, or 304 if unchanged
     """
-    # Try to get from database
-    try:
-        job_uuid = UUID(job_id)
-        job = session.get(ExtractionJob, job_uuid)
+    async def load():
+        # Try to get from database
+        try:
+            job_uuid = UUID(job_id)
+            async with AsyncSession(async_engine) as session:
+                job = await session.get(ExtractionJob, job_uuid)
+                
+                if job:
+                    logger.debug(f"[API] /jobs/{job_id} returns status={job.status.value}, pages_processed={job.pages_processed}, total_pages={job.total_pages}")
+                    return {
+                        "id": str(job.id),
+                        "document_id": str(job.document_id),
+                        "status": job.status.value,
+                        "model_name": job.model_name,
+                        "started_at": job.started_at.isoformat() if job.started_at else None,
+                        "completed_at": job.completed_at.isoformat() if job.completed_at else None,
+                        "pages_processed": job.pages_processed,
+                        "total_pages": job.total_pages,
+                        "cost_usd": job.cost_usd,
+                        "stage_stats": job.stage_stats,
+                        "preprocessing": job.preprocessing,
+                        "trace_id": trace_id_of(job.trace_context)
+                    }
+        except (ValueError, AttributeError):
+            pass
+        
+        # Fallback to mock data
+        return {
+            "id": job_id,
+            "status": "completed",
+            "started_at": "2023-01-01T00:00:00Z",
+            "completed_at": "2023-01-01T00:00:00Z",
+            "pages_processed": 1,
+            "total_pages": 1
+        }
+    
+    return await _conditional_status(job_key(job_id), load, if_none_match, wait)
+
+@router.get("/jobs/{job_id}/events")
+async def stream_job_events(
+    job_id: str,
+    last_event_id: Optional[int] = Query(None),
+    last_event_id_header: Optional[int] = Header(None, alias="Last-Event-ID")
+) -> StreamingResponse:
+    """
+    Stream job progress as Server-Sent Events.
+    
+    Browsers reconnecting with the Last-Event-ID header (or the
+    `last_event_id` query parameter) resume where they left off.
+    
+    Args:
+        job_id: The job ID
+        last_event_id: Last event id the client has seen
+        last_event_id_header: Same, as sent by EventSource on reconnect
         
-        if job:
-            logger.info(f"[API] /jobs/{job_id} returns status={job.status.value}, pages_processed={job.pages_processed}, total_pages={job.total_pages}")
-            return {
-                "id": str(job.id),
-                "document_id": str(job.document_id),
-                "status": job.status.value,
-                "model_name": job.model_name,
-                "started_at": job.started_at.isoformat() if job.started_at else None,
-                "completed_at": job.completed_at.isoformat() if job.completed_at else None,
-                "pages_processed": job.pages_processed,
-                "total_pages": job.total_pages
-            }
-    except (ValueError, AttributeError):
-        pass
+    Returns:
+        text/event-stream response that ends when the job completes or fails
+    """
+    events = job_event_stream(job_id, last_event_id if last_event_id is not None else last_event_id_header)
     
-    # Fallback to mock data
-    return {
-        "id": job_id,
-        "status": "completed",
-        "started_at": "2023-01-01T00:00:00Z",
-        "completed_at": "2023-01-01T00:00:00Z",
-        "pages_processed": 1,
-        "total_pages": 1
-    }
+    async def body():
+        async for event in events:
+            yield f"id: {event.id}\nevent: {event.type}\ndata: {json.dumps(event.data, default=str)}\n\n"
+    
+    return StreamingResponse(
+        body(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.websocket("/jobs/{job_id}/ws")
+async def job_events_ws(websocket: WebSocket, job_id: str, last_event_id: Optional[int] = None):
+    """
+    Push job progress events over a WebSocket.
+    
+    Each message is a JSON event ({"job_id", "id", "type", "data", "timestamp"});
+    the socket is closed after the job's completed/failed event.
+    """
+    try:
+        events = job_event_stream(job_id, last_event_id)
+    except HTTPException as e:
+        await websocket.close(code=4404, reason=e.detail)
+        return
+    
+    await websocket.accept()
+    try:
+        async for event in events:
+            await websocket.send_text(event.to_json())
+        await websocket.close()
+    except WebSocketDisconnect:
+        pass
 
 @router.get("/jobs/{job_id}/results")
 async def get_job_results(
     job_id: str,
-) -> List[Dict[str, Any]]:
+    accept_encoding: Optional[str] = Header(None),
+    if_none_match: Optional[str] = Header(None)
+):
     """
     Get job results.
     
+    Completed jobs are served from a pre-serialized, gzip-compressed copy.
+    
     Args:
         job_id: The job ID
+        accept_encoding: Whether the client takes the gzipped body as-is
+        if_none_match: ETag from a previous response
         
     Returns:
         List of extraction results
     """
-    return await pdf_service.get_job_results(job_id)
+    materialized = await pdf_service.get_materialized_job_results(job_id)
+    if materialized is None:
+        return await pdf_service.get_job_results(job_id)
+    
+    headers = {"ETag": materialized.etag, "Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+    if etag_matches(if_none_match, materialized.etag):
+        return Response(status_code=304, headers=headers)
+    if accept_encoding and "gzip" in accept_encoding:
+        return Response(materialized.body, media_type="application/json", headers={**headers, "Content-Encoding": "gzip"})
+    return Response(materialized.json_bytes(), media_type="application/json", headers=headers)
+
+@router.get("/jobs/{job_id}/usage")
+async def get_job_usage(job_id: UUID, session: AsyncSession = Depends(get_async_session)) -> Dict[str, Any]:
+    """
+    Get token usage, cost and latency breakdown of a job's model calls.
+    
+    Args:
+        job_id: The job ID
+        
+    Returns:
+        Job totals and the calls made for each page
+    """
+    if not await session.get(ExtractionJob, job_id):
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    return await session.run_sync(job_usage, job_id)
+
+@router.get("/jobs/{job_id}/pages")
+async def get_job_pages(job_id: UUID, session: AsyncSession = Depends(get_async_session)) -> Dict[str, Any]:
+    """
+    Get the processing state of each page of a job.
+    
+    Args:
+        job_id: The job ID
+        
+    Returns:
+        Page counts per state (pending, in_flight, done, failed) and each page's state
+    """
+    if not await session.get(ExtractionJob, job_id):
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    return await session.run_sync(page_states, job_id)
+
+@router.post("/jobs/{job_id}/resume")
+async def resume_job(
+    job_id: UUID,
+    api_key: Optional[str] = Query(None),
+    session: AsyncSession = Depends(get_async_session)
+) -> Dict[str, Any]:
+    """
+    Resume a failed or interrupted job, processing only the pages that are not done.
+    
+    Args:
+        job_id: The job ID
+        api_key: Optional API key for OpenAI
+        
+    Returns:
+        Job information and the number of pages left to process
+    """
+    job = await session.get(ExtractionJob, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    if job.status == ProcessingStatus.COMPLETED:
+        raise HTTPException(status_code=409, detail=f"Job {job_id} is already completed")
+    if is_job_running(job_id):
+        raise HTTPException(status_code=409, detail=f"Job {job_id} is still running")
+    document_id, total_pages = job.document_id, job.total_pages
+    pages_done = (await session.run_sync(page_states, job_id))["counts"][PageStatus.DONE.value]
+    
+    service = PDFProcessingService(api_key or os.environ.get("OPENAI_API_KEY"))
+    if not await service.resume_job(job_id):
+        raise HTTPException(status_code=409, detail=f"Job {job_id} could not be resumed")
+    status_cache.invalidate(document_key(document_id), document_status_key(document_id), job_key(job_id))
+    results_cache.invalidate_job(job_id)
+    
+    return {
+        "id": str(job_id),
+        "document_id": str(document_id),
+        "status": ProcessingStatus.PENDING.value,
+        "pages_done": pages_done,
+        "pages_to_process": max(total_pages - pages_done, 0),
+        "message": "Job resumed in background"
+    }
+
+@router.get("/usage")
+async def get_usage(
+    group_by: str = Query("day", description="Group by job, user, day or model"),
+    job_id: Optional[UUID] = None,
+    user_id: Optional[UUID] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    session: AsyncSession = Depends(get_async_session)
+) -> List[Dict[str, Any]]:
+    """
+    Roll up token usage, cost and latency of model calls.
+    
+    Args:
+        group_by: Grouping key
+        job_id, user_id: Optional filters
+        since, until: Optional time range (until is exclusive)
+        
+    Returns:
+        One row per group, largest cost first
+    """
+    try:
+        return await session.run_sync(usage_rollup, group_by, job_id=job_id, user_id=user_id, since=since, until=until)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 @router.post("/jobs/{job_id}/export")
 async def export_to_xlsx(
@@ -575,37 +816,46 @@ async def debug_pdf_access(document_id: str):
         return result
 
 @router.get("/documents/{document_id}/status")
-async def get_document_status(document_id: str, session: Session = Depends(get_session)) -> Dict[str, Any]:
+async def get_document_status(
+    document_id: str,
+    wait: float = Query(0, ge=0, description="Seconds to wait for a change when If-None-Match matches"),
+    if_none_match: Optional[str] = Header(None)
+) -> Response:
     """
     Get atomic status/progress for a document and its latest job.
+    
+    Supports If-None-Match (304 when unchanged) and `?wait=N` long-polling.
     """
-    from sqlmodel import select
-    from uuid import UUID
     try:
         document_uuid = UUID(document_id)
     except ValueError:
         raise HTTPException(status_code=400, detail="Invalid document ID")
-    document = session.get(Document, document_uuid)
-    if not document:
-        raise HTTPException(status_code=404, detail="Document not found")
-    # Get latest job
-    latest_job = session.exec(
-        select(ExtractionJob)
-        .where(ExtractionJob.document_id == document_uuid)
-        .order_by(ExtractionJob.started_at.desc())
-    ).first()
-    job_info = None
-    if latest_job:
-        job_info = {
-            "id": str(latest_job.id),
-            "status": latest_job.status.value,
-            "pages_processed": latest_job.pages_processed,
-            "total_pages": latest_job.total_pages,
-            "error_message": latest_job.error_message,
-        }
-    logger.info(f"[API] /documents/{document_id}/status returns status={document.status.value}, job={job_info}")
-    return {
-        "document_id": str(document.id),
-        "status": document.status.value,
-        "latest_job": job_info
-    } 
\ No newline at end of file
+    
+    async def load():
+        async with AsyncSession(async_engine) as session:
+            document = await session.get(Document, document_uuid)
+            if not document:
+                raise HTTPException(status_code=404, detail="Document not found")
+            # Get latest job
+            latest_job = (await session.exec(
+                select(ExtractionJob)
+                .where(ExtractionJob.document_id == document_uuid)
+                .order_by(ExtractionJob.started_at.desc())
+            )).first()
+            job_info = None
+            if latest_job:
+                job_info = {
+                    "id": str(latest_job.id),
+                    "status": latest_job.status.value,
+                    "pages_processed": latest_job.pages_processed,
+                    "total_pages": latest_job.total_pages,
+                    "error_message": latest_job.error_message,
+                }
+            logger.debug(f"[API] /documents/{document_id}/status returns status={document.status.value}, job={job_info}")
+            return {
+                "document_id": str(document.id),
+                "status": document.status.value,
+                "latest_job": job_info
+            }
+    
+    return await _conditional_status(document_status_key(document_uuid), load, if_none_match, wait)
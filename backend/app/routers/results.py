@@ -1,11 +1,13 @@
 from fastapi import APIRouter, Request, HTTPException, WebSocket, WebSocketDisconnect, Response
 from app.schemas import XLSXSignedURLResponse
 from app.config import settings
-import boto3
+from app.deps import get_s3_client
+from app.services.events import JOB_COMPLETED, JOB_FAILED, job_event_stream
+from app.services.extract import IN_FLIGHT_STATUSES
+from app.services.storage import download_bytes, upload_bytes, with_bucket
 import asyncio
 import json
 import io
-import pandas as pd
 import uuid
 from datetime import datetime
 from uuid import uuid4
@@ -17,6 +19,8 @@ job_status_store = {}
 
 def generate_sample_xlsx():
     """Generate a sample XLSX using pandas"""
+    import pandas as pd
+
     # Create a sample dataframe
     data = {
         "Sample": ["Blood Glucose", "Hemoglobin", "White Blood Cells", "Cholesterol", "Sodium"],
@@ -66,6 +70,13 @@ async def get_xlsx_signed_url(job_id: str, request: Request):
         # Log the issue
         print(f"Job {job_id} not found, creating placeholder")
         job = {"job_id": job_id, "xlsx_s3_key": None}
+    
+    # Extraction still running - there is nothing to sign yet
+    if job.get("status") in IN_FLIGHT_STATUSES:
+        raise HTTPException(status_code=409, detail=f"Job {job_id} is still {job['status']}")
+    # Extraction failed - don't hand out sample data in its place
+    if job.get("status") == "failed":
+        raise HTTPException(status_code=409, detail=job.get("error") or f"Job {job_id} failed")
         
     # If no XLSX key, generate sample and store it
     if not job.get("xlsx_s3_key"):
@@ -73,31 +84,20 @@ async def get_xlsx_signed_url(job_id: str, request: Request):
             # Create a sample XLSX
             file_content = generate_sample_xlsx()
             
-            # Set up S3 client
-            s3 = boto3.client(
-                "s3",
-                region_name=settings.aws_region,
-                aws_access_key_id=settings.aws_access_key_id,
-                aws_secret_access_key=settings.aws_secret_access_key,
-                endpoint_url=settings.s3_endpoint_url,
-            )
-            
-            # Ensure bucket exists
-            try:
-                s3.head_bucket(Bucket=settings.s3_bucket)
-            except:
-                s3.create_bucket(Bucket=settings.s3_bucket)
+            # Shared S3 client
+            s3 = get_s3_client()
             
-            # Upload sample to S3
+            # Upload sample to S3 (bucket readiness is cached, see services/storage.py)
             prefix = f"results/{datetime.utcnow().strftime('%Y/%m/%d')}/{uuid4()}"
             xlsx_key = f"{prefix}.xlsx"
             
-            s3.put_object(
-                Bucket=settings.s3_bucket,
-                Key=xlsx_key,
-                Body=file_content,
-                ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-            )
+            with_bucket(s3, settings.s3_bucket, settings.aws_region, lambda: upload_bytes(
+                s3,
+                settings.s3_bucket,
+                xlsx_key,
+                file_content,
+                content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+            ))
             
             # Update job with new key
             job["xlsx_s3_key"] = xlsx_key
@@ -117,13 +117,7 @@ async def get_xlsx_signed_url(job_id: str, request: Request):
     
     # Normal S3 URL generation flow
     try:
-        s3 = boto3.client(
-            "s3",
-            region_name=settings.aws_region,
-            aws_access_key_id=settings.aws_access_key_id,
-            aws_secret_access_key=settings.aws_secret_access_key,
-            endpoint_url=settings.s3_endpoint_url,
-        )
+        s3 = get_s3_client()
         bucket = settings.s3_bucket
         key = job["xlsx_s3_key"]
         
@@ -151,16 +145,9 @@ async def get_xlsx_file(job_id: str, request: Request, download: bool = False):
         if job and job.get("xlsx_s3_key"):
             print(f"Found job with XLSX key: {job['xlsx_s3_key']}")
             # Get from S3
-            s3 = boto3.client(
-                "s3",
-                region_name=settings.aws_region,
-                aws_access_key_id=settings.aws_access_key_id,
-                aws_secret_access_key=settings.aws_secret_access_key,
-                endpoint_url=settings.s3_endpoint_url,
-            )
+            s3 = get_s3_client()
             try:
-                response = s3.get_object(Bucket=settings.s3_bucket, Key=job["xlsx_s3_key"])
-                file_content = response['Body'].read()
+                file_content = download_bytes(s3, settings.s3_bucket, job["xlsx_s3_key"])
                 print(f"Successfully retrieved XLSX from S3, size: {len(file_content)} bytes")
             except Exception as e:
                 print(f"Error retrieving from S3: {str(e)}, falling back to sample")
@@ -189,27 +176,70 @@ async def get_xlsx_file(job_id: str, request: Request, download: bool = False):
         }
     )
 
+# How often the status of a running /extract job is re-read for WebSocket clients
+EXTRACT_JOB_POLL_INTERVAL = 0.5  # seconds
+
+
+def _event_status(event) -> dict:
+    """{status, progress, message} for a job event from the worker event bus."""
+    total = event.data.get("total_pages") or 0
+    done = event.data.get("pages_processed") or 0
+    if event.type == JOB_COMPLETED:
+        return {"status": "done", "progress": 100, "message": "Done!"}
+    if event.type == JOB_FAILED:
+        return {"status": "error", "progress": int(done * 100 / total) if total else 0,
+                "message": event.data.get("error") or "Processing failed"}
+    progress = int(done * 100 / total) if total else 0
+    return {"status": "processing", "progress": progress,
+            "message": f"Processing page {done} of {total} ({progress}%)"}
+
+
+def _extract_job_status(job: dict) -> dict:
+    """{status, progress, message} for an /extract job; jobs recorded here have no status and count as done."""
+    status = job.get("status", "completed")
+    if status == "completed":
+        return {"status": "done", "progress": 100, "message": "Done!"}
+    if status == "failed":
+        return {"status": "error", "progress": 0, "message": job.get("error") or "Extraction failed"}
+    if status == "processing":
+        return {"status": "processing", "progress": 0, "message": "Extracting data"}
+    return {"status": "queued", "progress": 0, "message": "Queued"}
+
+
 @router.websocket("/ws/jobs/{job_id}")
 async def job_status_ws(websocket: WebSocket, job_id: str):
+    """
+    Push {status, progress, message} updates for a job.
+
+    Handwriting jobs stream from the worker event bus; jobs that finished
+    before the bus saw them get one final message from the database. /extract
+    jobs don't publish events, so their in-memory status is polled. The socket
+    is closed once the job is done or failed, or right away for unknown jobs.
+    """
     await websocket.accept()
     try:
-        progress = 0
-        # Simulate progress for demo; replace with real job tracking
-        while progress < 100:
-            status = job_status_store.get(job_id, {
-                "status": "processing",
-                "progress": progress,
-                "message": f"Processing ({progress}%)"
-            })
-            await websocket.send_text(json.dumps(status))
-            await asyncio.sleep(0.5)
-            progress += 10
-            job_status_store[job_id] = {
-                "status": "processing" if progress < 100 else "done",
-                "progress": min(progress, 100),
-                "message": f"Processing ({min(progress, 100)}%)" if progress < 100 else "Done!"
-            }
-        # Send final done message
-        await websocket.send_text(json.dumps(job_status_store[job_id]))
+        jobs = getattr(websocket.app.state, "jobs", [])
+        extract_job = next((j for j in jobs if j.get("job_id") == job_id), None)
+        if extract_job is not None:
+            sent = None
+            while True:
+                status = _extract_job_status(extract_job)
+                if status != sent:
+                    job_status_store[job_id] = sent = status
+                    await websocket.send_text(json.dumps(status))
+                if extract_job.get("status") not in IN_FLIGHT_STATUSES:
+                    break
+                await asyncio.sleep(EXTRACT_JOB_POLL_INTERVAL)
+        else:
+            try:
+                events = job_event_stream(job_id)
+            except HTTPException as e:
+                await websocket.send_text(json.dumps({"status": "error", "progress": 0, "message": e.detail}))
+            else:
+                async for event in events:
+                    status = _event_status(event)
+                    job_status_store[job_id] = status
+                    await websocket.send_text(json.dumps(status))
+        await websocket.close()
     except WebSocketDisconnect:
-        pass 
\ No newline at end of file
+        pass
@@ -1,7 +1,6 @@
 from datetime import datetime
 from uuid import uuid4
 import io
-from PyPDF2 import PdfReader
 from sqlmodel import Session
 
 from fastapi import APIRouter, File, UploadFile, HTTPException, status, Depends
@@ -9,6 +8,7 @@ from fastapi import APIRouter, File, UploadFile, HTTPException, status, Depends
 from ..deps import get_s3_client, get_session
 from ..config import settings
 from ..schemas import PDFMetadataResponse
+from ..services.storage import upload_bytes
 
 router = APIRouter(prefix="/upload", tags=["ingestion"])
 
@@ -32,6 +32,7 @@ async def upload_file(
     # Extract PDF page count (only for PDFs)
     page_count = None
     if file.content_type == "application/pdf":
+        from PyPDF2 import PdfReader
         try:
             reader = PdfReader(io.BytesIO(file_bytes))
             page_count = len(reader.pages)
@@ -61,14 +62,13 @@ async def upload_file(
     # session.refresh(pdf_upload)
 
     key = f"uploads/{datetime.utcnow().strftime('%Y/%m/%d')}/{uuid4()}-{file.filename}"
-    s3.upload_fileobj(
-        Fileobj=io.BytesIO(file_bytes),
-        Bucket=settings.s3_bucket,
-        Key=key,
-        ExtraArgs={
-            "ContentType": file.content_type,
-            "ServerSideEncryption": "AES256",
-        },
+    upload_bytes(
+        s3,
+        settings.s3_bucket,
+        key,
+        file_bytes,
+        content_type=file.content_type,
+        extra_args={"ServerSideEncryption": "AES256"},
     )
     return PDFMetadataResponse(
         filename=file.filename,
@@ -24,6 +24,24 @@ class JobResult(BaseModel):
     anomalies: int
 
 
+class ExtractJobAccepted(BaseModel):
+    """Response for an accepted /extract upload"""
+    job_id: str = Field(..., description="Identifier to poll for the extraction result")
+    status: str = Field(..., description="Current status of the job (queued, processing, completed, failed)")
+    status_url: str = Field(..., description="URL to poll for the job status")
+
+
+class ExtractJobStatus(BaseModel):
+    """Status of an /extract job"""
+    job_id: str
+    status: str
+    created_at: Optional[str] = None
+    sheet_name: Optional[str] = None
+    anomalies: Optional[int] = None
+    xlsx_s3_key: Optional[str] = None
+    error: Optional[str] = None
+
+
 class PDFMetadataResponse(BaseModel):
     filename: str
     filesize_bytes: int
@@ -1,10 +1,11 @@
 from __future__ import annotations
 
-from typing import List
+from typing import TYPE_CHECKING, List
 
 import numpy as np
-import pandas as pd
-from sklearn.ensemble import IsolationForest
+
+if TYPE_CHECKING:
+    import pandas as pd
 
 
 THRESH_Z = 3.0
@@ -18,6 +19,8 @@ def z_score(series: pd.Series) -> pd.Series:
 
 
 def modified_z_score(series: pd.Series) -> pd.Series:
+    import pandas as pd
+
     median = series.median()
     mad = (series - median).abs().median()
     if mad == 0:
@@ -36,6 +39,10 @@ def iqr_method(series: pd.Series) -> pd.Series:
 
 
 def isolation_forest(series: pd.Series) -> pd.Series:
+    # scikit-learn takes over a second to import; only load it when used
+    import pandas as pd
+    from sklearn.ensemble import IsolationForest
+
     model = IsolationForest(contamination="auto", random_state=42)
     preds = model.fit_predict(series.to_frame())  # -1 anomaly, 1 normal
     return pd.Series(preds == -1, index=series.index)
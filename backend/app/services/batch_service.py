@@ -0,0 +1,355 @@
+"""
+Offline handwriting extraction through the OpenAI Batch API.
+
+Page requests for one or more documents are packed into a JSONL file,
+submitted as a single batch, polled until the batch finishes and the
+responses are mapped back into ExtractionResult rows. Batches are billed at
+a discount and don't count against the interactive rate limits, which makes
+them a better fit for overnight backfills than `process_image`.
+"""
+import asyncio
+import json
+import logging
+import os
+from contextlib import aclosing
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+from uuid import UUID
+
+from sqlmodel import Session, select
+
+from ..database import engine
+from ..models import Document, ExtractionJob, ExtractionResult, ProcessingStatus
+from .cascade import estimate_cost
+from .events import JOB_COMPLETED, JOB_FAILED, event_bus
+from .pdf_service import (
+    MODEL,
+    OPENAI_API_KEY,
+    OPENAI_BASE_URL,
+    UPLOAD_DIR,
+    build_page_messages,
+    build_page_request,
+    encode_image_to_base64,
+    iter_pdf_pages,
+    page_confidence,
+    parse_page_content,
+    pdf_page_count,
+)
+from .prompts import PAGE_PROMPT
+from .usage import record_model_calls
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+BATCH_ENDPOINT = "/v1/chat/completions"
+BATCH_COMPLETION_WINDOW = "24h"
+TERMINAL_BATCH_STATUSES = {"completed", "failed", "expired", "cancelled"}
+POLL_INTERVAL = float(os.environ.get("OPENAI_BATCH_POLL_INTERVAL", "60"))
+BATCH_PRICE_FACTOR = 0.5  # batch requests cost half the interactive price
+
+
+def make_custom_id(job_id: Union[str, UUID], page_num: int) -> str:
+    """Build the custom_id used to map a batch response back to its page."""
+    return f"{job_id}:{page_num}"
+
+
+def parse_custom_id(custom_id: str) -> Tuple[UUID, int]:
+    """
+    Split a custom_id produced by `make_custom_id`.
+
+    Returns:
+        Tuple of (job ID, page number)
+    """
+    job_id, page_num = custom_id.rsplit(":", 1)
+    return UUID(job_id), int(page_num)
+
+
+def build_batch_line(job_id: Union[str, UUID], page_num: int, base64_image: str, model: str = MODEL) -> Dict[str, Any]:
+    """
+    Build one JSONL line of a Batch API input file.
+
+    The body is the same request `process_image` sends interactively.
+    """
+    return {
+        "custom_id": make_custom_id(job_id, page_num),
+        "method": "POST",
+        "url": BATCH_ENDPOINT,
+        "body": build_page_request(build_page_messages(base64_image, page_num), model=model),
+    }
+
+
+def batch_call_usage(line: Dict[str, Any], page_num: int) -> Optional[Dict[str, Any]]:
+    """
+    Token usage of one batch response as a model call record, if it has any.
+
+    Batches have no per-request latency, so only tokens and cost are filled in.
+    """
+    body = (line.get("response") or {}).get("body") or {}
+    usage = body.get("usage")
+    if not usage:
+        return None
+    model = body.get("model", MODEL)
+    input_tokens = usage.get("prompt_tokens", 0)
+    cached_tokens = (usage.get("prompt_tokens_details") or {}).get("cached_tokens", 0)
+    output_tokens = usage.get("completion_tokens", 0)
+    return {
+        "page_number": page_num,
+        "model": model,
+        "kind": "batch",
+        "prompt_version": PAGE_PROMPT.key,
+        "input_tokens": input_tokens,
+        "cached_tokens": cached_tokens,
+        "output_tokens": output_tokens,
+        "cost_usd": estimate_cost(model, input_tokens, cached_tokens, output_tokens) * BATCH_PRICE_FACTOR,
+    }
+
+
+def parse_batch_output_line(line: Dict[str, Any]) -> Tuple[UUID, int, Dict[str, Any]]:
+    """
+    Convert one line of a batch output/error file into page content.
+
+    Args:
+        line: Decoded JSONL line
+
+    Returns:
+        Tuple of (job ID, page number, page content)
+    """
+    job_id, page_num = parse_custom_id(line["custom_id"])
+    response = line.get("response") or {}
+    error = line.get("error")
+
+    if not error and response.get("status_code") == 200:
+        body = response.get("body") or {}
+        try:
+            content = body["choices"][0]["message"]["content"]
+            return job_id, page_num, parse_page_content(content, page_num)
+        except Exception as e:
+            error = {"message": f"Unreadable batch response: {str(e)}"}
+
+    if not error:
+        error = {"message": f"Batch request failed with status {response.get('status_code')}"}
+    message = error.get("message") if isinstance(error, dict) else str(error)
+    return job_id, page_num, {
+        "error": f"Batch request failed: {message}",
+        "form_title": "Batch Processing Error",
+        "document_type": "error",
+        "questions": [
+            {
+                "question": "Error Details",
+                "answer": message,
+                "page": page_num,
+                "confidence": 0.0,
+                "is_handwritten": False
+            }
+        ],
+        "overall_confidence": 0.0
+    }
+
+
+class BatchExtractionService:
+    """Service that runs handwriting extraction for documents via the Batch API."""
+
+    def __init__(self, api_key: Optional[str] = None, client=None, poll_interval: float = POLL_INTERVAL):
+        """
+        Initialize the service.
+
+        Args:
+            api_key: Optional OpenAI API key
+            client: Optional pre-configured AsyncOpenAI client (used by tests)
+            poll_interval: Seconds between batch status checks
+        """
+        self.api_key = api_key or OPENAI_API_KEY
+        self.poll_interval = poll_interval
+        self._client = client
+
+    @property
+    def client(self):
+        """Lazily create the AsyncOpenAI client."""
+        if self._client is None:
+            from openai import AsyncOpenAI
+            self._client = AsyncOpenAI(api_key=self.api_key, base_url=OPENAI_BASE_URL)
+        return self._client
+
+    async def prepare(self, document_ids: Iterable[UUID], output_path: Union[str, Path]) -> List[UUID]:
+        """
+        Create pending jobs for the documents and write the batch input file.
+
+        Args:
+            document_ids: Documents to extract
+            output_path: Where to write the JSONL input file
+
+        Returns:
+            IDs of the created extraction jobs
+        """
+        output_path = Path(output_path)
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        job_ids: List[UUID] = []
+
+        with open(output_path, "w") as out, Session(engine) as session:
+            for document_id in document_ids:
+                document = session.get(Document, document_id)
+                if not document:
+                    logger.warning(f"Skipping unknown document {document_id}")
+                    continue
+
+                pdf_path = Path(UPLOAD_DIR) / str(document.id)
+                if not pdf_path.exists():
+                    logger.warning(f"Skipping document {document_id}: PDF not found at {pdf_path}")
+                    continue
+
+                total_pages = document.total_pages or await asyncio.to_thread(pdf_page_count, pdf_path)
+                job = ExtractionJob(
+                    document_id=document.id,
+                    started_at=datetime.utcnow(),
+                    model_name=MODEL,
+                    total_pages=total_pages,
+                    status=ProcessingStatus.PENDING
+                )
+                session.add(job)
+                session.commit()
+                session.refresh(job)
+
+                # Pages are rendered and written a window at a time, so long documents don't pile up in memory
+                async with aclosing(iter_pdf_pages(pdf_path, range(1, total_pages + 1))) as pages:
+                    async for page in pages:
+                        line = build_batch_line(job.id, page.number, encode_image_to_base64(page.image))
+                        out.write(json.dumps(line) + "\n")
+
+                job_ids.append(job.id)
+                logger.info(f"Added {total_pages} pages of document {document.id} to batch input (job {job.id})")
+
+        return job_ids
+
+    async def submit(self, input_path: Union[str, Path], job_ids: List[UUID]) -> str:
+        """
+        Upload the input file, create the batch and record it on the jobs.
+
+        Returns:
+            The batch ID
+        """
+        with open(input_path, "rb") as f:
+            upload = await self.client.files.create(file=f, purpose="batch")
+
+        batch = await self.client.batches.create(
+            input_file_id=upload.id,
+            endpoint=BATCH_ENDPOINT,
+            completion_window=BATCH_COMPLETION_WINDOW,
+        )
+        logger.info(f"Submitted batch {batch.id} covering {len(job_ids)} jobs")
+
+        with Session(engine) as session:
+            for job_id in job_ids:
+                job = session.get(ExtractionJob, job_id)
+                if not job:
+                    continue
+                job.batch_id = batch.id
+                job.status = ProcessingStatus.PROCESSING
+                document = session.get(Document, job.document_id)
+                if document:
+                    document.status = ProcessingStatus.PROCESSING
+            session.commit()
+
+        return batch.id
+
+    async def wait(self, batch_id: str):
+        """Poll the batch until it reaches a terminal status and return it."""
+        while True:
+            batch = await self.client.batches.retrieve(batch_id)
+            if batch.status in TERMINAL_BATCH_STATUSES:
+                logger.info(f"Batch {batch_id} finished with status {batch.status}")
+                return batch
+            logger.info(f"Batch {batch_id} is {batch.status}, checking again in {self.poll_interval}s")
+            await asyncio.sleep(self.poll_interval)
+
+    async def _read_jsonl(self, file_id: Optional[str]) -> List[Dict[str, Any]]:
+        """Download a batch output or error file and decode its lines."""
+        if not file_id:
+            return []
+        response = await self.client.files.content(file_id)
+        return [json.loads(line) for line in response.text.splitlines() if line.strip()]
+
+    async def apply_results(self, batch) -> int:
+        """
+        Store the responses of a finished batch as ExtractionResult rows.
+
+        Jobs covered by the batch are marked completed, or failed when none of
+        their pages produced a usable result.
+
+        Returns:
+            Number of page results stored
+        """
+        lines = await self._read_jsonl(getattr(batch, "output_file_id", None))
+        lines += await self._read_jsonl(getattr(batch, "error_file_id", None))
+
+        stored = 0
+        with Session(engine) as session:
+            jobs = session.exec(
+                select(ExtractionJob).where(ExtractionJob.batch_id == batch.id)
+            ).all()
+            jobs_by_id = {job.id: job for job in jobs}
+            succeeded = {job.id: 0 for job in jobs}
+
+            for line in sorted(lines, key=lambda item: item.get("custom_id", "")):
+                job_id, page_num, content = parse_batch_output_line(line)
+                job = jobs_by_id.get(job_id)
+                if not job:
+                    logger.warning(f"Batch {batch.id} returned a result for unknown job {job_id}")
+                    continue
+
+                session.add(ExtractionResult(
+                    job_id=job_id,
+                    page_number=page_num,
+                    content=content,
+                    processing_time=0.0,
+                    confidence_score=page_confidence(content)
+                ))
+                stored += 1
+                if not isinstance(content.get("error"), str):
+                    succeeded[job_id] += 1
+                call = batch_call_usage(line, page_num)
+                if call:
+                    document = session.get(Document, job.document_id)
+                    record_model_calls(session, [call], job_id, job.document_id, document.user_id if document else None)
+
+            for job in jobs:
+                job.pages_processed = succeeded[job.id]
+                job.completed_at = datetime.utcnow()
+                if succeeded[job.id]:
+                    job.status = ProcessingStatus.COMPLETED
+                else:
+                    job.status = ProcessingStatus.FAILED
+                    job.error_message = f"Batch {batch.id} finished with status {batch.status} and no usable pages"
+                document = session.get(Document, job.document_id)
+                if document:
+                    document.status = job.status
+
+            session.commit()
+
+            for job in jobs:
+                event_bus.publish(
+                    job.id, JOB_COMPLETED if job.status == ProcessingStatus.COMPLETED else JOB_FAILED,
+                    document_id=str(job.document_id), status=job.status.value,
+                    pages_processed=job.pages_processed, total_pages=job.total_pages
+                )
+
+        logger.info(f"Stored {stored} page results from batch {batch.id}")
+        return stored
+
+    async def run(self, document_ids: Iterable[UUID], work_dir: Union[str, Path]) -> Optional[str]:
+        """
+        Prepare, submit, wait for and apply a batch for the given documents.
+
+        Returns:
+            The batch ID, or None if there was nothing to submit
+        """
+        input_path = Path(work_dir) / f"batch_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}.jsonl"
+        job_ids = await self.prepare(document_ids, input_path)
+        if not job_ids:
+            logger.info("No documents to submit")
+            return None
+
+        batch_id = await self.submit(input_path, job_ids)
+        batch = await self.wait(batch_id)
+        await self.apply_results(batch)
+        return batch_id
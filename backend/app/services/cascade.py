@@ -0,0 +1,209 @@
+"""
+Model cascade for page extraction.
+
+When enabled, pages are first sent to a small, cheap model. Only pages
+whose result looks unreliable - low confidence, [ILLEGIBLE] answers,
+truncated or unparseable output - are re-run on the next (larger) model.
+Most forms are clean, so most pages never reach the full model. The cascade
+is opt-in: it changes which model answers most pages.
+
+Per-stage latency, token usage and estimated cost are collected in
+`CascadeStats` and stored on the ExtractionJob, together with the share of
+input tokens served from the prompt cache. Every individual call is
+also kept in `CascadeStats.calls` until it is persisted as a ModelCall row
+(see services/usage.py).
+
+Configuration (environment):
+    OPENAI_CASCADE_MODEL           first-stage model, e.g. gpt-4.1-mini (default empty: the
+                                   cascade is off and every page goes to OPENAI_MODEL only)
+    OPENAI_CASCADE_MIN_CONFIDENCE  escalate pages below this confidence (default 0.8)
+"""
+import os
+from dataclasses import asdict, dataclass, field, fields
+from typing import Any, Dict, List, Optional
+
+from .prompts import cache_hit_rate
+
+CASCADE_MODEL = os.environ.get("OPENAI_CASCADE_MODEL", "")
+CASCADE_MIN_CONFIDENCE = float(os.environ.get("OPENAI_CASCADE_MIN_CONFIDENCE", "0.8"))
+ILLEGIBLE_MARKER = "[ILLEGIBLE]"
+
+# USD per 1M tokens: (input, cached input, output)
+MODEL_PRICING = {
+    "gpt-4.1-nano": (0.10, 0.025, 0.40),
+    "gpt-4.1-mini": (0.40, 0.10, 1.60),
+    "gpt-4.1": (2.00, 0.50, 8.00),
+    "gpt-4o-mini": (0.15, 0.075, 0.60),
+    "gpt-4o": (2.50, 1.25, 10.00),
+}
+
+
+def model_pricing(model: str) -> Optional[tuple]:
+    """Look up pricing for a model, ignoring dated snapshot suffixes."""
+    for name in sorted(MODEL_PRICING, key=len, reverse=True):
+        if model == name or model.startswith(name + "-"):
+            return MODEL_PRICING[name]
+    return None
+
+
+def estimate_cost(model: str, input_tokens: int, cached_tokens: int, output_tokens: int) -> float:
+    """Estimated USD cost of a call; 0.0 for models without known pricing."""
+    pricing = model_pricing(model)
+    if not pricing:
+        return 0.0
+    input_price, cached_price, output_price = pricing
+    uncached = max(0, input_tokens - cached_tokens)
+    return (uncached * input_price + cached_tokens * cached_price + output_tokens * output_price) / 1_000_000
+
+
+@dataclass
+class CascadePolicy:
+    """Which models to try, cheapest first, and when to move to the next one."""
+    models: List[str]
+    min_confidence: float = CASCADE_MIN_CONFIDENCE
+
+    @classmethod
+    def from_env(cls, final_model: str) -> "CascadePolicy":
+        """Configured cascade ending in `final_model`."""
+        if CASCADE_MODEL and CASCADE_MODEL != final_model:
+            return cls(models=[CASCADE_MODEL, final_model])
+        return cls(models=[final_model])
+
+    def escalation_reason(self, result: Optional[Dict[str, Any]]) -> Optional[str]:
+        """
+        Decide whether a page result should be re-run on the next model.
+
+        Returns:
+            The reason to escalate, or None to accept the result
+        """
+        if not result or isinstance(result.get("error"), str):
+            return "schema_failure"
+        if result.get("truncated"):
+            return "truncated"
+        questions = result.get("questions") or []
+        if any(ILLEGIBLE_MARKER in str(q.get("answer", "")) for q in questions):
+            return "illegible"
+        if questions:
+            confidence = result.get("overall_confidence")
+            if confidence is None:
+                confidence = sum(q.get("confidence", 0.0) for q in questions) / len(questions)
+            if confidence < self.min_confidence:
+                return "low_confidence"
+        return None
+
+
+@dataclass
+class StageStats:
+    """Accumulated accounting for one model stage of a job."""
+    calls: int = 0
+    latency_s: float = 0.0
+    input_tokens: int = 0
+    cached_tokens: int = 0
+    output_tokens: int = 0
+    cost_usd: float = 0.0
+    escalated: Dict[str, int] = field(default_factory=dict)
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "StageStats":
+        """Rebuild stats stored by CascadeStats.to_dict (derived keys are ignored)."""
+        return cls(**{f.name: data[f.name] for f in fields(cls) if f.name in data})
+
+    def add(self, other: "StageStats") -> None:
+        """Add another run's stats for the same model."""
+        self.calls += other.calls
+        self.latency_s += other.latency_s
+        self.input_tokens += other.input_tokens
+        self.cached_tokens += other.cached_tokens
+        self.output_tokens += other.output_tokens
+        self.cost_usd += other.cost_usd
+        self.escalated = {
+            reason: self.escalated.get(reason, 0) + other.escalated.get(reason, 0)
+            for reason in {**self.escalated, **other.escalated}
+        }
+
+
+class CascadeStats:
+    """Per-stage latency and cost for the pages of one job."""
+
+    def __init__(self):
+        self.stages: Dict[str, StageStats] = {}
+        self.calls: List[Dict[str, Any]] = []
+        self._page_timings: Dict[str, float] = {}
+
+    def begin_page(self, queue_ms: float = 0.0, render_ms: float = 0.0) -> None:
+        """Start a page; its queue and render time go on the page's first call."""
+        self._page_timings = {"queue_ms": queue_ms, "render_ms": render_ms}
+
+    def record_encode(self, ms: float) -> None:
+        """Add image preparation time to the page's next call."""
+        self._page_timings["encode_ms"] = self._page_timings.get("encode_ms", 0.0) + ms
+
+    def record(
+        self, model: str, latency: float, usage: Dict[str, Any],
+        page_num: Optional[int] = None, kind: str = "page", prompt_version: Optional[str] = None,
+        error: Optional[str] = None
+    ) -> None:
+        stage = self.stages.setdefault(model, StageStats())
+        input_tokens = usage.get("input_tokens", 0)
+        cached_tokens = usage.get("cached_tokens", 0)
+        output_tokens = usage.get("output_tokens", 0)
+        cost = estimate_cost(model, input_tokens, cached_tokens, output_tokens)
+        stage.calls += 1
+        stage.latency_s += latency
+        stage.input_tokens += input_tokens
+        stage.cached_tokens += cached_tokens
+        stage.output_tokens += output_tokens
+        stage.cost_usd += cost
+        
+        timings, self._page_timings = self._page_timings, {}
+        self.calls.append({
+            "page_number": page_num or 0,
+            "model": model,
+            "kind": kind,
+            "prompt_version": prompt_version,
+            "input_tokens": input_tokens,
+            "cached_tokens": cached_tokens,
+            "output_tokens": output_tokens,
+            "cost_usd": cost,
+            "queue_ms": timings.get("queue_ms", 0.0),
+            "render_ms": timings.get("render_ms", 0.0),
+            "encode_ms": timings.get("encode_ms", 0.0),
+            "network_ms": usage.get("network_ms", 0.0),
+            "parse_ms": usage.get("parse_ms", 0.0),
+            "latency_ms": latency * 1000,
+            "error": error,
+        })
+
+    def take_calls(self) -> List[Dict[str, Any]]:
+        """Return and forget the calls recorded so far."""
+        calls, self.calls = self.calls, []
+        return calls
+
+    def record_escalation(self, model: str, reason: str) -> None:
+        stage = self.stages.setdefault(model, StageStats())
+        stage.escalated[reason] = stage.escalated.get(reason, 0) + 1
+
+    @property
+    def total_cost(self) -> float:
+        return sum(stage.cost_usd for stage in self.stages.values())
+
+    def to_dict(self, previous: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Per-stage stats as stored on the job.
+
+        Args:
+            previous: Stats stored by an earlier run of the job (it was
+                resumed); they are added to this run's
+        """
+        stages = {model: StageStats.from_dict(data) for model, data in (previous or {}).items()}
+        for model, stage in self.stages.items():
+            stages.setdefault(model, StageStats()).add(stage)
+        return {
+            model: {
+                **asdict(stage),
+                "latency_s": round(stage.latency_s, 3),
+                "cost_usd": round(stage.cost_usd, 6),
+                "cache_hit_rate": cache_hit_rate(stage.input_tokens, stage.cached_tokens),
+            }
+            for model, stage in stages.items()
+        }
@@ -0,0 +1,263 @@
+"""
+Job progress event bus.
+
+Workers publish page-level progress for extraction jobs; WebSocket and
+Server-Sent Events endpoints fan the events out to subscribers, so clients
+no longer have to poll the database for status.
+
+Events are delivered through a broker. `LocalBroker` keeps everything in
+this process and stands in for a shared pub/sub service (e.g. Redis) when
+the API runs as a single process; a multi-process deployment plugs in a
+broker with the same two methods. Each job keeps a short history so a
+client that reconnects with its last seen event id can resume without
+missing events; a job that is started again (resumed) starts a new history,
+so the previous run's completed/failed event doesn't end new streams.
+"""
+import asyncio
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict, deque
+from dataclasses import asdict, dataclass, field
+from typing import Any, AsyncIterator, Callable, Deque, Dict, List, Optional, Set
+from uuid import UUID
+
+from fastapi import HTTPException
+from sqlmodel import Session
+
+from ..database import engine
+from ..models import ExtractionJob, ProcessingStatus
+
+logger = logging.getLogger(__name__)
+
+# Event types published for a job
+JOB_STARTED = "started"
+PAGE_COMPLETED = "page"
+JOB_COMPLETED = "completed"
+JOB_FAILED = "failed"
+TERMINAL_EVENTS = {JOB_COMPLETED, JOB_FAILED}
+
+HISTORY_PER_JOB = 500
+MAX_TRACKED_JOBS = 1000
+
+
+@dataclass
+class JobEvent:
+    """A single progress event for an extraction job."""
+    job_id: str
+    id: int
+    type: str
+    data: Dict[str, Any] = field(default_factory=dict)
+    timestamp: float = field(default_factory=time.time)
+
+    def to_json(self) -> str:
+        return json.dumps(asdict(self), default=str)
+
+    @classmethod
+    def from_json(cls, payload: str) -> "JobEvent":
+        return cls(**json.loads(payload))
+
+
+class LocalBroker:
+    """In-process pub/sub broker standing in for a shared message broker."""
+
+    def __init__(self):
+        self._handlers: List[Callable[[str], None]] = []
+
+    def publish(self, payload: str) -> None:
+        for handler in list(self._handlers):
+            handler(payload)
+
+    def listen(self, handler: Callable[[str], None]) -> None:
+        self._handlers.append(handler)
+
+
+class JobEventBus:
+    """Publishes job events and fans them out to async subscribers."""
+
+    def __init__(self, broker=None, history: int = HISTORY_PER_JOB, max_jobs: int = MAX_TRACKED_JOBS):
+        self._broker = broker or LocalBroker()
+        self._broker.listen(self._receive)
+        self._history_size = history
+        self._max_jobs = max_jobs
+        self._history: "OrderedDict[str, Deque[JobEvent]]" = OrderedDict()
+        self._sequence: Dict[str, int] = {}
+        self._subscribers: Dict[str, Set[asyncio.Queue]] = {}
+        self._listeners: List[Callable[[JobEvent], None]] = []
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def bind_loop(self, loop: asyncio.AbstractEventLoop) -> None:
+        """Set the loop that owns the subscribers (the API server's loop)."""
+        self._loop = loop
+
+    def add_listener(self, listener: Callable[[JobEvent], None]) -> None:
+        """
+        Call `listener` for every event, on the thread that delivered it.
+
+        Used by caches that must be invalidated when a job changes.
+        """
+        self._listeners.append(listener)
+
+    def publish(self, job_id: Any, event_type: str, **data: Any) -> JobEvent:
+        """
+        Publish an event for a job. Safe to call from any thread.
+
+        Args:
+            job_id: The extraction job ID
+            event_type: One of the event type constants
+            **data: Event payload (pages_processed, total_pages, ...)
+
+        Returns:
+            The published event
+        """
+        job_id = str(job_id)
+        with self._lock:
+            sequence = self._sequence.get(job_id, 0) + 1
+            self._sequence[job_id] = sequence
+        event = JobEvent(job_id=job_id, id=sequence, type=event_type, data=data)
+        self._broker.publish(event.to_json())
+        return event
+
+    def _receive(self, payload: str) -> None:
+        """Broker callback: record the event and hand it to subscribers."""
+        event = JobEvent.from_json(payload)
+        with self._lock:
+            history = self._history.get(event.job_id)
+            if history is None:
+                history = self._history[event.job_id] = deque(maxlen=self._history_size)
+                while len(self._history) > self._max_jobs:
+                    old_job, _ = self._history.popitem(last=False)
+                    self._sequence.pop(old_job, None)
+            else:
+                self._history.move_to_end(event.job_id)
+                if event.type == JOB_STARTED:
+                    history.clear()  # a resumed job; the last run's events are stale
+            history.append(event)
+            queues = list(self._subscribers.get(event.job_id, ()))
+
+        for listener in list(self._listeners):
+            try:
+                listener(event)
+            except Exception as e:
+                logger.warning(f"Job event listener failed: {str(e)}")
+
+        if not queues:
+            return
+        loop = self._loop
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if loop is None or loop is running:
+            for queue in queues:
+                queue.put_nowait(event)
+        elif not loop.is_closed():
+            for queue in queues:
+                loop.call_soon_threadsafe(queue.put_nowait, event)
+
+    def clear_history(self, job_id: Any) -> None:
+        """Forget a job's recorded events (event ids keep counting up)."""
+        with self._lock:
+            self._history.pop(str(job_id), None)
+
+    def history(self, job_id: Any, after: Optional[int] = None) -> List[JobEvent]:
+        """Return the recorded events for a job, optionally only those after an event id."""
+        with self._lock:
+            events = list(self._history.get(str(job_id), ()))
+        if after is not None:
+            events = [event for event in events if event.id > after]
+        return events
+
+    def latest(self, job_id: Any) -> Optional[JobEvent]:
+        """Return the most recent event for a job, if any."""
+        with self._lock:
+            history = self._history.get(str(job_id))
+            return history[-1] if history else None
+
+    async def subscribe(self, job_id: Any, last_event_id: Optional[int] = None) -> AsyncIterator[JobEvent]:
+        """
+        Yield events for a job as they are published.
+
+        Events recorded after `last_event_id` are replayed first. The stream
+        ends after the job's completed/failed event.
+        """
+        job_id = str(job_id)
+        if self._loop is None:
+            self._loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+        with self._lock:
+            self._subscribers.setdefault(job_id, set()).add(queue)
+            backlog = [
+                event for event in self._history.get(job_id, ())
+                if last_event_id is None or event.id > last_event_id
+            ]
+
+        try:
+            seen = last_event_id or 0
+            for event in backlog:
+                seen = event.id
+                yield event
+                if event.type in TERMINAL_EVENTS:
+                    return
+            while True:
+                event = await queue.get()
+                if event.id <= seen:
+                    continue  # already replayed from history
+                seen = event.id
+                yield event
+                if event.type in TERMINAL_EVENTS:
+                    return
+        finally:
+            with self._lock:
+                subscribers = self._subscribers.get(job_id)
+                if subscribers:
+                    subscribers.discard(queue)
+                    if not subscribers:
+                        del self._subscribers[job_id]
+
+
+# Process-wide bus used by the workers and the API
+event_bus = JobEventBus()
+
+
+def job_event_stream(job_id: str, last_event_id: Optional[int] = None) -> AsyncIterator[JobEvent]:
+    """
+    Stream progress events for a job, replaying those after `last_event_id`.
+
+    Jobs that finished before the bus saw them (e.g. before a restart) get a
+    single terminal event built from the database row.
+
+    Raises:
+        HTTPException: 404 for an unknown job
+    """
+    try:
+        job_uuid = UUID(job_id)
+    except ValueError:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+
+    if event_bus.latest(job_uuid) is None:
+        with Session(engine) as session:
+            job = session.get(ExtractionJob, job_uuid)
+            if not job:
+                raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+            if job.status in (ProcessingStatus.COMPLETED, ProcessingStatus.FAILED):
+                event = JobEvent(
+                    job_id=str(job.id),
+                    id=0,
+                    type=JOB_COMPLETED if job.status == ProcessingStatus.COMPLETED else JOB_FAILED,
+                    data={
+                        "document_id": str(job.document_id),
+                        "status": job.status.value,
+                        "pages_processed": job.pages_processed,
+                        "total_pages": job.total_pages,
+                        "error": job.error_message,
+                    },
+                )
+
+                async def finished():
+                    yield event
+                return finished()
+
+    return event_bus.subscribe(job_uuid, last_event_id)
@@ -1,88 +1,235 @@
 from __future__ import annotations
 
 from io import BytesIO
+import hashlib
+import threading
 import time
 import json
 import traceback
+from typing import Dict, List, Optional, Tuple
 
-import boto3
-import openai
 from pydantic import ValidationError
 
 from ..schemas import ExtractionResult, LabRow
 from ..config import settings
+from ..deps import get_textract_client
 
-openai_client = openai.OpenAI()  # requires OPENAI_API_KEY env var
+# Statuses of /extract jobs that are queued or running
+IN_FLIGHT_STATUSES = ("queued", "processing")
+
+_openai_client = None
+_openai_client_lock = threading.Lock()
+
+
+def get_openai_client():
+    """Return the shared OpenAI client, created on first use (requires OPENAI_API_KEY)."""
+    global _openai_client
+    if _openai_client is None:
+        with _openai_client_lock:
+            if _openai_client is None:
+                import openai  # the SDK's type modules take ~0.7s to import
+                _openai_client = openai.OpenAI()
+    return _openai_client
 
 # --- GPT-4.1 extractor ----------------------------------------------------
 # We use the full-size model (gpt-4.1) first; we can later downgrade to
 # gpt-4.1-mini or gpt-4.1-nano depending on performance/cost.
 
+EXTRACTION_INSTRUCTIONS = (
+    "You are a precise lab data extraction specialist. "
+    "Extract structured information from lab test sheets and return "
+    "data EXACTLY matching this JSON schema (no markdown, no extra keys):\n" +
+    ExtractionResult.schema_json(indent=None)
+)
+
+# Uploaded files unused for this long are deleted by the GC. It must stay well
+# above the run timeout, since a file handed out just now is still in use.
+FILE_CACHE_TTL = 60 * 60  # seconds
+RESOURCE_GC_INTERVAL = 5 * 60  # seconds
+
+# (model, instructions hash) -> assistant id
+_assistant_registry: Dict[Tuple[str, str], str] = {}
+# sha256 of file content -> (file id, timestamp of the last upload or reuse)
+_file_cache: Dict[str, Tuple[str, float]] = {}
+# Threads whose runs have finished and can be deleted
+_finished_threads: List[str] = []
+_resources_lock = threading.Lock()
+_gc_thread: Optional[threading.Thread] = None
+
+
+def _instructions_hash(instructions: str) -> str:
+    return hashlib.sha256(instructions.encode()).hexdigest()[:16]
+
+
+def get_assistant_id(model: str, instructions: str) -> str:
+    """Return a persistent Assistant for (model, instructions), creating it once.
+
+    Assistants are tagged with the instruction hash in their metadata so a
+    restarted process finds and reuses the one it created before: the
+    configured OPENAI_ASSISTANT_ID if its tag still matches, otherwise among
+    the newest 100 assistants. The API calls run outside the lock.
+    """
+    key = (model, _instructions_hash(instructions))
+    with _resources_lock:
+        assistant_id = _assistant_registry.get(key)
+    if assistant_id:
+        return assistant_id
+
+    client = get_openai_client()
+    created = False
+    assistant_id = _configured_assistant(client, key)
+    if assistant_id is None:
+        # The API can't filter by metadata; only the first page is scanned
+        newest = client.beta.assistants.list(limit=100, order="desc").data
+        assistant_id = next((a.id for a in newest if _assistant_matches(a, key)), None)
+    if assistant_id is None:
+        assistant_id = client.beta.assistants.create(
+            name="Lab PDF Extractor (GPT-4.1)",
+            model=model,
+            instructions=instructions,
+            tools=[{"type": "file_search"}],
+            metadata={"instructions_hash": key[1]},
+        ).id
+        created = True
+        print(f"Created assistant {assistant_id} for model {model}")
+
+    with _resources_lock:
+        stored = _assistant_registry.setdefault(key, assistant_id)
+    if created and stored != assistant_id:
+        # Another thread created one at the same time; keep theirs
+        client.beta.assistants.delete(assistant_id)
+    return stored
+
+
+def _assistant_matches(assistant, key: Tuple[str, str]) -> bool:
+    return assistant.model == key[0] and (assistant.metadata or {}).get("instructions_hash") == key[1]
+
+
+def _configured_assistant(client, key: Tuple[str, str]) -> Optional[str]:
+    """settings.openai_assistant_id, if set and created for this model and these instructions."""
+    if not settings.openai_assistant_id:
+        return None
+    try:
+        assistant = client.beta.assistants.retrieve(settings.openai_assistant_id)
+    except Exception as e:
+        print(f"Configured assistant {settings.openai_assistant_id} not usable: {e}")
+        return None
+    return assistant.id if _assistant_matches(assistant, key) else None
+
+
+def upload_file_cached(file_bytes: bytes, filename: str = "document.pdf") -> str:
+    """Upload a file for assistant use, reusing earlier uploads of the same content."""
+    digest = hashlib.sha256(file_bytes).hexdigest()
+    with _resources_lock:
+        cached = _file_cache.get(digest)
+        if cached and time.time() - cached[1] < FILE_CACHE_TTL:
+            # Restart the clock so the GC doesn't delete the file during this run
+            _file_cache[digest] = (cached[0], time.time())
+            return cached[0]
+
+    upload = get_openai_client().files.create(file=(filename, BytesIO(file_bytes)), purpose="assistants")
+    with _resources_lock:
+        _file_cache[digest] = (upload.id, time.time())
+    return upload.id
+
+
+def collect_assistant_garbage(max_file_age: float = FILE_CACHE_TTL) -> None:
+    """Delete finished threads and uploaded files not used for `max_file_age` seconds."""
+    with _resources_lock:
+        threads = list(_finished_threads)
+        _finished_threads.clear()
+        now = time.time()
+        expired = [digest for digest, (_, uploaded_at) in _file_cache.items() if now - uploaded_at >= max_file_age]
+        files = [_file_cache.pop(digest)[0] for digest in expired]
+
+    for thread_id in threads:
+        try:
+            get_openai_client().beta.threads.delete(thread_id)
+        except Exception as e:
+            print(f"Could not delete thread {thread_id}: {str(e)}")
+    for file_id in files:
+        try:
+            get_openai_client().files.delete(file_id)
+        except Exception as e:
+            print(f"Could not delete file {file_id}: {str(e)}")
+
+
+def start_assistant_gc(interval: float = RESOURCE_GC_INTERVAL) -> None:
+    """Start the background thread that garbage-collects assistant resources."""
+    global _gc_thread
+    if _gc_thread and _gc_thread.is_alive():
+        return
+
+    def run():
+        while True:
+            time.sleep(interval)
+            try:
+                collect_assistant_garbage()
+            except Exception as e:
+                print(f"Assistant resource GC failed: {str(e)}")
+
+    _gc_thread = threading.Thread(target=run, name="assistant-gc", daemon=True)
+    _gc_thread.start()
+
+
 def call_gpt_4_1(file_bytes: bytes, timeout: int = 300) -> dict:
     """Extract JSON using the *latest* OpenAI Assistants API instead of legacy chat-completions.
 
     Workflow:
-        1. Upload the PDF (`purpose='assistants'`).
-        2. Create a transient Assistant with `code_interpreter` to enable PDF tooling
-           and instructions enforcing the `ExtractionResult` JSON schema.
-        3. Start a thread, attach the file, and post the user message.
-        4. Create a run, poll until completion (or timeout).
-        5. Parse and return the JSON from the Assistant's reply.
+        1. Upload the PDF (`purpose='assistants'`), reusing a cached upload of
+           the same content when there is one.
+        2. Look up the persistent Assistant for the configured model and
+           instructions (created once per process/instructions change).
+        3. Create the thread with the user message and start the run in a
+           single streamed request, so completion is pushed to us instead of
+           being polled for.
+        4. Parse and return the JSON from the Assistant's reply. The thread is
+           queued for deletion by the background GC.
     """
     try:
-        # 1) Upload PDF for assistant context
-        upload = openai_client.files.create(
-            file=("document.pdf", BytesIO(file_bytes)),
-            purpose="assistants",
-        )
-
-        # 2) Create Assistant (in production, reuse an assistant_id to save quota)
-        assistant = openai_client.beta.assistants.create(
-            name="Lab PDF Extractor (GPT-4.1)",
-            model=settings.openai_model,
-            instructions=(
-                "You are a precise lab data extraction specialist. "
-                "Extract structured information from lab test sheets and return "
-                "data EXACTLY matching this JSON schema (no markdown, no extra keys):\n" +
-                ExtractionResult.schema_json(indent=None)
-            ),
-            tools=[{"type": "file_search"}],
-        )
-
-        # 3) New thread + initial user message
-        thread = openai_client.beta.threads.create()
-
-        openai_client.beta.threads.messages.create(
-            thread_id=thread.id,
-            role="user",
-            content="Please extract the data from the attached PDF and respond with *only* the JSON.",
-            attachments=[
-                {
-                    "file_id": upload.id,
-                    "tools": [{"type": "file_search"}],
-                }
-            ],
-        )
-
-        # 4) Run Assistant and poll
-        run = openai_client.beta.threads.runs.create(thread_id=thread.id, assistant_id=assistant.id)
-
-        start_ts = time.time()
-        while run.status not in {"completed", "failed", "cancelled", "expired"}:
-            if time.time() - start_ts > timeout:
-                raise TimeoutError("Assistants run timed out")
-            time.sleep(2)
-            run = openai_client.beta.threads.runs.retrieve(thread_id=thread.id, run_id=run.id)
+        # 1) Upload PDF for assistant context (cached by content hash)
+        file_id = upload_file_cached(file_bytes)
+
+        # 2) Persistent Assistant
+        assistant_id = get_assistant_id(settings.openai_model, EXTRACTION_INSTRUCTIONS)
+
+        # 3) Thread + message + run, streamed until the run finishes
+        with get_openai_client().beta.threads.create_and_run_stream(
+            assistant_id=assistant_id,
+            thread={
+                "messages": [
+                    {
+                        "role": "user",
+                        "content": "Please extract the data from the attached PDF and respond with *only* the JSON.",
+                        "attachments": [
+                            {
+                                "file_id": file_id,
+                                "tools": [{"type": "file_search"}],
+                            }
+                        ],
+                    }
+                ]
+            },
+            timeout=timeout,
+        ) as stream:
+            try:
+                stream.until_done()
+                run = stream.get_final_run()
+                messages = stream.get_final_messages()
+            finally:
+                # Queue the thread for deletion even when the run failed midway
+                if stream.current_run is not None:
+                    with _resources_lock:
+                        _finished_threads.append(stream.current_run.thread_id)
 
         if run.status != "completed":
             raise RuntimeError(f"Assistants run finished with status '{run.status}'")
 
-        # 5) Retrieve last assistant message and parse JSON
-        msgs = openai_client.beta.threads.messages.list(thread_id=thread.id, order="desc", limit=1)
-        if not msgs.data:
+        # 4) Parse JSON from the assistant's reply
+        if not messages:
             raise ValueError("No messages returned by assistant")
 
-        for segment in msgs.data[0].content:
+        for segment in messages[-1].content:
             if getattr(segment, "type", "") == "text":
                 try:
                     return json.loads(segment.text.value)
@@ -98,12 +245,7 @@ def call_gpt_4_1(file_bytes: bytes, timeout: int = 300) -> dict:
 
 def call_textract(file_bytes: bytes) -> dict:
     try:
-        textract = boto3.client(
-            "textract",
-            region_name=settings.aws_region,
-            aws_access_key_id=settings.aws_access_key_id,
-            aws_secret_access_key=settings.aws_secret_access_key,
-        )
+        textract = get_textract_client()
         resp = textract.analyze_document(Document={"Bytes": file_bytes}, FeatureTypes=["TABLES", "FORMS"])
         
         # Convert Textract response to our schema format
@@ -0,0 +1,303 @@
+"""
+Registry of known form templates for region-based extraction.
+
+Most documents are one of a handful of fixed forms. For those, sending the
+whole 300-DPI page wastes image tokens on printed text the model doesn't
+need to read. A template describes where the answers are written; a page
+that matches a template is aligned to it by phase correlation and only the
+answer regions are cropped and sent, in a single request, with each answer
+mapped back onto a known field ID.
+
+Templates are JSON files in FORM_TEMPLATES_DIR (default: form_templates/
+next to the backend), each with a reference scan of the blank form:
+
+    {
+      "id": "lsb-admission-v1",
+      "name": "Admission Form",
+      "document_type": "application form",
+      "letterhead": "THE LIVERPOOL SCHOOL FOR THE BLIND",
+      "reference_image": "lsb-admission-v1.png",
+      "fields": [
+        {"id": "pupil_name", "question": "Name of pupil", "bbox": [0.12, 0.21, 0.88, 0.25]}
+      ]
+    }
+
+Field bounding boxes are (left, top, right, bottom) fractions of the
+reference image size.
+"""
+import hashlib
+import json
+import logging
+import os
+from dataclasses import dataclass, field
+from functools import cached_property
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+from .page_schema import parse_json_output
+from .prompts import REGION_PROMPT
+
+logger = logging.getLogger(__name__)
+
+FORM_TEMPLATES_DIR = Path(os.environ.get(
+    "FORM_TEMPLATES_DIR", Path(__file__).resolve().parents[2] / "form_templates"
+))
+MATCH_THRESHOLD = float(os.environ.get("FORM_TEMPLATE_MATCH_THRESHOLD", "0.6"))
+ALIGN_SIZE = (256, 256)  # (width, height) both pages are resampled to for alignment
+ALIGN_LOWPASS = 0.1  # Gaussian low-pass (cycles/pixel) so printed layout outweighs handwriting
+SCORE_BLOCK = 4  # block averaging before scoring the aligned pages
+CROP_PADDING = 0.01  # extra margin around each field, as a fraction of the page
+
+
+@dataclass
+class FieldRegion:
+    """An answer region on a form template."""
+    id: str
+    question: str
+    bbox: Tuple[float, float, float, float]
+
+
+@dataclass
+class FormTemplate:
+    """A known form layout with its answer regions."""
+    id: str
+    name: str
+    fields: List[FieldRegion]
+    reference: np.ndarray = field(repr=False)  # ink image of the blank form, see `ink_image`
+    document_type: str = "form"
+    letterhead: Optional[str] = None
+
+    @classmethod
+    def from_file(cls, path: Path) -> "FormTemplate":
+        data = json.loads(path.read_text())
+        reference_image = Image.open(path.parent / data["reference_image"])
+        return cls(
+            id=data["id"],
+            name=data.get("name", data["id"]),
+            document_type=data.get("document_type", "form"),
+            letterhead=data.get("letterhead"),
+            fields=[FieldRegion(f["id"], f["question"], tuple(f["bbox"])) for f in data["fields"]],
+            reference=ink_image(reference_image),
+        )
+
+
+@dataclass
+class TemplateMatch:
+    """A page matched to a template, with the page's offset from the reference."""
+    template: FormTemplate
+    dx: float  # horizontal shift as a fraction of page width
+    dy: float  # vertical shift as a fraction of page height
+    score: float  # correlation of the aligned pages, 1.0 for identical pages
+
+
+def ink_image(image) -> np.ndarray:
+    """Page resampled to ALIGN_SIZE with ink as positive values."""
+    gray = image.convert("L").resize(ALIGN_SIZE)
+    return 255.0 - np.asarray(gray, dtype=np.float32)
+
+
+def _windowed(ink: np.ndarray) -> np.ndarray:
+    """Zero-mean, Hann-windowed copy, so page edges don't dominate the spectrum."""
+    window = np.outer(np.hanning(ink.shape[0]), np.hanning(ink.shape[1])).astype(np.float32)
+    return (ink - ink.mean()) * window
+
+
+def phase_correlation(image_ink: np.ndarray, reference_ink: np.ndarray, lowpass: float = ALIGN_LOWPASS) -> Tuple[int, int]:
+    """
+    Find the translation between two ink images of the same shape.
+
+    The normalized cross-power spectrum is low-passed so the large printed
+    structure of the form decides the alignment rather than handwriting.
+
+    Returns:
+        Tuple of (dy, dx) such that the image equals the reference moved by
+        (dy, dx) pixels
+    """
+    cross_power = np.fft.rfft2(_windowed(image_ink)) * np.conj(np.fft.rfft2(_windowed(reference_ink)))
+    cross_power /= np.abs(cross_power) + 1e-9
+    fy = np.fft.fftfreq(image_ink.shape[0])[:, None]
+    fx = np.fft.rfftfreq(image_ink.shape[1])[None, :]
+    cross_power *= np.exp(-(fx ** 2 + fy ** 2) / (2 * lowpass ** 2))
+    correlation = np.fft.irfft2(cross_power, s=image_ink.shape)
+    dy, dx = np.unravel_index(np.argmax(correlation), correlation.shape)
+    h, w = correlation.shape
+    if dy > h // 2:
+        dy -= h
+    if dx > w // 2:
+        dx -= w
+    return int(dy), int(dx)
+
+
+def aligned_score(image_ink: np.ndarray, reference_ink: np.ndarray, dy: int, dx: int) -> float:
+    """Normalized correlation of block-averaged ink after moving the reference by (dy, dx)."""
+    shifted = np.roll(reference_ink, (dy, dx), axis=(0, 1))
+    h, w = image_ink.shape
+    shape = (h // SCORE_BLOCK, SCORE_BLOCK, w // SCORE_BLOCK, SCORE_BLOCK)
+    a = image_ink.reshape(shape).mean(axis=(1, 3))
+    b = shifted.reshape(shape).mean(axis=(1, 3))
+    a -= a.mean()
+    b -= b.mean()
+    denominator = np.sqrt((a * a).sum() * (b * b).sum())
+    return float((a * b).sum() / denominator) if denominator else 0.0
+
+
+class TemplateRegistry:
+    """Loaded form templates and page-to-template matching."""
+
+    def __init__(self, templates: Optional[List[FormTemplate]] = None, threshold: float = MATCH_THRESHOLD):
+        self.templates = templates or []
+        self.threshold = threshold
+
+    @classmethod
+    def from_directory(cls, directory: Path = FORM_TEMPLATES_DIR) -> "TemplateRegistry":
+        """Load every template JSON in a directory; a missing directory gives an empty registry."""
+        templates = []
+        if directory.is_dir():
+            for path in sorted(directory.glob("*.json")):
+                try:
+                    templates.append(FormTemplate.from_file(path))
+                except Exception as e:
+                    logger.warning(f"Skipping form template {path.name}: {str(e)}")
+        if templates:
+            logger.info(f"Loaded {len(templates)} form templates from {directory}")
+        return cls(templates)
+
+    @cached_property
+    def version(self) -> str:
+        """Hash of the loaded templates, changing whenever one is added, removed or edited."""
+        digest = hashlib.sha256()
+        for template in self.templates:
+            fields = [(region.id, region.question, list(region.bbox)) for region in template.fields]
+            digest.update(json.dumps([template.id, template.name, template.document_type, template.letterhead, fields]).encode())
+            digest.update(template.reference.tobytes())
+        return digest.hexdigest()[:16]
+
+    def match(self, image) -> Optional[TemplateMatch]:
+        """Return the best matching template for a page, if any clears the threshold."""
+        if not self.templates:
+            return None
+        page_ink = ink_image(image)
+        best = None
+        for template in self.templates:
+            dy, dx = phase_correlation(page_ink, template.reference)
+            score = aligned_score(page_ink, template.reference, dy, dx)
+            if score >= self.threshold and (best is None or score > best.score):
+                best = TemplateMatch(template, dx / ALIGN_SIZE[0], dy / ALIGN_SIZE[1], score)
+        return best
+
+
+def crop_fields(image, match: TemplateMatch) -> List[Tuple[FieldRegion, Any]]:
+    """Crop each answer region of the matched template out of the full-resolution page."""
+    width, height = image.size
+    crops = []
+    for region in match.template.fields:
+        left, top, right, bottom = region.bbox
+        box = (
+            max(0, int((left + match.dx - CROP_PADDING) * width)),
+            max(0, int((top + match.dy - CROP_PADDING) * height)),
+            min(width, int((right + match.dx + CROP_PADDING) * width)),
+            min(height, int((bottom + match.dy + CROP_PADDING) * height)),
+        )
+        if box[2] > box[0] and box[3] > box[1]:
+            crops.append((region, image.crop(box)))
+    return crops
+
+
+def build_region_messages(match: TemplateMatch, encoded_crops: List[Tuple[FieldRegion, str]], page_num: int) -> List[Dict[str, Any]]:
+    """
+    Build one request covering every answer region of a matched page.
+
+    Args:
+        match: The template match
+        encoded_crops: (field, base64 PNG) pairs
+        page_num: Page number
+    """
+    labelled = [(f"field_id: {region.id} - {region.question}", base64_image) for region, base64_image in encoded_crops]
+    return REGION_PROMPT.messages(labelled, form_name=match.template.name, page_num=page_num)
+
+
+def region_response_format(template: FormTemplate) -> Dict[str, Any]:
+    """Schema for region answers, restricted to the template's field IDs."""
+    return {
+        "type": "json_schema",
+        "json_schema": {
+            "name": "template_answers",
+            "strict": True,
+            "schema": {
+                "type": "object",
+                "properties": {
+                    "answers": {
+                        "type": "array",
+                        "items": {
+                            "type": "object",
+                            "properties": {
+                                "field_id": {"type": "string", "enum": [f.id for f in template.fields]},
+                                "answer": {"type": "string"},
+                                "confidence": {"type": "number"},
+                                "is_handwritten": {"type": "boolean"},
+                            },
+                            "required": ["field_id", "answer", "confidence", "is_handwritten"],
+                            "additionalProperties": False,
+                        },
+                    },
+                },
+                "required": ["answers"],
+                "additionalProperties": False,
+            },
+        },
+    }
+
+
+def parse_region_content(content: str, page_num: int, match: TemplateMatch) -> Dict[str, Any]:
+    """
+    Map region answers onto the template's questions as page content.
+
+    Returns:
+        Page content in the usual shape, or an error payload if nothing could be parsed
+    """
+    parsed, complete = parse_json_output(content)
+    if not isinstance(parsed, dict) or not isinstance(parsed.get("answers"), list):
+        return {"error": "Failed to parse region answers", "document_type": "error", "questions": [], "raw_content": content[:1000]}
+
+    template = match.template
+    answers = {a.get("field_id"): a for a in parsed["answers"] if isinstance(a, dict)}
+    questions = []
+    for region in template.fields:
+        answer = answers.get(region.id)
+        if answer is None or "answer" not in answer:
+            continue
+        questions.append({
+            "id": region.id,
+            "question": region.question,
+            "answer": answer["answer"],
+            "confidence": answer.get("confidence", 0.95),
+            "is_handwritten": answer.get("is_handwritten", True),
+            "page": page_num,
+        })
+
+    result = {
+        "form_title": template.name,
+        "document_type": template.document_type,
+        "letterhead": template.letterhead,
+        "template_id": template.id,
+        "alignment": {"dx": round(match.dx, 4), "dy": round(match.dy, 4), "score": round(match.score, 3)},
+        "questions": questions,
+        "overall_confidence": sum(q["confidence"] for q in questions) / len(questions) if questions else 0.0,
+    }
+    if not complete:
+        result["truncated"] = True
+    return result
+
+
+_registry: Optional[TemplateRegistry] = None
+
+
+def get_template_registry() -> TemplateRegistry:
+    """The process-wide registry, loaded on first use."""
+    global _registry
+    if _registry is None:
+        _registry = TemplateRegistry.from_directory()
+    return _registry
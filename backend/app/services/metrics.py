@@ -0,0 +1,267 @@
+"""
+In-process metrics for the extraction pipeline, exposed at /metrics.
+
+A small set of counters, gauges and histograms rendered in the Prometheus
+text exposition format, so the endpoint can be scraped without adding a
+client library. Metrics are process-wide singletons defined at the bottom
+of this module and are safe to update from worker threads.
+
+Configuration (environment):
+    METRICS_LOOP_LAG_INTERVAL  seconds between event loop lag probes (default 1, 0 disables)
+"""
+import asyncio
+import bisect
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+METRICS_LOOP_LAG_INTERVAL = float(os.environ.get("METRICS_LOOP_LAG_INTERVAL", "1"))
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+LabelValues = Tuple[str, ...]
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') for v in values)
+    return "{" + ",".join(f'{name}="{value}"' for name, value in zip(names, escaped)) + "}"
+
+
+class Registry:
+    """Collection of metrics rendered together."""
+
+    def __init__(self):
+        self._metrics: List["Metric"] = []
+        self._lock = threading.Lock()
+
+    def register(self, metric: "Metric") -> None:
+        with self._lock:
+            if any(m.name == metric.name for m in self._metrics):
+                raise ValueError(f"Metric {metric.name} is already registered")
+            self._metrics.append(metric)
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text format."""
+        lines = []
+        for metric in list(self._metrics):
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            for suffix, names, values, value in metric.samples():
+                lines.append(f"{metric.name}{suffix}{_format_labels(names, values)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+class Metric:
+    """Base class: a named metric with optional labels."""
+    type = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), registry: Optional[Registry] = None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[LabelValues, object] = {}
+        self._lock = threading.Lock()
+        (registry or REGISTRY).register(self)
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} takes labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def samples(self) -> Iterable[Tuple[str, Sequence[str], LabelValues, float]]:
+        raise NotImplementedError
+
+
+class Counter(Metric):
+    """Monotonically increasing count."""
+    type = "counter"
+
+    def labels(self, **labels: str) -> "_BoundCounter":
+        return _BoundCounter(self, self._key(labels))
+
+    def inc(self, amount: float = 1.0) -> None:
+        self._inc((), amount)
+
+    def _inc(self, key: LabelValues, amount: float) -> None:
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            yield "_total" if not self.name.endswith("_total") else "", self.labelnames, key, value
+
+
+class _BoundCounter:
+    def __init__(self, counter: Counter, key: LabelValues):
+        self._counter, self._key = counter, key
+
+    def inc(self, amount: float = 1.0) -> None:
+        self._counter._inc(self._key, amount)
+
+
+class Gauge(Metric):
+    """Value that goes up and down, or is read from a function at scrape time."""
+    type = "gauge"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._function: Optional[Callable[[], float]] = None
+
+    def set(self, value: float) -> None:
+        with self._lock:
+            self._values[()] = float(value)
+
+    def inc(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self._values[()] = self._values.get((), 0.0) + amount
+
+    def dec(self, amount: float = 1.0) -> None:
+        self.inc(-amount)
+
+    def set_function(self, function: Callable[[], float]) -> None:
+        """Read the value from `function` whenever metrics are rendered."""
+        self._function = function
+
+    def value(self) -> float:
+        if self._function is not None:
+            return float(self._function())
+        return self._values.get((), 0.0)
+
+    @contextmanager
+    def track(self) -> Iterator[None]:
+        """Count the enclosed block as in progress."""
+        self.inc()
+        try:
+            yield
+        finally:
+            self.dec()
+
+    def samples(self):
+        yield "", (), (), self.value()
+
+
+class Histogram(Metric):
+    """Distribution of observed values in cumulative buckets."""
+    type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS, registry: Optional[Registry] = None):
+        super().__init__(name, documentation, labelnames, registry)
+        self.buckets = tuple(sorted(buckets))
+
+    def labels(self, **labels: str) -> "_BoundHistogram":
+        return _BoundHistogram(self, self._key(labels))
+
+    def observe(self, value: float) -> None:
+        self._observe((), value)
+
+    def _observe(self, key: LabelValues, value: float) -> None:
+        with self._lock:
+            counts, total = self._values.get(key) or ([0] * (len(self.buckets) + 1), 0.0)
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            self._values[key] = (counts, total + value)
+
+    @contextmanager
+    def time(self) -> Iterator[None]:
+        """Observe the duration of the enclosed block in seconds."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+    def count(self, **labels: str) -> int:
+        entry = self._values.get(self._key(labels))
+        return sum(entry[0]) if entry else 0
+
+    def samples(self):
+        with self._lock:
+            items = [(key, list(counts), total) for key, (counts, total) in self._values.items()]
+        names = self.labelnames + ("le",)
+        for key, counts, total in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                yield "_bucket", names, key + (_format_value(bound),), cumulative
+            yield "_sum", self.labelnames, key, total
+            yield "_count", self.labelnames, key, cumulative
+
+
+class _BoundHistogram:
+    def __init__(self, histogram: Histogram, key: LabelValues):
+        self._histogram, self._key = histogram, key
+
+    def observe(self, value: float) -> None:
+        self._histogram._observe(self._key, value)
+
+
+async def count_http_response(response) -> None:
+    """httpx response hook counting rate-limited model API responses, including the SDK's own retries."""
+    if response.status_code == 429:
+        RATE_LIMITED.inc()
+
+
+async def monitor_loop_lag(interval: float = METRICS_LOOP_LAG_INTERVAL) -> None:
+    """Measure how late the event loop wakes up from a sleep, forever."""
+    loop = asyncio.get_running_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(interval)
+        LOOP_LAG.set(max(0.0, loop.time() - start - interval))
+
+
+def start_loop_lag_monitor() -> Optional[asyncio.Task]:
+    """Start the lag probe on the running loop, unless disabled."""
+    if METRICS_LOOP_LAG_INTERVAL <= 0:
+        return None
+    return asyncio.get_running_loop().create_task(monitor_loop_lag())
+
+
+REGISTRY = Registry()
+
+# Latency
+RENDER_SECONDS = Histogram("doctranscribe_render_seconds", "PDF to image conversion time per document")
+ENCODE_SECONDS = Histogram("doctranscribe_encode_seconds", "Page preprocessing and base64 encoding time")
+API_SECONDS = Histogram(
+    "doctranscribe_api_request_seconds", "Model API call latency, including continuations",
+    ["model", "outcome"], buckets=(0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0),
+)
+DB_COMMIT_SECONDS = Histogram(
+    "doctranscribe_db_commit_seconds", "Session flush and commit time",
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0),
+)
+EXPORT_SECONDS = Histogram("doctranscribe_export_seconds", "XLSX export generation time")
+
+# Load
+PAGES_QUEUED = Gauge("doctranscribe_pages_queued", "Rendered pages waiting to be processed")
+PAGES_IN_FLIGHT = Gauge("doctranscribe_pages_in_flight", "Pages being processed")
+ACTIVE_JOBS = Gauge("doctranscribe_active_jobs", "Extraction jobs running in this process")
+LOOP_LAG = Gauge("doctranscribe_event_loop_lag_seconds", "How late the event loop woke from the last lag probe")
+LOOP_STALLS = Histogram(
+    "doctranscribe_event_loop_stall_seconds", "Callbacks that blocked the event loop longer than LOOP_WATCHDOG_MS",
+    buckets=(0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0),
+)
+
+# Events
+RETRIES = Counter("doctranscribe_retries_total", "Model requests repeated for a page", ["reason"])
+RATE_LIMITED = Counter("doctranscribe_rate_limited_total", "Model API responses with status 429")
+CACHE_REQUESTS = Counter("doctranscribe_cache_requests_total", "In-process cache lookups", ["cache", "result"])
+PARSE_FAILURES = Counter("doctranscribe_parse_failures_total", "Model outputs that were not valid JSON", ["source"])
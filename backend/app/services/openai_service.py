@@ -1,20 +1,34 @@
+import asyncio
 import base64
 import io
 import json
 import logging
 import os
 import time
-from typing import List, Optional, Dict, Any
+from typing import TYPE_CHECKING, Any, Awaitable, Callable, Dict, List, Optional
 
-from openai import AsyncOpenAI
-from openai.types.chat import ChatCompletionMessageParam
 from fastapi import HTTPException
-from pdf2image import convert_from_bytes
 
 from ..config import settings
+from .metrics import (
+    API_SECONDS,
+    ENCODE_SECONDS,
+    PAGES_IN_FLIGHT,
+    PAGES_QUEUED,
+    PARSE_FAILURES,
+    RENDER_SECONDS,
+    RETRIES,
+    count_http_response,
+)
+from .pdf_service import page_windows, pdf_page_count
+from .prompts import METADATA_PROMPT
+from .tracing import span, traced
 
 logger = logging.getLogger(__name__)
 
+if TYPE_CHECKING:
+    from openai.types.chat import ChatCompletionMessageParam
+
 class OpenAIService:
     """Service for interacting with OpenAI's API, particularly for processing PDFs with GPT-4.1"""
     
@@ -26,15 +40,31 @@ class OpenAIService:
         self.model = settings.openai_model
         self.max_retries = 3
         self.retry_delay = 2  # seconds
-        self.client = AsyncOpenAI(api_key=self.api_key) if self.api_key else None
+        self.client = None
+        if self.api_key:
+            from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+            self.client = AsyncOpenAI(
+                api_key=self.api_key,
+                base_url=settings.openai_base_url,
+                http_client=DefaultAsyncHttpxClient(event_hooks={"response": [count_http_response]})
+            )
     
-    async def process_pdf(self, pdf_binary: bytes, max_pages: int = 10) -> Dict[str, Any]:
+    async def process_pdf(
+        self,
+        pdf_binary: bytes,
+        max_pages: Optional[int] = None,
+        on_page: Optional[Callable[[Dict[str, Any]], Awaitable[None]]] = None
+    ) -> Dict[str, Any]:
         """
         Process a PDF file using GPT-4.1 to extract handwritten text.
         
+        Pages are rendered PAGE_WINDOW at a time, so only one window of page
+        images is held in memory however long the document is.
+        
         Args:
             pdf_binary: Raw PDF file bytes
-            max_pages: Maximum number of pages to process (to avoid excessive costs)
+            max_pages: Last page to process (default: all pages)
+            on_page: Awaited with each page result as soon as the page is done, e.g. to store it
             
         Returns:
             Dictionary containing extracted data and processing metadata
@@ -64,37 +94,64 @@ class OpenAIService:
                             }
                         }),
                         "finish_reason": "stop",
-                        "processing_time": 100
+                        "processing_time": 0.0
                     }
                 ]
             }
             
         try:
-            # Convert PDF to list of images
             try:
-                logger.info("Converting PDF to images...")
-                images = self._pdf_to_images(pdf_binary, max_pages)
-                logger.info(f"Successfully converted PDF to {len(images)} images")
+                total_pages = pdf_page_count(io.BytesIO(pdf_binary))
             except Exception as e:
-                logger.error(f"Error converting PDF to images: {str(e)}")
+                logger.error(f"Error reading PDF page count: {str(e)}")
                 raise HTTPException(
                     status_code=500,
                     detail=f"PDF conversion failed: {str(e)}"
                 )
+            if max_pages:
+                total_pages = min(total_pages, max_pages)
             
-            # Process each page
+            # Render and process each window of pages
             results = []
-            for i, img in enumerate(images):
-                logger.info(f"Processing page {i+1} of {len(images)}")
-                page_result = await self._process_image(img, page_num=i+1)
-                results.append(page_result)
+            PAGES_QUEUED.inc(total_pages)
+            try:
+                for first, last in page_windows(range(1, total_pages + 1)):
+                    try:
+                        render_start = time.perf_counter()
+                        with span("pdf.render", {"page.first": first, "page.last": last}) as render_span:
+                            images = await asyncio.to_thread(self._pdf_to_images, pdf_binary, last, first)
+                            render_span.set_attribute("document.pages", len(images))
+                        rendered_at = time.perf_counter()
+                        RENDER_SECONDS.observe(rendered_at - render_start)
+                        render_ms = (rendered_at - render_start) * 1000 / max(1, len(images))
+                    except Exception as e:
+                        logger.error(f"Error converting PDF to images: {str(e)}")
+                        raise HTTPException(
+                            status_code=500,
+                            detail=f"PDF conversion failed: {str(e)}"
+                        )
+                    
+                    for page_num, img in enumerate(images, start=first):
+                        logger.info(f"Processing page {page_num} of {total_pages}")
+                        PAGES_QUEUED.dec()
+                        queue_ms = (time.perf_counter() - rendered_at) * 1000
+                        with PAGES_IN_FLIGHT.track():
+                            page_result = await self._process_image(img, page_num=page_num)
+                        if page_result.get("call"):
+                            page_result["call"].update(queue_ms=queue_ms, render_ms=render_ms)
+                        results.append(page_result)
+                        if on_page is not None:
+                            await on_page(page_result)
+                    del images
+            finally:
+                PAGES_QUEUED.dec(total_pages - len(results))
             
             # Combine results into structured data
             structured_data = self._combine_results(results)
             
             return {
                 "success": True,
-                "pages_processed": len(images),
+                "pages_processed": len(results),
                 "structured_data": structured_data,
                 "raw_results": results
             }
@@ -106,8 +163,8 @@ class OpenAIService:
                 detail=f"PDF processing failed: {str(e)}"
             )
     
-    def _pdf_to_images(self, pdf_binary: bytes, max_pages: int) -> List[bytes]:
-        """Convert PDF bytes to a list of image bytes"""
+    def _pdf_to_images(self, pdf_binary: bytes, max_pages: Optional[int], first_page: int = 1) -> List[bytes]:
+        """Convert a page range of PDF bytes to a list of image bytes"""
         try:
             # Log the poppler path for debugging
             import shutil
@@ -115,10 +172,11 @@ class OpenAIService:
             logger.info(f"Poppler path: {poppler_path}")
             
             # Convert PDF to list of PIL Images
+            from pdf2image import convert_from_bytes
             pil_images = convert_from_bytes(
                 pdf_binary,
                 dpi=300,  # Higher DPI for better text recognition
-                first_page=1,
+                first_page=first_page,
                 last_page=max_pages
             )
             
@@ -137,6 +195,7 @@ class OpenAIService:
             logger.error(f"Error converting PDF to images: {str(e)}")
             raise
     
+    @traced("page.process", attributes=lambda self, image_bytes, page_num: {"page.number": page_num, "model": self.model})
     async def _process_image(self, image_bytes: bytes, page_num: int) -> Dict[str, Any]:
         """
         Process a single image with GPT-4.1
@@ -146,67 +205,22 @@ class OpenAIService:
             page_num: Page number for reference
             
         Returns:
-            Dictionary with extracted content
+            Dictionary with extracted content, processing time in seconds and
+            the model call (tokens and timings) for usage accounting
         """
+        start_time = time.perf_counter()
+        
         # Base64 encode the image
         base64_image = base64.b64encode(image_bytes).decode('utf-8')
+        encode_ms = (time.perf_counter() - start_time) * 1000
+        ENCODE_SECONDS.observe(encode_ms / 1000)
         
-        # Construct the messages for GPT-4.1
-        messages: List[ChatCompletionMessageParam] = [
-            {
-                "role": "system",
-                "content": (
-                    "You are a precise document extraction expert specializing in form analysis and metadata extraction. "
-                    "Your task is to extract all text, data and metadata from the image, while maintaining the document structure. "
-                    "\n\n"
-                    "EXTRACTION REQUIREMENTS:\n"
-                    "1. Extract ALL text visible in the document, both printed and handwritten\n"
-                    "2. Identify form fields, labels, values, and their relationships\n"
-                    "3. Extract all metadata, such as form identifiers, dates, version numbers, company info\n"
-                    "4. Identify headers, footers, section titles, and organizational structure\n"
-                    "5. Label each section appropriately based on its content\n"
-                    "6. Format numerical data appropriately (dates, numbers, etc.)\n"
-                    "7. If text is illegible, mark it as [ILLEGIBLE]\n"
-                    "8. Identify handwritten vs printed text (mark with is_handwritten: true/false)\n"
-                    "9. Include a confidence score for each extracted field (0.0-1.0)\n"
-                    "10. Detect table structures and preserve their data format\n"
-                    "\n\n"
-                    "IMPORTANT: Return data in a well-structured JSON format with these top-level keys:\n"
-                    "- form_title: The title of the document\n"
-                    "- document_type: The type of document (medical form, survey, application, etc.)\n"
-                    "- explanation_text: Any explanatory text about the document's purpose\n"
-                    "- header: Document header information\n"
-                    "- footer: Document footer information\n"
-                    "- metadata: Any document metadata (form ID, version, etc.)\n"
-                    "- overall_confidence: Overall confidence in extraction accuracy (0.0-1.0)\n"
-                    "- sections: Array of logical sections, each with fields array\n"
-                    "- questions: Array of question-answer pairs found in the document\n"
-                    "- tables: Array of table data if present\n"
-                    "- form_elements: Object containing checkboxes, signatures, etc.\n"
-                    "- notes: Any additional observations\n"
-                    "\n"
-                    "Always include date formats for dates and appropriate units for measured values."
-                )
-            },
-            {
-                "role": "user",
-                "content": [
-                    {
-                        "type": "text",
-                        "text": f"Extract all text, data, and metadata from this document (page {page_num}). Include all printed and handwritten content. Preserve form structure and identify all key elements."
-                    },
-                    {
-                        "type": "image_url",
-                        "image_url": {
-                            "url": f"data:image/png;base64,{base64_image}"
-                        }
-                    }
-                ]
-            }
-        ]
+        # Static prompt first, page number last, so the prefix is served from the prompt cache
+        messages: List["ChatCompletionMessageParam"] = METADATA_PROMPT.messages([(None, base64_image)], page_num=page_num)
         
         # Make API request with retries
         for attempt in range(self.max_retries):
+            call_start = time.perf_counter()
             try:
                 if not self.client:
                     raise ValueError("OpenAI client not initialized (no API key)")
@@ -216,17 +230,20 @@ class OpenAIService:
                     model=self.model,
                     messages=messages,
                     max_tokens=4000,
-                    temperature=0.1  # Lower temperature for more deterministic outputs
+                    temperature=0.1,  # Lower temperature for more deterministic outputs
+                    extra_body={"prompt_cache_key": METADATA_PROMPT.key}
                 )
                 
                 # Process response
                 content = response.choices[0].message.content
                 finish_reason = response.choices[0].finish_reason
                 total_tokens = response.usage.total_tokens if response.usage else 0
+                network_ms = (time.perf_counter() - call_start) * 1000
                 
                 logger.info(f"Received response for page {page_num}, tokens: {total_tokens}")
                 
                 # Try to parse JSON from the content
+                parse_start = time.perf_counter()
                 try:
                     # Direct JSON parsing
                     json_content = json.loads(content)
@@ -240,18 +257,29 @@ class OpenAIService:
                         json_content = json.loads(json_part)
                     else:
                         logger.warning(f"GPT response is not valid JSON: {content[:200]}...")
+                        PARSE_FAILURES.labels(source="metadata").inc()
                         json_content = {"raw_text": content}
                 
+                parse_ms = (time.perf_counter() - parse_start) * 1000
+                API_SECONDS.labels(model=self.model, outcome="ok").observe(network_ms / 1000)
+                
                 return {
                     "page": page_num,
                     "content": json_content,
                     "finish_reason": finish_reason,
-                    "processing_time": total_tokens
+                    "processing_time": time.perf_counter() - start_time,
+                    "call": self._call_usage(
+                        response.usage, page_num,
+                        encode_ms=encode_ms, network_ms=network_ms, parse_ms=parse_ms,
+                        latency_ms=(time.perf_counter() - call_start) * 1000
+                    )
                 }
                 
             except Exception as e:
                 logger.error(f"Error processing image (attempt {attempt+1}/{self.max_retries}): {str(e)}")
+                API_SECONDS.labels(model=self.model, outcome="error").observe(time.perf_counter() - call_start)
                 if attempt < self.max_retries - 1:
+                    RETRIES.labels(reason="error").inc()
                     wait_time = self.retry_delay * (2 ** attempt)  # Exponential backoff
                     logger.info(f"Retrying in {wait_time} seconds...")
                     time.sleep(wait_time)
@@ -260,9 +288,30 @@ class OpenAIService:
                         "page": page_num,
                         "error": f"Failed after {self.max_retries} attempts: {str(e)}",
                         "content": {},
-                        "processing_time": 0
+                        "processing_time": time.perf_counter() - start_time,
+                        "call": self._call_usage(None, page_num, encode_ms=encode_ms, error=str(e))
                     }
     
+    def _call_usage(self, usage, page_num: int, error: Optional[str] = None, **timings: float) -> Dict[str, Any]:
+        """Token usage and timings of a request in the shape stored as a ModelCall."""
+        from .cascade import estimate_cost
+        
+        details = getattr(usage, "prompt_tokens_details", None)
+        input_tokens = getattr(usage, "prompt_tokens", 0) or 0
+        cached_tokens = (getattr(details, "cached_tokens", 0) or 0) if details else 0
+        output_tokens = getattr(usage, "completion_tokens", 0) or 0
+        return {
+            "page_number": page_num,
+            "model": self.model,
+            "prompt_version": METADATA_PROMPT.key,
+            "input_tokens": input_tokens,
+            "cached_tokens": cached_tokens,
+            "output_tokens": output_tokens,
+            "cost_usd": estimate_cost(self.model, input_tokens, cached_tokens, output_tokens),
+            "error": error,
+            **timings,
+        }
+    
     def _combine_results(self, page_results: List[Dict[str, Any]]) -> Dict[str, Any]:
         """
         Combine results from multiple pages into a structured data format
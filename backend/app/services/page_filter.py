@@ -0,0 +1,187 @@
+"""
+Local pre-filter that skips blank and duplicate pages before the vision model.
+
+Duplex scans produce blank backs and many packets repeat the same
+instruction page. Both are detected locally, mostly on a downscaled grayscale
+copy of the page:
+
+* blank: almost no pixels are clearly darker than the paper background and
+  the page has little tonal variation (bleed-through and scanner noise stay
+  under the thresholds);
+* duplicate: the page's difference hash is close to that of a page
+  already sent for this job, and their ink maps agree. The ink map keeps
+  the darkest pixel of every cell of a grid over the full-resolution page,
+  so a pen stroke one or two pixels wide at 300 DPI still marks its cell
+  (averaging it into a thumbnail would erase it); two copies of a template
+  filled in differently are therefore not mistaken for duplicates.
+
+Configuration (environment):
+    PAGE_FILTER_ENABLED          "0" to send every page (default on)
+    PAGE_FILTER_BLANK_INK        max fraction of ink pixels for a blank page (default 0.0005)
+    PAGE_FILTER_BLANK_STD        max gray-level standard deviation for a blank page (default 10)
+    PAGE_FILTER_DUPLICATE_BITS   max hash distance, out of 256 bits, for a duplicate candidate (default 16)
+"""
+import os
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+PAGE_FILTER_ENABLED = os.environ.get("PAGE_FILTER_ENABLED", "1") != "0"
+BLANK_INK_RATIO = float(os.environ.get("PAGE_FILTER_BLANK_INK", "0.0005"))
+BLANK_STD = float(os.environ.get("PAGE_FILTER_BLANK_STD", "10"))
+DUPLICATE_MAX_DISTANCE = int(os.environ.get("PAGE_FILTER_DUPLICATE_BITS", "16"))
+
+ANALYSIS_SIZE = 512  # longest side of the copy the checks run on
+MARGIN = 0.05  # ignore scanner edges and punch holes
+INK_CONTRAST = 60  # gray levels below the background that count as ink
+HASH_SIZE = 16  # 16x16 difference hash = 256 bits
+HASH_DEADBAND = 2  # gray levels; keeps flat paper from flipping bits on scanner noise
+INK_MAP_SIZE = 256  # cells along the longest side of the ink map
+INK_MAP_CONTRAST = 40  # gray levels below the background that mark a cell as inked
+INK_MAP_CHANGED_CELLS = 2  # inked cells one page has and the other lacks, tolerated as dust and noise
+
+
+def _gray_array(image, size: int = ANALYSIS_SIZE) -> np.ndarray:
+    """Downscaled grayscale copy of a PIL image as a uint8 array."""
+    gray = image.convert("L")
+    gray.thumbnail((size, size))
+    return np.asarray(gray)
+
+
+def ink_stats(image) -> Tuple[float, float]:
+    """
+    Measure how much of a page is covered by ink.
+
+    Returns:
+        Tuple of (fraction of ink pixels, gray-level standard deviation),
+        both measured inside the page margins
+    """
+    gray = _gray_array(image)
+    h, w = gray.shape
+    dy, dx = int(h * MARGIN), int(w * MARGIN)
+    inner = gray[dy:h - dy, dx:w - dx]
+    if inner.size == 0:
+        inner = gray
+    background = np.median(inner)
+    ink = np.count_nonzero(inner < background - INK_CONTRAST)
+    return ink / inner.size, float(inner.std())
+
+
+def difference_hash(image, hash_size: int = HASH_SIZE) -> int:
+    """Perceptual difference hash (dHash) of a page as an integer."""
+    gray = image.convert("L").resize((hash_size + 1, hash_size))
+    pixels = np.asarray(gray, dtype=np.int16)
+    bits = (pixels[:, 1:] - pixels[:, :-1] > HASH_DEADBAND).ravel()
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def ink_map(image, size: int = INK_MAP_SIZE) -> np.ndarray:
+    """
+    Boolean grid marking the cells of a page that contain ink.
+
+    Each cell takes the darkest pixel of its block of the full-resolution
+    page, so thin strokes survive the reduction.
+    """
+    gray = np.asarray(image.convert("L"))
+    h, w = gray.shape
+    block = max(1, -(-max(h, w) // size))
+    rows, cols = max(1, h // block), max(1, w // block)
+    gray = gray[:rows * block, :cols * block]
+    darkest = gray.reshape(rows, gray.shape[0] // rows, cols, gray.shape[1] // cols).min(axis=(1, 3))
+    return darkest < np.median(gray) - INK_MAP_CONTRAST
+
+
+def ink_map_difference(a: np.ndarray, b: np.ndarray) -> int:
+    """
+    Count inked cells present in one map and absent around the same place in the other.
+
+    Ink within one cell of ink in the other map is not counted, so a page
+    scanned again a few pixels off matches itself.
+    """
+    return int(np.count_nonzero(a & ~_dilate(b)) + np.count_nonzero(b & ~_dilate(a)))
+
+
+def _dilate(cells: np.ndarray) -> np.ndarray:
+    """Grow inked cells by one cell in every direction."""
+    padded = np.pad(cells, 1)
+    h, w = cells.shape
+    grown = np.zeros_like(cells)
+    for dy in range(3):
+        for dx in range(3):
+            grown |= padded[dy:dy + h, dx:dx + w]
+    return grown
+
+
+def hash_distance(a: int, b: int) -> int:
+    """Number of differing bits between two hashes."""
+    return bin(a ^ b).count("1")
+
+
+class PageFilter:
+    """Decides, page by page within one job, which pages need the model."""
+
+    def __init__(
+        self,
+        enabled: bool = PAGE_FILTER_ENABLED,
+        blank_ink_ratio: float = BLANK_INK_RATIO,
+        blank_std: float = BLANK_STD,
+        duplicate_max_distance: int = DUPLICATE_MAX_DISTANCE,
+    ):
+        self.enabled = enabled
+        self.blank_ink_ratio = blank_ink_ratio
+        self.blank_std = blank_std
+        self.duplicate_max_distance = duplicate_max_distance
+        # (page number, hash, ink map) of pages sent to the model
+        self._pages: List[Tuple[int, int, np.ndarray]] = []
+
+    def check(self, image, page_num: int) -> Optional[Dict[str, Any]]:
+        """
+        Check a page before it is sent to the model.
+
+        Args:
+            image: PIL image of the page
+            page_num: Page number
+
+        Returns:
+            None if the page should be processed, otherwise a dict describing
+            why it was skipped
+        """
+        if not self.enabled:
+            return None
+
+        # One downscaled grayscale copy serves the blank check and the hash
+        small = image.convert("L")
+        small.thumbnail((ANALYSIS_SIZE, ANALYSIS_SIZE))
+
+        ink_ratio, std = ink_stats(small)
+        if ink_ratio <= self.blank_ink_ratio and std <= self.blank_std:
+            return {"reason": "blank", "ink_ratio": round(ink_ratio, 5), "std": round(std, 2)}
+
+        page_hash = difference_hash(small)
+        page_ink = ink_map(image)
+        for other_page, other_hash, other_ink in self._pages:
+            distance = hash_distance(page_hash, other_hash)
+            if distance > self.duplicate_max_distance or other_ink.shape != page_ink.shape:
+                continue
+            if ink_map_difference(page_ink, other_ink) <= INK_MAP_CHANGED_CELLS:
+                return {"reason": "duplicate", "duplicate_of": other_page, "distance": distance}
+
+        self._pages.append((page_num, page_hash, page_ink))
+        return None
+
+
+def skipped_page_content(page_num: int, skip: Dict[str, Any]) -> Dict[str, Any]:
+    """ExtractionResult content recorded for a page the filter skipped."""
+    if skip["reason"] == "duplicate":
+        explanation = f"Page {page_num} duplicates page {skip['duplicate_of']} and was not sent for extraction."
+    else:
+        explanation = f"Page {page_num} is blank and was not sent for extraction."
+    return {
+        "skipped": True,
+        "skip": skip,
+        "form_title": "Skipped Page",
+        "document_type": "skipped",
+        "explanation_text": explanation,
+        "questions": [],
+        "overall_confidence": None,
+    }
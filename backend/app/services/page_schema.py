@@ -0,0 +1,182 @@
+"""
+Versioned JSON schema for per-page extraction output, and a tolerant parser.
+
+Page requests ask the model for schema-constrained output (OpenAI
+Structured Outputs), so well-formed responses always match `PAGE_SCHEMA`.
+The remaining failure mode is truncation: output cut off by `max_tokens`
+or a dropped stream. `IncrementalJSONParser` consumes streamed deltas and
+can at any point close the JSON at the last complete element, so a cut-off
+page still yields every question that was fully written.
+
+Bump `PAGE_SCHEMA_VERSION` whenever the schema changes; it is stored on
+each parsed page so results can be told apart later.
+"""
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+PAGE_SCHEMA_VERSION = "page-v1"
+
+PAGE_SCHEMA: Dict[str, Any] = {
+    "type": "object",
+    "properties": {
+        "form_title": {"type": "string", "description": "Title of the form or document"},
+        "document_type": {"type": "string", "description": "Kind of document, e.g. application form, letter"},
+        "letterhead": {
+            "type": ["string", "null"],
+            "description": "Institution name from the letterhead, or null if there is none",
+        },
+        "questions": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "question": {"type": "string"},
+                    "answer": {"type": "string"},
+                    "confidence": {"type": "number", "description": "0 to 1"},
+                    "is_handwritten": {"type": "boolean"},
+                },
+                "required": ["question", "answer", "confidence", "is_handwritten"],
+                "additionalProperties": False,
+            },
+        },
+    },
+    "required": ["form_title", "document_type", "letterhead", "questions"],
+    "additionalProperties": False,
+}
+
+
+def response_format() -> Dict[str, Any]:
+    """The `response_format` argument requesting output that matches PAGE_SCHEMA."""
+    return {
+        "type": "json_schema",
+        "json_schema": {
+            "name": f"handwritten_page_{PAGE_SCHEMA_VERSION.replace('-', '_')}",
+            "strict": True,
+            "schema": PAGE_SCHEMA,
+        },
+    }
+
+
+_CLOSERS = {"{": "}", "[": "]"}
+
+
+class IncrementalJSONParser:
+    """
+    Tolerant parser for a JSON object that arrives in pieces.
+
+    Text before the first `{` (e.g. a ```json fence) and after the closing
+    brace is ignored. While scanning, the parser remembers the last point at
+    which the document could be closed off validly - after a complete array
+    element or object member - so `value()` can recover truncated output.
+    """
+
+    def __init__(self):
+        self._buffer: List[str] = []
+        self._length = 0
+        self._started = False
+        self._done = False
+        self._in_string = False
+        self._escape = False
+        # One entry per open container: [opening char, expecting a key]
+        self._stack: List[List[Any]] = []
+        self._safe_end = 0
+        self._safe_closers = ""
+
+    def feed(self, chunk: str) -> None:
+        """Consume the next piece of model output."""
+        if self._done or not chunk:
+            return
+        if not self._started:
+            start = chunk.find("{")
+            if start < 0:
+                return
+            chunk = chunk[start:]
+            self._started = True
+
+        for i, char in enumerate(chunk):
+            position = self._length + i
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                    top = self._stack[-1] if self._stack else None
+                    # A finished string value (not a key) completes a member
+                    if top and (top[0] == "[" or not top[1]):
+                        self._mark_safe(position + 1)
+                continue
+
+            if char == '"':
+                self._in_string = True
+            elif char in "{[":
+                if self._stack and self._stack[-1][0] == "{":
+                    self._stack[-1][1] = False
+                self._stack.append([char, char == "{"])
+                self._mark_safe(position + 1)
+            elif char in "}]":
+                if self._stack:
+                    self._stack.pop()
+                self._mark_safe(position + 1)
+                if not self._stack:
+                    self._buffer.append(chunk[:i + 1])
+                    self._length += i + 1
+                    self._done = True
+                    return
+            elif char == ",":
+                self._mark_safe(position)
+                if self._stack and self._stack[-1][0] == "{":
+                    self._stack[-1][1] = True
+            elif char == ":":
+                if self._stack and self._stack[-1][0] == "{":
+                    self._stack[-1][1] = False
+
+        self._buffer.append(chunk)
+        self._length += len(chunk)
+
+    def _mark_safe(self, end: int) -> None:
+        self._safe_end = end
+        self._safe_closers = "".join(_CLOSERS[entry[0]] for entry in reversed(self._stack))
+
+    @property
+    def text(self) -> str:
+        """The JSON text consumed so far."""
+        return "".join(self._buffer)
+
+    @property
+    def complete(self) -> bool:
+        """Whether the top-level object has been closed."""
+        return self._done
+
+    def value(self) -> Tuple[Optional[Any], bool]:
+        """
+        Parse what has been consumed so far.
+
+        Returns:
+            Tuple of (parsed value or None, whether the JSON was complete)
+        """
+        text = self.text
+        if self._done:
+            try:
+                return json.loads(text), True
+            except json.JSONDecodeError:
+                pass
+        if not self._started or self._safe_end == 0:
+            return None, False
+        try:
+            return json.loads(text[:self._safe_end] + self._safe_closers), False
+        except json.JSONDecodeError:
+            return None, False
+
+
+def parse_json_output(content: str) -> Tuple[Optional[Any], bool]:
+    """
+    Parse model output as JSON, recovering what it can from truncated text.
+
+    Returns:
+        Tuple of (parsed value or None, whether the JSON was complete)
+    """
+    parser = IncrementalJSONParser()
+    parser.feed(content)
+    return parser.value()
@@ -0,0 +1,192 @@
+"""
+Per-page processing state for resumable, idempotent jobs.
+
+Every page of a job gets a PageTask row that moves from pending to
+in_flight to done or failed, committed as it changes. A job that stops -
+a crash, a restart, an API outage on page 7 - is resumed by processing
+only the pages that are not done; pages left in_flight by a dead process
+count as pending again.
+
+The idempotency key hashes (document, page, model, prompt version) and the
+other settings that change a page's output: the job's preprocessing, the
+region prompt and the form templates. A page whose key is already done in
+an earlier job of the same document has its result copied instead of being
+sent to the model again, so reprocessing a document with unchanged settings
+only pays for the pages that never finished.
+"""
+import hashlib
+import json
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Set
+from uuid import UUID
+
+from sqlmodel import Session, select
+
+from ..models import ExtractionResult, PageStatus, PageTask
+
+
+def idempotency_key(
+    document_id: UUID, page_number: int, model: str, prompt_version: str, settings: Optional[Dict[str, Any]] = None
+) -> str:
+    """Stable key for extracting one page of a document with a model, prompt version and settings."""
+    raw = f"{document_id}:{page_number}:{model}:{prompt_version}"
+    if settings:
+        raw += ":" + json.dumps(settings, sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+def plan_pages(
+    session: Session, job_id: UUID, document_id: UUID, total_pages: int, model: str, prompt_version: str,
+    settings: Optional[Dict[str, Any]] = None
+) -> List[int]:
+    """
+    Create or update the job's page tasks and return the pages still to process.
+
+    Error results of unfinished pages and the job's combined result are
+    removed, since they are rebuilt; a page whose stored result is an error
+    counts as unfinished. Pages done in an earlier job with the same
+    idempotency key get that job's result copied. Commits.
+
+    Args:
+        session: Database session
+        job_id: The job ID
+        document_id: The job's document
+        total_pages: Pages in the document
+        model: The models used for pages, e.g. "gpt-4.1-mini>gpt-4.1"
+        prompt_version: Key of the page prompt template
+        settings: Other settings that change page output, e.g. preprocessing
+            and the region prompt and template versions (JSON-serializable)
+
+    Returns:
+        Page numbers that are not done, in order
+    """
+    tasks = {task.page_number: task for task in session.exec(select(PageTask).where(PageTask.job_id == job_id)).all()}
+    results = {result.id: result for result in session.exec(select(ExtractionResult).where(ExtractionResult.job_id == job_id)).all()}
+    unfinished = []
+    for page_number in range(1, total_pages + 1):
+        key = idempotency_key(document_id, page_number, model, prompt_version, settings)
+        task = tasks.get(page_number)
+        if task is None:
+            task = PageTask(job_id=job_id, document_id=document_id, page_number=page_number,
+                            idempotency_key=key, model=model, prompt_version=prompt_version)
+            session.add(task)
+        elif (task.status == PageStatus.DONE and task.idempotency_key == key
+              and not is_error_content(getattr(results.get(task.result_id), "content", None))):
+            continue
+        else:
+            # Unfinished, done with other settings, or done with an error stored as its result
+            task.status = PageStatus.PENDING
+            task.idempotency_key, task.model, task.prompt_version = key, model, prompt_version
+            task.result_id = None
+            task.updated_at = datetime.utcnow()
+        unfinished.append(task)
+
+    keep_results = {task.result_id for task in tasks.values() if task.status == PageStatus.DONE}
+    for result in results.values():
+        if result.id not in keep_results:
+            session.delete(result)
+
+    todo = [task.page_number for task in unfinished if not _reuse_earlier_result(session, task)]
+    session.commit()
+    return todo
+
+
+def is_error_content(content: Optional[Dict[str, Any]]) -> bool:
+    """Whether page content records a failure (API error, unparseable output) rather than a result."""
+    return not content or isinstance(content.get("error"), str)
+
+
+def _reuse_earlier_result(session: Session, task: PageTask) -> bool:
+    """Copy the result of a done task with the same key from another job of the document (never an error result)."""
+    candidates = session.exec(
+        select(PageTask, ExtractionResult)
+        .join(ExtractionResult, ExtractionResult.id == PageTask.result_id)
+        .where(
+            PageTask.idempotency_key == task.idempotency_key,
+            PageTask.status == PageStatus.DONE,
+            PageTask.job_id != task.job_id,
+        )
+        .order_by(PageTask.updated_at.desc())
+    ).all()
+    earlier = next((pair for pair in candidates if not is_error_content(pair[1].content)), None)
+    if earlier is None:
+        return False
+    earlier_task, earlier_result = earlier
+    result = ExtractionResult(
+        job_id=task.job_id,
+        page_number=task.page_number,
+        content=earlier_result.content,
+        processing_time=0.0,
+        confidence_score=earlier_result.confidence_score,
+    )
+    session.add(result)
+    task.status = PageStatus.DONE
+    task.result_id = result.id
+    task.reused_from = earlier_task.job_id
+    task.updated_at = datetime.utcnow()
+    return True
+
+
+def _task(session: Session, job_id: UUID, page_number: int) -> PageTask:
+    return session.exec(
+        select(PageTask).where(PageTask.job_id == job_id, PageTask.page_number == page_number)
+    ).one()
+
+
+def start_page(session: Session, job_id: UUID, page_number: int) -> None:
+    """Mark a page as in flight before it is sent to the model. Commits."""
+    task = _task(session, job_id, page_number)
+    task.status = PageStatus.IN_FLIGHT
+    task.attempts += 1
+    task.error = None
+    task.updated_at = datetime.utcnow()
+    session.commit()
+
+
+def finish_page(
+    session: Session, job_id: UUID, page_number: int, result_id: Optional[UUID], error: Optional[str] = None
+) -> None:
+    """
+    Mark a page as done with its result, or failed with an error (not committed).
+
+    The caller commits together with the page's ExtractionResult, so a page
+    is never done without its result.
+    """
+    task = _task(session, job_id, page_number)
+    task.status = PageStatus.FAILED if error else PageStatus.DONE
+    task.result_id = None if error else result_id
+    task.error = error
+    task.updated_at = datetime.utcnow()
+
+
+def done_pages(session: Session, job_id: UUID) -> Set[int]:
+    """Page numbers of the job that are done."""
+    return set(session.exec(
+        select(PageTask.page_number).where(PageTask.job_id == job_id, PageTask.status == PageStatus.DONE)
+    ).all())
+
+
+def page_states(session: Session, job_id: UUID) -> Dict[str, Any]:
+    """
+    Page counts per state and the state of every page.
+
+    Returns:
+        {"counts": {state: n}, "pages": [{"page", "status", "attempts", "error", "reused_from"}, ...]}
+    """
+    tasks = session.exec(select(PageTask).where(PageTask.job_id == job_id).order_by(PageTask.page_number)).all()
+    counts = {status.value: 0 for status in PageStatus}
+    for task in tasks:
+        counts[task.status.value] += 1
+    return {
+        "counts": counts,
+        "pages": [
+            {
+                "page": task.page_number,
+                "status": task.status.value,
+                "attempts": task.attempts,
+                "error": task.error,
+                "reused_from": str(task.reused_from) if task.reused_from else None,
+            }
+            for task in tasks
+        ],
+    }
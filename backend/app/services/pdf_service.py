@@ -4,25 +4,54 @@ PDF processing service with GPT-4.1 handwriting recognition.
 import asyncio
 import base64
 import io
-import json
 import logging
 import os
 import time
 from datetime import datetime
 from pathlib import Path
-from typing import Dict, List, Optional, Union, Any
+from typing import Any, AsyncIterator, BinaryIO, Dict, Iterable, List, Optional, Set, Tuple, Union
 from uuid import UUID
 import traceback
 import difflib
+from contextlib import ExitStack, aclosing
+from dataclasses import dataclass
 
 import httpx
 from fastapi import UploadFile, HTTPException
 from fastapi.responses import FileResponse
-from pdf2image import convert_from_bytes, convert_from_path
 from sqlmodel import Session, select
-from sqlalchemy import text
+from sqlmodel.ext.asyncio.session import AsyncSession
 
-from ..database import engine
+from ..database import async_engine, engine
+from .events import JOB_COMPLETED, JOB_FAILED, JOB_STARTED, PAGE_COMPLETED, event_bus
+from .cascade import CascadePolicy, CascadeStats
+from .form_templates import (
+    TemplateMatch,
+    build_region_messages,
+    crop_fields,
+    get_template_registry,
+    parse_region_content,
+    region_response_format,
+)
+from .page_filter import PageFilter, skipped_page_content
+from .page_tasks import done_pages, finish_page, plan_pages, start_page
+from .page_schema import PAGE_SCHEMA_VERSION, IncrementalJSONParser, parse_json_output, response_format
+from .metrics import (
+    ACTIVE_JOBS,
+    API_SECONDS,
+    ENCODE_SECONDS,
+    PAGES_IN_FLIGHT,
+    PAGES_QUEUED,
+    PARSE_FAILURES,
+    RENDER_SECONDS,
+    RETRIES,
+    count_http_response,
+)
+from .preprocessing import PreprocessOptions, preprocess_page
+from .prompts import PAGE_PROMPT, REGION_PROMPT
+from .results_cache import MaterializedResults, results_cache
+from .tracing import current_span, current_traceparent, span, traced
+from .usage import record_model_calls
 from ..models import (
     Document, 
     ExtractionJob, 
@@ -35,11 +64,29 @@ logger = logging.getLogger(__name__)
 
 # Environment variables and configuration
 OPENAI_API_KEY = os.environ.get("OPENAI_API_KEY", "")
-OPENAI_API_URL = "https://api.openai.com/v1/chat/completions"
+# Any OpenAI-compatible endpoint, e.g. the mock server in benchmarks/mock_openai.py
+OPENAI_BASE_URL = os.environ.get("OPENAI_BASE_URL", "https://api.openai.com/v1").rstrip("/")
+OPENAI_API_URL = f"{OPENAI_BASE_URL}/chat/completions"
 MODEL = os.environ.get("OPENAI_MODEL", "gpt-4.1-2025-04-14")  # Using the new GPT-4.1 model that supports vision
+RENDER_DPI = int(os.environ.get("PDF_RENDER_DPI", "300"))  # higher DPI for better text recognition
+PAGE_WINDOW = int(os.environ.get("PDF_PAGE_WINDOW", "8"))  # pages rendered and held in memory at a time
+# Restart unfinished jobs at startup; only with a single worker process
+RESUME_INTERRUPTED_JOBS = os.environ.get("RESUME_INTERRUPTED_JOBS", "false").lower() in ("true", "1", "t")
+PAGE_MAX_TOKENS = 4000
+CONTINUATION_MAX_TOKENS = 1500
+EXTRA_BODY_FIELDS = ("prompt_cache_key",)  # request fields not known to every supported SDK version
+MAX_CONTINUATIONS = 2
 UPLOAD_DIR = Path("uploads")
 UPLOAD_DIR.mkdir(exist_ok=True)
 
+# Jobs with a processing task in this process, so resuming can't start a second one
+_running_jobs: Set[UUID] = set()
+
+
+def is_job_running(job_id: UUID) -> bool:
+    """Whether this process is working on the job."""
+    return job_id in _running_jobs
+
 def fuzzy_uuid_match(target_uuid: str, available_uuids: List[str], threshold: float = 0.9) -> Optional[str]:
     """
     Find the best matching UUID from a list of available UUIDs using fuzzy matching.
@@ -256,38 +303,32 @@ class PDFProcessingService:
         try:
             try:
                 document_uuid = UUID(str(document_id))
-                logger.info(f"get_document_by_id: Looking up document with UUID {document_uuid}")
+                logger.debug(f"get_document_by_id: Looking up document with UUID {document_uuid}")
                 
-                with Session(engine) as session:
-                    # Force refresh of the database connection to ensure latest data
-                    session.execute(text("SELECT 1"))
-                    
-                    document = session.exec(
+                # A fresh session always reads committed data, no refresh needed
+                async with AsyncSession(async_engine) as session:
+                    document = (await session.exec(
                         select(Document).where(Document.id == document_uuid)
-                    ).one_or_none()
+                    )).one_or_none()
                     
                     if document:
-                        logger.info(f"get_document_by_id: Found document with status={document.status.value}")
+                        logger.debug(f"get_document_by_id: Found document with status={document.status.value}")
                         
                         # Get latest job
-                        latest_job = session.exec(
+                        latest_job = (await session.exec(
                             select(ExtractionJob)
                             .where(ExtractionJob.document_id == document_uuid)
                             .order_by(ExtractionJob.started_at.desc())
-                        ).first()
+                        )).first()
                         
                         if latest_job:
-                            session.refresh(latest_job)
-                            logger.info(f"get_document_by_id: Found latest job with id={latest_job.id}, status={latest_job.status.value}, pages_processed={latest_job.pages_processed}")
+                            logger.debug(f"get_document_by_id: Found latest job with id={latest_job.id}, status={latest_job.status.value}, pages_processed={latest_job.pages_processed}")
                         else:
-                            logger.info(f"get_document_by_id: No jobs found for document {document_uuid}")
+                            logger.debug(f"get_document_by_id: No jobs found for document {document_uuid}")
 
                         # Always return latest_job data if document is in one of these statuses, even if no job was found
                         include_job_data = latest_job is not None or document.status.value in ["processing", "completed", "failed"]
                         
-                        # Log the inclusion decision
-                        logger.info(f"get_document_by_id: Will include job data: {include_job_data}")
-                        
                         result = {
                             "id": str(document.id),
                             "filename": document.filename,
@@ -318,7 +359,7 @@ class PDFProcessingService:
                                 }
                         
                         # Log the final result for debugging
-                        logger.info(f"get_document_by_id: Returning document status={result['status']}, latest_job={result.get('latest_job', {}).get('id') if 'latest_job' in result else None}")
+                        logger.debug(f"get_document_by_id: Returning document status={result['status']}, latest_job={result.get('latest_job', {}).get('id') if 'latest_job' in result else None}")
                         
                         return result
                     else:
@@ -338,6 +379,44 @@ class PDFProcessingService:
             logger.error(traceback.format_exc())
             raise HTTPException(status_code=500, detail=f"Error getting document metadata: {str(e)}")
     
+    async def get_materialized_job_results(self, job_id: str) -> Optional[MaterializedResults]:
+        """
+        Get the pre-serialized results of a completed job.
+        
+        The response is built by `get_job_results` on first read and cached;
+        jobs that are not completed yet return None since their results can
+        still change.
+        
+        Args:
+            job_id: The job ID
+            
+        Returns:
+            Materialized results, or None if the job isn't cacheable
+        """
+        try:
+            job_uuid = UUID(job_id)
+        except ValueError:
+            return None
+        
+        cached = results_cache.get(job_uuid)
+        if cached:
+            return cached
+        
+        async with AsyncSession(async_engine) as session:
+            job = await session.get(ExtractionJob, job_uuid)
+            if not job or job.status != ProcessingStatus.COMPLETED:
+                return None
+            document_id = job.document_id
+        
+        results = await self.get_job_results(str(job_uuid))
+        if any(str(r.get("id", "")).startswith("error-") for r in results):
+            return None
+        
+        materialized = MaterializedResults.build(job_uuid, document_id, results)
+        results_cache.put(materialized)
+        logger.debug(f"Materialized results for job {job_uuid}: {materialized.raw_size} bytes JSON, {len(materialized.body)} gzipped")
+        return materialized
+
     async def get_job_results(self, job_id: str) -> List[Dict[str, Any]]:
         """
         Get results for a job.
@@ -356,13 +435,13 @@ class PDFProcessingService:
                 
                 try:
                     document_uuid = UUID(document_id)
-                    with Session(engine) as session:
+                    async with AsyncSession(async_engine) as session:
                         # Find the latest real job for this document
-                        real_job = session.exec(
+                        real_job = (await session.exec(
                             select(ExtractionJob)
                             .where(ExtractionJob.document_id == document_uuid)
                             .order_by(ExtractionJob.started_at.desc())
-                        ).first()
+                        )).first()
                         
                         if real_job:
                             logger.info(f"Found real job {real_job.id} for virtual job {job_id}")
@@ -448,16 +527,16 @@ class PDFProcessingService:
                 }]
             
             # Query for results with the valid UUID
-            with Session(engine) as session:
+            async with AsyncSession(async_engine) as session:
                 # Log what we're looking for
                 logger.info(f"Looking for results for job {job_uuid}")
                 
                 # Find all results for the job, ordered by page number
-                results = session.exec(
+                results = list((await session.exec(
                     select(ExtractionResult).where(
                         ExtractionResult.job_id == job_uuid
                     ).order_by(ExtractionResult.page_number)
-                ).all()
+                )).all())
                 
                 logger.info(f"Found {len(results)} results for job {job_uuid}")
                 
@@ -484,7 +563,7 @@ class PDFProcessingService:
                                     all_questions.extend(questions)
                         
                         # Get form title and metadata from the first page
-                        first_page = next((r for r in results if r.page_number == 1), None)
+                        first_page = next((r for r in results if r.page_number >= 1 and not (r.content or {}).get("skipped")), None)
                         form_title = first_page.content.get("form_title", "Extracted Document") if first_page else "Extracted Document"
                         document_type = first_page.content.get("document_type", "form") if first_page else "form"
                         explanation_text = first_page.content.get("explanation_text", "") if first_page else ""
@@ -532,7 +611,7 @@ class PDFProcessingService:
                     ]
                 
                 # If no results found but job exists, check job status
-                job = session.get(ExtractionJob, job_uuid)
+                job = await session.get(ExtractionJob, job_uuid)
                 if job:
                     logger.info(f"No results but job found with status {job.status.value}")
                     
@@ -644,6 +723,7 @@ class PDFProcessingService:
                 "confidence_score": 0
             }]
 
+    @traced("document.save")
     async def save_uploaded_file(self, file: UploadFile) -> Dict[str, Any]:
         """
         Save an uploaded PDF file and create a Document record.
@@ -663,7 +743,8 @@ class PDFProcessingService:
             filename=file.filename,
             file_size=file_size,
             mime_type=file.content_type or "application/pdf",
-            status=ProcessingStatus.PENDING
+            status=ProcessingStatus.PENDING,
+            trace_context=current_traceparent()
         )
         
         # Save to database - use a regular session since get_session is not async
@@ -709,15 +790,21 @@ class PDFProcessingService:
         except Exception as e:
             logger.error(f"Error getting page count: {str(e)}")
         
+        current_span().set_attributes({
+            "document.id": str(doc_dict["id"]), "document.size": file_size, "document.pages": doc_dict["total_pages"]
+        })
         return doc_dict
 
-    async def process_document(self, document_id: Union[str, UUID], session: Session) -> ExtractionJob:
+    async def process_document(
+        self, document_id: Union[str, UUID], session: Session, preprocess: Optional[PreprocessOptions] = None
+    ) -> ExtractionJob:
         """
         Process a document for handwriting extraction.
         
         Args:
             document_id: The document ID
             session: Database session
+            preprocess: Page preprocessing for this job (defaults to PAGE_PREPROCESS)
             
         Returns:
             Job information
@@ -791,31 +878,37 @@ class PDFProcessingService:
             session.commit()
             return error_job
         
-        # Update document status to 'processing' early
-        document.status = ProcessingStatus.PROCESSING
-        session.add(document) # Ensure change is staged
-
-        # Create extraction job
-        job = ExtractionJob(
-            document_id=document_id,
-            started_at=datetime.utcnow(),
-            model_name=MODEL,
-            total_pages=document.total_pages or 0,
-            status=ProcessingStatus.PENDING # Job starts as pending, task will update it
-        )
-        session.add(job)
-        session.commit() # Commit document status update and new job
-        session.refresh(job)
-        session.refresh(document) # Refresh document to reflect its new status
+        # The job joins the trace started when the document was uploaded
+        with span("job.create", {"document.id": str(document.id), "job.total_pages": document.total_pages},
+                  parent=document.trace_context) as job_span:
+            # Update document status to 'processing' early
+            document.status = ProcessingStatus.PROCESSING
+            session.add(document) # Ensure change is staged
+
+            # Create extraction job
+            job = ExtractionJob(
+                document_id=document_id,
+                started_at=datetime.utcnow(),
+                model_name=MODEL,
+                total_pages=document.total_pages or 0,
+                status=ProcessingStatus.PENDING, # Job starts as pending, task will update it
+                preprocessing=(preprocess or PreprocessOptions.from_env()).to_dict(),
+                trace_context=job_span.traceparent
+            )
+            session.add(job)
+            session.commit() # Commit document status update and new job
+            session.refresh(job)
+            session.refresh(document) # Refresh document to reflect its new status
+            job_span.set_attribute("job.id", str(job.id))
         
-        # Derive file path from document ID
-        pdf_path = os.path.join(UPLOAD_DIR, str(document.id))
+            # Derive file path from document ID
+            pdf_path = os.path.join(UPLOAD_DIR, str(document.id))
             
-        # Get the full path
-        full_path = os.path.join(os.getcwd(), pdf_path)
+            # Get the full path
+            full_path = os.path.join(os.getcwd(), pdf_path)
         
-        # Start the background task
-        asyncio.create_task(self._process_document_task(full_path, job.id, api_key))
+            # Start the background task
+            asyncio.create_task(self._process_document_task(full_path, job.id, api_key))
         
         return job
 
@@ -829,6 +922,12 @@ class PDFProcessingService:
             api_key: OpenAI API key
         """
         logger.info(f"Starting background processing task for job {job_id}")
+        _running_jobs.add(job_id)
+        ACTIVE_JOBS.inc()
+        pages_queued = 0
+        # Runs as a task created inside the job.create span, so it stays in the document's trace
+        trace = ExitStack()
+        job_span = trace.enter_context(span("job.process", {"job.id": str(job_id)}))
         
         try:
             with Session(engine) as session:
@@ -851,6 +950,7 @@ class PDFProcessingService:
                     job.status = "failed"
                     job.error_message = f"Document {job.document_id} not found"
                     session.commit()
+                    event_bus.publish(job_id, JOB_FAILED, status="failed", error=job.error_message)
                     return
                 
                 # Update document and job status
@@ -865,104 +965,194 @@ class PDFProcessingService:
                     job.error_message = f"PDF file not found at {pdf_path}"
                     document.status = "failed"
                     session.commit()
+                    event_bus.publish(job_id, JOB_FAILED, document_id=str(document.id), status="failed", error=job.error_message)
                     return
                 
-                # Convert PDF to images
-                logger.info(f"Converting PDF at {pdf_path} to images")
-                images = await convert_pdf_to_images(pdf_path, max_pages=job.total_pages or 10)
+                # Pages done before a crash, restart or failed run are kept; only the rest are rendered
+                job_span.set_attribute("document.id", str(document.id))
+                total_pages = job.total_pages or document.total_pages or await asyncio.to_thread(pdf_page_count, pdf_path)
+                cascade_policy = CascadePolicy.from_env(MODEL)
+                preprocess = PreprocessOptions.from_dict(job.preprocessing)
+                # Results are only reused across jobs when everything that shapes them matches
+                page_settings = {
+                    "preprocessing": preprocess.to_dict(),
+                    "region_prompt": REGION_PROMPT.key,
+                    "templates": await asyncio.to_thread(lambda: get_template_registry().version),
+                }
+                todo_pages = plan_pages(
+                    session, job.id, document.id, total_pages, ">".join(cascade_policy.models), PAGE_PROMPT.key,
+                    page_settings
+                )
+                pages_done = total_pages - len(todo_pages)
+                if pages_done:
+                    logger.info(f"Job {job_id} has {pages_done}/{total_pages} pages done already")
+                pages_queued = len(todo_pages)
+                PAGES_QUEUED.inc(pages_queued)
                 
                 # Update total pages if needed
-                if not job.total_pages or job.total_pages != len(images):
-                    job.total_pages = len(images)
-                    document.total_pages = len(images)
+                if job.total_pages != total_pages or document.total_pages != total_pages:
+                    job.total_pages = total_pages
+                    document.total_pages = total_pages
                     session.commit()
-                    logger.info(f"Updated document to {len(images)} total pages")
+                    logger.info(f"Updated document to {total_pages} total pages")
+                
+                event_bus.publish(
+                    job_id, JOB_STARTED,
+                    document_id=str(document.id), status="processing",
+                    pages_processed=pages_done, total_pages=total_pages
+                )
                 
-                # Process each page
-                all_results = []
-                form_title = None
-                explanation_text = None
-                all_questions = []
+                # Process each page, rendering PAGE_WINDOW pages at a time
+                cascade_stats = CascadeStats()
+                page_filter = PageFilter()
                 
-                for i, img in enumerate(images):
-                    page_num = i + 1
-                    logger.info(f"Processing page {page_num} of {len(images)}")
+                async with aclosing(iter_pdf_pages(pdf_path, todo_pages)) as rendered_pages:
+                    async for rendered in rendered_pages:
+                        page_num, img = rendered.number, rendered.image
+                        logger.info(f"Processing page {page_num} of {total_pages}")
+                        pages_queued -= 1
+                        PAGES_QUEUED.dec()
                     
-                    # Process the image
-                    start_time = time.time()
-                    result = await process_image(img, page_num, api_key)
-                    processing_time = time.time() - start_time
+                        # Blank and repeated pages don't need the model
+                        start_time = time.time()
+                        skip = await asyncio.to_thread(page_filter.check, img, page_num)
+                        if skip:
+                            logger.info(f"Skipping page {page_num}: {skip}")
+                            skipped_result = ExtractionResult(
+                                job_id=job.id,
+                                page_number=page_num,
+                                content=skipped_page_content(page_num, skip),
+                                processing_time=time.time() - start_time,
+                                confidence_score=None
+                            )
+                            session.add(skipped_result)
+                            finish_page(session, job.id, page_num, skipped_result.id)
+                            pages_done += 1
+                            job.pages_processed = pages_done
+                            session.commit()
+                            event_bus.publish(
+                                job_id, PAGE_COMPLETED,
+                                document_id=str(document.id), status="processing", page_number=page_num,
+                                pages_processed=pages_done, total_pages=total_pages, skipped=skip["reason"]
+                            )
+                            continue
                     
-                    if result:
-                        # Extract form title from the first page if available
-                        if page_num == 1 and "form_title" in result:
-                            form_title = result.get("form_title")
-                        
-                        # Extract explanation text from the first page if available    
-                        if page_num == 1 and "explanation_text" in result:
-                            explanation_text = result.get("explanation_text")
-                            
-                        # Add page number to each question if not already present
-                        if "questions" in result:
-                            for question in result["questions"]:
+                        # Process the image
+                        cascade_stats.begin_page(
+                            queue_ms=(time.perf_counter() - rendered.rendered_at) * 1000, render_ms=rendered.render_ms
+                        )
+                        start_page(session, job.id, page_num)
+                        error = None
+                        with PAGES_IN_FLIGHT.track():
+                            try:
+                                result = await process_image(img, page_num, api_key, cascade_policy, cascade_stats, preprocess)
+                            except Exception as e:
+                                # One page failing doesn't stop the others; resuming the job retries it
+                                logger.error(f"Page {page_num} of job {job_id} failed: {str(e)}")
+                                job_span.record_exception(e)
+                                result, error = None, str(e)
+                        processing_time = time.time() - start_time
+                        record_model_calls(session, cascade_stats.take_calls(), job.id, document.id, document.user_id)
+                        # API and parsing failures come back as error content; the page stays retryable
+                        if result and isinstance(result.get("error"), str):
+                            error = result["error"]
+                    
+                        if result and not error:
+                            # Add page number to each question if not already present
+                            for question in result.get("questions") or []:
                                 if "page" not in question:
                                     question["page"] = page_num
-                            all_questions.extend(result["questions"])
                         
-                        # Create extraction result record
-                        extraction_result = ExtractionResult(
-                            job_id=job.id,
-                            page_number=page_num,
-                            content=result,
-                            processing_time=processing_time,
-                            # Use overall confidence score or calculate from questions
-                            confidence_score=result.get("overall_confidence", 
-                                # If no overall score, calculate from questions
-                                sum(q.get("confidence", 0.0) for q in result.get("questions", []))
-                                / max(1, len(result.get("questions", []))) 
-                                if result.get("questions") else 0.0
-                            ) if not isinstance(result.get("error"), str) else 0.0
-                        )
-                        session.add(extraction_result)
-                        all_results.append(extraction_result)
+                            # Create extraction result record
+                            extraction_result = ExtractionResult(
+                                job_id=job.id,
+                                page_number=page_num,
+                                content=result,
+                                processing_time=processing_time,
+                                # Use overall confidence score or calculate from questions
+                                confidence_score=page_confidence(result)
+                            )
+                            session.add(extraction_result)
+                            finish_page(session, job.id, page_num, extraction_result.id)
                         
-                        # Update job progress
-                        job.pages_processed = page_num
-                        session.commit()
-                        session.refresh(job)
-                        logger.info(f"Processed page {page_num}/{len(images)} - {processing_time:.2f}s")
-                    else:
-                        logger.error(f"Failed to process page {page_num}")
-                        extraction_result = ExtractionResult(
-                            job_id=job.id,
-                            page_number=page_num,
-                            content={
-                                "error": "Processing failed for this page",
-                                "form_title": "Processing Error",
-                                "document_type": "error",
-                                "questions": [
-                                    {
-                                        "question": "Error Details",
-                                        "answer": "The page processing failed with no results returned",
-                                        "page": page_num,
-                                        "confidence": 0.0,
-                                        "is_handwritten": False
-                                    }
-                                ],
-                                "overall_confidence": 0.0
-                            },
-                            processing_time=processing_time,
-                            confidence_score=0.0
-                        )
-                        session.add(extraction_result)
+                            # Update job progress; the committed page is the checkpoint a resume starts after
+                            pages_done += 1
+                            job.pages_processed = pages_done
+                            with span("page.persist", {"page.number": page_num}):
+                                session.commit()
+                            session.refresh(job)
+                            logger.info(f"Processed page {page_num}/{total_pages} - {processing_time:.2f}s")
+                            event_bus.publish(
+                                job_id, PAGE_COMPLETED,
+                                document_id=str(document.id), status="processing", page_number=page_num,
+                                pages_processed=pages_done, total_pages=total_pages,
+                                processing_time=processing_time
+                            )
+                        else:
+                            logger.error(f"Failed to process page {page_num}")
+                            error = error or "The page processing failed with no results returned"
+                            extraction_result = ExtractionResult(
+                                job_id=job.id,
+                                page_number=page_num,
+                                content=result or {
+                                    "error": "Processing failed for this page",
+                                    "form_title": "Processing Error",
+                                    "document_type": "error",
+                                    "questions": [
+                                        {
+                                            "question": "Error Details",
+                                            "answer": error,
+                                            "page": page_num,
+                                            "confidence": 0.0,
+                                            "is_handwritten": False
+                                        }
+                                    ],
+                                    "overall_confidence": 0.0
+                                },
+                                processing_time=processing_time,
+                                confidence_score=0.0
+                            )
+                            session.add(extraction_result)
+                            finish_page(session, job.id, page_num, None, error=error)
+                            session.commit()
+                
+                # Failed pages keep their state; resuming the job processes only them
+                failed_pages = sorted(set(range(1, total_pages + 1)) - done_pages(session, job.id))
+                if failed_pages:
+                    job.status = "failed"
+                    job.error_message = (
+                        f"{len(failed_pages)} of {total_pages} pages failed "
+                        f"({', '.join(map(str, failed_pages[:20]))}{', ...' if len(failed_pages) > 20 else ''}); "
+                        "resume the job to retry them"
+                    )
+                    job.pages_processed = pages_done
+                    job.stage_stats = cascade_stats.to_dict(job.stage_stats)
+                    job.cost_usd = (job.cost_usd or 0.0) + cascade_stats.total_cost
+                    document.status = "failed"
+                    session.commit()
+                    event_bus.publish(job_id, JOB_FAILED, document_id=str(document.id), status="failed", error=job.error_message)
+                    return
+                
+                # Combine the stored page results, including those from before a resume
+                page_results = session.exec(
+                    select(ExtractionResult)
+                    .where(ExtractionResult.job_id == job.id, ExtractionResult.page_number >= 1)
+                    .order_by(ExtractionResult.page_number)
+                ).all()
+                all_results = [r for r in page_results if r.content and not r.content.get("skipped") and "error" not in r.content]
+                skipped_pages = [{"page": r.page_number, **r.content["skip"]} for r in page_results if r.content and r.content.get("skipped")]
+                form_title = next((r.content["form_title"] for r in all_results if "form_title" in r.content), None)
+                explanation_text = next((r.content["explanation_text"] for r in all_results if "explanation_text" in r.content), None)
+                all_questions = [q for r in all_results for q in r.content.get("questions") or []]
                 
-                # If no successful results were obtained
-                if not all_results:
+                # If no successful results were obtained (pages that were all blank are fine)
+                if not all_results and not skipped_pages:
                     logger.error(f"No pages were processed successfully for job {job_id}")
                     job.status = "failed"
                     job.error_message = "No pages were processed successfully"
                     document.status = "failed"
                     session.commit()
+                    event_bus.publish(job_id, JOB_FAILED, document_id=str(document.id), status="failed", error=job.error_message)
                     return
                 
                 # Create a combined content structure with results from all pages
@@ -973,6 +1163,8 @@ class PDFProcessingService:
                     "overall_confidence": 0.0 if not all_results else 
                         sum(r.confidence_score for r in all_results) / len(all_results)
                 }
+                if skipped_pages:
+                    combined_content["skipped_pages"] = skipped_pages
                 
                 # If the first page has structured data but it's not in the expected format
                 if all_results and not combined_content["questions"]:
@@ -1065,7 +1257,9 @@ class PDFProcessingService:
                 # Update job status
                 job.status = "completed"
                 job.completed_at = datetime.utcnow()
-                job.pages_processed = len(images)
+                job.pages_processed = pages_done
+                job.stage_stats = cascade_stats.to_dict(job.stage_stats)
+                job.cost_usd = (job.cost_usd or 0.0) + cascade_stats.total_cost  # earlier runs of a resumed job included
                 
                 # Update document status
                 document.status = "completed"
@@ -1076,9 +1270,15 @@ class PDFProcessingService:
 
                 session.refresh(document)
                 logger.info(f"Document {document.id} status set to completed.")
+                event_bus.publish(
+                    job_id, JOB_COMPLETED,
+                    document_id=str(document.id), status="completed",
+                    pages_processed=job.pages_processed, total_pages=job.total_pages
+                )
                 
         except Exception as e:
             logger.error(f"Error in background processing task: {str(e)}")
+            job_span.record_exception(e)
             # Update job status
             try:
                 with Session(engine) as session:
@@ -1099,6 +1299,7 @@ class PDFProcessingService:
                             document.status = "failed"
                         
                         session.commit()
+                        event_bus.publish(job_id, JOB_FAILED, document_id=str(job.document_id), status="failed", error=str(e))
                         
                         # Add error result
                         error_result = ExtractionResult(
@@ -1126,6 +1327,64 @@ class PDFProcessingService:
                         session.commit()
             except Exception as inner_error:
                 logger.error(f"Failed to update job status after error: {str(inner_error)}")
+        finally:
+            PAGES_QUEUED.dec(pages_queued)
+            ACTIVE_JOBS.dec()
+            _running_jobs.discard(job_id)
+            trace.close()
+
+    async def resume_job(self, job_id: UUID) -> bool:
+        """
+        Restart an unfinished job; only pages that are not done are processed.
+        
+        Args:
+            job_id: The job ID
+            
+        Returns:
+            Whether the job was restarted (False for unknown, completed or running jobs)
+        """
+        if is_job_running(job_id):
+            return False
+        with Session(engine) as session:
+            job = session.get(ExtractionJob, job_id)
+            if not job or job.status == ProcessingStatus.COMPLETED:
+                return False
+            job.status = ProcessingStatus.PENDING
+            job.error_message = None
+            job.completed_at = None
+            session.commit()
+            pdf_path = os.path.join(os.getcwd(), UPLOAD_DIR, str(job.document_id))
+            trace_context = job.trace_context
+        
+        # Subscribers arriving before the job publishes its start must not see the last run's end
+        event_bus.clear_history(job_id)
+        _running_jobs.add(job_id)
+        with span("job.resume", {"job.id": str(job_id)}, parent=trace_context):
+            asyncio.create_task(self._process_document_task(pdf_path, job_id, self.api_key))
+        return True
+
+    async def resume_interrupted_jobs(self) -> List[UUID]:
+        """
+        Resume the jobs a crash or restart left pending or processing.
+        
+        Only safe with a single worker process, otherwise every worker picks
+        up the same jobs; see RESUME_INTERRUPTED_JOBS.
+        
+        Returns:
+            IDs of the resumed jobs
+        """
+        with Session(engine) as session:
+            job_ids = session.exec(
+                select(ExtractionJob.id).where(
+                    ExtractionJob.status.in_([ProcessingStatus.PENDING, ProcessingStatus.PROCESSING]),
+                    ExtractionJob.batch_id == None  # noqa: E711 - batch jobs finish through the Batch API
+                )
+            ).all()
+        
+        resumed = [job_id for job_id in job_ids if await self.resume_job(job_id)]
+        if resumed:
+            logger.info(f"Resumed {len(resumed)} interrupted jobs: {', '.join(map(str, resumed))}")
+        return resumed
 
     async def _validate_api_key(self, api_key: str) -> bool:
         """
@@ -1147,7 +1406,7 @@ class PDFProcessingService:
                 headers = {
                     "Authorization": f"Bearer {api_key}"
                 }
-                response = await client.get("https://api.openai.com/v1/models", headers=headers)
+                response = await client.get(f"{OPENAI_BASE_URL}/models", headers=headers)
                 
                 if response.status_code == 200:
                     logger.info("API key validated successfully")
@@ -1160,46 +1419,137 @@ class PDFProcessingService:
             return False
 
 
-async def convert_pdf_to_images(pdf_path: Union[str, Path], max_pages: int = 10) -> List:
+def _render_pages(pdf_path: Union[str, Path], first_page: int, last_page: Optional[int], dpi: int) -> List:
+    """Render a page range with pdf2image; blocks while poppler runs."""
+    from pdf2image import convert_from_bytes, convert_from_path
+    
+    with RENDER_SECONDS.time():
+        try:
+            # First try the standard method
+            try:
+                images = convert_from_path(
+                    pdf_path,
+                    dpi=dpi,
+                    first_page=first_page,
+                    last_page=last_page
+                )
+                if images:
+                    return images
+            except Exception as e:
+                logger.warning(f"Standard PDF conversion failed: {e}, trying alternative method")
+        
+            # If standard method fails, try with file bytes
+            with open(pdf_path, "rb") as f:
+                pdf_bytes = f.read()
+            
+            images = convert_from_bytes(
+                pdf_bytes,
+                dpi=dpi,
+                first_page=first_page,
+                last_page=last_page
+            )
+            return images
+        except Exception as e:
+            logger.error(f"All PDF conversion methods failed: {e}")
+            raise
+
+
+async def convert_pdf_to_images(
+    pdf_path: Union[str, Path], max_pages: Optional[int] = None, dpi: int = RENDER_DPI, first_page: int = 1
+) -> List:
     """
     Convert a PDF file to a list of images.
     
+    Rendering runs in a worker thread, so the event loop keeps serving
+    requests meanwhile. Every image is held in memory; use
+    `iter_pdf_pages` for long documents.
+    
     Args:
         pdf_path: Path to the PDF file
-        max_pages: Maximum number of pages to process
+        max_pages: Last page to render (default: the last page of the document)
+        dpi: Rendering resolution (defaults to PDF_RENDER_DPI)
+        first_page: First page to render
         
     Returns:
         List of PIL images
     """
-    logger.info(f"Converting PDF to images: {pdf_path}")
+    logger.info(f"Converting PDF to images: {pdf_path} (pages {first_page}-{max_pages or 'end'})")
+    return await asyncio.to_thread(_render_pages, pdf_path, first_page, max_pages, dpi)
+
+
+def pdf_page_count(pdf: Union[str, Path, BinaryIO]) -> int:
+    """Number of pages in a PDF file or file object, read from its page tree without rendering."""
+    from PyPDF2 import PdfReader
+    
+    if isinstance(pdf, (str, Path)):
+        with open(pdf, "rb") as f:
+            return len(PdfReader(f).pages)
+    return len(PdfReader(pdf).pages)
+
+
+def page_windows(pages: Iterable[int], window: int = PAGE_WINDOW) -> List[Tuple[int, int]]:
+    """
+    Split page numbers into contiguous (first, last) ranges of at most `window` pages.
+    
+    Gaps - pages a resumed job already has - start a new range, so they
+    are never rendered.
+    """
+    windows: List[Tuple[int, int]] = []
+    for page in sorted(set(pages)):
+        if windows and page == windows[-1][1] + 1 and page - windows[-1][0] < window:
+            windows[-1] = (windows[-1][0], page)
+        else:
+            windows.append((page, page))
+    return windows
+
+
+@dataclass
+class RenderedPage:
+    """One page image from `iter_pdf_pages`."""
+    number: int
+    image: Any
+    rendered_at: float  # perf_counter() when its window finished rendering
+    render_ms: float  # the window's render time, per page
+
+
+async def iter_pdf_pages(
+    pdf_path: Union[str, Path], pages: Iterable[int], window: int = PAGE_WINDOW, dpi: int = RENDER_DPI
+) -> AsyncIterator[RenderedPage]:
+    """
+    Render and yield the given pages a window at a time.
+    
+    The next window is rendered in a worker thread while the caller works
+    on the current one, so at most two windows of images are in memory no
+    matter how long the document is.
+    
+    Args:
+        pdf_path: Path to the PDF file
+        pages: Page numbers to render (1-based)
+        window: Pages rendered per pdf2image call (defaults to PDF_PAGE_WINDOW)
+        dpi: Rendering resolution (defaults to PDF_RENDER_DPI)
+    """
+    async def render(first: int, last: int) -> Tuple[List, float, float]:
+        started = time.perf_counter()
+        with span("pdf.render", {"page.first": first, "page.last": last}) as render_span:
+            images = await convert_pdf_to_images(pdf_path, max_pages=last, dpi=dpi, first_page=first)
+            render_span.set_attribute("document.pages", len(images))
+        rendered_at = time.perf_counter()
+        return images, rendered_at, (rendered_at - started) * 1000 / max(1, len(images))
+    
+    windows = page_windows(pages, window)
+    if not windows:
+        return
+    pending = asyncio.create_task(render(*windows[0]))
     try:
-        # First try the standard method
-        try:
-            images = convert_from_path(
-                pdf_path,
-                dpi=300,  # Higher DPI for better text recognition
-                first_page=1,
-                last_page=max_pages
-            )
-            if images:
-                return images
-        except Exception as e:
-            logger.warning(f"Standard PDF conversion failed: {e}, trying alternative method")
-        
-        # If standard method fails, try with file bytes
-        with open(pdf_path, "rb") as f:
-            pdf_bytes = f.read()
-            
-        images = convert_from_bytes(
-            pdf_bytes,
-            dpi=300,
-            first_page=1,
-            last_page=max_pages
-        )
-        return images
-    except Exception as e:
-        logger.error(f"All PDF conversion methods failed: {e}")
-        raise
+        for i, (first, _) in enumerate(windows):
+            images, rendered_at, render_ms = await pending
+            pending = asyncio.create_task(render(*windows[i + 1])) if i + 1 < len(windows) else None
+            for offset, image in enumerate(images):
+                yield RenderedPage(first + offset, image, rendered_at, render_ms)
+            del images
+    finally:
+        if pending is not None:
+            pending.cancel()
 
 
 def encode_image_to_base64(pil_image) -> str:
@@ -1217,14 +1567,345 @@ def encode_image_to_base64(pil_image) -> str:
     return base64.b64encode(buffer.getvalue()).decode("utf-8")
 
 
-async def process_image(image, page_num: int, api_key: str) -> Dict:
+def build_page_messages(base64_image: str, page_num: int) -> List[Dict[str, Any]]:
+    """
+    Build the chat-completions messages for a single rasterized page.
+
+    Args:
+        base64_image: PNG image encoded as base64
+        page_num: Page number
+
+    Returns:
+        List of chat messages (see services/prompts.py for the layout)
+    """
+    return PAGE_PROMPT.messages([(None, base64_image)], page_num=page_num)
+
+
+def build_page_request(
+    messages: List[Dict[str, Any]], model: str = MODEL, output_format: Optional[Dict[str, Any]] = None,
+    prompt_key: str = PAGE_PROMPT.key
+) -> Dict[str, Any]:
+    """
+    Build the chat-completions request body for a page.
+
+    Shared by the interactive path and the Batch API path so both send
+    identical requests. Output is constrained to the versioned page schema
+    unless another `output_format` is given. `prompt_key` names the prompt
+    template and routes requests sharing it to the same prompt cache.
+    """
+    return {
+        "model": model,
+        "messages": messages,
+        "max_tokens": PAGE_MAX_TOKENS,
+        "temperature": 0.1,  # Lower temperature for more deterministic outputs
+        "response_format": output_format or response_format(),
+        "prompt_cache_key": prompt_key
+    }
+
+
+def build_continuation_request(
+    messages: List[Dict[str, Any]], partial: str, model: str = MODEL, prompt_key: str = PAGE_PROMPT.key
+) -> Dict[str, Any]:
+    """
+    Build a request asking the model to finish output that was cut off.
+
+    Only the missing tail is generated, which is far cheaper than re-running
+    the page. The schema can't be enforced on a fragment, so the result is
+    appended to `partial` and parsed as a whole.
+    """
+    return {
+        "model": model,
+        "messages": messages + [
+            {"role": "assistant", "content": partial},
+            {"role": "user", "content": "Your JSON answer was cut off. Continue it from exactly the last character, without repeating anything and without code fences."}
+        ],
+        "max_tokens": CONTINUATION_MAX_TOKENS,
+        "temperature": 0.1,
+        "prompt_cache_key": prompt_key
+    }
+
+
+def _json_parse_error(content: str, page_num: int) -> Dict[str, Any]:
+    """Build the error payload recorded when a model response is not valid JSON."""
+    logger.error(f"Failed to parse JSON from response: {content[:200]}...")
+    PARSE_FAILURES.labels(source="page").inc()
+    return {
+        "error": "Failed to parse JSON from OpenAI response",
+        "form_title": "JSON Parsing Error",
+        "document_type": "error",
+        "questions": [
+            {
+                "question": "Error Details",
+                "answer": "The OpenAI API returned a response that couldn't be parsed as JSON",
+                "page": page_num,
+                "confidence": 0.0,
+                "is_handwritten": False
+            }
+        ],
+        "raw_content": content[:1000],  # Increase the length of raw_content to debug
+        "overall_confidence": 0.0
+    }
+
+
+def parse_page_content(content: str, page_num: int) -> Dict[str, Any]:
+    """
+    Parse the model's text response for a page into structured content.
+
+    Args:
+        content: Raw message content returned by the model
+        page_num: Page number
+
+    Returns:
+        Parsed page content, or an error payload if the JSON can't be recovered
     """
-    Process a single image with GPT-4.1.
+    # Code fences and truncated output are handled by the tolerant parser
+    parsed_content, complete = parse_json_output(content)
+    if not isinstance(parsed_content, dict):
+        return _json_parse_error(content, page_num)
+    
+    if not complete:
+        # Keep only the questions that were written out in full
+        logger.warning(f"Page {page_num} output was truncated, keeping the complete part")
+        parsed_content["truncated"] = True
+        if isinstance(parsed_content.get("questions"), list):
+            parsed_content["questions"] = [
+                q for q in parsed_content["questions"]
+                if isinstance(q, dict) and "question" in q and "answer" in q
+            ]
+    parsed_content.setdefault("schema_version", PAGE_SCHEMA_VERSION)
+
+    # Ensure page numbers are set for all questions
+    if "questions" in parsed_content:
+        for question in parsed_content["questions"]:
+            if "page" not in question:
+                question["page"] = page_num
+            if "confidence" not in question or question["confidence"] is None:
+                question["confidence"] = 0.95
+
+    # Calculate and set overall confidence
+    if parsed_content.get("questions") and not parsed_content.get("overall_confidence"):
+        total_confidence = sum(q.get("confidence", 0.95) for q in parsed_content["questions"])
+        parsed_content["overall_confidence"] = total_confidence / len(parsed_content["questions"])
+
+    return parsed_content
+
+
+def page_confidence(result: Dict[str, Any]) -> float:
+    """
+    Confidence score stored on an ExtractionResult for a parsed page.
+
+    Uses the page's overall confidence, falling back to the mean question
+    confidence, and 0.0 for error payloads.
+    """
+    if isinstance(result.get("error"), str):
+        return 0.0
+    questions = result.get("questions", [])
+    return result.get(
+        "overall_confidence",
+        sum(q.get("confidence", 0.0) for q in questions) / max(1, len(questions)) if questions else 0.0
+    )
+
+
+async def stream_page_completion(
+    client, request: Dict[str, Any], on_delta=None, usage: Optional[Dict[str, int]] = None
+) -> Tuple[str, Optional[str]]:
+    """
+    Run a chat completion with streamed output.
+
+    Args:
+        client: AsyncOpenAI client
+        request: Request body
+        on_delta: Optional callback receiving each text delta
+        usage: Optional dict that input/cached/output token counts and the
+            time spent waiting on the network (network_ms) are added to
+
+    Returns:
+        Tuple of (generated text, finish reason)
+    """
+    parts: List[str] = []
+    finish_reason = None
+    # Newer request fields go through extra_body so older SDK versions still send them
+    request = dict(request)
+    extra_body = {name: request.pop(name) for name in EXTRA_BODY_FIELDS if name in request}
+    start_time = time.perf_counter()
+    stream = await client.chat.completions.create(
+        **request, stream=True, stream_options={"include_usage": True}, extra_body=extra_body or None
+    )
+    async for chunk in stream:
+        if usage is not None and getattr(chunk, "usage", None):
+            details = getattr(chunk.usage, "prompt_tokens_details", None)
+            usage["input_tokens"] = usage.get("input_tokens", 0) + (chunk.usage.prompt_tokens or 0)
+            usage["cached_tokens"] = usage.get("cached_tokens", 0) + ((details.cached_tokens or 0) if details else 0)
+            usage["output_tokens"] = usage.get("output_tokens", 0) + (chunk.usage.completion_tokens or 0)
+        if not chunk.choices:
+            continue
+        choice = chunk.choices[0]
+        if choice.delta and choice.delta.content:
+            parts.append(choice.delta.content)
+            if on_delta:
+                on_delta(choice.delta.content)
+        if choice.finish_reason:
+            finish_reason = choice.finish_reason
+    if usage is not None:
+        usage["network_ms"] = usage.get("network_ms", 0.0) + (time.perf_counter() - start_time) * 1000
+    return "".join(parts), finish_reason
+
+
+async def extract_page_content(
+    client, messages: List[Dict[str, Any]], page_num: int, model: str = MODEL, usage: Optional[Dict[str, int]] = None,
+    output_format: Optional[Dict[str, Any]] = None, parse=parse_page_content, prompt_key: str = PAGE_PROMPT.key
+) -> Dict[str, Any]:
+    """
+    Extract one page with schema-constrained, streamed output.
+
+    If the output is cut off before the JSON is complete, the model is asked
+    to continue from where it stopped (up to MAX_CONTINUATIONS times) instead
+    of re-running the whole page. Whatever is still missing after that is
+    dropped by the tolerant parser.
+
+    Args:
+        output_format: Optional response_format replacing the page schema
+        parse: Function turning (content, page_num) into page content
+        prompt_key: Prompt template the messages were built from
+
+    Returns:
+        Parsed page content
+    """
+    parser = IncrementalJSONParser()
+    request = build_page_request(messages, model=model, output_format=output_format, prompt_key=prompt_key)
+    content, finish_reason = await stream_page_completion(client, request, parser.feed, usage)
+    logger.info(f"Page {page_num} streamed {len(content)} chars (finish_reason={finish_reason})")
+    
+    for attempt in range(MAX_CONTINUATIONS):
+        if parser.complete:
+            break
+        logger.warning(f"Page {page_num} output incomplete (finish_reason={finish_reason}), requesting continuation {attempt + 1}")
+        RETRIES.labels(reason="continuation").inc()
+        tail, finish_reason = await stream_page_completion(client, build_continuation_request(messages, content, model=model, prompt_key=prompt_key), usage=usage)
+        if tail.lstrip().startswith("```"):
+            tail = tail.lstrip().removeprefix("```json").removeprefix("```")
+        if not tail:
+            break
+        content += tail
+        parser.feed(tail)
+    
+    start_time = time.perf_counter()
+    try:
+        return parse(content, page_num)
+    finally:
+        if usage is not None:
+            usage["parse_ms"] = usage.get("parse_ms", 0.0) + (time.perf_counter() - start_time) * 1000
+
+
+async def run_cascade(
+    client, messages: List[Dict[str, Any]], page_num: int, policy: CascadePolicy, stats: CascadeStats,
+    kind: str = "page", prompt_key: str = PAGE_PROMPT.key, **extract_options
+) -> Dict[str, Any]:
+    """
+    Extract a page with each model of the cascade until one gives a usable result.
+
+    The page content records the model and prompt that produced it and, if
+    the page was escalated, why. Every call is recorded in `stats` under
+    `kind`. `extract_options` are passed on to `extract_page_content`.
+    """
+    result = None
+    escalations = []
+    for stage, model in enumerate(policy.models):
+        last_stage = stage == len(policy.models) - 1
+        usage: Dict[str, Any] = {}
+        error = None
+        start_time = time.perf_counter()
+        with span("model.call", {"page.number": page_num, "model": model, "call.kind": kind}) as call_span:
+            try:
+                result = await extract_page_content(
+                    client, messages, page_num, model=model, usage=usage, prompt_key=prompt_key, **extract_options
+                )
+            except Exception as e:
+                error = str(e)
+                if last_stage:
+                    raise
+                logger.warning(f"Page {page_num} failed on {model}: {str(e)}")
+                call_span.record_exception(e)
+                result = None
+            finally:
+                latency = time.perf_counter() - start_time
+                API_SECONDS.labels(model=model, outcome="error" if error else "ok").observe(latency)
+                stats.record(
+                    model, latency, usage,
+                    page_num=page_num, kind=kind, prompt_version=prompt_key, error=error
+                )
+                call_span.set_attributes({
+                    "tokens.input": usage.get("input_tokens"),
+                    "tokens.cached": usage.get("cached_tokens"),
+                    "tokens.output": usage.get("output_tokens"),
+                })
+        
+        if last_stage:
+            break
+        reason = policy.escalation_reason(result)
+        if not reason:
+            break
+        stats.record_escalation(model, reason)
+        RETRIES.labels(reason="escalation").inc()
+        escalations.append({"model": model, "reason": reason})
+        logger.info(f"Page {page_num} escalated from {model} ({reason})")
+    
+    result["model"] = model
+    result["prompt_version"] = prompt_key
+    if escalations:
+        result["escalations"] = escalations
+    return result
+
+
+async def extract_template_regions(
+    client, image, match: TemplateMatch, page_num: int, policy: CascadePolicy, stats: CascadeStats,
+    preprocess: Optional[PreprocessOptions] = None
+) -> Dict[str, Any]:
+    """
+    Extract a page that matched a form template from its answer regions only.
+
+    The regions are cropped from the aligned page and sent together in one
+    request; answers come back keyed by the template's field IDs. Crops are
+    only binarized, since deskewing or cropping would move them off the
+    template's regions.
+    """
+    start_time = time.perf_counter()
+    crops = crop_fields(image, match)
+    if preprocess and preprocess.binarize:
+        region_options = preprocess.for_regions()
+        for i, (region, crop) in enumerate(crops):
+            crops[i] = (region, (await asyncio.to_thread(preprocess_page, crop, region_options))[0])
+    encoded = [(region, encode_image_to_base64(crop)) for region, crop in crops]
+    ENCODE_SECONDS.observe(time.perf_counter() - start_time)
+    stats.record_encode((time.perf_counter() - start_time) * 1000)
+    logger.info(f"Page {page_num} matched template {match.template.id} (score {match.score:.2f}), sending {len(encoded)} regions")
+    page_span = current_span()
+    if page_span is not None:
+        page_span.set_attributes({"template.id": match.template.id, "template.regions": len(encoded)})
+    return await run_cascade(
+        client, build_region_messages(match, encoded, page_num), page_num, policy, stats,
+        kind="region", prompt_key=REGION_PROMPT.key,
+        output_format=region_response_format(match.template),
+        parse=lambda content, page: parse_region_content(content, page, match)
+    )
+
+
+@traced("page.process", attributes=lambda image, page_num, *args, **kwargs: {"page.number": page_num})
+async def process_image(
+    image, page_num: int, api_key: str,
+    policy: Optional[CascadePolicy] = None, stats: Optional[CascadeStats] = None,
+    preprocess: Optional[PreprocessOptions] = None
+) -> Dict:
+    """
+    Process a single image through the model cascade (small model first, GPT-4.1 if needed).
     
     Args:
         image: PIL image
         page_num: Page number
         api_key: OpenAI API key
+        policy: Cascade policy (defaults to the configured one)
+        stats: Optional per-job stage accounting
+        preprocess: Optional page preprocessing (deskew, crop, binarize)
         
     Returns:
         Dict of extracted content or None on failure
@@ -1243,118 +1924,57 @@ async def process_image(image, page_num: int, api_key: str) -> Dict:
             ]
         }
     
-    # Encode the image to base64
-    base64_image = encode_image_to_base64(image)
-    
-    # Construct the messages for GPT-4.1
-    messages = [
-        {
-            "role": "system",
-            "content": "You are a world-class handwriting recognition assistant specializing in historical documents and forms. Extract all handwritten text from the provided image, including form titles, headers, and all text. Pay special attention to letterhead information such as 'THE LIVERPOOL SCHOOL FOR THE BLIND'. Return the result as structured JSON with form_title for the document title, document_type for the type of form, letterhead for the institution name, and questions/answers for form fields."
-        },
-        {
-            "role": "user",
-            "content": [
-                {"type": "text", "text": f"Extract all handwritten text and document information from page {page_num}. Look for letterhead information like 'THE LIVERPOOL SCHOOL FOR THE BLIND' at the top of the form. Identify the document type, any headers or letterhead, and all form fields. Return as JSON with form_title, document_type, letterhead, and questions array. Add confidence:0.95 field to each question."},
-                {"type": "image_url", "image_url": {"url": f"data:image/png;base64,{base64_image}"}}
-            ]
-        }
-    ]
+    policy = policy or CascadePolicy.from_env(MODEL)
+    stats = stats if stats is not None else CascadeStats()
     
     # Make the API request with the new OpenAI client library
     try:
-        from openai import AsyncOpenAI
+        from openai import AsyncOpenAI, DefaultAsyncHttpxClient
         
-        # Create client with the API key
-        client = AsyncOpenAI(api_key=api_key)
+        # Create client with the API key; the hook counts 429s the SDK retries on its own
+        client = AsyncOpenAI(
+            api_key=api_key,
+            base_url=OPENAI_BASE_URL,
+            http_client=DefaultAsyncHttpxClient(event_hooks={"response": [count_http_response]})
+        )
         
-        logger.info(f"Making API request to OpenAI with model {MODEL}...")
+        # Known forms only need their answer regions read; matching (resize and
+        # an FFT per template) runs off the event loop
+        match = await asyncio.to_thread(get_template_registry().match, image)
+        if match:
+            try:
+                result = await extract_template_regions(client, image, match, page_num, policy, stats, preprocess)
+                if not isinstance(result.get("error"), str) and result.get("questions"):
+                    return result
+                logger.warning(f"Region extraction for page {page_num} gave no answers, reading the full page")
+            except Exception as e:
+                logger.warning(f"Region extraction for page {page_num} failed, reading the full page: {str(e)}")
         
-        response = await client.chat.completions.create(
-            model=MODEL,
-            messages=messages,
-            max_tokens=4000,
-            temperature=0.1  # Lower temperature for more deterministic outputs
-        )
-            
-        # Extract the content from the response
-        content = response.choices[0].message.content
-        logger.info(f"Page {page_num} processed successfully: {content[:100]}...")
+        # Straighten, crop and binarize the page off the event loop
+        start_time = time.perf_counter()
+        preprocessing = None
+        if preprocess and preprocess.enabled:
+            with span("page.preprocess", {"page.number": page_num}):
+                image, preprocessing = await asyncio.to_thread(preprocess_page, image, preprocess)
+            logger.info(f"Preprocessed page {page_num}: {preprocessing}")
+        
+        # Encode the image to base64
+        with span("page.encode", {"page.number": page_num}):
+            base64_image = encode_image_to_base64(image)
+        ENCODE_SECONDS.observe(time.perf_counter() - start_time)
+        stats.record_encode((time.perf_counter() - start_time) * 1000)
+        
+        # Construct the messages for GPT-4.1
+        messages = build_page_messages(base64_image, page_num)
         
-        # Parse JSON content
+        logger.info(f"Making API request to OpenAI with model {MODEL}...")
+        
+        # Stream schema-constrained output, escalating to larger models when needed
         try:
-            # Check if the content is wrapped in ```json ... ``` code blocks
-            if "```json" in content:
-                json_part = content.split("```json")[1].split("```")[0].strip()
-                parsed_content = json.loads(json_part)
-            elif "```" in content:
-                # Try with just the code block markers
-                json_part = content.split("```")[1].split("```")[0].strip()
-                parsed_content = json.loads(json_part)
-            else:
-                # Try to parse directly as JSON
-                try:
-                    parsed_content = json.loads(content)
-                except json.JSONDecodeError:
-                    # Try to fix common issues by completing the JSON
-                    if content.strip().startswith('{') and not content.strip().endswith('}'):
-                        # Add missing closing brace
-                        fixed_content = content.strip() + "}"
-                        try:
-                            parsed_content = json.loads(fixed_content)
-                        except json.JSONDecodeError:
-                            # Still failed, fall back to error handling
-                            logger.error(f"Failed to parse JSON from response: {content[:200]}...")
-                            return {
-                                "error": "Failed to parse JSON from OpenAI response",
-                                "form_title": "JSON Parsing Error",
-                                "document_type": "error",
-                                "questions": [
-                                    {
-                                        "question": "Error Details",
-                                        "answer": "The OpenAI API returned a response that couldn't be parsed as JSON",
-                                        "page": page_num,
-                                        "confidence": 0.0,
-                                        "is_handwritten": False
-                                    }
-                                ],
-                                "raw_content": content[:1000],  # Increase the length of raw_content to debug
-                                "overall_confidence": 0.0
-                            }
-                    else:
-                        # Not a fixable JSON format
-                        logger.error(f"Failed to parse JSON from response: {content[:200]}...")
-                        return {
-                            "error": "Failed to parse JSON from OpenAI response",
-                            "form_title": "JSON Parsing Error",
-                            "document_type": "error",
-                            "questions": [
-                                {
-                                    "question": "Error Details",
-                                    "answer": "The OpenAI API returned a response that couldn't be parsed as JSON",
-                                    "page": page_num,
-                                    "confidence": 0.0,
-                                    "is_handwritten": False
-                                }
-                            ],
-                            "raw_content": content[:1000],  # Increase the length of raw_content to debug
-                            "overall_confidence": 0.0
-                        }
-            
-            # Ensure page numbers are set for all questions
-            if "questions" in parsed_content:
-                for question in parsed_content["questions"]:
-                    if "page" not in question:
-                        question["page"] = page_num
-                    if "confidence" not in question or question["confidence"] is None:
-                        question["confidence"] = 0.95
-            
-            # Calculate and set overall confidence
-            if parsed_content.get("questions") and not parsed_content.get("overall_confidence"):
-                total_confidence = sum(q.get("confidence", 0.95) for q in parsed_content["questions"])
-                parsed_content["overall_confidence"] = total_confidence / len(parsed_content["questions"])
-            
-            return parsed_content
+            result = await run_cascade(client, messages, page_num, policy, stats)
+            if preprocessing:
+                result["preprocessing"] = preprocessing
+            return result
         except Exception as e:
             error_msg = f"Error in API request: {str(e)}"
             logger.error(error_msg)
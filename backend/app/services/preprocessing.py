@@ -0,0 +1,319 @@
+"""
+Optional page preprocessing before extraction: deskew, border crop and binarization.
+
+Scans arrive slightly rotated, with dark scanner edges and wide margins, in
+full colour. Straightening the page, cutting it down to the written area
+and reducing it to black and white gives the model a cleaner image and a
+much smaller PNG to upload.
+
+Everything runs on NumPy arrays of a single grayscale copy of the page:
+
+* deskew: projection-profile search over a downscaled ink mask, all
+  candidate angles scored in one vectorized pass;
+* border crop: row/column ink profiles, dropping dark scanner edges;
+* binarization: Otsu (global, from the histogram) or Sauvola (local mean
+  and deviation from integral images), for uneven lighting and faded ink.
+
+Which steps run is configurable per job with a comma-separated spec, e.g.
+"sauvola,deskew,crop" (see `PreprocessOptions.parse`). The default comes
+from the PAGE_PREPROCESS environment variable and is empty, i.e. pages are
+sent as rendered.
+"""
+import os
+import time
+from dataclasses import asdict, dataclass, replace
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+PAGE_PREPROCESS = os.environ.get("PAGE_PREPROCESS", "")
+
+BINARIZE_METHODS = ("otsu", "sauvola")
+SAUVOLA_WINDOW = 31  # pixels; about a line of handwriting at 300 DPI
+SAUVOLA_K = 0.2
+SAUVOLA_R = 128.0  # dynamic range of the standard deviation for 8-bit images
+MAX_SKEW = 5.0  # degrees searched either way
+SKEW_STEP = 0.5  # coarse search step, refined to SKEW_STEP / 5
+MIN_SKEW = 0.1  # smaller angles are left alone
+SKEW_ANALYSIS_SIZE = 1024  # longest side of the copy the skew is measured on
+SKEW_MAX_SAMPLES = 200_000  # ink pixels used for the projection profiles
+BORDER_DARK_FRACTION = 0.5  # edge rows/columns darker than this are scanner border
+CONTENT_MIN_FRACTION = 0.002  # rows/columns with less ink than this are margin
+CROP_PADDING = 0.02  # margin kept around the content, as a fraction of the page
+
+
+@dataclass(frozen=True)
+class PreprocessOptions:
+    """Which preprocessing steps to apply to a page."""
+    binarize: Optional[str] = None  # "otsu", "sauvola" or None
+    deskew: bool = False
+    crop_borders: bool = False
+    sauvola_window: int = SAUVOLA_WINDOW
+    sauvola_k: float = SAUVOLA_K
+    max_skew: float = MAX_SKEW
+
+    def __post_init__(self):
+        if self.binarize is not None and self.binarize not in BINARIZE_METHODS:
+            raise ValueError(f"Unknown binarization method: {self.binarize}")
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.binarize or self.deskew or self.crop_borders)
+
+    @classmethod
+    def parse(cls, spec: Optional[str]) -> "PreprocessOptions":
+        """
+        Build options from a comma-separated list of steps.
+
+        Steps are "otsu" or "sauvola", "deskew" and "crop"; "none" or an
+        empty spec disables preprocessing.
+
+        Raises:
+            ValueError: for unknown or conflicting steps
+        """
+        steps = [s.strip().lower() for s in (spec or "").split(",") if s.strip()]
+        binarize = None
+        deskew = crop = False
+        for step in steps:
+            if step in BINARIZE_METHODS:
+                if binarize and binarize != step:
+                    raise ValueError("Only one binarization method can be used")
+                binarize = step
+            elif step == "deskew":
+                deskew = True
+            elif step == "crop":
+                crop = True
+            elif step != "none":
+                raise ValueError(f"Unknown preprocessing step: {step}")
+        return cls(binarize=binarize, deskew=deskew, crop_borders=crop)
+
+    @classmethod
+    def from_env(cls) -> "PreprocessOptions":
+        return cls.parse(PAGE_PREPROCESS)
+
+    @classmethod
+    def from_dict(cls, data: Optional[Dict[str, Any]]) -> "PreprocessOptions":
+        """Options stored on a job; None gives the configured default."""
+        if data is None:
+            return cls.from_env()
+        return cls(**{k: v for k, v in data.items() if k in cls.__dataclass_fields__})
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+    def for_regions(self) -> "PreprocessOptions":
+        """The subset that keeps page geometry, for crops of a template-aligned page."""
+        return replace(self, deskew=False, crop_borders=False)
+
+
+def otsu_threshold(gray: np.ndarray) -> int:
+    """Global threshold maximizing between-class variance of an 8-bit image."""
+    hist = np.bincount(gray.ravel(), minlength=256).astype(np.float64)
+    weight = np.cumsum(hist)
+    total = weight[-1]
+    if total == 0:
+        return 128
+    levels_sum = np.cumsum(hist * np.arange(256))
+    background = weight[:-1]
+    foreground = total - background
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mean_bg = levels_sum[:-1] / background
+        mean_fg = (levels_sum[-1] - levels_sum[:-1]) / foreground
+        variance = background * foreground * (mean_bg - mean_fg) ** 2
+    variance[~np.isfinite(variance)] = 0
+    # Pixels <= threshold are the dark class
+    return int(np.argmax(variance))
+
+
+def _window_sums(values: np.ndarray, window: int) -> np.ndarray:
+    """Sum over a window x window neighbourhood of each pixel, from an integral image."""
+    pad = window // 2
+    integral = np.pad(values, ((pad + 1, pad), (pad + 1, pad)), mode="edge").cumsum(0, dtype=np.float64)
+    integral.cumsum(1, out=integral)
+    integral[0, :] = 0
+    integral[:, 0] = 0
+    return (integral[window:, window:] - integral[:-window, window:]
+            - integral[window:, :-window] + integral[:-window, :-window])
+
+
+def sauvola_threshold(gray: np.ndarray, window: int = SAUVOLA_WINDOW, k: float = SAUVOLA_K) -> np.ndarray:
+    """
+    Per-pixel Sauvola threshold T = m * (1 + k * (s / R - 1)).
+
+    The local mean m and standard deviation s come from integral images of
+    the page and its square, so the cost does not depend on the window size.
+    """
+    window |= 1  # odd, so the window is centred on the pixel
+    values = gray.astype(np.float32)
+    area = float(window * window)
+    mean = (_window_sums(values, window) / area).astype(np.float32)
+    np.square(values, out=values)
+    variance = (_window_sums(values, window) / area).astype(np.float32)
+    variance -= mean * mean
+    np.maximum(variance, 0, out=variance)
+    np.sqrt(variance, out=variance)
+    variance *= k / SAUVOLA_R
+    variance += 1 - k
+    mean *= variance
+    return mean
+
+
+def binarize(gray: np.ndarray, method: str = "otsu", window: int = SAUVOLA_WINDOW, k: float = SAUVOLA_K) -> np.ndarray:
+    """Boolean ink mask (True where the page is dark)."""
+    if method == "otsu":
+        return gray <= otsu_threshold(gray)
+    if method == "sauvola":
+        return gray <= sauvola_threshold(gray, window, k)
+    raise ValueError(f"Unknown binarization method: {method}")
+
+
+def estimate_skew(gray_image, max_angle: float = MAX_SKEW, step: float = SKEW_STEP) -> float:
+    """
+    Estimate how far a page is rotated, in degrees counter-clockwise.
+
+    Ink pixels of a downscaled copy are projected onto the vertical axis at
+    each candidate angle; text lines give the sharpest profile (largest sum
+    of squared row counts) when the angle matches the page's rotation.
+    """
+    gray_image = gray_image if gray_image.mode == "L" else gray_image.convert("L")
+    factor = -(-max(gray_image.size) // SKEW_ANALYSIS_SIZE)
+    pixels = np.asarray(gray_image.reduce(factor) if factor > 1 else gray_image)
+    ys, xs = np.nonzero(pixels <= otsu_threshold(pixels))
+    if ys.size < 100:
+        return 0.0
+    if ys.size > SKEW_MAX_SAMPLES:
+        stride = ys.size // SKEW_MAX_SAMPLES + 1
+        ys, xs = ys[::stride], xs[::stride]
+    ys = ys.astype(np.float32)
+    xs = xs.astype(np.float32)
+    height = pixels.shape[0] + pixels.shape[1]  # room for any rotated row index
+
+    def best_angle(angles: np.ndarray) -> float:
+        radians = np.deg2rad(angles).astype(np.float32)[:, None]
+        # Row of each ink pixel once the page is rotated back by the candidate angle
+        rows = ys * np.cos(radians) + xs * np.sin(radians)
+        rows = rows.astype(np.int64) + pixels.shape[1]
+        rows += np.arange(len(angles))[:, None] * height
+        profiles = np.bincount(rows.ravel(), minlength=len(angles) * height).reshape(len(angles), height)
+        scores = (profiles.astype(np.float64) ** 2).sum(axis=1)
+        return float(angles[np.argmax(scores)])
+
+    coarse = best_angle(np.arange(-max_angle, max_angle + step / 2, step))
+    fine_step = step / 5
+    return best_angle(np.arange(coarse - step, coarse + step + fine_step / 2, fine_step))
+
+
+def _ink_mask(gray: np.ndarray, threshold: Optional[int]) -> np.ndarray:
+    return gray <= (otsu_threshold(gray) if threshold is None else threshold)
+
+
+def _strip_dark_edges(profile: np.ndarray) -> Tuple[int, int]:
+    start, end = 0, len(profile)
+    while start < end and profile[start] > BORDER_DARK_FRACTION:
+        start += 1
+    while end > start and profile[end - 1] > BORDER_DARK_FRACTION:
+        end -= 1
+    return start, end
+
+
+def border_box(gray: np.ndarray, threshold: Optional[int] = None) -> Tuple[int, int, int, int]:
+    """Box (left, top, right, bottom) inside the dark scanner edges of a page."""
+    ink = _ink_mask(gray, threshold)
+    top, bottom = _strip_dark_edges(np.count_nonzero(ink, axis=1) / ink.shape[1])
+    left, right = _strip_dark_edges(np.count_nonzero(ink, axis=0) / ink.shape[0])
+    if right - left < ink.shape[1] * 0.1 or bottom - top < ink.shape[0] * 0.1:
+        return 0, 0, ink.shape[1], ink.shape[0]
+    return left, top, right, bottom
+
+
+def content_box(gray: np.ndarray, threshold: Optional[int] = None) -> Tuple[int, int, int, int]:
+    """
+    Bounding box (left, top, right, bottom) of the written area of a page.
+
+    Dark scanner edges are excluded first, then the box is fitted to the
+    remaining ink with a small padding. A page without ink keeps its full
+    size.
+    """
+    h, w = gray.shape
+    left, top, right, bottom = border_box(gray, threshold)
+    ink = _ink_mask(gray[top:bottom, left:right], threshold)
+
+    def fit(profile: np.ndarray, start: int, end: int, size: int) -> Tuple[int, int]:
+        content = np.nonzero(profile > CONTENT_MIN_FRACTION)[0]
+        if content.size == 0:
+            return start, end
+        pad = int(size * CROP_PADDING)
+        return max(start, start + content[0] - pad), min(end, start + content[-1] + 1 + pad)
+
+    top, bottom = fit(np.count_nonzero(ink, axis=1) / ink.shape[1], top, bottom, h)
+    left, right = fit(np.count_nonzero(ink, axis=0) / ink.shape[0], left, right, w)
+    if right - left < w * 0.1 or bottom - top < h * 0.1:
+        return 0, 0, w, h
+    return int(left), int(top), int(right), int(bottom)
+
+
+def preprocess_page(image, options: PreprocessOptions) -> Tuple[Any, Dict[str, Any]]:
+    """
+    Apply the configured steps to a page image.
+
+    Args:
+        image: PIL image of the page
+        options: Steps to apply
+
+    Returns:
+        Tuple of (processed PIL image, dict describing what was done). A
+        binarized page is a 1-bit image; otherwise the original mode is kept.
+    """
+    if not options.enabled:
+        return image, {}
+
+    start = time.perf_counter()
+    info: Dict[str, Any] = {}
+    gray = image.convert("L")
+
+    if options.crop_borders:
+        # Scanner edges are parallel to the scan, so they go before deskewing
+        border = border_box(np.asarray(gray))
+        if border != (0, 0) + gray.size:
+            info["border_box"] = [int(v) for v in border]
+            gray = gray.crop(border)
+            if not options.binarize:
+                image = image.crop(border)
+
+    if options.deskew:
+        angle = estimate_skew(gray, options.max_skew)
+        info["skew_deg"] = round(angle, 2)
+        if abs(angle) >= MIN_SKEW:
+            gray = gray.rotate(-angle, resample=Image.BILINEAR, fillcolor=255)
+            if not options.binarize:
+                image = image.rotate(-angle, resample=Image.BILINEAR, fillcolor="white")
+
+    pixels = np.asarray(gray)
+    threshold = otsu_threshold(pixels) if options.binarize == "otsu" or options.crop_borders else None
+    box = None
+    if options.crop_borders:
+        box = content_box(pixels, threshold)
+        if box != (0, 0, pixels.shape[1], pixels.shape[0]):
+            info["crop_box"] = list(box)
+            left, top, right, bottom = box
+            pixels = pixels[top:bottom, left:right]  # view, no copy
+        else:
+            box = None
+
+    if options.binarize:
+        if options.binarize == "otsu":
+            ink = pixels <= threshold
+            info["threshold"] = threshold
+        else:
+            ink = binarize(pixels, "sauvola", options.sauvola_window, options.sauvola_k)
+        np.logical_not(ink, out=ink)  # white paper, black ink
+        result = Image.fromarray(ink)
+        info["binarize"] = options.binarize
+    elif box is not None:
+        result = image.crop(box)
+    else:
+        result = image
+
+    info["ms"] = round((time.perf_counter() - start) * 1000, 1)
+    return result, info
@@ -0,0 +1,230 @@
+"""
+Finding blocking code under real load: an event loop watchdog and an
+on-demand sampling profiler.
+
+The watchdog keeps a heartbeat coroutine on the event loop and checks it
+from a separate thread. When the heartbeat is late by more than the
+threshold, the loop is stuck in one callback; the watcher then records the
+loop thread's stack at that moment, which shows the blocking call itself
+(a sync session, time.sleep, a boto3 request) rather than just the fact
+that the loop was late. Stalls are logged, counted on /metrics and kept
+for /admin/loop-stalls.
+
+The profiler samples the stacks of all threads (or only the event loop
+thread) at a fixed interval for a few seconds and writes them in the
+collapsed-stack format read by flamegraph.pl and speedscope. It is started
+through POST /admin/profile.
+
+Configuration (environment):
+    LOOP_WATCHDOG_MS    report callbacks blocking the loop longer than this (default 0, off)
+    LOOP_WATCHDOG_FILE  also append stalls to this file as JSON lines (default: log only)
+    PROFILE_DIR         directory for profiler output (default profiles)
+"""
+import asyncio
+import collections
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Counter, Deque, Dict, List, Optional, Set
+
+from .metrics import LOOP_STALLS
+
+logger = logging.getLogger(__name__)
+
+LOOP_WATCHDOG_MS = float(os.environ.get("LOOP_WATCHDOG_MS", "0"))
+LOOP_WATCHDOG_FILE = os.environ.get("LOOP_WATCHDOG_FILE", "")
+PROFILE_DIR = Path(os.environ.get("PROFILE_DIR", "profiles"))
+
+MAX_PROFILE_SECONDS = 120
+
+
+class LoopWatchdog:
+    """Detects event loop stalls and captures the stack of the blocking callback."""
+
+    def __init__(self, threshold_ms: float, path: Optional[str] = None, keep: int = 100):
+        self.threshold = threshold_ms / 1000
+        self.interval = max(self.threshold / 4, 0.005)  # heartbeat period
+        self.path = path
+        self.stalls: Deque[Dict[str, Any]] = collections.deque(maxlen=keep)
+        self._beat = (0, time.monotonic())
+        self._pending: Optional[Dict[str, Any]] = None
+        self._reported_beat = -1
+        self.loop_thread_id: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+
+    def start(self) -> None:
+        """Start watching the running loop."""
+        self.loop_thread_id = threading.get_ident()
+        self._beat = (0, time.monotonic())
+        self._task = asyncio.get_running_loop().create_task(self._heartbeat())
+        threading.Thread(target=self._watch, name="loop-watchdog", daemon=True).start()
+        logger.info(f"Event loop watchdog reporting stalls over {self.threshold * 1000:.0f} ms")
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+
+    async def _heartbeat(self) -> None:
+        count = 0
+        while True:
+            count += 1
+            self._beat = (count, time.monotonic())
+            await asyncio.sleep(self.interval)
+
+    def _watch(self) -> None:
+        while not self._stop.wait(self.interval / 2):
+            self.check()
+
+    def check(self) -> None:
+        """Compare the heartbeat with the clock; called from the watcher thread."""
+        with self._lock:
+            count, at = self._beat
+            if self._pending is not None and count != self._pending["beat"]:
+                # The loop is running again: the stall lasted from the last beat until this one
+                stall, self._pending = self._pending, None
+                stall.pop("beat")
+                stall["blocked_ms"] = round(max(0.0, at - stall.pop("since") - self.interval) * 1000, 1)
+                self._finish(stall)
+            late = time.monotonic() - at - self.interval
+            if self._pending is None and late > self.threshold and count != self._reported_beat:
+                self._reported_beat = count
+                self._pending = {
+                    "at": datetime.utcnow().isoformat(),
+                    "beat": count,
+                    "since": at,
+                    "stack": self._loop_stack(),
+                }
+
+    def _loop_stack(self) -> List[str]:
+        frame = sys._current_frames().get(self.loop_thread_id)
+        if frame is None:
+            return []
+        return [line.rstrip() for line in traceback.format_stack(frame)]
+
+    def _finish(self, stall: Dict[str, Any]) -> None:
+        LOOP_STALLS.observe(stall["blocked_ms"] / 1000)
+        self.stalls.append(stall)
+        logger.warning(f"Event loop blocked for {stall['blocked_ms']} ms in:\n" + "\n".join(stall["stack"]))
+        if self.path:
+            try:
+                with open(self.path, "a") as f:
+                    f.write(json.dumps(stall) + "\n")
+            except OSError as e:
+                logger.error(f"Could not write loop stall to {self.path}: {str(e)}")
+
+
+_watchdog: Optional[LoopWatchdog] = None
+
+
+def start_loop_watchdog(threshold_ms: float = LOOP_WATCHDOG_MS) -> Optional[LoopWatchdog]:
+    """Start the watchdog on the running loop, unless disabled."""
+    global _watchdog
+    if threshold_ms <= 0:
+        return None
+    _watchdog = LoopWatchdog(threshold_ms, LOOP_WATCHDOG_FILE or None)
+    _watchdog.start()
+    return _watchdog
+
+
+def get_loop_watchdog() -> Optional[LoopWatchdog]:
+    return _watchdog
+
+
+def _fold(frame, thread_name: str) -> str:
+    """One stack in collapsed format: thread;outermost;...;innermost."""
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+        frame = frame.f_back
+    return ";".join([thread_name, *reversed(names)])
+
+
+def sample_stacks(seconds: float, interval: float = 0.005, thread_ids: Optional[Set[int]] = None) -> Counter[str]:
+    """
+    Sample thread stacks for `seconds`.
+
+    Args:
+        seconds: How long to sample
+        interval: Time between samples
+        thread_ids: Only these threads (default: all but the sampling thread)
+
+    Returns:
+        Collapsed stacks and how often each was seen
+    """
+    counts: Counter[str] = collections.Counter()
+    me = threading.get_ident()
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == me or (thread_ids is not None and thread_id not in thread_ids):
+                continue
+            counts[_fold(frame, names.get(thread_id, str(thread_id)))] += 1
+        time.sleep(interval)
+    return counts
+
+
+_profile_lock = threading.Lock()
+
+
+class ProfilerBusy(RuntimeError):
+    """A profile is already being taken."""
+
+
+def write_profile(seconds: float, interval: float = 0.005, loop_only: bool = False,
+                  directory: Optional[Path] = None) -> Dict[str, Any]:
+    """
+    Take a sampling profile and write it to a .folded file; blocks for `seconds`.
+
+    Args:
+        seconds: How long to sample (at most MAX_PROFILE_SECONDS)
+        interval: Time between samples
+        loop_only: Only sample the event loop thread (needs the watchdog or a loop in the main thread)
+        directory: Where to write the file (default PROFILE_DIR)
+
+    Returns:
+        The file path, the sample count and the functions seen most often at the top of the stack
+
+    Raises:
+        ProfilerBusy: Another profile is in progress
+    """
+    if not _profile_lock.acquire(blocking=False):
+        raise ProfilerBusy("A profile is already being taken")
+    try:
+        seconds = min(seconds, MAX_PROFILE_SECONDS)
+        thread_ids = None
+        if loop_only:
+            watchdog = get_loop_watchdog()
+            thread_ids = {watchdog.loop_thread_id if watchdog else threading.main_thread().ident}
+        counts = sample_stacks(seconds, interval, thread_ids)
+
+        directory = directory or PROFILE_DIR
+        directory.mkdir(parents=True, exist_ok=True)
+        path = directory / f"profile-{datetime.utcnow().strftime('%Y%m%dT%H%M%S')}.folded"
+        with open(path, "w") as f:
+            for stack, count in counts.most_common():
+                f.write(f"{stack} {count}\n")
+
+        leaves: Counter[str] = collections.Counter()
+        for stack, count in counts.items():
+            leaves[stack.rsplit(";", 1)[-1]] += count
+        total = sum(counts.values())
+        logger.info(f"Wrote {total} stack samples over {seconds} s to {path}")
+        return {
+            "path": str(path),
+            "seconds": seconds,
+            "samples": total,
+            "top": [{"frame": frame, "samples": count} for frame, count in leaves.most_common(20)],
+        }
+    finally:
+        _profile_lock.release()
@@ -0,0 +1,139 @@
+"""
+Versioned prompt templates for page extraction requests.
+
+OpenAI caches the longest previously seen prefix of a request, so every
+request is laid out static-first: the system prompt, then the fixed
+instructions, then the images, and only at the very end the per-page text
+(page number, form name). The static part is a module constant and comes
+out byte-identical for every page, so from the second page on it is billed
+as cached input and the first token arrives sooner. Requests also carry a
+`prompt_cache_key` so that pages using the same template are routed to the
+same cache.
+
+Bump a template's version whenever its text changes; the version is stored
+with each page result and model call so results can be traced back to the
+prompt that produced them.
+"""
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+
+@dataclass(frozen=True)
+class PromptTemplate:
+    """A system prompt and static instructions, followed by images and a per-page note."""
+    name: str
+    version: str
+    system: str
+    instructions: str
+    page_note: str  # str.format() template for the per-page variables
+
+    @property
+    def key(self) -> str:
+        """Identifies the template and version, e.g. in results and as prompt_cache_key."""
+        return f"{self.name}-{self.version}"
+
+    def messages(self, images: Sequence[Tuple[Optional[str], str]], **variables: Any) -> List[Dict[str, Any]]:
+        """
+        Build chat messages for one request.
+
+        Args:
+            images: (label, base64 PNG) pairs; a label is sent as text just before its image
+            variables: Values for `page_note`
+
+        Returns:
+            List of chat messages
+        """
+        content: List[Dict[str, Any]] = [{"type": "text", "text": self.instructions}]
+        for label, base64_image in images:
+            if label:
+                content.append({"type": "text", "text": label})
+            content.append({"type": "image_url", "image_url": {"url": f"data:image/png;base64,{base64_image}"}})
+        content.append({"type": "text", "text": self.page_note.format(**variables)})
+        return [
+            {"role": "system", "content": self.system},
+            {"role": "user", "content": content},
+        ]
+
+
+# Full-page handwriting extraction (pdf_service.process_image and the Batch API)
+PAGE_PROMPT = PromptTemplate(
+    name="handwritten-page",
+    version="v2",
+    system=(
+        "You are a world-class handwriting recognition assistant specializing in historical documents and forms. "
+        "Extract all handwritten text from the provided image, including form titles, headers, and all text. "
+        "Pay special attention to letterhead information such as 'THE LIVERPOOL SCHOOL FOR THE BLIND'. "
+        "Return the result as structured JSON with form_title for the document title, document_type for the "
+        "type of form, letterhead for the institution name, and questions/answers for form fields."
+    ),
+    instructions=(
+        "Extract all handwritten text and document information from this page. Look for letterhead information "
+        "like 'THE LIVERPOOL SCHOOL FOR THE BLIND' at the top of the form. Identify the document type, any headers "
+        "or letterhead, and all form fields. Return as JSON with form_title, document_type, letterhead, and "
+        "questions array. Add confidence:0.95 field to each question."
+    ),
+    page_note="This is page {page_num}.",
+)
+
+# Answer regions cropped from a page that matched a form template
+REGION_PROMPT = PromptTemplate(
+    name="template-regions",
+    version="v2",
+    system="You are a world-class handwriting recognition assistant transcribing answers written on a known form.",
+    instructions=(
+        "These are the answer fields cut from one page of a known form. Each image is preceded by its field_id "
+        "and the printed question. Transcribe the handwriting in each image exactly; use an empty answer if the "
+        "field is blank and [ILLEGIBLE] for words you cannot read."
+    ),
+    page_note="Form: '{form_name}', page {page_num}.",
+)
+
+# Free-form text and metadata extraction (OpenAIService, used by the legacy worker)
+METADATA_PROMPT = PromptTemplate(
+    name="document-metadata",
+    version="v2",
+    system=(
+        "You are a precise document extraction expert specializing in form analysis and metadata extraction. "
+        "Your task is to extract all text, data and metadata from the image, while maintaining the document structure. "
+        "\n\n"
+        "EXTRACTION REQUIREMENTS:\n"
+        "1. Extract ALL text visible in the document, both printed and handwritten\n"
+        "2. Identify form fields, labels, values, and their relationships\n"
+        "3. Extract all metadata, such as form identifiers, dates, version numbers, company info\n"
+        "4. Identify headers, footers, section titles, and organizational structure\n"
+        "5. Label each section appropriately based on its content\n"
+        "6. Format numerical data appropriately (dates, numbers, etc.)\n"
+        "7. If text is illegible, mark it as [ILLEGIBLE]\n"
+        "8. Identify handwritten vs printed text (mark with is_handwritten: true/false)\n"
+        "9. Include a confidence score for each extracted field (0.0-1.0)\n"
+        "10. Detect table structures and preserve their data format\n"
+        "\n\n"
+        "IMPORTANT: Return data in a well-structured JSON format with these top-level keys:\n"
+        "- form_title: The title of the document\n"
+        "- document_type: The type of document (medical form, survey, application, etc.)\n"
+        "- explanation_text: Any explanatory text about the document's purpose\n"
+        "- header: Document header information\n"
+        "- footer: Document footer information\n"
+        "- metadata: Any document metadata (form ID, version, etc.)\n"
+        "- overall_confidence: Overall confidence in extraction accuracy (0.0-1.0)\n"
+        "- sections: Array of logical sections, each with fields array\n"
+        "- questions: Array of question-answer pairs found in the document\n"
+        "- tables: Array of table data if present\n"
+        "- form_elements: Object containing checkboxes, signatures, etc.\n"
+        "- notes: Any additional observations\n"
+        "\n"
+        "Always include date formats for dates and appropriate units for measured values."
+    ),
+    instructions=(
+        "Extract all text, data, and metadata from this document. Include all printed and handwritten content. "
+        "Preserve form structure and identify all key elements."
+    ),
+    page_note="This is page {page_num}.",
+)
+
+
+def cache_hit_rate(input_tokens: int, cached_tokens: int) -> Optional[float]:
+    """Share of input tokens served from the prompt cache, or None without input."""
+    if not input_tokens:
+        return None
+    return round(cached_tokens / input_tokens, 4)
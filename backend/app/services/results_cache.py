@@ -0,0 +1,126 @@
+"""
+Materialized results for completed extraction jobs.
+
+Completed jobs are read many times by reviewers but never change, so their
+results response (including the synthesized page-0 combined result) is
+built once, serialized with orjson when available and gzip-compressed. The
+blobs live in a size-bounded LRU cache and are served as-is to clients that
+accept gzip.
+
+A job's blob is dropped when the job receives new progress events (it is
+being reprocessed) or when its document is sent for processing again.
+"""
+import gzip
+import hashlib
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, List, Optional
+
+from .events import JobEvent, event_bus
+from .metrics import CACHE_REQUESTS
+
+try:
+    import orjson
+except ImportError:  # optional, the stdlib encoder is only slower
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+RESULTS_CACHE_MAX_BYTES = int(os.environ.get("RESULTS_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+GZIP_LEVEL = 6
+
+
+def dumps(value: Any) -> bytes:
+    """Serialize to compact JSON bytes."""
+    if orjson is not None:
+        return orjson.dumps(value, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(value, separators=(",", ":"), default=str).encode()
+
+
+@dataclass
+class MaterializedResults:
+    """A pre-serialized, gzip-compressed results response."""
+    job_id: str
+    document_id: Optional[str]
+    body: bytes
+    raw_size: int
+    etag: str
+
+    @classmethod
+    def build(cls, job_id: Any, document_id: Any, results: List[dict]) -> "MaterializedResults":
+        raw = dumps(results)
+        return cls(
+            job_id=str(job_id),
+            document_id=str(document_id) if document_id else None,
+            body=gzip.compress(raw, compresslevel=GZIP_LEVEL, mtime=0),
+            raw_size=len(raw),
+            etag=f'"{hashlib.sha1(raw).hexdigest()[:20]}"',
+        )
+
+    def json_bytes(self) -> bytes:
+        """The uncompressed JSON body, for clients that don't accept gzip."""
+        return gzip.decompress(self.body)
+
+
+class ResultsCache:
+    """LRU cache of materialized results bounded by compressed size."""
+
+    def __init__(self, max_bytes: int = RESULTS_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, MaterializedResults]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, job_id: Any) -> Optional[MaterializedResults]:
+        with self._lock:
+            entry = self._entries.get(str(job_id))
+            if entry is not None:
+                self._entries.move_to_end(entry.job_id)
+        CACHE_REQUESTS.labels(cache="results", result="hit" if entry is not None else "miss").inc()
+        return entry
+
+    def put(self, entry: MaterializedResults) -> None:
+        if len(entry.body) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(entry.job_id, None)
+            if old is not None:
+                self._size -= len(old.body)
+            self._entries[entry.job_id] = entry
+            self._size += len(entry.body)
+            while self._size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted.body)
+
+    def invalidate_job(self, job_id: Any) -> None:
+        with self._lock:
+            entry = self._entries.pop(str(job_id), None)
+            if entry is not None:
+                self._size -= len(entry.body)
+
+    def invalidate_document(self, document_id: Any) -> None:
+        """Drop the results of every cached job of a document."""
+        document_id = str(document_id)
+        with self._lock:
+            for job_id in [k for k, v in self._entries.items() if v.document_id == document_id]:
+                self._size -= len(self._entries.pop(job_id).body)
+
+    def on_job_event(self, event: JobEvent) -> None:
+        """Event bus listener: a job that publishes events again is being reprocessed."""
+        self.invalidate_job(event.job_id)
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+# Process-wide cache of completed job results
+results_cache = ResultsCache()
+event_bus.add_listener(results_cache.on_job_event)
@@ -0,0 +1,173 @@
+"""
+In-memory cache for document and job status responses.
+
+Status endpoints are polled far more often than jobs change. Each cached
+entry carries an ETag derived from the job's progress, so a poller that
+sends If-None-Match gets a 304 without touching the database, and a poller
+that asks to wait is parked until the job publishes a progress event (see
+`events.event_bus`) or the wait runs out.
+
+Entries expire after a short TTL as a safety net for status changes that
+don't go through the event bus.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Set, Tuple
+from uuid import UUID
+
+from .events import JobEvent, event_bus
+from .metrics import CACHE_REQUESTS
+
+logger = logging.getLogger(__name__)
+
+STATUS_CACHE_TTL = float(os.environ.get("STATUS_CACHE_TTL", "5"))
+STATUS_CACHE_MAX_ENTRIES = 5000
+MAX_LONG_POLL_WAIT = 60.0
+
+
+def _normalize_id(value: Any) -> str:
+    try:
+        return str(UUID(str(value)))
+    except ValueError:
+        return str(value)
+
+
+def document_key(document_id: Any) -> str:
+    return f"document:{_normalize_id(document_id)}"
+
+
+def document_status_key(document_id: Any) -> str:
+    return f"document-status:{_normalize_id(document_id)}"
+
+
+def job_key(job_id: Any) -> str:
+    return f"job:{_normalize_id(job_id)}"
+
+
+def make_etag(version: Any) -> str:
+    """Build a weak ETag from a JSON-serializable version value."""
+    digest = hashlib.sha1(json.dumps(version, sort_keys=True, default=str).encode()).hexdigest()
+    return f'W/"{digest[:20]}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Check an If-None-Match header value against an ETag."""
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    # Weak comparison: ignore the W/ prefix on either side
+    bare = etag[2:] if etag.startswith("W/") else etag
+    return "*" in candidates or any((tag[2:] if tag.startswith("W/") else tag) == bare for tag in candidates)
+
+
+class StatusCache:
+    """Status payloads keyed by document/job with ETags and change notification."""
+
+    def __init__(self, ttl: float = STATUS_CACHE_TTL, max_entries: int = STATUS_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[float, str, Dict[str, Any]]]" = OrderedDict()
+        self._waiters: Dict[str, Set[Tuple[asyncio.AbstractEventLoop, asyncio.Event]]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Tuple[str, Dict[str, Any]]]:
+        """Return (etag, payload) for a fresh entry, or None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                CACHE_REQUESTS.labels(cache="status", result="miss").inc()
+                return None
+            expires, etag, payload = entry
+            if expires < time.monotonic():
+                del self._entries[key]
+                CACHE_REQUESTS.labels(cache="status", result="miss").inc()
+                return None
+            self._entries.move_to_end(key)
+            CACHE_REQUESTS.labels(cache="status", result="hit").inc()
+            return etag, payload
+
+    def put(self, key: str, payload: Dict[str, Any], version: Any = None) -> str:
+        """
+        Store a payload and return its ETag.
+
+        Args:
+            key: Cache key (see `document_key` / `job_key`)
+            payload: Response body
+            version: Value the ETag is derived from (defaults to the payload)
+        """
+        etag = make_etag(payload if version is None else version)
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, etag, payload)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return etag
+
+    def invalidate(self, *keys: str) -> None:
+        """Drop entries and wake anyone long-polling on them. Safe from any thread."""
+        with self._lock:
+            waiters = []
+            for key in keys:
+                self._entries.pop(key, None)
+                waiters.extend(self._waiters.get(key, ()))
+
+        for loop, changed in waiters:
+            if loop.is_closed():
+                continue
+            try:
+                running = asyncio.get_running_loop()
+            except RuntimeError:
+                running = None
+            if loop is running:
+                changed.set()
+            else:
+                loop.call_soon_threadsafe(changed.set)
+
+    def on_job_event(self, event: JobEvent) -> None:
+        """Event bus listener: a job progressed, so its cached status is stale."""
+        keys = [job_key(event.job_id)]
+        if event.data.get("document_id"):
+            keys += [document_key(event.data["document_id"]), document_status_key(event.data["document_id"])]
+        self.invalidate(*keys)
+
+    async def wait_for_change(self, key: str, timeout: float) -> bool:
+        """
+        Wait until `key` is invalidated.
+
+        Returns immediately if the entry is already gone, so a change that
+        lands between reading the cache and calling this isn't missed.
+
+        Returns:
+            True if it changed, False if the timeout expired first
+        """
+        if timeout <= 0:
+            return False
+        changed = asyncio.Event()
+        waiter = (asyncio.get_running_loop(), changed)
+        with self._lock:
+            if key not in self._entries:
+                return True
+            self._waiters.setdefault(key, set()).add(waiter)
+        try:
+            await asyncio.wait_for(changed.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            with self._lock:
+                waiters = self._waiters.get(key)
+                if waiters:
+                    waiters.discard(waiter)
+                    if not waiters:
+                        del self._waiters[key]
+
+
+# Process-wide cache, kept current by job progress events
+status_cache = StatusCache()
+event_bus.add_listener(status_cache.on_job_event)
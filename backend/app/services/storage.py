@@ -0,0 +1,132 @@
+"""
+S3 transfer helpers for result storage.
+
+Uploads and downloads go through boto3's managed transfer so large files are
+split into parts and moved concurrently over the shared client's connection
+pool; small objects still take a single request.
+"""
+from functools import lru_cache
+from io import BytesIO
+import logging
+import os
+import threading
+from typing import Any, Callable, Dict, Optional, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+MB = 1024 * 1024
+
+
+@lru_cache(maxsize=None)
+def transfer_config():
+    """Managed transfer settings, built on first use so boto3 isn't imported at startup."""
+    from boto3.s3.transfer import TransferConfig
+
+    return TransferConfig(
+        multipart_threshold=int(os.getenv("S3_MULTIPART_THRESHOLD_MB", "8")) * MB,
+        multipart_chunksize=int(os.getenv("S3_MULTIPART_CHUNKSIZE_MB", "8")) * MB,
+        max_concurrency=int(os.getenv("S3_MAX_CONCURRENCY", "10")),
+        use_threads=True,
+    )
+
+
+def upload_bytes(
+    s3_client,
+    bucket: str,
+    key: str,
+    data: bytes,
+    content_type: Optional[str] = None,
+    extra_args: Optional[Dict[str, Any]] = None,
+) -> None:
+    """Upload bytes to S3 with the managed transfer (multipart for large payloads)."""
+    args = dict(extra_args or {})
+    if content_type:
+        args["ContentType"] = content_type
+    s3_client.upload_fileobj(
+        Fileobj=BytesIO(data),
+        Bucket=bucket,
+        Key=key,
+        ExtraArgs=args or None,
+        Config=transfer_config(),
+    )
+
+
+def download_bytes(s3_client, bucket: str, key: str) -> bytes:
+    """Download an S3 object into memory with the managed transfer (ranged parts for large objects)."""
+    buffer = BytesIO()
+    s3_client.download_fileobj(Bucket=bucket, Key=key, Fileobj=buffer, Config=transfer_config())
+    return buffer.getvalue()
+
+
+# Buckets known to exist. Filled at startup and on first use, cleared for a
+# bucket when S3 reports it missing, so the head_bucket round-trip is only
+# paid once per process instead of on every request.
+_ready_buckets: set = set()
+_ready_buckets_lock = threading.Lock()
+
+
+def _is_missing_bucket_error(err: Exception) -> bool:
+    import botocore.exceptions
+
+    if isinstance(err, botocore.exceptions.ClientError):
+        return err.response.get("Error", {}).get("Code", "") in ("404", "NoSuchBucket")
+    # upload_fileobj/download_fileobj wrap the ClientError in their own exception types
+    return "NoSuchBucket" in str(err)
+
+
+def ensure_bucket(s3_client, bucket: str, region: Optional[str] = None) -> None:
+    """Idempotently create the bucket if it doesn't exist.
+
+    Works for both real AWS S3 and LocalStack. The result is cached, so only
+    the first call per bucket talks to S3. If the check fails for any reason
+    other than a missing bucket (e.g. invalid credentials), the original error
+    is re-raised so we don't mask credentials issues.
+    """
+    if bucket in _ready_buckets:
+        return
+
+    import botocore.exceptions
+
+    with _ready_buckets_lock:
+        if bucket in _ready_buckets:
+            return
+        try:
+            s3_client.head_bucket(Bucket=bucket)
+        except botocore.exceptions.ClientError as err:  # bucket missing or forbidden
+            if not _is_missing_bucket_error(err):
+                # Any other error (e.g., invalid credentials) should bubble up
+                raise
+            create_kwargs = {"Bucket": bucket}
+            if region and region != "us-east-1":
+                create_kwargs["CreateBucketConfiguration"] = {"LocationConstraint": region}
+            s3_client.create_bucket(**create_kwargs)
+            logger.info(f"Created S3 bucket {bucket}")
+        _ready_buckets.add(bucket)
+
+
+def forget_bucket(bucket: str) -> None:
+    """Drop a bucket from the readiness cache so the next use re-checks it."""
+    with _ready_buckets_lock:
+        _ready_buckets.discard(bucket)
+
+
+def with_bucket(s3_client, bucket: str, region: Optional[str], operation: Callable[[], T]) -> T:
+    """
+    Run an S3 operation against a bucket that is ensured to exist.
+
+    If S3 reports the bucket missing (e.g. it was deleted after the cache was
+    filled), the cache entry is dropped, the bucket re-created and the
+    operation retried once.
+    """
+    ensure_bucket(s3_client, bucket, region)
+    try:
+        return operation()
+    except Exception as err:
+        if not _is_missing_bucket_error(err):
+            raise
+        logger.warning(f"S3 bucket {bucket} disappeared, re-creating it")
+        forget_bucket(bucket)
+        ensure_bucket(s3_client, bucket, region)
+        return operation()
@@ -0,0 +1,446 @@
+"""
+Lightweight tracing with OpenTelemetry-compatible spans.
+
+A document's life - upload, render, model calls, persistence, export - is
+recorded as one trace. Spans carry W3C trace/span IDs and job/page
+attributes, and are exported in the OTLP/JSON format, so the output can be
+loaded by any OpenTelemetry collector (e.g. its `otlpjsonfile` receiver) or
+sent straight to an OTLP/HTTP endpoint.
+
+The current span lives in a context variable. Tasks created with
+asyncio.create_task and calls made through asyncio.to_thread inherit it;
+plain threads and executors need `bind_context`. Work that happens in a
+later request (processing an uploaded document, exporting a finished job)
+joins the document's trace through the `traceparent` stored on the
+Document and ExtractionJob rows, and links back to the request's span.
+
+Finished spans are queued and exported in batches from a background
+thread, so exporting never blocks the event loop.
+
+Configuration (environment):
+    TRACING_EXPORTER            "" (off), "file", "otlp" or "package.module:ExporterClass"
+    TRACING_FILE                file for the file exporter (default traces.jsonl)
+    OTEL_EXPORTER_OTLP_ENDPOINT base URL for the otlp exporter (default http://localhost:4318)
+    OTEL_SERVICE_NAME           service.name resource attribute (default doctranscribe)
+    TRACING_BATCH_SIZE          spans per export batch (default 256)
+    TRACING_FLUSH_INTERVAL      seconds between background exports (default 5)
+"""
+import atexit
+import contextvars
+import functools
+import importlib
+import json
+import logging
+import os
+import queue
+import secrets
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+TRACING_EXPORTER = os.environ.get("TRACING_EXPORTER", "")
+TRACING_FILE = os.environ.get("TRACING_FILE", "traces.jsonl")
+OTLP_ENDPOINT = os.environ.get("OTEL_EXPORTER_OTLP_ENDPOINT", "http://localhost:4318")
+SERVICE_NAME = os.environ.get("OTEL_SERVICE_NAME", "doctranscribe")
+TRACING_BATCH_SIZE = int(os.environ.get("TRACING_BATCH_SIZE", "256"))
+TRACING_FLUSH_INTERVAL = float(os.environ.get("TRACING_FLUSH_INTERVAL", "5"))
+
+# OTLP span kinds and status codes
+KIND_INTERNAL, KIND_SERVER, KIND_CLIENT = 1, 2, 3
+STATUS_UNSET, STATUS_OK, STATUS_ERROR = 0, 1, 2
+
+_current_span: contextvars.ContextVar[Optional["Span"]] = contextvars.ContextVar("current_span", default=None)
+
+
+def format_traceparent(trace_id: str, span_id: str) -> str:
+    return f"00-{trace_id}-{span_id}-01"
+
+
+def parse_traceparent(value: Optional[str]) -> Optional[Tuple[str, str]]:
+    """Return (trace ID, span ID) from a W3C traceparent header, or None if it is invalid."""
+    if not value:
+        return None
+    parts = value.strip().split("-")
+    if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None
+    try:
+        int(parts[1], 16), int(parts[2], 16)
+    except ValueError:
+        return None
+    if parts[1] == "0" * 32 or parts[2] == "0" * 16:
+        return None
+    return parts[1], parts[2]
+
+
+def trace_id_of(traceparent: Optional[str]) -> Optional[str]:
+    """Trace ID of a stored traceparent, to look the trace up in a tracing backend."""
+    parsed = parse_traceparent(traceparent)
+    return parsed[0] if parsed else None
+
+
+class Span:
+    """One timed operation within a trace."""
+
+    __slots__ = ("name", "trace_id", "span_id", "parent_span_id", "kind", "start_ns", "end_ns",
+                 "attributes", "events", "links", "status_code", "status_message")
+
+    def __init__(self, name: str, trace_id: str, parent_span_id: Optional[str] = None, kind: int = KIND_INTERNAL,
+                 attributes: Optional[Dict[str, Any]] = None, links: Sequence[Tuple[str, str]] = ()):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent_span_id = parent_span_id
+        self.kind = kind
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.attributes: Dict[str, Any] = dict(attributes or {})
+        self.events: List[Tuple[int, str, Dict[str, Any]]] = []
+        self.links = list(links)
+        self.status_code = STATUS_UNSET
+        self.status_message = ""
+
+    @property
+    def traceparent(self) -> str:
+        return format_traceparent(self.trace_id, self.span_id)
+
+    @property
+    def duration_ms(self) -> Optional[float]:
+        return None if self.end_ns is None else (self.end_ns - self.start_ns) / 1e6
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        if value is not None:
+            self.attributes[key] = value
+
+    def set_attributes(self, attributes: Dict[str, Any]) -> None:
+        for key, value in attributes.items():
+            self.set_attribute(key, value)
+
+    def add_event(self, name: str, attributes: Optional[Dict[str, Any]] = None) -> None:
+        self.events.append((time.time_ns(), name, dict(attributes or {})))
+
+    def record_exception(self, error: BaseException) -> None:
+        self.add_event("exception", {"exception.type": type(error).__name__, "exception.message": str(error)})
+        self.status_code = STATUS_ERROR
+        self.status_message = str(error)
+
+    def end(self) -> None:
+        if self.end_ns is None:
+            self.end_ns = time.time_ns()
+            _processor.on_end(self)
+
+    def to_otlp(self) -> Dict[str, Any]:
+        """The span as an OTLP/JSON span object."""
+        data = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": self.kind,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns or self.start_ns),
+            "attributes": _otlp_attributes(self.attributes),
+            "status": {"code": self.status_code, **({"message": self.status_message} if self.status_message else {})},
+        }
+        if self.parent_span_id:
+            data["parentSpanId"] = self.parent_span_id
+        if self.events:
+            data["events"] = [
+                {"timeUnixNano": str(ts), "name": name, "attributes": _otlp_attributes(attrs)}
+                for ts, name, attrs in self.events
+            ]
+        if self.links:
+            data["links"] = [{"traceId": trace_id, "spanId": span_id} for trace_id, span_id in self.links]
+        return data
+
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    if isinstance(value, (list, tuple)):
+        return {"arrayValue": {"values": [_otlp_value(v) for v in value]}}
+    return {"stringValue": str(value)}
+
+
+def _otlp_attributes(attributes: Dict[str, Any]) -> List[Dict[str, Any]]:
+    return [{"key": key, "value": _otlp_value(value)} for key, value in attributes.items()]
+
+
+def otlp_request(spans: Sequence[Span]) -> Dict[str, Any]:
+    """Wrap spans in an OTLP ExportTraceServiceRequest."""
+    return {
+        "resourceSpans": [{
+            "resource": {"attributes": _otlp_attributes({"service.name": SERVICE_NAME})},
+            "scopeSpans": [{"scope": {"name": "doctranscribe"}, "spans": [span.to_otlp() for span in spans]}],
+        }]
+    }
+
+
+class SpanExporter:
+    """Receives batches of finished spans. Subclass and override `export`."""
+
+    def export(self, spans: Sequence[Span]) -> None:
+        raise NotImplementedError
+
+    def shutdown(self) -> None:
+        pass
+
+
+class FileSpanExporter(SpanExporter):
+    """Appends each batch as one OTLP/JSON line, the layout the collector's otlpjsonfile receiver reads."""
+
+    def __init__(self, path: str = TRACING_FILE):
+        self.path = path
+
+    def export(self, spans: Sequence[Span]) -> None:
+        line = json.dumps(otlp_request(spans), separators=(",", ":"))
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+
+class OTLPHttpSpanExporter(SpanExporter):
+    """Posts batches to an OTLP/HTTP endpoint as JSON."""
+
+    def __init__(self, endpoint: str = OTLP_ENDPOINT, timeout: float = 10.0):
+        import httpx
+
+        self.url = endpoint.rstrip("/") + "/v1/traces"
+        self._client = httpx.Client(timeout=timeout)
+
+    def export(self, spans: Sequence[Span]) -> None:
+        self._client.post(self.url, json=otlp_request(spans)).raise_for_status()
+
+    def shutdown(self) -> None:
+        self._client.close()
+
+
+class InMemorySpanExporter(SpanExporter):
+    """Keeps exported spans in a list, for tests and debugging."""
+
+    def __init__(self):
+        self.spans: List[Span] = []
+
+    def export(self, spans: Sequence[Span]) -> None:
+        self.spans.extend(spans)
+
+
+class BatchSpanProcessor:
+    """Queues finished spans and exports them from a background thread."""
+
+    def __init__(self, batch_size: int = TRACING_BATCH_SIZE, interval: float = TRACING_FLUSH_INTERVAL,
+                 max_queue: int = 10000):
+        self.exporter: Optional[SpanExporter] = None
+        self.batch_size = batch_size
+        self.interval = interval
+        self._queue: "queue.Queue[Span]" = queue.Queue(max_queue)
+        self._export_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.dropped = 0
+
+    def set_exporter(self, exporter: Optional[SpanExporter]) -> None:
+        self.flush()
+        with self._export_lock:
+            if self.exporter is not None:
+                self.exporter.shutdown()
+            self.exporter = exporter
+        if exporter is not None and self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="span-exporter", daemon=True)
+            self._thread.start()
+
+    def on_end(self, span: Span) -> None:
+        if self.exporter is None:
+            return
+        try:
+            self._queue.put_nowait(span)
+        except queue.Full:
+            self.dropped += 1
+            return
+        if self._queue.qsize() >= self.batch_size:
+            self._wake.set()
+
+    def flush(self) -> None:
+        """Export everything queued so far, on the calling thread."""
+        while self._export_batch():
+            pass
+
+    def _export_batch(self) -> bool:
+        batch = []
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        if not batch:
+            return False
+        with self._export_lock:
+            if self.exporter is None:
+                return False
+            try:
+                self.exporter.export(batch)
+            except Exception as e:
+                logger.warning(f"Could not export {len(batch)} spans: {str(e)}")
+        return True
+
+    def _run(self) -> None:
+        while True:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            self.flush()
+
+
+_processor = BatchSpanProcessor()
+
+
+def load_exporter(name: str = TRACING_EXPORTER) -> Optional[SpanExporter]:
+    """Build the exporter named by TRACING_EXPORTER."""
+    if not name:
+        return None
+    if name == "file":
+        return FileSpanExporter()
+    if name == "otlp":
+        return OTLPHttpSpanExporter()
+    module_name, _, class_name = name.partition(":")
+    return getattr(importlib.import_module(module_name), class_name)()
+
+
+def set_exporter(exporter: Optional[SpanExporter]) -> None:
+    """Replace the exporter; None turns exporting off."""
+    _processor.set_exporter(exporter)
+
+
+def flush() -> None:
+    _processor.flush()
+
+
+def configure() -> None:
+    """Set up the exporter from the environment (called at startup)."""
+    try:
+        exporter = load_exporter()
+    except Exception as e:
+        logger.error(f"Could not load span exporter {TRACING_EXPORTER!r}: {str(e)}")
+        return
+    if exporter is not None:
+        set_exporter(exporter)
+        logger.info(f"Exporting trace spans with {type(exporter).__name__}")
+
+
+atexit.register(flush)
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+def current_traceparent() -> Optional[str]:
+    """traceparent of the current span, to store or send along."""
+    span = _current_span.get()
+    return span.traceparent if span else None
+
+
+@contextmanager
+def span(name: str, attributes: Optional[Dict[str, Any]] = None, parent: Optional[str] = None,
+         kind: int = KIND_INTERNAL) -> Iterator[Span]:
+    """
+    Run the enclosed block in a new span.
+
+    Args:
+        name: Span name, e.g. "page.process"
+        attributes: Initial attributes
+        parent: traceparent to continue instead of the current span; the
+            current span, if any, is then added as a link
+        kind: OTLP span kind
+    """
+    current = _current_span.get()
+    links: List[Tuple[str, str]] = []
+    remote = parse_traceparent(parent)
+    if remote:
+        trace_id, parent_span_id = remote
+        if current is not None and current.span_id != parent_span_id:
+            links.append((current.trace_id, current.span_id))
+    elif current is not None:
+        trace_id, parent_span_id = current.trace_id, current.span_id
+    else:
+        trace_id, parent_span_id = secrets.token_hex(16), None
+
+    new_span = Span(name, trace_id, parent_span_id, kind, attributes, links)
+    token = _current_span.set(new_span)
+    try:
+        yield new_span
+    except BaseException as e:
+        new_span.record_exception(e)
+        raise
+    finally:
+        _current_span.reset(token)
+        new_span.end()
+
+
+def bind_context(function: Callable[..., Any]) -> Callable[..., Any]:
+    """Wrap `function` to run in a copy of the caller's context, e.g. as a thread target."""
+    context = contextvars.copy_context()
+
+    def run(*args, **kwargs):
+        return context.run(function, *args, **kwargs)
+    return run
+
+
+def traced(name: str, attributes: Optional[Callable[..., Dict[str, Any]]] = None,
+           parent: Optional[Callable[..., Optional[str]]] = None):
+    """
+    Decorator running an async function in a span.
+
+    Args:
+        name: Span name
+        attributes: Called with the function's arguments, returns span attributes
+        parent: Called with the function's arguments, returns a traceparent to continue
+    """
+    def decorate(function):
+        @functools.wraps(function)
+        async def wrapper(*args, **kwargs):
+            with span(
+                name,
+                attributes(*args, **kwargs) if attributes else None,
+                parent=parent(*args, **kwargs) if parent else None,
+            ):
+                return await function(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+class TracingMiddleware:
+    """ASGI middleware opening a server span per HTTP request and returning its traceparent."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        headers = dict(scope.get("headers") or [])
+        incoming = headers.get(b"traceparent", b"").decode("latin-1") or None
+        method = scope.get("method", "GET")
+        attributes = {"http.request.method": method, "url.path": scope.get("path", "")}
+
+        with span(f"{method} {scope.get('path', '')}", attributes, parent=incoming, kind=KIND_SERVER) as server_span:
+            async def send_with_traceparent(message):
+                if message["type"] == "http.response.start":
+                    status = message["status"]
+                    server_span.set_attribute("http.response.status_code", status)
+                    if status >= 500:
+                        server_span.status_code = STATUS_ERROR
+                    message = {**message, "headers": [*message.get("headers", []),
+                                                      (b"traceparent", server_span.traceparent.encode())]}
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_with_traceparent)
+            finally:
+                route = scope.get("route")
+                if route is not None and getattr(route, "path", None):
+                    server_span.name = f"{method} {route.path}"
+                    server_span.set_attribute("http.route", route.path)
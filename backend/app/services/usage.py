@@ -0,0 +1,122 @@
+"""
+Token and latency accounting for model calls.
+
+Each model request made while extracting a page is stored as a ModelCall
+row with its input, cached and output tokens, estimated cost and a split of
+where the time went (queue, render, encode, network, parse). The rollups
+here aggregate those rows per job, user, day or model for the usage
+endpoint and `usage_report.py`, including the prompt cache hit rate
+(cached / input tokens).
+"""
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional
+from uuid import UUID
+
+from sqlalchemy import func
+from sqlmodel import Session, select
+
+from ..models import ModelCall
+from .prompts import cache_hit_rate
+
+GROUP_BY = {
+    "job": ModelCall.job_id,
+    "user": ModelCall.user_id,
+    "day": func.date(ModelCall.created_at),
+    "model": ModelCall.model,
+}
+
+_SUMMED = (
+    "input_tokens", "cached_tokens", "output_tokens", "cost_usd",
+    "queue_ms", "render_ms", "encode_ms", "network_ms", "parse_ms", "latency_ms",
+)
+
+
+def record_model_calls(
+    session: Session, calls: Iterable[Dict[str, Any]], job_id: UUID,
+    document_id: Optional[UUID] = None, user_id: Optional[UUID] = None
+) -> int:
+    """
+    Add ModelCall rows for calls collected by CascadeStats (not committed).
+
+    Returns:
+        Number of rows added
+    """
+    count = 0
+    for call in calls:
+        session.add(ModelCall(job_id=job_id, document_id=document_id, user_id=user_id, **call))
+        count += 1
+    return count
+
+
+def usage_rollup(
+    session: Session, group_by: str = "job", job_id: Optional[UUID] = None, user_id: Optional[UUID] = None,
+    since: Optional[datetime] = None, until: Optional[datetime] = None
+) -> List[Dict[str, Any]]:
+    """
+    Sum token usage, cost and latency of model calls.
+
+    Args:
+        group_by: "job", "user", "day" or "model"
+        job_id, user_id: Optional filters
+        since, until: Optional created_at range (until is exclusive)
+
+    Returns:
+        One dict per group, largest cost first
+    """
+    if group_by not in GROUP_BY:
+        raise ValueError(f"Unknown group_by {group_by!r}, expected one of {', '.join(GROUP_BY)}")
+    key = GROUP_BY[group_by].label("key")
+    query = select(
+        key,
+        func.count().label("calls"),
+        func.count(ModelCall.error).label("errors"),
+        *(func.sum(getattr(ModelCall, name)).label(name) for name in _SUMMED),
+    )
+    if job_id is not None:
+        query = query.where(ModelCall.job_id == job_id)
+    if user_id is not None:
+        query = query.where(ModelCall.user_id == user_id)
+    if since is not None:
+        query = query.where(ModelCall.created_at >= since)
+    if until is not None:
+        query = query.where(ModelCall.created_at < until)
+    query = query.group_by(key).order_by(func.sum(ModelCall.cost_usd).desc())
+
+    rows = []
+    for row in session.exec(query).all():
+        data = row._asdict()
+        rows.append({
+            group_by: str(data["key"]) if data["key"] is not None else None,
+            "calls": data["calls"],
+            "errors": data["errors"],
+            "input_tokens": data["input_tokens"] or 0,
+            "cached_tokens": data["cached_tokens"] or 0,
+            "cache_hit_rate": cache_hit_rate(data["input_tokens"] or 0, data["cached_tokens"] or 0),
+            "output_tokens": data["output_tokens"] or 0,
+            "cost_usd": round(data["cost_usd"] or 0.0, 6),
+            **{name: round(data[name] or 0.0, 1) for name in _SUMMED if name.endswith("_ms")},
+        })
+    return rows
+
+
+def job_usage(session: Session, job_id: UUID) -> Dict[str, Any]:
+    """Totals and per-page breakdown of a job's model calls."""
+    calls = session.exec(
+        select(ModelCall).where(ModelCall.job_id == job_id).order_by(ModelCall.page_number, ModelCall.created_at)
+    ).all()
+    pages: Dict[int, Dict[str, Any]] = {}
+    for call in calls:
+        page = pages.setdefault(call.page_number, {"page": call.page_number, "calls": []})
+        page["calls"].append({
+            "model": call.model,
+            "kind": call.kind,
+            "prompt_version": call.prompt_version,
+            "input_tokens": call.input_tokens,
+            "cached_tokens": call.cached_tokens,
+            "output_tokens": call.output_tokens,
+            "cost_usd": round(call.cost_usd, 6),
+            **{name: round(getattr(call, name), 1) for name in _SUMMED if name.endswith("_ms")},
+            "error": call.error,
+        })
+    totals = usage_rollup(session, "job", job_id=job_id)
+    return {"job_id": str(job_id), "totals": totals[0] if totals else None, "pages": list(pages.values())}
@@ -0,0 +1,114 @@
+"""
+Short-lived in-process cache of authenticated users.
+
+Every authenticated request decodes its JWT and then needs the User row. A
+token is reused for many requests, so the user is cached for a few seconds
+under the token's subject and ID (`jti`) and handed out without a database
+query. Any update or delete of a User flushed in this process - a role
+change, deactivation, password reset - drops that user's entries at once;
+other processes pick such changes up when the TTL runs out.
+
+Configuration (environment):
+    AUTH_USER_CACHE_TTL   seconds a user stays cached (default 30, 0 disables)
+    AUTH_USER_CACHE_MAX   maximum number of cached tokens (default 10000)
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Set, Tuple
+
+from sqlalchemy import event
+
+from ..models import User
+from .metrics import CACHE_REQUESTS
+
+AUTH_USER_CACHE_TTL = float(os.environ.get("AUTH_USER_CACHE_TTL", "30"))
+AUTH_USER_CACHE_MAX = int(os.environ.get("AUTH_USER_CACHE_MAX", "10000"))
+
+_USER_FIELDS = ("id", "email", "name", "is_active", "role", "password", "created_at")
+
+
+class UserCache:
+    """TTL cache of user snapshots keyed by (subject, token ID)."""
+
+    def __init__(self, ttl: float = AUTH_USER_CACHE_TTL, max_entries: int = AUTH_USER_CACHE_MAX):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        # (subject, token ID) -> (expiry, user ID, column values)
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[float, str, Dict[str, Any]]]" = OrderedDict()
+        self._keys_by_user: Dict[str, Set[Tuple[str, str]]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, subject: str, token_id: str) -> Optional[User]:
+        """
+        Return a copy of the cached user for a token, if still fresh.
+
+        Each call builds a new, session-less User so requests never share or
+        mutate the same instance.
+        """
+        if self.ttl <= 0:
+            return None
+        key = (subject, token_id)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    self._remove(key)
+                self.misses += 1
+                CACHE_REQUESTS.labels(cache="user", result="miss").inc()
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            data = entry[2]
+        CACHE_REQUESTS.labels(cache="user", result="hit").inc()
+        return User(**data)
+
+    def put(self, subject: str, token_id: str, user: User) -> None:
+        if self.ttl <= 0:
+            return
+        key = (subject, token_id)
+        user_id = str(user.id)
+        data = {field: getattr(user, field) for field in _USER_FIELDS}
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.monotonic() + self.ttl, user_id, data)
+            self._keys_by_user.setdefault(user_id, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def invalidate_user(self, user_id: Any) -> None:
+        """Drop every cached token of a user."""
+        with self._lock:
+            for key in list(self._keys_by_user.get(str(user_id), ())):
+                self._remove(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._keys_by_user.clear()
+
+    def _remove(self, key: Tuple[str, str]) -> None:
+        _, user_id, _ = self._entries.pop(key)
+        keys = self._keys_by_user.get(user_id)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._keys_by_user[user_id]
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+# Process-wide cache used by auth.get_current_user
+user_cache = UserCache()
+
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _drop_changed_user(mapper, connection, target) -> None:
+    """Role, active flag, password or any other change takes effect on the next request."""
+    user_cache.invalidate_user(target.id)
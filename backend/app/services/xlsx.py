@@ -1,16 +1,20 @@
+from __future__ import annotations
+
 from io import BytesIO
 import base64
-from typing import Dict, Any
-
-import pandas as pd
-from openpyxl.styles import PatternFill, Border, Side, Alignment, Font
-from openpyxl.utils import get_column_letter
+from typing import TYPE_CHECKING, Dict, Any
 
 from ..schemas import ExtractionResult
 
+# pandas and openpyxl are imported on first export, not at API startup
+if TYPE_CHECKING:
+    import pandas as pd
+
 
 def to_xlsx_bytes(result: ExtractionResult) -> bytes:
     """Convert ExtractionResult to XLSX bytes (original implementation)"""
+    import pandas as pd
+
     data = [row.model_dump() for row in result.rows]
     df = pd.DataFrame(data)
     buffer = BytesIO()
@@ -32,6 +36,8 @@ class XLSXService:
         Returns:
             Base64 encoded XLSX file
         """
+        import pandas as pd
+
         buffer = BytesIO()
         
         with pd.ExcelWriter(buffer, engine="openpyxl") as writer:
@@ -53,6 +59,8 @@ class XLSXService:
     
     def _add_form_fields_sheet(self, writer: pd.ExcelWriter, form_fields: Dict[str, Any]):
         """Add a sheet with form fields"""
+        import pandas as pd
+
         if not form_fields:
             # Create an empty form fields sheet
             pd.DataFrame({
@@ -72,6 +80,8 @@ class XLSXService:
     
     def _add_table_sheet(self, writer: pd.ExcelWriter, table_data: Dict[str, Any], sheet_name: str):
         """Add a sheet with table data"""
+        import pandas as pd
+
         # If table data has headers and rows
         headers = table_data.get("headers", [])
         rows = table_data.get("rows", [])
@@ -92,6 +102,9 @@ class XLSXService:
     
     def _apply_styling(self, worksheet):
         """Apply professional styling to the worksheet"""
+        from openpyxl.styles import PatternFill, Border, Side, Alignment, Font
+        from openpyxl.utils import get_column_letter
+
         # Define styles
         header_fill = PatternFill(start_color="1F4E78", end_color="1F4E78", fill_type="solid")
         header_font = Font(color="FFFFFF", bold=True, size=12)
@@ -2,6 +2,7 @@
 XLSX export service for generating Excel files from extraction results.
 """
 import logging
+import time
 from datetime import datetime
 from pathlib import Path
 from typing import List, Optional, Dict, Any, Union
@@ -15,6 +16,8 @@ from openpyxl.utils import get_column_letter
 from sqlmodel import Session, select
 
 from ..models import ExtractionJob, ExtractionResult, ProcessingStatus, XLSXExport
+from .metrics import EXPORT_SECONDS
+from .tracing import traced
 
 # Configure logging
 logger = logging.getLogger(__name__)
@@ -24,6 +27,12 @@ EXCEL_DIR = Path("excel_exports")
 EXCEL_DIR.mkdir(exist_ok=True)
 
 
+def _job_trace_context(job_id: UUID, session: Session) -> Optional[str]:
+    """traceparent stored on the job, so the export joins the document's trace."""
+    job = session.get(ExtractionJob, job_id)
+    return job.trace_context if job else None
+
+
 class XLSXExportService:
     """Service for generating Excel files from extraction results."""
     
@@ -82,6 +91,7 @@ class XLSXExportService:
         return clean_content
     
     @staticmethod
+    @traced("export.xlsx", attributes=lambda job_id, session: {"job.id": str(job_id)}, parent=_job_trace_context)
     async def generate_xlsx(job_id: UUID, session: Session) -> XLSXExport:
         """
         Generate an XLSX file from extraction results.
@@ -93,6 +103,8 @@ class XLSXExportService:
         Returns:
             XLSXExport: The XLSX export record
         """
+        start_time = time.perf_counter()
+        
         # Find the extraction job
         job = session.exec(
             select(ExtractionJob).where(ExtractionJob.id == job_id)
@@ -282,6 +294,7 @@ class XLSXExportService:
         session.commit()
         session.refresh(xlsx_export)
         
+        EXPORT_SECONDS.observe(time.perf_counter() - start_time)
         return xlsx_export
     
     @staticmethod
@@ -1,10 +1,12 @@
 """
 Background worker for document processing with OpenAI API.
 """
+import io
 import threading
 import logging
 import uuid
 import os
+from contextlib import ExitStack
 from datetime import datetime
 
 from sqlmodel import select
@@ -12,6 +14,11 @@ from sqlmodel import select
 from .models import Document, ProcessingStatus, ExtractionJob, ExtractionResult
 from .database import get_session
 from .services.openai_service import OpenAIService
+from .services.pdf_service import pdf_page_count
+from .services.metrics import ACTIVE_JOBS
+from .services.events import JOB_COMPLETED, JOB_FAILED, JOB_STARTED, PAGE_COMPLETED, event_bus
+from .services.tracing import bind_context, span
+from .services.usage import record_model_calls
 
 # Setup logging
 logging.basicConfig(level=logging.INFO)
@@ -25,9 +32,12 @@ async def process_document_task(document_id: uuid.UUID) -> None:
     Background task to process a document with real OpenAI API.
     """
     logger.info(f"Starting background processing for document {document_id}")
+    ACTIVE_JOBS.inc()
     
     # Get a new db session for this thread
     db = next(get_session())
+    trace = ExitStack()
+    job_span = None
     
     try:
         # Get document
@@ -35,6 +45,9 @@ async def process_document_task(document_id: uuid.UUID) -> None:
         if not document:
             logger.error(f"Document {document_id} not found")
             return
+        job_span = trace.enter_context(
+            span("job.process", {"document.id": str(document_id)}, parent=document.trace_context)
+        )
         
         # Create a new job
         job = ExtractionJob(
@@ -43,13 +56,15 @@ async def process_document_task(document_id: uuid.UUID) -> None:
             model_name="gpt-4.1",
             status=ProcessingStatus.PROCESSING,
             total_pages=document.total_pages or 1,
-            pages_processed=0
+            pages_processed=0,
+            trace_context=job_span.traceparent
         )
         db.add(job)
         db.commit()
         db.refresh(job)
         
         job_id = job.id
+        job_span.set_attribute("job.id", str(job_id))
         logger.info(f"Created job {job_id} for document {document_id}")
         
         # Update document status
@@ -106,49 +121,64 @@ async def process_document_task(document_id: uuid.UUID) -> None:
         logger.info(f"Initializing OpenAI service with API key: {api_key[:5]}...")
         openai_service = OpenAIService(api_key=api_key)
         
-        # Process the PDF
-        logger.info("Sending PDF to OpenAI service for processing...")
-        result = await openai_service.process_pdf(pdf_content)
-        logger.info(f"Received processing result: {len(result.get('raw_results', []))} pages processed")
-        
-        # Calculate actual number of pages
-        total_pages = result.get("pages_processed", 1)
-        if document.total_pages != total_pages:
+        # Count the pages up front so progress is known while pages stream in
+        total_pages = pdf_page_count(io.BytesIO(pdf_content))
+        if document.total_pages != total_pages or job.total_pages != total_pages:
             document.total_pages = total_pages
-            db.add(document)
-            db.commit()
-            
-            # Update job total pages
             job.total_pages = total_pages
+            db.add(document)
             db.add(job)
             db.commit()
         
-        # Process each page result
-        raw_results = result.get("raw_results", [])
-        for page_result in raw_results:
+        event_bus.publish(
+            job_id, JOB_STARTED,
+            document_id=str(document_id), status="processing",
+            pages_processed=0, total_pages=total_pages
+        )
+        
+        async def store_page(page_result):
+            """Store each page as soon as it's done, so a crash loses at most the page in flight."""
             page_number = page_result.get("page", 1)
-            processing_time = page_result.get("processing_time", 0) / 1000  # Convert tokens to seconds
+            processing_time = page_result.get("processing_time", 0.0)
             
             # Debug log the content
             content = page_result.get("content", {})
             logger.info(f"Content for page {page_number}: {content}")
             
+            # The confidence is the model's own, if it reported one
+            confidence = content.get("overall_confidence") if isinstance(content, dict) else None
+            if not isinstance(confidence, (int, float)):
+                confidence = None
+            
             # Create extraction result
             extraction_result = ExtractionResult(
                 job_id=job_id,
                 page_number=page_number,
                 processing_time=processing_time,
-                confidence_score=0.9,  # OpenAI doesn't provide confidence scores
+                confidence_score=confidence,
                 content=content
             )
             db.add(extraction_result)
+            if page_result.get("call"):
+                record_model_calls(db, [page_result["call"]], job_id, document_id, document.user_id)
             
             # Update job progress
             job.pages_processed = page_number
             db.add(job)
-            db.commit()
+            with span("page.persist", {"page.number": page_number}):
+                db.commit()
             
             logger.info(f"Processed page {page_number}/{total_pages} for document {document_id}")
+            event_bus.publish(
+                job_id, PAGE_COMPLETED,
+                document_id=str(document_id), status="processing", page_number=page_number,
+                pages_processed=page_number, total_pages=total_pages
+            )
+        
+        # Process the PDF
+        logger.info("Sending PDF to OpenAI service for processing...")
+        result = await openai_service.process_pdf(pdf_content, on_page=store_page)
+        logger.info(f"Received processing result: {len(result.get('raw_results', []))} pages processed")
         
         # Mark job as completed
         job.completed_at = datetime.utcnow()
@@ -161,12 +191,19 @@ async def process_document_task(document_id: uuid.UUID) -> None:
         db.commit()
         
         logger.info(f"Completed processing document {document_id}")
+        event_bus.publish(
+            job_id, JOB_COMPLETED,
+            document_id=str(document_id), status="completed",
+            pages_processed=job.pages_processed, total_pages=total_pages
+        )
         
     except Exception as e:
         logger.error(f"Error processing document {document_id}: {str(e)}")
         logger.error(f"Exception details: {type(e).__name__}")
         import traceback
         logger.error(f"Traceback: {traceback.format_exc()}")
+        if job_span is not None:
+            job_span.record_exception(e)
         
         try:
             # Mark document and job as failed
@@ -186,6 +223,8 @@ async def process_document_task(document_id: uuid.UUID) -> None:
                 db.add(job)
                 
             db.commit()
+            if job:
+                event_bus.publish(job.id, JOB_FAILED, document_id=str(document_id), status="failed", error=str(e))
         except Exception as inner_e:
             logger.error(f"Error updating status after failure: {str(inner_e)}")
     finally:
@@ -195,6 +234,8 @@ async def process_document_task(document_id: uuid.UUID) -> None:
         
         # Close db session
         db.close()
+        ACTIVE_JOBS.dec()
+        trace.close()
 
 def start_processing(document_id: uuid.UUID) -> bool:
     """
@@ -225,9 +266,9 @@ def start_processing(document_id: uuid.UUID) -> bool:
         loop.run_until_complete(process_document_task(document_id))
         loop.close()
     
-    # Start background thread
+    # Start background thread, carrying the request's trace context along
     thread = threading.Thread(
-        target=run_async_process,
+        target=bind_context(run_async_process),
         daemon=True
     )
     thread.start()
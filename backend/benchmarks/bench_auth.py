@@ -0,0 +1,154 @@
+#!/usr/bin/env python
+"""
+Benchmark login and authenticated-read latency under concurrency.
+
+Runs the auth router in-process against an in-memory SQLite database and
+drives it with concurrent requests through httpx's ASGI transport:
+
+* authenticated reads (GET /auth/me) with the user cache on and off;
+* logins with bcrypt on the hashing pool and, for comparison, inline on
+  the event loop, while a reader keeps calling /auth/me - the reader's
+  latency shows how much the logins stall everything else.
+
+Run:
+  python benchmarks/bench_auth.py
+  python benchmarks/bench_auth.py --concurrency 32 --reads 2000 --rounds 12
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+from fastapi import FastAPI
+from sqlalchemy.pool import StaticPool
+from sqlmodel import Session, SQLModel, create_engine
+
+from app import auth
+from app.database import get_session
+from app.routers import auth as auth_router
+from app.services.user_cache import user_cache
+
+PASSWORD = "bench-password"
+
+
+def report(name, samples):
+    samples = sorted(samples)
+    p95 = samples[int(len(samples) * 0.95) - 1] if len(samples) >= 20 else samples[-1]
+    print(f"{name:<40} mean {statistics.mean(samples):8.2f} ms   p50 {statistics.median(samples):8.2f} ms   "
+          f"p95 {p95:8.2f} ms   (n={len(samples)})")
+
+
+def build_app():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    SQLModel.metadata.create_all(engine)
+
+    def session():
+        with Session(engine) as s:
+            yield s
+
+    app = FastAPI()
+    app.include_router(auth_router.router)
+    app.dependency_overrides[get_session] = session
+    return app
+
+
+async def timed_request(samples, send):
+    start = time.perf_counter()
+    response = await send()
+    response.raise_for_status()
+    samples.append((time.perf_counter() - start) * 1000)
+
+
+async def run_concurrently(count, concurrency, make_request):
+    samples = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with semaphore:
+            await timed_request(samples, make_request)
+
+    await asyncio.gather(*(one() for _ in range(count)))
+    return samples
+
+
+async def login_storm(client, logins, concurrency):
+    """Run logins concurrently while a reader polls /auth/me; returns (login, read) samples."""
+    token = (await client.post("/auth/login", data={"username": "bench0@example.com", "password": PASSWORD})).json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    read_samples = []
+    done = asyncio.Event()
+
+    async def reader():
+        while not done.is_set():
+            await timed_request(read_samples, lambda: client.get("/auth/me", headers=headers))
+            await asyncio.sleep(0.005)
+
+    reader_task = asyncio.create_task(reader())
+    login_samples = await run_concurrently(logins, concurrency, lambda: client.post(
+        "/auth/login", data={"username": "bench0@example.com", "password": PASSWORD}
+    ))
+    done.set()
+    await reader_task
+    return login_samples, read_samples
+
+
+async def main_async(args):
+    auth.BCRYPT_ROUNDS = args.rounds
+    app = build_app()
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        tokens = []
+        for i in range(args.users):
+            response = await client.post("/auth/register", json={
+                "email": f"bench{i}@example.com", "password": PASSWORD, "name": f"Bench {i}"
+            })
+            tokens.append(response.json()["access_token"])
+
+        def read():
+            token = tokens[read.counter % len(tokens)]
+            read.counter += 1
+            return client.get("/auth/me", headers={"Authorization": f"Bearer {token}"})
+        read.counter = 0
+
+        print(f"bcrypt cost {args.rounds}, {args.users} users, concurrency {args.concurrency}\n")
+
+        user_cache.ttl = 0
+        report("GET /auth/me, no cache", await run_concurrently(args.reads, args.concurrency, read))
+        user_cache.ttl = 30
+        user_cache.clear()
+        report("GET /auth/me, user cache", await run_concurrently(args.reads, args.concurrency, read))
+
+        logins, reads = await login_storm(client, args.logins, args.concurrency)
+        report("POST /auth/login, hashing pool", logins)
+        report("  /auth/me during logins", reads)
+
+        # The previous behaviour: bcrypt on the event loop
+        async def inline_authenticate(db, email, password):
+            return auth.authenticate_user(db, email, password)
+        pooled = auth_router.authenticate_user_async
+        auth_router.authenticate_user_async = inline_authenticate
+        try:
+            logins, reads = await login_storm(client, args.logins, args.concurrency)
+        finally:
+            auth_router.authenticate_user_async = pooled
+        report("POST /auth/login, inline bcrypt", logins)
+        report("  /auth/me during logins", reads)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark login and authenticated reads")
+    parser.add_argument("--concurrency", type=int, default=16, help="Concurrent requests")
+    parser.add_argument("--reads", type=int, default=1000, help="Authenticated reads per mode")
+    parser.add_argument("--logins", type=int, default=32, help="Logins per mode")
+    parser.add_argument("--users", type=int, default=20, help="Distinct users/tokens")
+    parser.add_argument("--rounds", type=int, default=auth.BCRYPT_ROUNDS, help="bcrypt cost factor")
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
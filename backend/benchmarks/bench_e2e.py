@@ -0,0 +1,289 @@
+#!/usr/bin/env python
+"""
+End-to-end throughput benchmark for the handwriting pipeline.
+
+Drives the real /handwriting routes - upload, process, wait for the job,
+results, XLSX export - for a mix of generated documents, against the mock
+OpenAI server (benchmarks/mock_openai.py, started as a subprocess unless
+--mock-url is given). The app runs in this process on a fresh SQLite
+database in a temporary working directory.
+
+Reports:
+* documents per minute and end-to-end document latency;
+* p50/p95/p99 page latency (ExtractionResult.processing_time);
+* peak RSS of this process (app and load generator);
+* DB lock wait: time spent in write statements and commits, which on
+  SQLite is mostly waiting for the database write lock;
+* requests and 429s seen by the mock server.
+
+Rendering needs poppler, as in production.
+
+Run:
+  python benchmarks/bench_e2e.py
+  python benchmarks/bench_e2e.py --docs 40 --mix 1:4,5:2,10:1 --concurrency 8
+  python benchmarks/bench_e2e.py --latency-ms 3000 --sigma 0.8 --rate-limit 0.05 --json
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Tuple
+from uuid import UUID
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import httpx
+
+from mock_openai import add_profile_arguments
+
+TERMINAL_STATUSES = {"completed", "failed"}
+
+
+def percentile(samples: List[float], q: float) -> float:
+    """Nearest-rank percentile; 0 for no samples."""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[max(0, min(len(ordered) - 1, int(round(q / 100 * len(ordered))) - 1))]
+
+
+def parse_mix(value: str) -> List[Tuple[int, int]]:
+    """'1:4,5:2' -> [(pages, weight), ...]"""
+    mix = []
+    for item in value.split(","):
+        pages, _, weight = item.partition(":")
+        mix.append((int(pages), int(weight or 1)))
+    return mix
+
+
+def make_pdf(pages: int) -> bytes:
+    """A scanned-looking form of `pages` pages with scribbled answers."""
+    import io
+    from PIL import Image, ImageDraw
+
+    rng = random.Random(pages)
+    images = []
+    for number in range(pages):
+        image = Image.new("L", (1240, 1754), 245)
+        draw = ImageDraw.Draw(image)
+        draw.text((120, 80), "THE LIVERPOOL SCHOOL FOR THE BLIND", fill=20)
+        for row in range(12):
+            y = 220 + row * 120
+            draw.text((120, y), f"Question {row + 1} (page {number + 1})", fill=30)
+            x = 520
+            for _ in range(rng.randint(4, 10)):
+                points = [(x + i * 6, y + rng.randint(-12, 12)) for i in range(rng.randint(4, 12))]
+                draw.line(points, fill=rng.randint(0, 60), width=3)
+                x = points[-1][0] + 18
+        images.append(image.convert("RGB"))
+    buffer = io.BytesIO()
+    images[0].save(buffer, "PDF", resolution=150, save_all=True, append_images=images[1:])
+    return buffer.getvalue()
+
+
+def start_mock(args) -> subprocess.Popen:
+    command = [
+        sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "mock_openai.py"),
+        "--port", str(args.mock_port), "--latency-ms", str(args.latency_ms), "--sigma", str(args.sigma),
+        "--rate-limit", str(args.rate_limit), "--retry-after-ms", str(args.retry_after_ms),
+        "--output-tokens", str(args.output_tokens), "--illegible", str(args.illegible),
+    ]
+    if args.seed is not None:
+        command += ["--seed", str(args.seed)]
+    process = subprocess.Popen(command)
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            httpx.get(f"http://127.0.0.1:{args.mock_port}/v1/models", timeout=1).raise_for_status()
+            return process
+        except httpx.HTTPError:
+            if process.poll() is not None:
+                break
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError("Mock OpenAI server did not start")
+
+
+class LockWaitRecorder:
+    """
+    Times write statements and the database commit after each flush.
+
+    On SQLite both block while another connection holds the write lock, so
+    their sum is the time the pipeline spent waiting on the database.
+    """
+
+    def __init__(self, engine):
+        from sqlalchemy import event
+        from sqlalchemy.orm import Session as ORMSession
+
+        self.samples: List[float] = []
+        event.listen(engine, "before_cursor_execute", self._before_statement)
+        event.listen(engine, "after_cursor_execute", self._after_statement)
+        event.listen(ORMSession, "before_commit", self._before_commit)
+        event.listen(ORMSession, "after_flush_postexec", self._after_flush)
+        event.listen(ORMSession, "after_commit", self._after_commit)
+
+    def _before_statement(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info["statement_started"] = time.perf_counter()
+
+    def _after_statement(self, conn, cursor, statement, parameters, context, executemany):
+        started = conn.info.pop("statement_started", None)
+        if started is not None and not statement.lstrip().upper().startswith("SELECT"):
+            self.samples.append((time.perf_counter() - started) * 1000)
+
+    def _before_commit(self, session):
+        # Forget autoflushes; only the flush inside this commit counts
+        session.info.pop("flushed_at", None)
+
+    def _after_flush(self, session, flush_context):
+        session.info["flushed_at"] = time.perf_counter()
+
+    def _after_commit(self, session):
+        flushed_at = session.info.pop("flushed_at", None)
+        if flushed_at is not None:
+            self.samples.append((time.perf_counter() - flushed_at) * 1000)
+
+
+async def run_document(client, pdf: bytes, pages: int, results: Dict[str, list]) -> None:
+    start = time.perf_counter()
+    response = await client.post(
+        "/handwriting/upload", files={"file": (f"bench-{pages}p.pdf", pdf, "application/pdf")}
+    )
+    response.raise_for_status()
+    document_id = response.json()["id"]
+
+    response = await client.post(f"/handwriting/documents/{document_id}/process")
+    response.raise_for_status()
+    job_id = response.json()["id"]
+
+    etag, status = None, None
+    while status not in TERMINAL_STATUSES:
+        headers = {"If-None-Match": etag} if etag else {}
+        response = await client.get(f"/handwriting/jobs/{job_id}", params={"wait": 5}, headers=headers)
+        if response.status_code == 200:
+            status = response.json()["status"]
+            etag = response.headers.get("ETag")
+    if status != "completed":
+        results["failed"].append(job_id)
+        return
+
+    (await client.get(f"/handwriting/jobs/{job_id}/results")).raise_for_status()
+    (await client.post(f"/handwriting/jobs/{job_id}/export")).raise_for_status()
+    results["jobs"].append(job_id)
+    results["documents_ms"].append((time.perf_counter() - start) * 1000)
+
+
+async def main_async(args, documents: List[int]) -> Dict[str, float]:
+    from fastapi import FastAPI
+    from sqlmodel import Session, select
+
+    from app.database import create_db_and_tables, engine
+    from app.models import ExtractionResult
+    from app.routers import handwriting
+    from app.services.events import event_bus
+
+    create_db_and_tables()
+    event_bus.bind_loop(asyncio.get_running_loop())
+    lock_wait = LockWaitRecorder(engine)
+    app = FastAPI()
+    app.include_router(handwriting.router)
+
+    pdfs = {pages: make_pdf(pages) for pages in set(documents)}
+    results: Dict[str, list] = {"jobs": [], "failed": [], "documents_ms": []}
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def one(pages):
+        async with semaphore:
+            await run_document(client, pdfs[pages], pages, results)
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        start = time.perf_counter()
+        await asyncio.gather(*(one(pages) for pages in documents))
+        elapsed = time.perf_counter() - start
+
+    with Session(engine) as session:
+        completed = [UUID(job_id) for job_id in results["jobs"]]
+        page_ms = [
+            (seconds or 0) * 1000
+            for seconds in session.exec(
+                select(ExtractionResult.processing_time).where(ExtractionResult.job_id.in_(completed))
+            ).all()
+        ]
+    mock = httpx.get(f"{os.environ['OPENAI_BASE_URL'].rsplit('/v1', 1)[0]}/mock/stats", timeout=5).json()
+
+    return {
+        "documents": len(documents),
+        "pages": sum(documents),
+        "failed": len(results["failed"]),
+        "elapsed_s": round(elapsed, 2),
+        "docs_per_min": round(len(results["jobs"]) / elapsed * 60, 2),
+        "pages_per_min": round(len(page_ms) / elapsed * 60, 2),
+        "document_p50_ms": round(percentile(results["documents_ms"], 50), 1),
+        "document_p95_ms": round(percentile(results["documents_ms"], 95), 1),
+        "page_p50_ms": round(percentile(page_ms, 50), 1),
+        "page_p95_ms": round(percentile(page_ms, 95), 1),
+        "page_p99_ms": round(percentile(page_ms, 99), 1),
+        # ru_maxrss is in KiB on Linux
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "db_lock_wait_total_ms": round(sum(lock_wait.samples), 1),
+        "db_lock_wait_p95_ms": round(percentile(lock_wait.samples, 95), 2),
+        "db_lock_wait_max_ms": round(max(lock_wait.samples, default=0.0), 2),
+        "model_requests": mock["requests"],
+        "rate_limited": mock["rate_limited"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end throughput benchmark against a mock OpenAI server")
+    parser.add_argument("--docs", type=int, default=20, help="Documents to process")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix("1:3,3:2,10:1"),
+                        help="Document mix as pages:weight pairs (default 1:3,3:2,10:1)")
+    parser.add_argument("--concurrency", type=int, default=4, help="Documents in flight")
+    parser.add_argument("--mock-url", help="Use a running mock/compatible server (base URL ending in /v1)")
+    parser.add_argument("--mock-port", type=int, default=8089, help="Port for the spawned mock server")
+    parser.add_argument("--workdir", help="Working directory for the database, uploads and exports (default: temporary)")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    sizes, weights = zip(*args.mix)
+    documents = rng.choices(sizes, weights=weights, k=args.docs)
+
+    # The app reads its configuration at import time
+    workdir = args.workdir or tempfile.mkdtemp(prefix="doctranscribe-bench-")
+    os.chdir(workdir)
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    os.environ["OPENAI_API_KEY"] = "mock"
+    os.environ["OPENAI_BASE_URL"] = args.mock_url or f"http://127.0.0.1:{args.mock_port}/v1"
+    os.environ.setdefault("METRICS_LOOP_LAG_INTERVAL", "0")
+
+    mock = None if args.mock_url else start_mock(args)
+    try:
+        report = asyncio.run(main_async(args, documents))
+    finally:
+        if mock is not None:
+            mock.terminate()
+            mock.wait()
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+    print(f"{report['documents']} documents, {report['pages']} pages, concurrency {args.concurrency}, "
+          f"mock latency {args.latency_ms:.0f} ms (sigma {args.sigma}), 429 rate {args.rate_limit}\n")
+    for key, value in report.items():
+        print(f"{key:<24} {value}")
+    print(f"\nworking directory: {workdir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+"""
+Benchmark page preprocessing (app/services/preprocessing.py) per page.
+
+Times each preprocessing spec on a synthetic 300-DPI form page (slightly
+rotated, with a dark scanner edge and uneven lighting) or on the pages of a
+real PDF, and reports the PNG size sent to the model. The old PIL pipeline
+from simple_pdf_server.preprocess_form_image (per-pixel point() lambda,
+several full-page copies) is included for comparison.
+
+Run:
+  python benchmarks/bench_preprocessing.py
+  python benchmarks/bench_preprocessing.py --pdf uploads/<document id> --dpi 300
+"""
+import argparse
+import io
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageEnhance, ImageOps
+
+from app.services.preprocessing import PreprocessOptions, preprocess_page
+
+SPECS = ["otsu", "sauvola", "deskew", "crop", "otsu,deskew,crop", "sauvola,deskew,crop"]
+
+
+def timed(fn, repeat):
+    """Run fn `repeat` times and return per-call durations in milliseconds."""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def report(name, samples, png_bytes):
+    print(f"{name:<24} mean {statistics.mean(samples):8.1f} ms   p50 {statistics.median(samples):8.1f} ms   "
+          f"max {max(samples):8.1f} ms   png {png_bytes / 1024:8.0f} KiB   (n={len(samples)})")
+
+
+def png_size(image):
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.tell()
+
+
+def synthetic_page(width=2550, height=3300, skew=1.5):
+    """A letter-size form at 300 DPI with lines, 'handwriting' strokes and a shaded corner."""
+    page = Image.new("L", (width, height), 240)
+    draw = ImageDraw.Draw(page)
+    rng = np.random.default_rng(0)
+    for y in range(400, height - 400, 110):
+        draw.line((300, y, width - 300, y), fill=90, width=3)
+        x = 320
+        while x < width - 500:
+            stroke = [(x + i * 6, y - 20 + int(rng.integers(-12, 12))) for i in range(12)]
+            draw.line(stroke, fill=40, width=4)
+            x += int(rng.integers(80, 160))
+    shading = np.linspace(0, 60, width, dtype=np.float32)[None, :]
+    pixels = np.clip(np.asarray(page, dtype=np.float32) - shading, 0, 255).astype(np.uint8)
+    page = Image.fromarray(pixels).rotate(skew, resample=Image.BILINEAR, fillcolor=240)
+    ImageDraw.Draw(page).rectangle((0, 0, 40, height), fill=20)  # scanner edge
+    return page.convert("RGB")
+
+
+def legacy_preprocess(image):
+    """The previous simple_pdf_server.preprocess_form_image."""
+    img = image.copy()
+    img = ImageEnhance.Contrast(img).enhance(1.4)
+    img = ImageEnhance.Sharpness(img).enhance(1.5)
+    threshold_img = img.convert('L').point(lambda x: 0 if x > 200 else 255, '1')
+    enhanced_img = threshold_img.convert('RGB')
+    blended = np.clip(np.array(img) * 0.6 + np.array(enhanced_img) * 0.4, 0, 255).astype(np.uint8)
+    return ImageOps.autocontrast(Image.fromarray(blended), cutoff=2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark page preprocessing")
+    parser.add_argument("--pdf", help="Benchmark on the pages of this PDF instead of a synthetic page")
+    parser.add_argument("--dpi", type=int, default=300, help="Render DPI for --pdf")
+    parser.add_argument("--repeat", type=int, default=5, help="Iterations per page and spec")
+    parser.add_argument("--specs", default=";".join(SPECS), help="Semicolon-separated preprocessing specs")
+    args = parser.parse_args()
+
+    if args.pdf:
+        from pdf2image import convert_from_path
+        pages = convert_from_path(args.pdf, dpi=args.dpi)
+    else:
+        pages = [synthetic_page()]
+    print(f"{len(pages)} page(s), {pages[0].size[0]}x{pages[0].size[1]}")
+
+    report("original", [0.0], sum(png_size(p) for p in pages) / len(pages))
+    samples = [ms for page in pages for ms in timed(lambda: legacy_preprocess(page), args.repeat)]
+    report("legacy PIL pipeline", samples, sum(png_size(legacy_preprocess(p)) for p in pages) / len(pages))
+
+    for spec in args.specs.split(";"):
+        options = PreprocessOptions.parse(spec)
+        samples = [ms for page in pages for ms in timed(lambda: preprocess_page(page, options), args.repeat)]
+        size = sum(png_size(preprocess_page(p, options)[0]) for p in pages) / len(pages)
+        report(spec, samples, size)
+
+
+if __name__ == "__main__":
+    main()
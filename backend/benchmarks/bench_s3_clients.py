@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+"""
+Benchmark S3 client reuse and managed transfers against moto (or LocalStack).
+
+Compares building a boto3 client per request (the old behaviour of
+deps.get_s3_client and routers/results.py) with the shared pooled client,
+and put_object with the TransferConfig-based uploader/downloader.
+
+Run:
+  python benchmarks/bench_s3_clients.py                 # in-process moto
+  python benchmarks/bench_s3_clients.py --localstack    # uses S3_ENDPOINT_URL
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+from contextlib import nullcontext
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import boto3
+
+from app.config import settings
+from app.deps import get_aws_client
+from app.services.storage import download_bytes, upload_bytes
+
+BUCKET = "bench-results"
+
+
+def timed(fn, repeat):
+    """Run fn `repeat` times and return per-call durations in milliseconds."""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def report(name, samples):
+    print(f"{name:<40} mean {statistics.mean(samples):8.2f} ms   p50 {statistics.median(samples):8.2f} ms   "
+          f"max {max(samples):8.2f} ms   (n={len(samples)})")
+
+
+def per_request_client():
+    return boto3.client(
+        "s3",
+        region_name=settings.aws_region,
+        aws_access_key_id=settings.aws_access_key_id,
+        aws_secret_access_key=settings.aws_secret_access_key,
+        endpoint_url=settings.s3_endpoint_url,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark S3 client setup and transfers")
+    parser.add_argument("--localstack", action="store_true", help="Use S3_ENDPOINT_URL instead of moto")
+    parser.add_argument("--repeat", type=int, default=50, help="Iterations for small-object benchmarks")
+    parser.add_argument("--large-mb", type=int, default=32, help="Size of the large-object payload")
+    args = parser.parse_args()
+
+    if args.localstack:
+        context = nullcontext()
+    else:
+        from moto import mock_aws
+        context = mock_aws()
+
+    with context:
+        shared = get_aws_client("s3", settings.s3_endpoint_url)
+        try:
+            shared.create_bucket(Bucket=BUCKET)
+        except shared.exceptions.BucketAlreadyOwnedByYou:
+            pass
+
+        small = b"x" * 4096
+        large = os.urandom(args.large_mb * 1024 * 1024)
+
+        report("client construction only", timed(per_request_client, args.repeat))
+        report("new client + put_object (4 KB)", timed(
+            lambda: per_request_client().put_object(Bucket=BUCKET, Key="small", Body=small), args.repeat))
+        report("shared client + put_object (4 KB)", timed(
+            lambda: shared.put_object(Bucket=BUCKET, Key="small", Body=small), args.repeat))
+
+        large_repeat = max(1, args.repeat // 10)
+        report(f"put_object ({args.large_mb} MB)", timed(
+            lambda: shared.put_object(Bucket=BUCKET, Key="large", Body=large), large_repeat))
+        report(f"upload_bytes ({args.large_mb} MB)", timed(
+            lambda: upload_bytes(shared, BUCKET, "large", large), large_repeat))
+        report(f"get_object ({args.large_mb} MB)", timed(
+            lambda: shared.get_object(Bucket=BUCKET, Key="large")["Body"].read(), large_repeat))
+        report(f"download_bytes ({args.large_mb} MB)", timed(
+            lambda: download_bytes(shared, BUCKET, "large"), large_repeat))
+
+
+if __name__ == "__main__":
+    main()
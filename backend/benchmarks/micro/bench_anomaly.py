@@ -0,0 +1,34 @@
+"""Anomaly detection over 100k rows, per method and all together."""
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.services.anomaly import ALGOS, detect_anomalies
+
+ROWS = 100_000
+
+
+@pytest.fixture(scope="module")
+def frame():
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({
+        "age": rng.normal(12, 3, ROWS).round(),
+        "weight": rng.normal(40, 8, ROWS),
+        "score": rng.gamma(2.0, 10.0, ROWS),
+    })
+    outliers = rng.choice(ROWS, 200, replace=False)
+    df.loc[outliers, "weight"] *= 4
+    return df
+
+
+@pytest.mark.parametrize("method", sorted(ALGOS))
+def test_detect_anomalies_100k(benchmark, frame, method):
+    benchmark.group = "detect_anomalies (100k rows, 3 columns)"
+    result = benchmark.pedantic(detect_anomalies, args=(frame,), kwargs={"methods": [method]}, rounds=3, iterations=1)
+    assert result["is_anomaly"].any()
+
+
+def test_detect_anomalies_100k_all_methods(benchmark, frame):
+    benchmark.group = "detect_anomalies (100k rows, 3 columns)"
+    result = benchmark.pedantic(detect_anomalies, args=(frame,), rounds=1, iterations=1)
+    assert len(result) == ROWS
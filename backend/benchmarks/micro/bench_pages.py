@@ -0,0 +1,32 @@
+"""Per-page image stages: rendering, preprocessing and encoding."""
+import asyncio
+import shutil
+
+import pytest
+
+from app.services.pdf_service import convert_pdf_to_images, encode_image_to_base64
+from app.services.preprocessing import PreprocessOptions, preprocess_page
+
+needs_poppler = pytest.mark.skipif(shutil.which("pdftoppm") is None, reason="rendering needs poppler")
+
+
+@needs_poppler
+@pytest.mark.parametrize("dpi", [150, 200, 300])
+def test_convert_pdf_to_images(benchmark, form_pdf, dpi):
+    benchmark.group = "render (3 pages)"
+    images = benchmark(lambda: asyncio.run(convert_pdf_to_images(form_pdf, max_pages=3, dpi=dpi)))
+    assert len(images) == 3
+
+
+def test_encode_image_to_base64(benchmark, form_page):
+    encoded = benchmark(encode_image_to_base64, form_page)
+    assert encoded
+
+
+# "sauvola,deskew" is what simple_pdf_server.preprocess_form_image runs
+@pytest.mark.parametrize("spec", ["sauvola,deskew", "sauvola,deskew,crop", "otsu"])
+def test_preprocess_page(benchmark, form_page, spec):
+    benchmark.group = "preprocess"
+    options = PreprocessOptions.parse(spec)
+    processed, _ = benchmark(preprocess_page, form_page, options)
+    assert processed.size[0] > 0
@@ -0,0 +1,77 @@
+"""Result handling: file lookup, merging pages, sanitizing and XLSX export."""
+import asyncio
+import random
+import uuid
+from datetime import datetime
+
+import pytest
+from sqlalchemy.pool import StaticPool
+from sqlmodel import Session, SQLModel, create_engine
+
+from app.models import Document, ExtractionJob, ExtractionResult, ProcessingStatus
+from app.services.openai_service import OpenAIService
+from app.services.pdf_service import fuzzy_uuid_match
+from app.services.xlsx_service import XLSXExportService
+
+
+@pytest.fixture(scope="module")
+def uploaded_ids():
+    rng = random.Random(0)
+    return [str(uuid.UUID(int=rng.getrandbits(128), version=4)) for _ in range(10_000)]
+
+
+@pytest.mark.parametrize("case", ["typo", "missing"])
+def test_fuzzy_uuid_match_10k(benchmark, uploaded_ids, case):
+    benchmark.group = "fuzzy_uuid_match (10k files)"
+    target = uploaded_ids[-1]
+    if case == "typo":
+        target = target[:-1] + ("0" if target[-1] != "0" else "1")
+    else:
+        target = str(uuid.uuid4())
+    match = benchmark.pedantic(fuzzy_uuid_match, args=(target, uploaded_ids), rounds=3, iterations=1)
+    assert (match is not None) == (case == "typo")
+
+
+def test_sanitize_data(benchmark, page_content):
+    content = page_content(1, 100)
+    clean = benchmark(XLSXExportService.sanitize_data, content)
+    assert len(clean["questions"]) == 100
+
+
+def test_combine_results_100_pages(benchmark, page_content):
+    service = OpenAIService(api_key=None)
+    pages = [{"page": n, "content": page_content(n, 20), "processing_time": 1.0} for n in range(1, 101)]
+    combined = benchmark(service._combine_results, pages)
+    assert len(combined["questions"]) == 2000
+
+
+@pytest.fixture(scope="module")
+def completed_job(page_content):
+    """A completed job whose export has 10,000 rows: 100 pages of 93 answers and 7 other fields."""
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        document = Document(filename="register.pdf", file_size=1, total_pages=100)
+        session.add(document)
+        session.flush()
+        job = ExtractionJob(document_id=document.id, status=ProcessingStatus.COMPLETED, total_pages=100,
+                            pages_processed=100, started_at=datetime.utcnow(), completed_at=datetime.utcnow())
+        session.add(job)
+        session.flush()
+        for n in range(1, 101):
+            session.add(ExtractionResult(job_id=job.id, page_number=n, content=page_content(n, 93),
+                                         processing_time=1.0, confidence_score=0.9))
+        session.commit()
+        job_id = job.id
+    return engine, job_id
+
+
+def test_generate_xlsx_10k_rows(benchmark, completed_job, export_dir):
+    engine, job_id = completed_job
+
+    def export():
+        with Session(engine) as session:
+            return asyncio.run(XLSXExportService.generate_xlsx(job_id, session)).file_size
+
+    size = benchmark.pedantic(export, rounds=3, iterations=1)
+    assert size > 0
@@ -0,0 +1,89 @@
+"""
+Micro-benchmarks for the CPU-bound pipeline stages, run with pytest-benchmark.
+
+The bench_*.py modules here are only collected when this directory (or one
+of its files) is named on the command line, so a plain `pytest` run of the
+test suite skips them. Every run saved with --benchmark-autosave is stored
+under .benchmarks/ together with the commit it ran on, and later runs can
+be compared against it.
+
+Run (from backend/):
+  python -m pytest benchmarks/micro --benchmark-autosave
+  python -m pytest benchmarks/micro --benchmark-compare --benchmark-compare-fail=mean:10%
+  python -m pytest benchmarks/micro -k xlsx --benchmark-autosave
+  pytest-benchmark compare --group-by=name         # table of all saved runs
+"""
+import sys
+from pathlib import Path
+
+import pytest
+
+HERE = Path(__file__).resolve().parent
+sys.path.insert(0, str(HERE.parent.parent))  # backend/, for `app`
+sys.path.insert(0, str(HERE.parent))  # benchmarks/, for the shared helpers
+
+
+def _requested(config) -> bool:
+    """Whether this directory, or something in it, was named on the command line."""
+    for arg in config.invocation_params.args:
+        arg = str(arg)
+        if arg.startswith("-"):
+            continue
+        path = Path(config.invocation_params.dir, arg.split("::")[0]).resolve()
+        if path == HERE or HERE in path.parents:
+            return True
+    return False
+
+
+def pytest_collect_file(file_path, parent):
+    if file_path.suffix == ".py" and file_path.name.startswith("bench_") and _requested(parent.config):
+        return pytest.Module.from_parent(parent, path=file_path)
+    return None
+
+
+@pytest.fixture(scope="session")
+def form_page():
+    """A letter-size form page rendered at 300 DPI."""
+    from bench_preprocessing import synthetic_page
+    return synthetic_page()
+
+
+@pytest.fixture(scope="session")
+def form_pdf(tmp_path_factory):
+    """A three-page scanned form as a PDF file."""
+    from bench_e2e import make_pdf
+    path = tmp_path_factory.mktemp("pdf") / "form.pdf"
+    path.write_bytes(make_pdf(3))
+    return path
+
+
+@pytest.fixture
+def export_dir(tmp_path, monkeypatch):
+    """Write XLSX exports to a temporary directory."""
+    from app.services import xlsx_service
+    monkeypatch.setattr(xlsx_service, "EXCEL_DIR", tmp_path)
+    return tmp_path
+
+
+@pytest.fixture(scope="session")
+def page_content():
+    """Builds model output for one page, shaped like the real responses."""
+    return _page_content
+
+
+def _page_content(page: int, questions: int) -> dict:
+    return {
+        "form_title": "Admission Register",
+        "document_type": "form",
+        "letterhead": "THE LIVERPOOL SCHOOL FOR THE BLIND",
+        "header": {"institution": "Liverpool School for the Blind", "year": "1912"},
+        "metadata": {"form_id": f"AR-{page}", "version": "2"},
+        "overall_confidence": 0.9,
+        "questions": [
+            {"question": f"Question {i + 1}", "answer": "[ILLEGIBLE]" if i % 17 == 0 else f"Answer {page}-{i}",
+             "confidence": 0.9, "is_handwritten": True, "bbox": [10, 20 + i, 300, 40 + i]}
+            for i in range(questions)
+        ],
+        "form_elements": {"checkboxes": [{"label": "Boarder", "checked": page % 2 == 0}], "signatures": []},
+    }
+
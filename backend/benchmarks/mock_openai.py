@@ -0,0 +1,203 @@
+#!/usr/bin/env python
+"""
+Local stand-in for the OpenAI chat completions API, for benchmarks.
+
+Answers vision requests the way the real API does, so the pipeline can be
+driven end to end without a key or network:
+
+* latency follows a log-normal distribution around a median, split into
+  time to first token and streaming time, for streamed and plain requests;
+* a share of requests is rejected with 429 and a retry-after-ms header,
+  which the SDK honours when it retries;
+* usage reports input tokens estimated from the text and images, cached
+  tokens once a prompt_cache_key has been seen, and output tokens;
+* a share of pages can come back illegible to exercise model escalation.
+
+Point the app at it with OPENAI_BASE_URL=http://127.0.0.1:<port>/v1.
+
+Run:
+  python benchmarks/mock_openai.py --port 8089
+  python benchmarks/mock_openai.py --port 8089 --latency-ms 3000 --sigma 0.8 --rate-limit 0.05
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Set
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+CACHE_BLOCK_TOKENS = 128  # prompt caching works in blocks, from 1024 tokens on
+MIN_CACHED_PROMPT_TOKENS = 1024
+
+
+@dataclass
+class MockProfile:
+    """How the mock server behaves."""
+    latency_ms: float = 1500.0  # median total latency of a request
+    sigma: float = 0.5  # log-normal shape; 0 gives a constant latency
+    first_token_share: float = 0.3  # share of the latency spent before the first token
+    rate_limit: float = 0.0  # share of requests answered with 429
+    retry_after_ms: int = 200
+    image_tokens: int = 765  # input tokens per high-detail page image
+    output_tokens: int = 350
+    questions: int = 8
+    illegible: float = 0.0  # share of pages answered with [ILLEGIBLE]
+    seed: Optional[int] = None
+
+
+@dataclass
+class MockStats:
+    requests: int = 0
+    rate_limited: int = 0
+    cache_keys: Set[str] = field(default_factory=set)
+
+
+def estimate_input_tokens(messages: List[Dict[str, Any]], image_tokens: int) -> int:
+    tokens = 0
+    for message in messages:
+        content = message.get("content")
+        parts = content if isinstance(content, list) else [{"type": "text", "text": content or ""}]
+        for part in parts:
+            if part.get("type") == "image_url":
+                tokens += image_tokens
+            else:
+                tokens += len(part.get("text") or "") // 4 + 1
+    return tokens
+
+
+def page_content(rng: random.Random, profile: MockProfile) -> str:
+    illegible = rng.random() < profile.illegible
+    return json.dumps({
+        "form_title": "Admission Register",
+        "document_type": "form",
+        "letterhead": "THE LIVERPOOL SCHOOL FOR THE BLIND",
+        "questions": [
+            {
+                "question": f"Question {i + 1}",
+                "answer": "[ILLEGIBLE]" if illegible else f"Answer {rng.randint(1, 9999)}",
+                "confidence": round(rng.uniform(0.85, 0.99), 2),
+                "is_handwritten": True,
+            }
+            for i in range(profile.questions)
+        ],
+    })
+
+
+def create_app(profile: MockProfile) -> FastAPI:
+    """Build the mock API; counters are on app.state.stats."""
+    app = FastAPI(title="Mock OpenAI")
+    app.state.stats = stats = MockStats()
+    rng = random.Random(profile.seed)
+
+    def sample_latency() -> float:
+        return profile.latency_ms / 1000 * rng.lognormvariate(0, profile.sigma)
+
+    @app.get("/v1/models")
+    async def models():
+        return {"object": "list", "data": [{"id": "gpt-4.1", "object": "model"}, {"id": "gpt-4.1-mini", "object": "model"}]}
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        stats.requests += 1
+        if rng.random() < profile.rate_limit:
+            stats.rate_limited += 1
+            return JSONResponse(
+                {"error": {"message": "Rate limit reached", "type": "requests", "code": "rate_limit_exceeded"}},
+                status_code=429,
+                headers={"retry-after-ms": str(profile.retry_after_ms)},
+            )
+
+        model = body.get("model", "gpt-4.1")
+        input_tokens = estimate_input_tokens(body.get("messages", []), profile.image_tokens)
+        cache_key = body.get("prompt_cache_key")
+        cached_tokens = 0
+        if cache_key in stats.cache_keys and input_tokens >= MIN_CACHED_PROMPT_TOKENS:
+            # Everything but the per-page note at the end is a repeated prefix
+            cached_tokens = (input_tokens - 16) // CACHE_BLOCK_TOKENS * CACHE_BLOCK_TOKENS
+        if cache_key:
+            stats.cache_keys.add(cache_key)
+        usage = {
+            "prompt_tokens": input_tokens,
+            "completion_tokens": profile.output_tokens,
+            "total_tokens": input_tokens + profile.output_tokens,
+            "prompt_tokens_details": {"cached_tokens": cached_tokens},
+        }
+        content = page_content(rng, profile)
+        latency = sample_latency()
+        created = int(time.time())
+
+        if not body.get("stream"):
+            await asyncio.sleep(latency)
+            return {
+                "id": "chatcmpl-mock", "object": "chat.completion", "created": created, "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+                "usage": usage,
+            }
+
+        include_usage = (body.get("stream_options") or {}).get("include_usage", False)
+
+        async def stream():
+            chunks = [content[i:i + 64] for i in range(0, len(content), 64)]
+            await asyncio.sleep(latency * profile.first_token_share)
+            delay = latency * (1 - profile.first_token_share) / max(1, len(chunks))
+            for i, text in enumerate(chunks):
+                chunk = {
+                    "id": "chatcmpl-mock", "object": "chat.completion.chunk", "created": created, "model": model,
+                    "choices": [{"index": 0, "delta": {"content": text},
+                                 "finish_reason": "stop" if i == len(chunks) - 1 else None}],
+                }
+                yield f"data: {json.dumps(chunk)}\n\n"
+                await asyncio.sleep(delay)
+            if include_usage:
+                chunk = {"id": "chatcmpl-mock", "object": "chat.completion.chunk", "created": created,
+                         "model": model, "choices": [], "usage": usage}
+                yield f"data: {json.dumps(chunk)}\n\n"
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(stream(), media_type="text/event-stream")
+
+    @app.get("/mock/stats")
+    async def mock_stats():
+        return {"requests": stats.requests, "rate_limited": stats.rate_limited}
+
+    return app
+
+
+def add_profile_arguments(parser: argparse.ArgumentParser) -> None:
+    """Command line options for a MockProfile, shared with the benchmarks."""
+    defaults = MockProfile()
+    parser.add_argument("--latency-ms", type=float, default=defaults.latency_ms, help="Median request latency")
+    parser.add_argument("--sigma", type=float, default=defaults.sigma, help="Log-normal latency shape")
+    parser.add_argument("--rate-limit", type=float, default=defaults.rate_limit, help="Share of requests answered with 429")
+    parser.add_argument("--retry-after-ms", type=int, default=defaults.retry_after_ms, help="retry-after-ms on 429s")
+    parser.add_argument("--output-tokens", type=int, default=defaults.output_tokens, help="Output tokens per answer")
+    parser.add_argument("--illegible", type=float, default=defaults.illegible, help="Share of pages answered illegibly")
+    parser.add_argument("--seed", type=int, default=None, help="Random seed")
+
+
+def profile_from_args(args: argparse.Namespace) -> MockProfile:
+    return MockProfile(
+        latency_ms=args.latency_ms, sigma=args.sigma, rate_limit=args.rate_limit,
+        retry_after_ms=args.retry_after_ms, output_tokens=args.output_tokens,
+        illegible=args.illegible, seed=args.seed,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mock OpenAI chat completions server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+
+    import uvicorn
+    uvicorn.run(create_app(profile_from_args(args)), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+"""
+Profile import time of the API process.
+
+Imports a module (default app.main) in a fresh interpreter with
+`python -X importtime`, then reports the total, the slowest modules by
+cumulative and by self time, and which heavy optional dependencies were
+loaded at import. Those should all be imported lazily on first use; the
+script exits non-zero if any of them are, so it can run in CI.
+
+Run:
+  python benchmarks/profile_imports.py
+  python benchmarks/profile_imports.py --module app.worker --top 30
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Dependencies that must not be imported when the API starts
+HEAVY_MODULES = ["pandas", "sklearn", "scipy", "boto3", "botocore", "openai", "openpyxl", "pdf2image", "PyPDF2"]
+
+
+def profile(module):
+    """
+    Import `module` in a subprocess.
+
+    Returns:
+        Tuple of (list of (self_us, cumulative_us, depth, name), loaded heavy modules)
+    """
+    check = (
+        f"import sys, {module}; "
+        f"print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+    )
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", check],
+        cwd=BACKEND_DIR, capture_output=True, text=True, check=True,
+    )
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip())) // 2
+        rows.append((int(self_us), int(cumulative_us), depth, name.strip()))
+    loaded = [m for m in proc.stdout.strip().split(",") if m]
+    return rows, loaded
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Report the slowest imports of the API process")
+    parser.add_argument("--module", default="app.main", help="Module to import")
+    parser.add_argument("--top", type=int, default=20, help="Number of modules to list")
+    args = parser.parse_args()
+
+    rows, loaded = profile(args.module)
+    total = next((cumulative for _, cumulative, _, name in rows if name == args.module), 0)
+    print(f"import {args.module}: {total / 1000:.1f} ms ({len(rows)} modules)\n")
+
+    print("Slowest by cumulative time (top-level packages and app modules):")
+    packages = [r for r in rows if r[2] <= 1 or r[3].startswith("app.")]
+    for self_us, cumulative_us, _, name in sorted(packages, key=lambda r: r[1], reverse=True)[:args.top]:
+        print(f"  {cumulative_us / 1000:9.1f} ms  {name}")
+
+    print("\nSlowest by self time:")
+    for self_us, cumulative_us, _, name in sorted(rows, key=lambda r: r[0], reverse=True)[:args.top]:
+        print(f"  {self_us / 1000:9.1f} ms  {name}")
+
+    if loaded:
+        print(f"\nHeavy modules imported at startup: {', '.join(loaded)}")
+        sys.exit(1)
+    print("\nNo heavy optional dependencies imported at startup")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+"""
+Run an overnight handwriting extraction backfill through the OpenAI Batch API.
+
+Examples:
+  python run_batch_backfill.py                       # all pending documents
+  python run_batch_backfill.py --document-id <uuid>  # specific documents
+  python run_batch_backfill.py --resume <batch_id>   # collect an earlier batch
+"""
+import argparse
+import asyncio
+import logging
+import sys
+from uuid import UUID
+
+from sqlmodel import Session, select
+
+from app.database import engine
+from app.models import Document, ProcessingStatus
+from app.services.batch_service import POLL_INTERVAL, BatchExtractionService
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    handlers=[logging.StreamHandler(sys.stdout)]
+)
+
+logger = logging.getLogger(__name__)
+
+
+def pending_document_ids() -> list:
+    """Return the IDs of documents that have not been processed yet."""
+    with Session(engine) as session:
+        return list(session.exec(
+            select(Document.id).where(Document.status == ProcessingStatus.PENDING)
+        ).all())
+
+
+async def main() -> int:
+    """Main entry point for the backfill."""
+    parser = argparse.ArgumentParser(description="Extract documents through the OpenAI Batch API")
+    parser.add_argument("--document-id", action="append", default=[],
+                        help="Document to include (repeatable, default: all pending documents)")
+    parser.add_argument("--resume", metavar="BATCH_ID",
+                        help="Wait for and apply an already submitted batch")
+    parser.add_argument("--work-dir", default="batch_inputs",
+                        help="Directory for batch input files (default: batch_inputs)")
+    parser.add_argument("--poll-interval", type=float, default=POLL_INTERVAL,
+                        help=f"Seconds between status checks (default: {POLL_INTERVAL})")
+    args = parser.parse_args()
+
+    service = BatchExtractionService(poll_interval=args.poll_interval)
+
+    if args.resume:
+        batch = await service.wait(args.resume)
+        stored = await service.apply_results(batch)
+        logger.info(f"Applied {stored} results from batch {args.resume}")
+        return 0
+
+    document_ids = [UUID(d) for d in args.document_id] or pending_document_ids()
+    if not document_ids:
+        logger.info("No pending documents found")
+        return 0
+
+    logger.info(f"Starting batch backfill for {len(document_ids)} documents")
+    batch_id = await service.run(document_ids, args.work_dir)
+    logger.info(f"Batch backfill finished: {batch_id}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,97 @@
+import asyncio
+import json
+from dataclasses import dataclass
+
+import httpx
+import pytest
+from openai import AsyncOpenAI
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from sqlmodel import SQLModel, create_engine
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.routers import handwriting
+from app.services import events, pdf_service
+
+
+@dataclass
+class Database:
+    """A per-test SQLite file with a sync and an async engine."""
+    engine: Engine
+    async_engine: AsyncEngine
+
+    async def async_session(self):
+        """Drop-in for the get_async_session dependency."""
+        async with AsyncSession(self.async_engine) as session:
+            yield session
+
+
+@pytest.fixture()
+def db(tmp_path, monkeypatch):
+    """Fresh database used by pdf_service, the event streams and the handwriting router in place of the app's."""
+    path = tmp_path / "test.db"
+    engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False})
+    SQLModel.metadata.create_all(engine)
+    async_engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+    for module in (events, pdf_service):
+        monkeypatch.setattr(module, "engine", engine)
+    for module in (handwriting, pdf_service):
+        monkeypatch.setattr(module, "async_engine", async_engine)
+    yield Database(engine, async_engine)
+    engine.dispose()
+
+
+@pytest.fixture()
+def fake_renderer():
+    """
+    Factory for a stand-in for pdf_service.convert_pdf_to_images.
+
+    Rendered windows are appended to `calls` as (first, last) and their sizes
+    to `outstanding`; windows starting at a page in `fail_at` fail once.
+    """
+    def make(calls, outstanding, fail_at=None):
+        fail_at = list(fail_at or [])
+
+        async def convert(pdf_path, max_pages=None, dpi=300, first_page=1):
+            calls.append((first_page, max_pages))
+            outstanding.append(max_pages - first_page + 1)
+            await asyncio.sleep(0)
+            if first_page in fail_at:
+                fail_at.remove(first_page)
+                raise OSError("pdftoppm was killed")
+            return [f"image {n}" for n in range(first_page, max_pages + 1)]
+        return convert
+    return make
+
+
+@pytest.fixture()
+def page_json():
+    """Factory for a one-question page as the model returns it."""
+    def make(answer, confidence):
+        return json.dumps({
+            "form_title": "Admission", "document_type": "form", "letterhead": None,
+            "questions": [{"question": "Name", "answer": answer, "confidence": confidence, "is_handwritten": True}],
+        })
+    return make
+
+
+@pytest.fixture()
+def stub_client():
+    """Factory for an AsyncOpenAI client streaming `responses[model]`, recording requested models in `seen`."""
+    def make(responses, seen):
+        def handler(request):
+            body = json.loads(request.content)
+            seen.append(body["model"])
+            chunks = [
+                {"id": "c", "object": "chat.completion.chunk", "created": 0, "model": body["model"],
+                 "choices": [{"index": 0, "delta": {"content": responses[body["model"]]}, "finish_reason": "stop"}]},
+                {"id": "c", "object": "chat.completion.chunk", "created": 0, "model": body["model"], "choices": [],
+                 "usage": {"prompt_tokens": 1000, "completion_tokens": 100, "total_tokens": 1100,
+                           "prompt_tokens_details": {"cached_tokens": 200}}},
+            ]
+            text = "".join(f"data: {json.dumps(c)}\n\n" for c in chunks) + "data: [DONE]\n\n"
+            return httpx.Response(200, text=text, headers={"content-type": "text/event-stream"})
+
+        return AsyncOpenAI(api_key="test", base_url="http://stub/v1",
+                           http_client=httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+    return make
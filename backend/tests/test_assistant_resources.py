@@ -0,0 +1,159 @@
+import threading
+from contextlib import contextmanager
+from types import SimpleNamespace
+
+import pytest
+
+from app.services import extract
+
+
+class StubClient:
+    """Records the Assistants API calls made by the extractor."""
+
+    def __init__(self, run_error=None):
+        self.created_assistants = []
+        self.deleted_assistants = []
+        self.assistant_requests = []
+        self.create_barrier = None
+        self.uploads = []
+        self.deleted_files = []
+        self.deleted_threads = []
+        self.run_error = run_error
+        self.files = SimpleNamespace(create=self.create_file, delete=self.deleted_files.append)
+        self.beta = SimpleNamespace(
+            assistants=SimpleNamespace(list=self.list_assistants, retrieve=self.retrieve_assistant,
+                                       create=self.create_assistant, delete=self.deleted_assistants.append),
+            threads=SimpleNamespace(delete=self.deleted_threads.append, create_and_run_stream=self.run_stream),
+        )
+
+    def list_assistants(self, **kwargs):
+        # The API is called without holding the extractor's resource lock
+        assert not extract._resources_lock.locked()
+        self.assistant_requests.append("list")
+        return SimpleNamespace(data=list(reversed(self.created_assistants)))
+
+    def retrieve_assistant(self, assistant_id):
+        self.assistant_requests.append("retrieve")
+        return next(a for a in self.created_assistants if a.id == assistant_id)
+
+    def create_assistant(self, model, metadata, **kwargs):
+        assert not extract._resources_lock.locked()
+        if self.create_barrier:
+            self.create_barrier.wait(timeout=5)
+        assistant = SimpleNamespace(id=f"asst_{len(self.created_assistants)}", model=model, metadata=metadata)
+        self.created_assistants.append(assistant)
+        return assistant
+
+    def create_file(self, file, purpose):
+        self.uploads.append(file[0])
+        return SimpleNamespace(id=f"file_{len(self.uploads)}")
+
+    @contextmanager
+    def run_stream(self, **kwargs):
+        run = SimpleNamespace(thread_id="thread_1", status="completed")
+        reply = SimpleNamespace(content=[SimpleNamespace(type="text", text=SimpleNamespace(value='{"rows": []}'))])
+
+        def until_done():
+            if self.run_error:
+                raise self.run_error
+
+        yield SimpleNamespace(
+            current_run=run,
+            until_done=until_done,
+            get_final_run=lambda: run,
+            get_final_messages=lambda: [reply],
+        )
+
+
+@pytest.fixture
+def client(monkeypatch):
+    stub = StubClient()
+    monkeypatch.setattr(extract, "get_openai_client", lambda: stub)
+    monkeypatch.setattr(extract, "_assistant_registry", {})
+    monkeypatch.setattr(extract, "_file_cache", {})
+    monkeypatch.setattr(extract, "_finished_threads", [])
+    return stub
+
+
+def test_assistant_created_once_per_model_and_instructions(client, monkeypatch):
+    first = extract.get_assistant_id("gpt-4.1", "extract")
+    assert extract.get_assistant_id("gpt-4.1", "extract") == first
+    assert extract.get_assistant_id("gpt-4.1", "extract v2") != first
+    assert len(client.created_assistants) == 2
+
+    # A restarted process finds its assistant by the instructions hash
+    monkeypatch.setattr(extract, "_assistant_registry", {})
+    assert extract.get_assistant_id("gpt-4.1", "extract") == first
+    assert len(client.created_assistants) == 2
+
+
+def test_configured_assistant_skips_the_lookup_while_it_matches(client, monkeypatch):
+    first = extract.get_assistant_id("gpt-4.1", "extract")
+    monkeypatch.setattr(extract.settings, "openai_assistant_id", first)
+
+    monkeypatch.setattr(extract, "_assistant_registry", {})
+    client.assistant_requests.clear()
+    assert extract.get_assistant_id("gpt-4.1", "extract") == first
+    assert client.assistant_requests == ["retrieve"]
+
+    # Changed instructions need another assistant; the configured one isn't used
+    monkeypatch.setattr(extract, "_assistant_registry", {})
+    assert extract.get_assistant_id("gpt-4.1", "extract v2") != first
+    assert len(client.created_assistants) == 2
+
+
+def test_concurrent_first_calls_share_one_assistant(client):
+    client.create_barrier = threading.Barrier(2)
+    ids = []
+    threads = [threading.Thread(target=lambda: ids.append(extract.get_assistant_id("gpt-4.1", "extract")))
+               for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(client.created_assistants) == 2
+    assert ids[0] == ids[1]
+    assert client.deleted_assistants == [a.id for a in client.created_assistants if a.id != ids[0]]
+
+
+def test_upload_cache_reuses_content_and_refreshes_on_hit(client, monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(extract.time, "time", lambda: clock[0])
+
+    file_id = extract.upload_file_cached(b"%PDF-1")
+    clock[0] += extract.FILE_CACHE_TTL - 10
+    assert extract.upload_file_cached(b"%PDF-1") == file_id
+    assert extract.upload_file_cached(b"%PDF-2") != file_id
+    assert len(client.uploads) == 2
+
+    # Handed out 10s before it would have expired: the GC must keep it
+    clock[0] += 20
+    extract.collect_assistant_garbage()
+    assert client.deleted_files == []
+
+    clock[0] += extract.FILE_CACHE_TTL
+    extract.collect_assistant_garbage()
+    assert sorted(client.deleted_files) == ["file_1", "file_2"]
+    assert extract._file_cache == {}
+    assert extract.upload_file_cached(b"%PDF-1") == "file_3"
+
+
+def test_finished_threads_are_collected(client, monkeypatch):
+    monkeypatch.setattr(extract.settings, "openai_model", "gpt-4.1")
+    assert extract.call_gpt_4_1(b"%PDF") == {"rows": []}
+    assert extract._finished_threads == ["thread_1"]
+
+    extract.collect_assistant_garbage()
+    assert client.deleted_threads == ["thread_1"]
+    assert extract._finished_threads == []
+
+
+def test_thread_of_failed_run_is_collected(client, monkeypatch):
+    monkeypatch.setattr(extract.settings, "openai_model", "gpt-4.1")
+    client.run_error = TimeoutError("stream timed out")
+    with pytest.raises(TimeoutError):
+        extract.call_gpt_4_1(b"%PDF")
+
+    extract.collect_assistant_garbage()
+    assert client.deleted_threads == ["thread_1"]
@@ -0,0 +1,69 @@
+import asyncio
+import threading
+import time
+
+import pytest
+from sqlmodel import Session
+
+from app.database import async_url
+from app.models import Document, ExtractionJob, ProcessingStatus
+from app.services import pdf_service
+
+
+def test_async_url_swaps_in_async_driver():
+    assert async_url("sqlite:///./doctranscribe.db") == "sqlite+aiosqlite:///./doctranscribe.db"
+    assert async_url("postgresql://u:p@db:5432/app") == "postgresql+asyncpg://u:p@db:5432/app"
+    assert async_url("postgresql+psycopg2://u:p@db/app") == "postgresql+asyncpg://u:p@db/app"
+    assert async_url("sqlite+aiosqlite:///x.db") == "sqlite+aiosqlite:///x.db"
+    with pytest.raises(ValueError):
+        async_url("oracle://u:p@db/app")
+
+
+def test_status_reads_waiting_on_a_lock_do_not_block_the_loop(db, monkeypatch):
+    engine, async_engine = db.engine, db.async_engine
+    with Session(engine) as session:
+        document = Document(filename="form.pdf", file_size=10, total_pages=2, status=ProcessingStatus.PROCESSING)
+        session.add(document)
+        session.flush()
+        session.add(ExtractionJob(document_id=document.id, total_pages=2, status=ProcessingStatus.PROCESSING))
+        session.commit()
+        document_id = str(document.id)
+
+    monkeypatch.setattr(pdf_service, "engine", None)  # the sync engine must not be used
+    service = pdf_service.PDFProcessingService(api_key="sk-test")
+
+    locked = threading.Event()
+
+    def writer():
+        # A slow write transaction keeps readers waiting in the driver
+        with engine.connect() as connection:
+            connection.exec_driver_sql("BEGIN EXCLUSIVE")
+            locked.set()
+            time.sleep(0.5)
+            connection.exec_driver_sql("COMMIT")
+
+    async def main():
+        ticks = 0
+
+        async def heartbeat():
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0.01)
+
+        threading.Thread(target=writer).start()
+        locked.wait()
+        beat = asyncio.create_task(heartbeat())
+        started = time.monotonic()
+        docs = await asyncio.gather(*(service.get_document_by_id(document_id) for _ in range(5)))
+        elapsed = time.monotonic() - started
+        beat.cancel()
+        await async_engine.dispose()
+        return docs, elapsed, ticks
+
+    docs, elapsed, ticks = asyncio.run(main())
+
+    assert all(doc["latest_job"]["total_pages"] == 2 for doc in docs)
+    assert elapsed >= 0.3
+    # The loop kept running while the reads waited for the lock
+    assert ticks > elapsed / 0.01 / 2
@@ -0,0 +1,100 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+from sqlalchemy.pool import StaticPool
+from sqlmodel import Session, SQLModel, create_engine
+
+from app import auth
+from app.database import get_session
+from app.models import User, UserRole
+from app.routers import auth as auth_router
+from app.services.user_cache import user_cache
+
+
+@pytest.fixture()
+def client(monkeypatch):
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    SQLModel.metadata.create_all(engine)
+    monkeypatch.setattr(auth, "BCRYPT_ROUNDS", 4)
+    user_cache.clear()
+
+    def session():
+        with Session(engine) as s:
+            yield s
+
+    app = FastAPI()
+    app.include_router(auth_router.router)
+    app.dependency_overrides[get_session] = session
+
+    user_queries = []
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def count(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT") and "FROM user" in statement:
+            user_queries.append(statement)
+
+    with TestClient(app) as test_client:
+        yield test_client, engine, user_queries
+
+
+def register(client, email="reader@example.com"):
+    response = client.post("/auth/register", json={"email": email, "password": "s3cret-pass", "name": "Reader"})
+    assert response.status_code == 200
+    return response.json()
+
+
+def test_repeated_requests_are_served_from_the_user_cache(client):
+    client, _, user_queries = client
+    token = register(client)["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+
+    user_queries.clear()
+    for _ in range(5):
+        response = client.get("/auth/me", headers=headers)
+        assert response.status_code == 200
+        assert response.json()["email"] == "reader@example.com"
+    assert len(user_queries) == 1
+
+
+def test_role_and_active_changes_invalidate_the_cache(client):
+    client, engine, _ = client
+    registered = register(client)
+    headers = {"Authorization": f"Bearer {registered['access_token']}"}
+    assert client.get("/auth/users", headers=headers).status_code == 403
+
+    with Session(engine) as session:
+        user = session.get(User, auth.UUID(registered["user"]["id"]))
+        user.role = UserRole.ADMIN
+        session.add(user)
+        session.commit()
+
+    response = client.get("/auth/me", headers=headers)
+    assert response.json()["role"] == "admin"
+    assert client.get("/auth/users", headers=headers).status_code == 200
+
+    with Session(engine) as session:
+        user = session.get(User, auth.UUID(registered["user"]["id"]))
+        user.is_active = False
+        session.add(user)
+        session.commit()
+
+    assert client.get("/auth/me", headers=headers).json()["is_active"] is False
+
+
+def test_login_checks_password_off_the_event_loop(client):
+    client, _, _ = client
+    register(client)
+
+    ok = client.post("/auth/login", data={"username": "reader@example.com", "password": "s3cret-pass"})
+    assert ok.status_code == 200
+    assert ok.json()["access_token"]
+
+    bad = client.post("/auth/login", data={"username": "reader@example.com", "password": "wrong"})
+    assert bad.status_code == 401
+
+
+def test_tokens_get_distinct_ids():
+    first = auth.jwt.decode(auth.create_access_token({"sub": "a"}), auth.SECRET_KEY, algorithms=[auth.ALGORITHM])
+    second = auth.jwt.decode(auth.create_access_token({"sub": "a"}), auth.SECRET_KEY, algorithms=[auth.ALGORITHM])
+    assert first["jti"] != second["jti"]
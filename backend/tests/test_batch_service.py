@@ -0,0 +1,121 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+from openai import AsyncOpenAI
+from sqlalchemy.pool import StaticPool
+from sqlmodel import Session, SQLModel, create_engine, select
+
+from app.models import Document, ExtractionJob, ExtractionResult, ProcessingStatus
+from app.services import batch_service
+from app.services.batch_service import BatchExtractionService, build_batch_line, make_custom_id
+
+
+class StubBatchServer:
+    """Minimal stand-in for the OpenAI files/batches endpoints."""
+
+    def __init__(self, page_contents):
+        self.page_contents = page_contents
+        self.input_lines = []
+        self.polls = 0
+
+    def handler(self, request: httpx.Request) -> httpx.Response:
+        path = request.url.path
+        if request.method == "POST" and path.endswith("/files"):
+            # Pick the JSONL lines out of the multipart body
+            self.input_lines = [
+                json.loads(line) for line in request.content.decode().splitlines()
+                if line.startswith('{"custom_id"')
+            ]
+            return httpx.Response(200, json={
+                "id": "file-input", "object": "file", "bytes": len(request.content), "created_at": 0,
+                "filename": "batch.jsonl", "purpose": "batch", "status": "processed",
+            })
+        if request.method == "POST" and path.endswith("/batches"):
+            return httpx.Response(200, json=self._batch("validating"))
+        if request.method == "GET" and path.endswith("/batches/batch-1"):
+            self.polls += 1
+            return httpx.Response(200, json=self._batch("completed" if self.polls > 1 else "in_progress"))
+        if request.method == "GET" and path.endswith("/files/file-output/content"):
+            lines = []
+            for line in self.input_lines:
+                content = self.page_contents.get(line["custom_id"])
+                if content is None:
+                    lines.append({"custom_id": line["custom_id"], "response": {"status_code": 500, "body": {}}})
+                else:
+                    lines.append({"custom_id": line["custom_id"], "response": {"status_code": 200, "body": {
+                        "choices": [{"message": {"role": "assistant", "content": content}}]
+                    }}})
+            return httpx.Response(200, text="\n".join(json.dumps(line) for line in lines))
+        return httpx.Response(404, json={"error": {"message": f"unexpected {request.method} {path}"}})
+
+    def _batch(self, status):
+        return {
+            "id": "batch-1", "object": "batch", "endpoint": "/v1/chat/completions",
+            "input_file_id": "file-input", "completion_window": "24h", "status": status,
+            "created_at": 0, "output_file_id": "file-output" if status == "completed" else None,
+        }
+
+
+@pytest.fixture()
+def db_engine(monkeypatch):
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    SQLModel.metadata.create_all(engine)
+    monkeypatch.setattr(batch_service, "engine", engine)
+    return engine
+
+
+def test_build_batch_line_matches_interactive_request():
+    line = build_batch_line("job", 3, "aGVsbG8=", model="gpt-4.1-mini")
+
+    assert line["custom_id"] == "job:3"
+    assert line["url"] == "/v1/chat/completions"
+    assert line["body"]["model"] == "gpt-4.1-mini"
+    image_part = line["body"]["messages"][1]["content"][1]
+    assert image_part["image_url"]["url"] == "data:image/png;base64,aGVsbG8="
+
+
+def test_batch_round_trip_stores_results(db_engine, tmp_path):
+    with Session(db_engine) as session:
+        document = Document(filename="form.pdf", file_size=10, total_pages=2)
+        session.add(document)
+        session.commit()
+        job = ExtractionJob(document_id=document.id, total_pages=2)
+        session.add(job)
+        session.commit()
+        job_id, document_id = job.id, document.id
+
+    input_path = tmp_path / "batch.jsonl"
+    input_path.write_text("\n".join(json.dumps(build_batch_line(job_id, page, "aGVsbG8=")) for page in (1, 2)))
+
+    stub = StubBatchServer({
+        make_custom_id(job_id, 1): json.dumps({"form_title": "Survey", "questions": [{"question": "Name", "answer": "Ann"}]}),
+    })
+    client = AsyncOpenAI(
+        api_key="test",
+        base_url="http://stub/v1",
+        http_client=httpx.AsyncClient(transport=httpx.MockTransport(stub.handler)),
+    )
+    service = BatchExtractionService(client=client, poll_interval=0)
+
+    async def run():
+        batch_id = await service.submit(input_path, [job_id])
+        batch = await service.wait(batch_id)
+        return await service.apply_results(batch)
+
+    assert asyncio.run(run()) == 2
+    assert len(stub.input_lines) == 2
+
+    with Session(db_engine) as session:
+        job = session.get(ExtractionJob, job_id)
+        assert job.batch_id == "batch-1"
+        assert job.status == ProcessingStatus.COMPLETED
+        assert job.pages_processed == 1
+        assert session.get(Document, document_id).status == ProcessingStatus.COMPLETED
+
+        results = session.exec(select(ExtractionResult).order_by(ExtractionResult.page_number)).all()
+        assert results[0].content["questions"][0]["page"] == 1
+        assert results[0].confidence_score == pytest.approx(0.95)
+        assert results[1].content["document_type"] == "error"
+        assert results[1].confidence_score == 0.0
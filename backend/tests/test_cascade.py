@@ -0,0 +1,49 @@
+import asyncio
+
+from app.services import cascade
+from app.services.cascade import CascadePolicy, CascadeStats, estimate_cost
+from app.services.pdf_service import build_page_messages, run_cascade
+
+
+POLICY = CascadePolicy(models=["gpt-4.1-mini", "gpt-4.1"], min_confidence=0.8)
+
+
+def test_clean_page_stays_on_small_model(page_json, stub_client):
+    seen, stats = [], CascadeStats()
+    client = stub_client({"gpt-4.1-mini": page_json("Ann", 0.95)}, seen)
+
+    result = asyncio.run(run_cascade(client, build_page_messages("aGVsbG8=", 1), 1, POLICY, stats))
+
+    assert seen == ["gpt-4.1-mini"]
+    assert result["model"] == "gpt-4.1-mini"
+    assert "escalations" not in result
+    assert stats.to_dict()["gpt-4.1-mini"]["input_tokens"] == 1000
+    assert stats.total_cost == estimate_cost("gpt-4.1-mini", 1000, 200, 100)
+
+
+def test_illegible_page_is_escalated_with_accounting(page_json, stub_client):
+    seen, stats = [], CascadeStats()
+    client = stub_client({"gpt-4.1-mini": page_json("[ILLEGIBLE]", 0.9), "gpt-4.1": page_json("Ann", 0.9)}, seen)
+
+    result = asyncio.run(run_cascade(client, build_page_messages("aGVsbG8=", 1), 1, POLICY, stats))
+
+    assert seen == ["gpt-4.1-mini", "gpt-4.1"]
+    assert result["model"] == "gpt-4.1"
+    assert result["escalations"] == [{"model": "gpt-4.1-mini", "reason": "illegible"}]
+    summary = stats.to_dict()
+    assert summary["gpt-4.1-mini"]["escalated"] == {"illegible": 1}
+    assert summary["gpt-4.1"]["calls"] == 1
+    assert stats.total_cost > estimate_cost("gpt-4.1", 1000, 200, 100)
+
+
+def test_policy_escalates_low_confidence_and_schema_failures():
+    assert POLICY.escalation_reason({"questions": [{"answer": "x", "confidence": 0.5}]}) == "low_confidence"
+    assert POLICY.escalation_reason({"error": "bad json", "questions": []}) == "schema_failure"
+    assert POLICY.escalation_reason({"questions": [{"answer": "x", "confidence": 0.9}]}) is None
+
+
+def test_cascade_is_opt_in(monkeypatch):
+    monkeypatch.setattr(cascade, "CASCADE_MODEL", "")
+    assert CascadePolicy.from_env("gpt-4.1").models == ["gpt-4.1"]
+    monkeypatch.setattr(cascade, "CASCADE_MODEL", "gpt-4.1-mini")
+    assert CascadePolicy.from_env("gpt-4.1").models == ["gpt-4.1-mini", "gpt-4.1"]
@@ -0,0 +1,102 @@
+import asyncio
+import threading
+import uuid
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.services.events import JOB_COMPLETED, JOB_FAILED, JOB_STARTED, PAGE_COMPLETED, JobEventBus, event_bus
+
+
+@pytest.fixture()
+def extract_jobs():
+    """app.state.jobs for the test, restored afterwards."""
+    saved = getattr(app.state, "jobs", [])
+    app.state.jobs = []
+    try:
+        yield app.state.jobs
+    finally:
+        app.state.jobs = saved
+
+
+def test_subscribe_replays_history_then_receives_live_events():
+    bus = JobEventBus()
+
+    async def run():
+        bus.publish("job", JOB_STARTED, total_pages=2)
+        bus.publish("job", PAGE_COMPLETED, pages_processed=1, total_pages=2)
+
+        def worker():
+            bus.publish("job", PAGE_COMPLETED, pages_processed=2, total_pages=2)
+            bus.publish("job", JOB_COMPLETED, pages_processed=2, total_pages=2)
+
+        received = []
+        async for event in bus.subscribe("job", last_event_id=1):
+            received.append(event)
+            if len(received) == 1:
+                threading.Thread(target=worker).start()
+        return received
+
+    events = asyncio.run(run())
+    assert [e.id for e in events] == [2, 3, 4]
+    assert events[-1].type == JOB_COMPLETED
+
+
+def test_restarted_job_replays_only_its_new_run():
+    bus = JobEventBus()
+
+    async def run():
+        bus.publish("job", JOB_STARTED, total_pages=1)
+        bus.publish("job", JOB_FAILED, error="503 Service Unavailable")
+        bus.publish("job", JOB_STARTED, total_pages=1)
+        bus.publish("job", PAGE_COMPLETED, pages_processed=1, total_pages=1)
+        bus.publish("job", JOB_COMPLETED, pages_processed=1, total_pages=1)
+        return [event async for event in bus.subscribe("job")]
+
+    events = asyncio.run(run())
+    assert [(e.id, e.type) for e in events] == [(3, JOB_STARTED), (4, PAGE_COMPLETED), (5, JOB_COMPLETED)]
+
+
+def test_sse_endpoint_resumes_from_last_event_id():
+    job_id = uuid.uuid4()
+    event_bus.publish(job_id, JOB_STARTED, total_pages=1)
+    event_bus.publish(job_id, PAGE_COMPLETED, pages_processed=1, total_pages=1)
+    event_bus.publish(job_id, JOB_COMPLETED, pages_processed=1, total_pages=1)
+
+    with TestClient(app) as client:
+        response = client.get(f"/handwriting/jobs/{job_id}/events", headers={"Last-Event-ID": "1"})
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    assert "id: 1\n" not in response.text
+    assert "id: 2\nevent: page\n" in response.text
+    assert "event: completed" in response.text
+
+
+def test_results_websocket_closes_after_terminal_event(extract_jobs):
+    job_id = uuid.uuid4()
+    event_bus.publish(job_id, JOB_STARTED, total_pages=2)
+    event_bus.publish(job_id, PAGE_COMPLETED, pages_processed=1, total_pages=2)
+    event_bus.publish(job_id, JOB_COMPLETED, pages_processed=2, total_pages=2)
+
+    with TestClient(app) as client:
+        with client.websocket_connect(f"/results/ws/jobs/{job_id}") as ws:
+            messages = [ws.receive_json() for _ in range(3)]
+            assert ws.receive()["type"] == "websocket.close"
+
+    assert [m["progress"] for m in messages] == [0, 50, 100]
+    assert messages[-1]["status"] == "done"
+
+
+def test_results_websocket_reports_unknown_and_extract_jobs(extract_jobs):
+    with TestClient(app) as client:
+        with client.websocket_connect(f"/results/ws/jobs/{uuid.uuid4()}") as ws:
+            assert ws.receive_json()["status"] == "error"
+            assert ws.receive()["type"] == "websocket.close"
+
+        # /extract jobs don't publish events; a finished one gets its final status
+        extract_jobs.append({"job_id": "lab-1", "status": "failed", "error": "Extraction failed: timeout"})
+        with client.websocket_connect("/results/ws/jobs/lab-1") as ws:
+            assert ws.receive_json() == {"status": "error", "progress": 0, "message": "Extraction failed: timeout"}
+            assert ws.receive()["type"] == "websocket.close"
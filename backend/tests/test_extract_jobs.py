@@ -0,0 +1,93 @@
+import threading
+import time
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.deps import get_s3_client
+from app.routers import extract as extract_router
+from app.routers import results
+
+
+@pytest.fixture
+def client(monkeypatch):
+    release = threading.Event()
+
+    def run_extraction(file_bytes, s3):
+        release.wait(5)
+        if file_bytes == b"broken":
+            raise ValueError("unreadable sheet")
+        return {"sheet_name": "Lab", "anomalies": 1, "xlsx_s3_key": "results/lab.xlsx"}
+
+    monkeypatch.setattr(extract_router, "_run_extraction", run_extraction)
+    app = FastAPI()
+    app.include_router(extract_router.router)
+    app.include_router(results.router)
+    app.dependency_overrides[get_s3_client] = lambda: None
+    with TestClient(app) as client:
+        client.release = release
+        yield client
+    release.set()
+
+
+def submit(client, content=b"%PDF"):
+    response = client.post("/extract/", files={"file": ("sheet.pdf", content, "application/pdf")})
+    assert response.status_code == 202
+    return response.json()
+
+
+def wait_for(client, job_id, status):
+    for _ in range(100):
+        body = client.get(f"/extract/jobs/{job_id}").json()
+        if body["status"] == status:
+            return body
+        time.sleep(0.02)
+    raise AssertionError(f"job {job_id} never reached {status}: {body}")
+
+
+def test_extract_returns_202_and_polls_to_completion(client):
+    accepted = submit(client)
+    assert accepted["status"] == "queued"
+    assert accepted["status_url"].endswith(f"/extract/jobs/{accepted['job_id']}")
+
+    assert client.get(f"/extract/jobs/{accepted['job_id']}").json()["status"] in ("queued", "processing")
+    client.release.set()
+    body = wait_for(client, accepted["job_id"], "completed")
+    assert body["sheet_name"] == "Lab"
+    assert body["xlsx_s3_key"] == "results/lab.xlsx"
+
+
+def test_failed_job_reports_error_and_has_no_xlsx(client):
+    client.release.set()
+    job_id = submit(client, b"broken")["job_id"]
+    body = wait_for(client, job_id, "failed")
+    assert "unreadable sheet" in body["error"]
+
+    response = client.get(f"/results/{job_id}/xlsx-url")
+    assert response.status_code == 409
+    assert "unreadable sheet" in response.json()["detail"]
+
+
+def test_in_flight_jobs_are_not_evicted(client):
+    running = submit(client)["job_id"]
+    client.app.state.jobs.extend(
+        {"job_id": f"done-{i}", "status": "completed", "created_at": "2026-01-01T00:00:00"}
+        for i in range(extract_router.MAX_FINISHED_JOBS)
+    )
+    for _ in range(extract_router.MAX_FINISHED_JOBS):
+        submit(client)
+
+    assert client.get(f"/extract/jobs/{running}").status_code == 200
+    jobs = client.app.state.jobs
+    assert sum(job["status"] not in extract_router.IN_FLIGHT_STATUSES for job in jobs) <= extract_router.MAX_FINISHED_JOBS
+    client.release.set()
+
+
+def test_unknown_and_sample_jobs(client):
+    assert client.get("/extract/jobs/nope").status_code == 404
+
+    sample = client.get("/results/").json()[0]
+    response = client.get(f"/extract/jobs/{sample['job_id']}")
+    assert response.status_code == 200
+    assert response.json()["status"] == "completed"
@@ -0,0 +1,106 @@
+import asyncio
+import json
+import threading
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+from app.services.form_templates import (
+    FieldRegion,
+    FormTemplate,
+    TemplateRegistry,
+    crop_fields,
+    ink_image,
+    parse_region_content,
+)
+from app.services import pdf_service
+
+ROWS = [250 + i * 170 for i in range(6)]
+
+
+def form(shift=(0, 0), answers=False):
+    """A 1000x1400 form: letterhead bar, six questions with answer lines, optional handwriting."""
+    sx, sy = shift
+    image = Image.new("L", (1000, 1400), 240)
+    draw = ImageDraw.Draw(image)
+    draw.rectangle([100 + sx, 60 + sy, 900 + sx, 130 + sy], fill=40)
+    rng = np.random.default_rng(1)
+    for i, y in enumerate(ROWS):
+        draw.text((110 + sx, y + sy), f"Question {i}", fill=0)
+        draw.line([100 + sx, y + 80 + sy, 900 + sx, y + 80 + sy], fill=20, width=3)
+        if answers:
+            for k in range(8):
+                x = 300 + k * 60 + int(rng.integers(0, 20))
+                draw.line([x + sx, y + 60 + sy, x + 40 + sx, y + 30 + sy], fill=10, width=4)
+    return image.convert("RGB")
+
+
+def letter():
+    image = Image.new("RGB", (1000, 1400), (240, 240, 240))
+    draw = ImageDraw.Draw(image)
+    for i in range(30):
+        draw.text((100, 100 + i * 40), "Dear Sir, I write regarding the admission of my son " * 2, fill=0)
+    return image
+
+
+def template():
+    fields = [
+        FieldRegion(f"q{i}", f"Question {i}", (0.1, (y + 20) / 1400, 0.9, (y + 85) / 1400))
+        for i, y in enumerate(ROWS)
+    ]
+    return FormTemplate("test-form", "Test Form", fields, ink_image(form()), letterhead="TEST SCHOOL")
+
+
+def test_filled_and_shifted_page_matches_and_aligns():
+    registry = TemplateRegistry([template()])
+
+    match = registry.match(form(shift=(20, 30), answers=True))
+
+    assert match is not None
+    assert abs(match.dx * 1000 - 20) < 6
+    assert abs(match.dy * 1400 - 30) < 8
+    assert registry.match(letter()) is None
+
+
+def test_crops_follow_alignment_and_answers_map_to_field_ids():
+    page = form(shift=(20, 30), answers=True)
+    match = TemplateRegistry([template()]).match(page)
+
+    crops = crop_fields(page, match)
+    assert [region.id for region, _ in crops] == [f"q{i}" for i in range(6)]
+    # Every crop contains the handwriting strokes written for its row
+    assert all(np.asarray(crop.convert("L")).min() < 50 for _, crop in crops)
+
+    content = json.dumps({"answers": [
+        {"field_id": "q1", "answer": "Ann", "confidence": 0.9, "is_handwritten": True},
+        {"field_id": "q0", "answer": "12", "confidence": 0.7, "is_handwritten": True},
+    ]})
+    result = parse_region_content(content, 3, match)
+    assert result["template_id"] == "test-form"
+    assert result["letterhead"] == "TEST SCHOOL"
+    assert [(q["id"], q["answer"], q["page"]) for q in result["questions"]] == [("q0", "12", 3), ("q1", "Ann", 3)]
+
+
+def test_registry_version_follows_template_changes():
+    version = TemplateRegistry([template()]).version
+    assert TemplateRegistry([template()]).version == version
+    assert TemplateRegistry([]).version != version
+
+    edited = template()
+    edited.fields[0] = FieldRegion("q0", "Question 0", (0.2, 0.2, 0.9, 0.25))
+    assert TemplateRegistry([edited]).version != version
+
+
+def test_template_matching_runs_off_the_event_loop(monkeypatch):
+    threads = []
+
+    class Registry:
+        def match(self, image):
+            threads.append(threading.current_thread())
+            raise RuntimeError("stop after matching")
+
+    monkeypatch.setattr(pdf_service, "get_template_registry", lambda: Registry())
+    result = asyncio.run(pdf_service.process_image(letter(), 1, "sk-test"))
+
+    assert "stop after matching" in result["error"]
+    assert threads and threads[0] is not threading.main_thread()
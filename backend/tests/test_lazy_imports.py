@@ -0,0 +1,17 @@
+import os
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_api_startup_does_not_import_heavy_dependencies():
+    env = {k: v for k, v in os.environ.items() if k != "OPENAI_API_KEY"}
+    code = (
+        "import sys, app.main; "
+        "print(','.join(m for m in ('pandas', 'sklearn', 'boto3', 'openai', 'openpyxl', 'PyPDF2') if m in sys.modules))"
+    )
+    proc = subprocess.run([sys.executable, "-c", code], cwd=BACKEND_DIR, env=env, capture_output=True, text=True)
+
+    assert proc.returncode == 0, proc.stderr
+    assert proc.stdout.strip() == ""
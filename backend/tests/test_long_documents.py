@@ -0,0 +1,88 @@
+import asyncio
+from contextlib import aclosing
+
+from sqlmodel import Session, select
+
+from app.models import Document, ExtractionJob, ExtractionResult, ProcessingStatus
+from app.services import pdf_service
+from app.services.page_filter import PageFilter
+from app.services.pdf_service import PDFProcessingService, iter_pdf_pages, page_windows
+
+
+def test_page_windows_split_runs_and_skip_gaps():
+    assert page_windows(range(1, 21), window=8) == [(1, 8), (9, 16), (17, 20)]
+    assert page_windows([1, 2, 3, 7, 8, 20], window=2) == [(1, 2), (3, 3), (7, 8), (20, 20)]
+    assert page_windows([]) == []
+
+
+def test_iter_pdf_pages_renders_one_window_ahead(monkeypatch, fake_renderer):
+    calls, rendered = [], []
+    monkeypatch.setattr(pdf_service, "convert_pdf_to_images", fake_renderer(calls, rendered))
+
+    async def main():
+        seen = []
+        async with aclosing(iter_pdf_pages("doc.pdf", range(1, 201), window=10)) as pages:
+            async for page in pages:
+                assert page.image == f"image {page.number}"
+                # Pages rendered but not yet handed out: the current window and the next one at most
+                assert sum(rendered) - len(seen) <= 20
+                seen.append(page.number)
+        return seen
+
+    assert asyncio.run(main()) == list(range(1, 201))
+    assert len(calls) == 20
+
+
+def test_crashed_job_resumes_after_last_stored_page(tmp_path, monkeypatch, db, fake_renderer):
+    engine = db.engine
+    monkeypatch.setattr(pdf_service, "convert_pdf_to_images", fake_renderer([], [], fail_at=[17]))
+    monkeypatch.setattr(pdf_service, "PageFilter", lambda: PageFilter(enabled=False))
+    pdf_path = tmp_path / "case.pdf"
+    pdf_path.write_bytes(b"%PDF")
+
+    processed = []
+
+    async def process_image(image, page_num, api_key, *args):
+        processed.append(page_num)
+        return {"form_title": "Case file", "questions": [{"question": f"Page {page_num}", "answer": "x", "confidence": 0.9}]}
+
+    monkeypatch.setattr(pdf_service, "process_image", process_image)
+
+    with Session(engine) as session:
+        document = Document(filename="case.pdf", file_size=4, total_pages=40)
+        session.add(document)
+        session.flush()
+        job = ExtractionJob(document_id=document.id, total_pages=40)
+        session.add(job)
+        session.commit()
+        job_id, document_id = job.id, document.id
+
+    service = PDFProcessingService(api_key="sk-test")
+    asyncio.run(service._process_document_task(str(pdf_path), job_id, "sk-test"))
+    with Session(engine) as session:
+        job = session.get(ExtractionJob, job_id)
+        assert job.status == ProcessingStatus.FAILED and job.pages_processed == 16
+
+    assert processed == list(range(1, 17))
+    processed.clear()
+    monkeypatch.setattr(pdf_service, "UPLOAD_DIR", tmp_path)
+    pdf_path.rename(tmp_path / str(document_id))
+
+    async def resume():
+        assert await service.resume_job(job_id)
+        while True:
+            await asyncio.sleep(0.01)
+            with Session(engine) as session:
+                if session.get(ExtractionJob, job_id).status in (ProcessingStatus.COMPLETED, ProcessingStatus.FAILED):
+                    return
+
+    asyncio.run(resume())
+
+    assert processed == list(range(17, 41))
+    with Session(engine) as session:
+        job = session.get(ExtractionJob, job_id)
+        assert job.status == ProcessingStatus.COMPLETED and job.pages_processed == 40
+        results = session.exec(select(ExtractionResult).where(ExtractionResult.job_id == job_id)).all()
+        assert sorted(r.page_number for r in results) == list(range(0, 41))
+        combined = next(r for r in results if r.page_number == 0)
+        assert [q["page"] for q in combined.content["questions"]] == list(range(1, 41))
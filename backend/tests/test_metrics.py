@@ -0,0 +1,93 @@
+import asyncio
+
+import httpx
+from openai import AsyncOpenAI
+from sqlmodel import Session, SQLModel, create_engine
+
+from app.main import metrics
+from app.models import User
+from app.services import metrics as m
+from app.services.cascade import CascadePolicy, CascadeStats
+from app.services.pdf_service import build_page_messages, run_cascade
+
+
+def test_text_exposition_format():
+    registry = m.Registry()
+    requests = m.Counter("demo_requests_total", "Requests", ["code"], registry=registry)
+    depth = m.Gauge("demo_depth", "Depth", registry=registry)
+    latency = m.Histogram("demo_seconds", "Latency", buckets=(0.1, 1.0), registry=registry)
+
+    requests.labels(code="429").inc()
+    requests.labels(code="429").inc(2)
+    depth.set_function(lambda: 7)
+    for value in (0.05, 0.1, 0.5, 3.0):
+        latency.observe(value)
+
+    lines = registry.render().splitlines()
+    assert "# TYPE demo_requests_total counter" in lines
+    assert 'demo_requests_total{code="429"} 3' in lines
+    assert "demo_depth 7" in lines
+    assert 'demo_seconds_bucket{le="0.1"} 2' in lines
+    assert 'demo_seconds_bucket{le="1"} 3' in lines
+    assert 'demo_seconds_bucket{le="+Inf"} 4' in lines
+    assert "demo_seconds_count 4" in lines
+    assert "demo_seconds_sum 3.65" in lines
+
+
+def test_cascade_records_latency_and_escalations(page_json, stub_client):
+    before_calls = m.API_SECONDS.count(model="gpt-4.1-mini", outcome="ok")
+    before_escalations = m.RETRIES.value(reason="escalation")
+    client = stub_client({"gpt-4.1-mini": page_json("[ILLEGIBLE]", 0.9), "gpt-4.1": page_json("Ann", 0.9)}, [])
+
+    asyncio.run(run_cascade(client, build_page_messages("aGVsbG8=", 1), 1,
+                            CascadePolicy(models=["gpt-4.1-mini", "gpt-4.1"]), CascadeStats()))
+
+    assert m.API_SECONDS.count(model="gpt-4.1-mini", outcome="ok") == before_calls + 1
+    assert m.RETRIES.value(reason="escalation") == before_escalations + 1
+
+
+def test_rate_limited_responses_are_counted_across_sdk_retries():
+    responses = iter([
+        httpx.Response(429, json={"error": {"message": "slow down"}}, headers={"retry-after-ms": "1"}),
+        httpx.Response(200, json={"id": "c", "object": "chat.completion", "created": 0, "model": "gpt-4.1",
+                                  "choices": [{"index": 0, "finish_reason": "stop",
+                                               "message": {"role": "assistant", "content": "{}"}}]}),
+    ])
+    http_client = httpx.AsyncClient(transport=httpx.MockTransport(lambda request: next(responses)),
+                                    event_hooks={"response": [m.count_http_response]})
+    client = AsyncOpenAI(api_key="test", base_url="http://stub/v1", http_client=http_client, max_retries=1)
+    before = m.RATE_LIMITED.value()
+
+    asyncio.run(client.chat.completions.create(model="gpt-4.1", messages=[{"role": "user", "content": "hi"}]))
+
+    assert m.RATE_LIMITED.value() == before + 1
+
+
+def test_session_commits_and_cache_lookups_are_observed():
+    engine = create_engine("sqlite://")
+    SQLModel.metadata.create_all(engine)
+    before = m.DB_COMMIT_SECONDS.count()
+    with Session(engine) as session:
+        session.add(User(email="a@example.com", name="A", password="x"))
+        session.commit()
+    assert m.DB_COMMIT_SECONDS.count() == before + 1
+
+    from app.services.status_cache import StatusCache
+    cache = StatusCache()
+    misses = m.CACHE_REQUESTS.value(cache="status", result="miss")
+    hits = m.CACHE_REQUESTS.value(cache="status", result="hit")
+    cache.get("job:1")
+    cache.put("job:1", {"status": "processing"})
+    cache.get("job:1")
+    assert m.CACHE_REQUESTS.value(cache="status", result="miss") == misses + 1
+    assert m.CACHE_REQUESTS.value(cache="status", result="hit") == hits + 1
+
+
+def test_metrics_endpoint_lists_pipeline_series():
+    body = asyncio.run(metrics()).body.decode()
+    for name in ("doctranscribe_render_seconds", "doctranscribe_encode_seconds", "doctranscribe_api_request_seconds",
+                 "doctranscribe_db_commit_seconds", "doctranscribe_pages_queued", "doctranscribe_pages_in_flight",
+                 "doctranscribe_active_jobs", "doctranscribe_event_loop_lag_seconds", "doctranscribe_retries_total",
+                 "doctranscribe_rate_limited_total", "doctranscribe_cache_requests_total",
+                 "doctranscribe_parse_failures_total"):
+        assert f"# TYPE {name} " in body
@@ -0,0 +1,43 @@
+from sqlalchemy import inspect
+from sqlmodel import Session, SQLModel, create_engine, select
+
+from app.database import ADDED_COLUMNS, migrate_db
+from app.models import Document, ExtractionJob
+
+# The tables as the first release created them
+OLD_SCHEMA = [
+    """CREATE TABLE document (
+        filename VARCHAR NOT NULL, file_size INTEGER NOT NULL, mime_type VARCHAR NOT NULL,
+        total_pages INTEGER, uploaded_at DATETIME NOT NULL, notes VARCHAR,
+        id CHAR(32) NOT NULL, status VARCHAR(10) NOT NULL, user_id CHAR(32),
+        PRIMARY KEY (id))""",
+    """CREATE TABLE extractionjob (
+        started_at DATETIME, completed_at DATETIME, model_name VARCHAR NOT NULL,
+        pages_processed INTEGER NOT NULL, total_pages INTEGER NOT NULL,
+        confidence_score FLOAT, error_message VARCHAR,
+        id CHAR(32) NOT NULL, document_id CHAR(32) NOT NULL, status VARCHAR(10) NOT NULL,
+        PRIMARY KEY (id))""",
+]
+
+
+def test_migrate_db_adds_missing_columns(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    with engine.begin() as conn:
+        for statement in OLD_SCHEMA:
+            conn.exec_driver_sql(statement)
+    SQLModel.metadata.create_all(engine)
+
+    migrate_db(engine)
+    migrate_db(engine)  # idempotent
+
+    inspector = inspect(engine)
+    for table_name, column_names in ADDED_COLUMNS.items():
+        existing = {column["name"] for column in inspector.get_columns(table_name)}
+        assert set(column_names) <= existing
+    with Session(engine) as session:
+        document = Document(filename="a.pdf", file_size=1, mime_type="application/pdf", trace_context="00-abc-def-01")
+        session.add(document)
+        session.add(ExtractionJob(document_id=document.id, model_name="gpt-4.1", stage_stats={"gpt-4.1": {}}))
+        session.commit()
+        assert session.exec(select(ExtractionJob)).one().stage_stats == {"gpt-4.1": {}}
+        assert session.exec(select(Document)).one().trace_context == "00-abc-def-01"
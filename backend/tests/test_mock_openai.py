@@ -0,0 +1,47 @@
+import asyncio
+
+import httpx
+from openai import AsyncOpenAI
+
+from app.services.cascade import CascadePolicy, CascadeStats
+from app.services.pdf_service import build_page_messages, run_cascade
+from benchmarks.mock_openai import MockProfile, create_app
+
+
+def mock_client(profile):
+    app = create_app(profile)
+    client = AsyncOpenAI(api_key="mock", base_url="http://mock/v1", max_retries=3,
+                         http_client=httpx.AsyncClient(transport=httpx.ASGITransport(app=app)))
+    return app, client
+
+
+def test_pipeline_reads_streamed_pages_and_usage_from_mock():
+    app, client = mock_client(MockProfile(latency_ms=5, sigma=0, image_tokens=1500, questions=3, seed=1))
+    policy, stats = CascadePolicy(models=["gpt-4.1"]), CascadeStats()
+
+    async def run():
+        return [await run_cascade(client, build_page_messages("aGVsbG8=", n), n, policy, stats) for n in (1, 2)]
+
+    first, _ = asyncio.run(run())
+    assert len(first["questions"]) == 3
+    assert first["letterhead"] == "THE LIVERPOOL SCHOOL FOR THE BLIND"
+    calls = stats.take_calls()
+    assert [c["output_tokens"] for c in calls] == [350, 350]
+    assert calls[0]["input_tokens"] > 1024
+    # The repeated prompt prefix is reported as cached from the second page on
+    assert calls[0]["cached_tokens"] == 0 and calls[1]["cached_tokens"] > 0
+    assert app.state.stats.requests == 2
+
+
+def test_rate_limited_requests_are_retried():
+    app, client = mock_client(MockProfile(latency_ms=1, sigma=0, rate_limit=0.5, retry_after_ms=1, seed=3))
+    policy = CascadePolicy(models=["gpt-4.1"])
+
+    async def run():
+        for n in range(1, 6):
+            await run_cascade(client, build_page_messages("aGVsbG8=", n), n, policy, CascadeStats())
+
+    asyncio.run(run())
+    stats = app.state.stats
+    assert stats.rate_limited > 0
+    assert stats.requests == 5 + stats.rate_limited
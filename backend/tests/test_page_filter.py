@@ -0,0 +1,72 @@
+import numpy as np
+from PIL import Image, ImageDraw
+
+from app.services.page_filter import PageFilter, ink_stats
+
+
+def scan(seed, lines=0, offset=0):
+    """A 1000x1400 'scanned' page: off-white paper with noise and optional text lines."""
+    rng = np.random.default_rng(seed)
+    page = np.clip(rng.normal(235, 3, (1400, 1000)), 0, 255).astype(np.uint8)
+    image = Image.fromarray(page)
+    draw = ImageDraw.Draw(image)
+    for i in range(lines):
+        y = 150 + i * 60
+        draw.rectangle([100 + offset, y, 100 + offset + (i * 97) % 700 + 100, y + 12], fill=30)
+    return image
+
+
+def test_blank_page_is_skipped_and_text_page_is_not():
+    page_filter = PageFilter(enabled=True)
+
+    assert page_filter.check(scan(1), 1)["reason"] == "blank"
+    assert page_filter.check(scan(2, lines=1), 2) is None
+    assert ink_stats(scan(2, lines=1))[0] > 0.0005
+
+
+def test_near_duplicate_page_is_skipped():
+    page_filter = PageFilter(enabled=True)
+
+    assert page_filter.check(scan(1, lines=15), 1) is None
+    skip = page_filter.check(scan(7, lines=15), 2)
+    assert skip["reason"] == "duplicate"
+    assert skip["duplicate_of"] == 1
+    assert page_filter.check(scan(3, lines=15, offset=120), 3) is None
+
+
+def test_same_template_with_different_answers_is_not_a_duplicate():
+    page_filter = PageFilter(enabled=True)
+
+    assert page_filter.check(scan(1, lines=15), 1) is None
+    assert page_filter.check(scan(2, lines=14), 2) is None
+
+
+def test_disabled_filter_sends_everything():
+    assert PageFilter(enabled=False).check(scan(1), 1) is None
+
+
+def form_at_300_dpi(seed, answers=(), shift=0):
+    """A US-letter form scanned at 300 DPI (2550x3300): printed labels and boxes, thin-stroke answers."""
+    rng = np.random.default_rng(seed)
+    page = np.clip(rng.normal(235, 3, (3300, 2550)), 0, 255).astype(np.uint8)
+    image = Image.fromarray(page)
+    draw = ImageDraw.Draw(image)
+    for i in range(12):
+        y, x = 300 + i * 240 + shift, shift
+        draw.rectangle([200 + x, y, 900 + x, y + 30], fill=30)
+        draw.rectangle([1000 + x, y - 20, 2300 + x, y + 80], outline=40, width=4)
+    for i in answers:
+        y = 300 + i * 240
+        # A handwritten word: a few 2px pen strokes inside the answer box
+        draw.line([(1050, y + 50), (1090, y), (1130, y + 50), (1170, y + 5), (1210, y + 45)], fill=90, width=2)
+    return image
+
+
+def test_thin_stroke_answers_at_300_dpi_are_not_duplicates_of_the_blank_form():
+    page_filter = PageFilter(enabled=True)
+
+    assert page_filter.check(form_at_300_dpi(1), 1) is None
+    # Another scan of the blank form, a few pixels off, is still a duplicate
+    assert page_filter.check(form_at_300_dpi(2, shift=3), 2)["reason"] == "duplicate"
+    assert page_filter.check(form_at_300_dpi(3, answers=[4]), 3) is None
+    assert page_filter.check(form_at_300_dpi(4, answers=[4, 9]), 4) is None
@@ -0,0 +1,92 @@
+import asyncio
+import json
+
+import httpx
+from openai import AsyncOpenAI
+
+from app.services.page_schema import PAGE_SCHEMA_VERSION, IncrementalJSONParser, parse_json_output
+from app.services.pdf_service import build_page_messages, build_page_request, extract_page_content, parse_page_content
+
+PAGE = {
+    "form_title": "Admission",
+    "document_type": "application form",
+    "letterhead": None,
+    "questions": [
+        {"question": "Name", "answer": "Ann \"Nan\" Lee", "confidence": 0.9, "is_handwritten": True},
+        {"question": "Age", "answer": "12", "confidence": 0.8, "is_handwritten": True},
+    ],
+}
+
+
+def sse(chunks, finish_reason):
+    events = []
+    for i, text in enumerate(chunks):
+        last = i == len(chunks) - 1
+        events.append({
+            "id": "c", "object": "chat.completion.chunk", "created": 0, "model": "m",
+            "choices": [{"index": 0, "delta": {"content": text}, "finish_reason": finish_reason if last else None}],
+        })
+    body = "".join(f"data: {json.dumps(e)}\n\n" for e in events) + "data: [DONE]\n\n"
+    return httpx.Response(200, text=body, headers={"content-type": "text/event-stream"})
+
+
+def test_parser_recovers_complete_elements_from_truncated_output():
+    text = "```json\n" + json.dumps(PAGE)
+    cut = text[:text.index('"Age"') + 10]
+
+    value, complete = parse_json_output(cut)
+
+    assert not complete
+    assert value["questions"][0]["answer"] == 'Ann "Nan" Lee'
+    assert value["questions"][1] == {"question": "Age"}
+
+
+def test_parser_is_incremental():
+    text = json.dumps(PAGE) + "\n```"
+    parser = IncrementalJSONParser()
+    for i in range(0, len(text), 5):
+        parser.feed(text[i:i + 5])
+
+    assert parser.complete
+    assert parser.value() == (PAGE, True)
+
+
+def test_truncated_page_keeps_only_complete_questions():
+    text = json.dumps(PAGE)
+    result = parse_page_content(text[:text.index('"Age"') + 10], 2)
+
+    assert result["truncated"] is True
+    assert [q["question"] for q in result["questions"]] == ["Name"]
+    assert result["questions"][0]["page"] == 2
+
+
+def test_request_uses_versioned_schema():
+    request = build_page_request(build_page_messages("aGVsbG8=", 1))
+
+    assert request["response_format"]["type"] == "json_schema"
+    assert PAGE_SCHEMA_VERSION.replace("-", "_") in request["response_format"]["json_schema"]["name"]
+
+
+def test_cut_off_output_is_continued_not_rerun():
+    text = json.dumps(PAGE)
+    split = text.index('"Age"') + 3
+    requests = []
+
+    def handler(request):
+        body = json.loads(request.content)
+        requests.append(body)
+        if len(requests) == 1:
+            return sse([text[:split // 2], text[split // 2:split]], "length")
+        return sse([text[split:]], "stop")
+
+    client = AsyncOpenAI(api_key="test", base_url="http://stub/v1",
+                         http_client=httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+
+    result = asyncio.run(extract_page_content(client, build_page_messages("aGVsbG8=", 1), 1))
+
+    assert len(requests) == 2
+    assert requests[1]["messages"][-2] == {"role": "assistant", "content": text[:split]}
+    assert "response_format" not in requests[1]
+    assert "truncated" not in result
+    assert result["schema_version"] == PAGE_SCHEMA_VERSION
+    assert [q["answer"] for q in result["questions"]] == ['Ann "Nan" Lee', "12"]
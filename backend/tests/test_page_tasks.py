@@ -0,0 +1,287 @@
+import asyncio
+import threading
+import time
+import uuid
+from types import SimpleNamespace
+
+import pytest
+from PIL import Image
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlmodel import Session, select
+
+from app.database import get_async_session
+from app.models import Document, ExtractionJob, ExtractionResult, PageStatus, PageTask, ProcessingStatus
+from app.routers import handwriting
+from app.services import pdf_service
+from app.services.cascade import estimate_cost
+from app.services.events import JOB_COMPLETED, JOB_STARTED, PAGE_COMPLETED, event_bus, job_event_stream
+from app.services.form_templates import TemplateRegistry
+from app.services.page_filter import PageFilter
+from app.services.page_tasks import idempotency_key
+
+# The real page extractor, before fixtures stub it
+process_image = pdf_service.process_image
+
+
+@pytest.fixture()
+def pipeline(tmp_path, monkeypatch, db, fake_renderer):
+    """A 10-page document whose pages go through a stubbed model."""
+    engine = db.engine
+    monkeypatch.setattr(pdf_service, "UPLOAD_DIR", tmp_path)
+    monkeypatch.setattr(pdf_service, "convert_pdf_to_images", fake_renderer([], []))
+    monkeypatch.setattr(pdf_service, "PageFilter", lambda: PageFilter(enabled=False))
+
+    calls, outage = [], []
+
+    async def process_image(image, page_num, api_key, policy=None, stats=None, *args):
+        calls.append(page_num)
+        stats.record("gpt-4.1", 0.5, {"input_tokens": 1000, "output_tokens": 100}, page_num)
+        if page_num in outage:
+            outage.remove(page_num)
+            raise ConnectionError("503 Service Unavailable")
+        return {"form_title": "Case file", "questions": [{"question": f"Page {page_num}", "answer": "x", "confidence": 0.9}]}
+
+    monkeypatch.setattr(pdf_service, "process_image", process_image)
+
+    with Session(engine) as session:
+        document = Document(filename="case.pdf", file_size=4, total_pages=10)
+        session.add(document)
+        session.commit()
+        document_id = document.id
+    (tmp_path / str(document_id)).write_bytes(b"%PDF")
+
+    def run_job(preprocessing=None):
+        with Session(engine) as session:
+            job = ExtractionJob(document_id=document_id, total_pages=10, preprocessing=preprocessing)
+            session.add(job)
+            session.commit()
+            job_id = job.id
+        service = pdf_service.PDFProcessingService(api_key="sk-test")
+        asyncio.run(service._process_document_task(str(tmp_path / str(document_id)), job_id, "sk-test"))
+        return job_id
+
+    return engine, run_job, calls, outage
+
+
+def job_state(engine, job_id):
+    with Session(engine) as session:
+        job = session.get(ExtractionJob, job_id)
+        tasks = session.exec(select(PageTask).where(PageTask.job_id == job_id)).all()
+        return job.status, job.error_message, {t.page_number: t.status for t in tasks}
+
+
+def resume_and_wait(engine, job_id):
+    async def resume():
+        assert await pdf_service.PDFProcessingService(api_key="sk-test").resume_job(job_id)
+        while pdf_service.is_job_running(job_id):
+            await asyncio.sleep(0.01)
+
+    asyncio.run(resume())
+
+
+def test_page_filter_runs_off_the_event_loop(pipeline, monkeypatch):
+    engine, run_job, calls, _ = pipeline
+    threads = []
+
+    class Filter:
+        def check(self, image, page_num):
+            threads.append(threading.current_thread())
+            return None
+
+    monkeypatch.setattr(pdf_service, "PageFilter", Filter)
+    job_id = run_job()
+    assert job_state(engine, job_id)[0] == ProcessingStatus.COMPLETED
+    assert len(threads) == 10 and threading.main_thread() not in threads
+
+
+def test_idempotency_key_covers_document_page_model_and_prompt():
+    document_id = uuid.uuid4()
+    key = idempotency_key(document_id, 3, "gpt-4.1", "page-v2")
+    assert key == idempotency_key(document_id, 3, "gpt-4.1", "page-v2")
+    assert len({
+        key,
+        idempotency_key(uuid.uuid4(), 3, "gpt-4.1", "page-v2"),
+        idempotency_key(document_id, 4, "gpt-4.1", "page-v2"),
+        idempotency_key(document_id, 3, "gpt-4.1-mini>gpt-4.1", "page-v2"),
+        idempotency_key(document_id, 3, "gpt-4.1", "page-v3"),
+        idempotency_key(document_id, 3, "gpt-4.1", "page-v2", {"preprocessing": {"binarize": "sauvola"}}),
+    }) == 6
+    # Settings are hashed independently of key order
+    assert idempotency_key(document_id, 3, "gpt-4.1", "page-v2", {"a": 1, "b": 2}) == \
+        idempotency_key(document_id, 3, "gpt-4.1", "page-v2", {"b": 2, "a": 1})
+
+
+def test_failed_page_does_not_stop_the_job_and_resume_retries_only_it(pipeline, db):
+    engine, run_job, calls, outage = pipeline
+    outage.append(7)
+    job_id = run_job()
+
+    status, error, pages = job_state(engine, job_id)
+    assert status == ProcessingStatus.FAILED and "1 of 10 pages failed (7)" in error
+    assert pages[7] == PageStatus.FAILED
+    assert all(state == PageStatus.DONE for page, state in pages.items() if page != 7)
+    assert calls == list(range(1, 11))
+
+    app = FastAPI()
+    app.include_router(handwriting.router)
+    app.dependency_overrides[get_async_session] = db.async_session
+    calls.clear()
+    with TestClient(app) as client:
+        states = client.get(f"/handwriting/jobs/{job_id}/pages").json()
+        assert states["counts"] == {"pending": 0, "in_flight": 0, "done": 9, "failed": 1}
+        assert states["pages"][6] == {"page": 7, "status": "failed", "attempts": 1,
+                                      "error": "503 Service Unavailable", "reused_from": None}
+
+        response = client.post(f"/handwriting/jobs/{job_id}/resume", params={"api_key": "sk-test"})
+        assert response.status_code == 200
+        assert response.json()["pages_to_process"] == 1
+
+        deadline = time.monotonic() + 10
+        while job_state(engine, job_id)[0] != ProcessingStatus.COMPLETED and time.monotonic() < deadline:
+            time.sleep(0.02)
+
+        assert client.post(f"/handwriting/jobs/{job_id}/resume").status_code == 409
+        assert client.post(f"/handwriting/jobs/{uuid.uuid4()}/resume").status_code == 404
+
+    assert calls == [7]
+    status, _, pages = job_state(engine, job_id)
+    assert status == ProcessingStatus.COMPLETED and set(pages.values()) == {PageStatus.DONE}
+    with Session(engine) as session:
+        combined = session.exec(
+            select(ExtractionResult).where(ExtractionResult.job_id == job_id, ExtractionResult.page_number == 0)
+        ).one()
+        assert [q["page"] for q in combined.content["questions"]] == list(range(1, 11))
+
+
+def test_new_job_reuses_pages_done_with_the_same_settings(pipeline, monkeypatch):
+    engine, run_job, calls, outage = pipeline
+    first = run_job()
+    calls.clear()
+
+    second = run_job()
+    assert calls == []
+    status, _, pages = job_state(engine, second)
+    assert status == ProcessingStatus.COMPLETED and set(pages.values()) == {PageStatus.DONE}
+    with Session(engine) as session:
+        tasks = session.exec(select(PageTask).where(PageTask.job_id == second)).all()
+        assert {task.reused_from for task in tasks} == {first}
+
+    # Another model means other keys, so every page is extracted again
+    monkeypatch.setattr(pdf_service, "MODEL", "gpt-4.1-2026-01-01")
+    run_job()
+    assert calls == list(range(1, 11))
+
+
+def test_pages_are_extracted_again_when_preprocessing_or_region_prompt_change(pipeline, monkeypatch):
+    engine, run_job, calls, outage = pipeline
+    run_job({"binarize": None, "deskew": False, "crop_borders": False})
+    calls.clear()
+
+    run_job({"binarize": "sauvola", "deskew": True, "crop_borders": False})
+    assert calls == list(range(1, 11))
+    calls.clear()
+
+    run_job({"binarize": "sauvola", "deskew": True, "crop_borders": False})
+    assert calls == []
+
+    monkeypatch.setattr(pdf_service, "REGION_PROMPT", SimpleNamespace(key="region-v99"))
+    run_job({"binarize": "sauvola", "deskew": True, "crop_borders": False})
+    assert calls == list(range(1, 11))
+
+
+def test_api_errors_returned_as_content_leave_pages_retryable(pipeline, monkeypatch):
+    """process_image reports API failures as error content instead of raising."""
+    engine, run_job, _, _ = pipeline
+    outage, model_calls = [True], []
+
+    async def run_cascade(client, messages, page_num, policy, stats):
+        model_calls.append(page_num)
+        if outage:
+            raise ConnectionError("Connection refused")
+        return {"form_title": "Case file", "questions": [{"question": f"Page {page_num}", "answer": "x", "confidence": 0.9}]}
+
+    async def render(pdf_path, max_pages=None, dpi=300, first_page=1):
+        return [Image.new("RGB", (64, 80), "white") for _ in range(first_page, max_pages + 1)]
+
+    monkeypatch.setattr(pdf_service, "process_image", process_image)
+    monkeypatch.setattr(pdf_service, "run_cascade", run_cascade)
+    monkeypatch.setattr(pdf_service, "convert_pdf_to_images", render)
+    monkeypatch.setattr(pdf_service, "get_template_registry", lambda: TemplateRegistry([]))
+
+    job_id = run_job()
+    status, error, pages = job_state(engine, job_id)
+    assert status == ProcessingStatus.FAILED and "10 of 10 pages failed" in error
+    assert set(pages.values()) == {PageStatus.FAILED}
+    with Session(engine) as session:
+        task = session.exec(select(PageTask).where(PageTask.job_id == job_id, PageTask.page_number == 1)).one()
+        assert "Connection refused" in task.error
+
+    # A new job of the document has nothing to reuse
+    model_calls.clear()
+    run_job()
+    assert model_calls == list(range(1, 11))
+
+    # Once the API is back, resuming extracts every page
+    outage.clear()
+    model_calls.clear()
+    resume_and_wait(engine, job_id)
+    assert model_calls == list(range(1, 11))
+    status, _, pages = job_state(engine, job_id)
+    assert status == ProcessingStatus.COMPLETED and set(pages.values()) == {PageStatus.DONE}
+
+
+def test_error_results_marked_done_are_neither_kept_nor_reused(pipeline):
+    """Pages stored as done with error content (before errors counted as failures) are redone."""
+    engine, run_job, calls, _ = pipeline
+    first = run_job()
+    with Session(engine) as session:
+        for result in session.exec(select(ExtractionResult).where(ExtractionResult.job_id == first)).all():
+            result.content = {"error": "Error in API request: Connection refused", "questions": []}
+        job = session.get(ExtractionJob, first)
+        job.status = ProcessingStatus.FAILED
+        session.commit()
+
+    calls.clear()
+    second = run_job()
+    assert calls == list(range(1, 11))
+
+    # Resuming the first job replaces its error results with the second job's
+    calls.clear()
+    resume_and_wait(engine, first)
+    assert calls == []
+    status, _, pages = job_state(engine, first)
+    assert status == ProcessingStatus.COMPLETED and set(pages.values()) == {PageStatus.DONE}
+    with Session(engine) as session:
+        tasks = session.exec(select(PageTask).where(PageTask.job_id == first)).all()
+        assert {task.reused_from for task in tasks} == {second}
+
+
+def test_subscribers_after_resume_follow_the_new_run(pipeline):
+    """The failed event of the first run must not end streams opened after the resume."""
+    engine, run_job, calls, outage = pipeline
+    outage.append(7)
+    job_id = run_job()
+
+    async def resume_and_follow():
+        event_bus.bind_loop(asyncio.get_running_loop())
+        assert await pdf_service.PDFProcessingService(api_key="sk-test").resume_job(job_id)
+        return [event.type async for event in job_event_stream(str(job_id))]
+
+    assert asyncio.run(resume_and_follow()) == [JOB_STARTED, PAGE_COMPLETED, JOB_COMPLETED]
+    assert job_state(engine, job_id)[0] == ProcessingStatus.COMPLETED
+
+
+def test_resumed_job_adds_its_stage_stats_to_the_earlier_runs(pipeline):
+    engine, run_job, calls, outage = pipeline
+    outage.append(7)
+    job_id = run_job()
+    resume_and_wait(engine, job_id)
+
+    with Session(engine) as session:
+        job = session.get(ExtractionJob, job_id)
+        assert job.status == ProcessingStatus.COMPLETED
+        assert job.stage_stats["gpt-4.1"]["calls"] == 11
+        assert job.stage_stats["gpt-4.1"]["input_tokens"] == 11000
+        assert job.cost_usd == pytest.approx(11 * estimate_cost("gpt-4.1", 1000, 0, 100))
+        assert job.stage_stats["gpt-4.1"]["cost_usd"] == pytest.approx(job.cost_usd)
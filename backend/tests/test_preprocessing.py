@@ -0,0 +1,87 @@
+import numpy as np
+import pytest
+from PIL import Image, ImageDraw
+
+from app.services.preprocessing import (
+    PreprocessOptions,
+    content_box,
+    estimate_skew,
+    otsu_threshold,
+    preprocess_page,
+    sauvola_threshold,
+)
+
+
+def form(rotate=0.0, edge=False):
+    """A 1000x1400 page with ruled lines of 'text', optionally rotated and with a dark scanner edge."""
+    image = Image.new("L", (1000, 1400), 235)
+    draw = ImageDraw.Draw(image)
+    for y in range(200, 1200, 50):
+        draw.rectangle([150, y, 850, y + 8], fill=30)
+    image = image.rotate(rotate, resample=Image.BILINEAR, fillcolor=235)
+    if edge:
+        ImageDraw.Draw(image).rectangle([0, 0, 25, 1400], fill=15)
+    return image
+
+
+def test_otsu_splits_a_bimodal_page():
+    pixels = np.full((100, 100), 220, dtype=np.uint8)
+    pixels[40:60, :] = 40
+    threshold = otsu_threshold(pixels)
+    assert 40 <= threshold < 220
+
+
+def test_sauvola_keeps_faint_ink_under_a_shadow():
+    x = np.linspace(250, 120, 400, dtype=np.float32)
+    pixels = np.tile(x, (200, 1))
+    pixels[97:103, 20:380] -= 50  # a stroke whose contrast stays constant across the shadow
+    pixels = pixels.astype(np.uint8)
+
+    ink = pixels <= sauvola_threshold(pixels, window=31)
+    assert ink[97:103, 30:370].mean() > 0.95
+    assert ink[:60].mean() < 0.01
+    # A global threshold loses the stroke on the bright side or floods the dark side
+    global_ink = pixels <= otsu_threshold(pixels)
+    assert global_ink[97:103, 30:50].mean() < 0.5 or global_ink[:60].mean() > 0.1
+
+
+@pytest.mark.parametrize("angle", [-3.0, -1.0, 2.5])
+def test_estimate_skew_recovers_rotation(angle):
+    assert estimate_skew(form(rotate=angle)) == pytest.approx(angle, abs=0.15)
+
+
+def test_content_box_drops_scanner_edge_and_margins():
+    left, top, right, bottom = content_box(np.asarray(form(edge=True)))
+    assert 26 <= left < 150 and right > 850 and right < 1000
+    assert 0 < top < 200 and 1158 < bottom < 1400
+
+
+def test_parse_spec():
+    options = PreprocessOptions.parse("Sauvola, deskew,crop")
+    assert options == PreprocessOptions(binarize="sauvola", deskew=True, crop_borders=True)
+    assert not PreprocessOptions.parse("none").enabled
+    assert PreprocessOptions.from_dict(options.to_dict()) == options
+    with pytest.raises(ValueError):
+        PreprocessOptions.parse("otsu,sauvola")
+    with pytest.raises(ValueError):
+        PreprocessOptions.parse("sharpen")
+
+
+def test_preprocess_page_deskews_crops_and_binarizes():
+    page = form(rotate=2.0, edge=True).convert("RGB")
+
+    result, info = preprocess_page(page, PreprocessOptions.parse("otsu,deskew,crop"))
+
+    assert result.mode == "1"
+    assert result.size[0] < page.size[0] and result.size[1] < page.size[1]
+    assert info["skew_deg"] == pytest.approx(2.0, abs=0.15)
+    assert info["binarize"] == "otsu"
+    # Once straightened, each ruled line is a solid run of black rows
+    black_rows = (~np.asarray(result)).mean(axis=1) > 0.5
+    assert black_rows.sum() >= 20 * 6
+
+
+def test_disabled_options_return_the_page_untouched():
+    page = form()
+    result, info = preprocess_page(page, PreprocessOptions())
+    assert result is page and info == {}
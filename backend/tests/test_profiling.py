@@ -0,0 +1,86 @@
+import asyncio
+import threading
+import time
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.auth import get_current_user
+from app.models import User, UserRole
+from app.routers import admin
+from app.services import profiling
+from app.services.profiling import LoopWatchdog, write_profile
+
+
+def blocking_upload_parse():
+    time.sleep(0.3)
+
+
+def test_watchdog_captures_stack_of_blocking_callback(tmp_path):
+    path = tmp_path / "stalls.jsonl"
+
+    async def main():
+        watchdog = LoopWatchdog(threshold_ms=50, path=str(path))
+        watchdog.start()
+        await asyncio.sleep(0.1)
+        blocking_upload_parse()
+        await asyncio.sleep(0.2)
+        watchdog.stop()
+        return watchdog
+
+    watchdog = asyncio.run(main())
+
+    (stall,) = watchdog.stalls
+    assert 200 <= stall["blocked_ms"] <= 1000
+    assert any("blocking_upload_parse" in line for line in stall["stack"])
+    assert path.read_text().count("\n") == 1
+
+
+def test_short_callbacks_are_not_reported():
+    async def main():
+        watchdog = LoopWatchdog(threshold_ms=200)
+        watchdog.start()
+        for _ in range(5):
+            time.sleep(0.02)
+            await asyncio.sleep(0.02)
+        watchdog.stop()
+        return watchdog
+
+    assert list(asyncio.run(main()).stalls) == []
+
+
+def busy_worker(stop):
+    while not stop.is_set():
+        sum(range(1000))
+
+
+def test_profile_writes_collapsed_stacks(tmp_path):
+    stop = threading.Event()
+    worker = threading.Thread(target=busy_worker, args=(stop,), name="busy")
+    worker.start()
+    try:
+        report = write_profile(0.3, interval=0.005, directory=tmp_path)
+    finally:
+        stop.set()
+        worker.join()
+
+    lines = open(report["path"]).read().splitlines()
+    assert report["samples"] == sum(int(line.rsplit(" ", 1)[1]) for line in lines)
+    busy = [line for line in lines if line.startswith("busy;")]
+    assert busy and all("busy_worker" in line for line in busy)
+
+
+def test_admin_endpoints_require_admin(tmp_path, monkeypatch):
+    monkeypatch.setattr(profiling, "PROFILE_DIR", tmp_path)
+    app = FastAPI()
+    app.include_router(admin.router)
+    client = TestClient(app)
+
+    app.dependency_overrides[get_current_user] = lambda: User(email="u@example.com", name="U", password="x")
+    assert client.get("/admin/loop-stalls").status_code == 403
+
+    app.dependency_overrides[get_current_user] = lambda: User(
+        email="a@example.com", name="A", password="x", role=UserRole.ADMIN)
+    assert client.get("/admin/loop-stalls").json() == {"enabled": False, "threshold_ms": None, "stalls": []}
+    report = client.post("/admin/profile", params={"seconds": 0.1}).json()
+    assert report["path"].startswith(str(tmp_path)) and report["samples"] > 0
@@ -0,0 +1,62 @@
+import asyncio
+import json
+
+from app.services.cascade import CascadePolicy, CascadeStats
+from app.services.form_templates import FieldRegion, FormTemplate, TemplateMatch, build_region_messages
+from app.services.pdf_service import build_page_messages, build_page_request, run_cascade
+from app.services.prompts import PAGE_PROMPT, REGION_PROMPT, cache_hit_rate
+
+
+def static_prefix(request):
+    """Serialized request up to the first image - the part the provider can cache."""
+    text = json.dumps(request)
+    return text[:text.index("data:image/png")]
+
+
+def test_page_requests_share_a_byte_identical_prefix():
+    first = build_page_request(build_page_messages("aGVsbG8=", 1))
+    later = build_page_request(build_page_messages("d29ybGQ=", 37))
+
+    assert static_prefix(first) == static_prefix(later)
+    # The page number only appears after the image
+    assert "37" not in static_prefix(later)
+    assert later["messages"][1]["content"][-1]["text"] == "This is page 37."
+    assert later["prompt_cache_key"] == PAGE_PROMPT.key
+
+
+def test_region_requests_keep_form_and_page_last():
+    def match(name):
+        region = FieldRegion(id="name", question="Name of pupil", bbox=(0.1, 0.1, 0.5, 0.2))
+        return TemplateMatch(FormTemplate(id=name, name=name, fields=[region], reference=None), 0.0, 0.0, 0.9)
+
+    first = build_region_messages(match("Admission"), [(match("Admission").template.fields[0], "aGVsbG8=")], 1)
+    other = build_region_messages(match("Discharge"), [(match("Discharge").template.fields[0], "aGVsbG8=")], 4)
+
+    assert static_prefix(first) == static_prefix(other)
+    assert other[1]["content"][-1]["text"] == "Form: 'Discharge', page 4."
+    assert other[1]["content"][1]["text"] == "field_id: name - Name of pupil"
+
+
+def test_cascade_sends_cache_key_and_reports_hit_rate(page_json, stub_client):
+    bodies = []
+    client = stub_client({"gpt-4.1-mini": page_json("Ann", 0.95)}, [])
+    handler = client._client._transport.handler
+
+    def capture(request):
+        bodies.append(json.loads(request.content))
+        return handler(request)
+    client._client._transport.handler = capture
+
+    stats = CascadeStats()
+    result = asyncio.run(run_cascade(client, build_page_messages("aGVsbG8=", 1), 1, CascadePolicy(models=["gpt-4.1-mini"]), stats))
+
+    assert bodies[0]["prompt_cache_key"] == PAGE_PROMPT.key
+    assert result["prompt_version"] == PAGE_PROMPT.key
+    assert stats.calls[0]["prompt_version"] == PAGE_PROMPT.key
+    assert stats.to_dict()["gpt-4.1-mini"]["cache_hit_rate"] == 0.2
+
+
+def test_cache_hit_rate():
+    assert cache_hit_rate(0, 0) is None
+    assert cache_hit_rate(2000, 1536) == 0.768
+    assert PAGE_PROMPT.key != REGION_PROMPT.key
@@ -0,0 +1,62 @@
+import pytest
+from fastapi.testclient import TestClient
+from sqlmodel import Session
+
+from app.main import app
+from app.models import Document, ExtractionJob, ExtractionResult, ProcessingStatus
+from app.services import pdf_service
+from app.services.events import JOB_STARTED, event_bus
+from app.services.results_cache import results_cache
+
+
+@pytest.fixture()
+def completed_job(db):
+    with Session(db.engine) as session:
+        document = Document(filename="form.pdf", file_size=10, total_pages=2, status=ProcessingStatus.COMPLETED)
+        session.add(document)
+        session.commit()
+        job = ExtractionJob(document_id=document.id, total_pages=2, status=ProcessingStatus.COMPLETED)
+        session.add(job)
+        session.commit()
+        for page in (1, 2):
+            session.add(ExtractionResult(job_id=job.id, page_number=page, processing_time=1.0, confidence_score=0.9, content={
+                "form_title": "Survey", "questions": [{"question": f"Q{page}", "answer": "yes", "confidence": 0.9}]
+            }))
+        session.commit()
+        session.refresh(job)
+    yield job
+    results_cache.invalidate_job(job.id)
+
+
+def test_completed_results_are_materialized_once(completed_job, monkeypatch):
+    calls = []
+    build = pdf_service.PDFProcessingService.get_job_results
+
+    async def counting(self, job_id):
+        calls.append(job_id)
+        return await build(self, job_id)
+
+    monkeypatch.setattr(pdf_service.PDFProcessingService, "get_job_results", counting)
+
+    with TestClient(app) as client:
+        first = client.get(f"/handwriting/jobs/{completed_job.id}/results", headers={"Accept-Encoding": "gzip"})
+        second = client.get(f"/handwriting/jobs/{completed_job.id}/results", headers={"Accept-Encoding": "gzip"})
+        unchanged = client.get(
+            f"/handwriting/jobs/{completed_job.id}/results", headers={"If-None-Match": first.headers["ETag"]}
+        )
+
+    assert len(calls) == 1
+    assert first.headers["Content-Encoding"] == "gzip"
+    assert first.json() == second.json()
+    assert [r["page_number"] for r in first.json()] == [1, 2, 0]
+    assert len(first.json()[-1]["content"]["questions"]) == 2
+    assert unchanged.status_code == 304
+
+
+def test_reprocessing_drops_materialized_results(completed_job):
+    with TestClient(app) as client:
+        client.get(f"/handwriting/jobs/{completed_job.id}/results")
+    assert results_cache.get(completed_job.id) is not None
+
+    event_bus.publish(completed_job.id, JOB_STARTED, document_id=str(completed_job.document_id))
+    assert results_cache.get(completed_job.id) is None
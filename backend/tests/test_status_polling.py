@@ -0,0 +1,61 @@
+import threading
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlmodel import Session
+
+from app.main import app
+from app.models import Document, ExtractionJob, ProcessingStatus
+from app.services.events import PAGE_COMPLETED, event_bus
+
+
+@pytest.fixture()
+def job(db):
+    with Session(db.engine) as session:
+        document = Document(filename="form.pdf", file_size=10, total_pages=2, status=ProcessingStatus.PROCESSING)
+        session.add(document)
+        session.commit()
+        job = ExtractionJob(document_id=document.id, total_pages=2, status=ProcessingStatus.PROCESSING)
+        session.add(job)
+        session.commit()
+        session.refresh(job)
+    return db.engine, job
+
+
+def test_unchanged_status_returns_304(job):
+    _, job = job
+    with TestClient(app) as client:
+        first = client.get(f"/handwriting/jobs/{job.id}")
+        assert first.status_code == 200
+        etag = first.headers["ETag"]
+
+        second = client.get(f"/handwriting/jobs/{job.id}", headers={"If-None-Match": etag})
+        assert second.status_code == 304
+        assert second.headers["ETag"] == etag
+
+
+def test_long_poll_returns_when_job_progresses(job):
+    engine, job = job
+    with TestClient(app) as client:
+        etag = client.get(f"/handwriting/documents/{job.document_id}").headers["ETag"]
+
+        def progress():
+            time.sleep(0.2)
+            with Session(engine) as session:
+                row = session.get(ExtractionJob, job.id)
+                row.pages_processed = 1
+                session.commit()
+            event_bus.publish(job.id, PAGE_COMPLETED, document_id=str(job.document_id), pages_processed=1, total_pages=2)
+
+        threading.Thread(target=progress).start()
+        started = time.monotonic()
+        response = client.get(
+            f"/handwriting/documents/{job.document_id}?wait=10", headers={"If-None-Match": etag}
+        )
+        elapsed = time.monotonic() - started
+
+    assert response.status_code == 200
+    assert elapsed < 5
+    assert response.headers["ETag"] != etag
+    assert response.json()["latest_job"]["pages_processed"] == 1
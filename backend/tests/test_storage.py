@@ -0,0 +1,92 @@
+import botocore.exceptions
+import pytest
+
+from app.services import storage
+
+
+def client_error(code, operation):
+    return botocore.exceptions.ClientError({"Error": {"Code": code, "Message": code}}, operation)
+
+
+class FakeS3:
+    """Buckets held in memory; counts the calls ensure_bucket makes."""
+
+    def __init__(self, buckets=(), head_error=None):
+        self.buckets = {name: {} for name in buckets}
+        self.head_error = head_error
+        self.head_calls = 0
+        self.created = []
+
+    def head_bucket(self, Bucket):
+        self.head_calls += 1
+        if self.head_error:
+            raise client_error(self.head_error, "HeadBucket")
+        if Bucket not in self.buckets:
+            raise client_error("404", "HeadBucket")
+
+    def create_bucket(self, Bucket, **kwargs):
+        self.created.append((Bucket, kwargs))
+        self.buckets[Bucket] = {}
+
+    def put(self, bucket, key, data):
+        if bucket not in self.buckets:
+            raise client_error("NoSuchBucket", "PutObject")
+        self.buckets[bucket][key] = data
+
+
+@pytest.fixture(autouse=True)
+def empty_cache(monkeypatch):
+    monkeypatch.setattr(storage, "_ready_buckets", set())
+
+
+def test_existing_bucket_is_checked_once():
+    s3 = FakeS3(buckets=["results"])
+    storage.ensure_bucket(s3, "results", "eu-west-1")
+    storage.ensure_bucket(s3, "results", "eu-west-1")
+    assert s3.head_calls == 1
+    assert s3.created == []
+
+
+def test_missing_bucket_is_created_in_region():
+    s3 = FakeS3()
+    storage.ensure_bucket(s3, "results", "eu-west-1")
+    storage.ensure_bucket(s3, "results", "eu-west-1")
+    assert s3.created == [("results", {"CreateBucketConfiguration": {"LocationConstraint": "eu-west-1"}})]
+    assert s3.head_calls == 1
+
+
+def test_other_errors_are_not_cached():
+    s3 = FakeS3(buckets=["results"], head_error="403")
+    with pytest.raises(botocore.exceptions.ClientError):
+        storage.ensure_bucket(s3, "results")
+    s3.head_error = None
+    storage.ensure_bucket(s3, "results")
+    assert s3.head_calls == 2
+    assert s3.created == []
+
+
+def test_deleted_bucket_is_recreated_and_operation_retried():
+    s3 = FakeS3(buckets=["results"])
+    storage.with_bucket(s3, "results", None, lambda: s3.put("results", "a.json", b"{}"))
+
+    del s3.buckets["results"]  # deleted behind the cache's back
+    storage.with_bucket(s3, "results", None, lambda: s3.put("results", "b.json", b"{}"))
+
+    assert s3.buckets == {"results": {"b.json": b"{}"}}
+    assert s3.created == [("results", {})]
+    assert s3.head_calls == 2
+    assert "results" in storage._ready_buckets
+
+
+def test_unrelated_operation_errors_are_not_retried():
+    s3 = FakeS3(buckets=["results"])
+    calls = []
+
+    def operation():
+        calls.append(1)
+        raise client_error("AccessDenied", "PutObject")
+
+    with pytest.raises(botocore.exceptions.ClientError):
+        storage.with_bucket(s3, "results", None, operation)
+    assert len(calls) == 1
+    assert "results" in storage._ready_buckets
@@ -0,0 +1,138 @@
+import asyncio
+import json
+import threading
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.services import tracing
+from app.services.cascade import CascadePolicy, CascadeStats
+from app.services.pdf_service import build_page_messages, run_cascade
+from app.services.tracing import (
+    FileSpanExporter,
+    InMemorySpanExporter,
+    TracingMiddleware,
+    bind_context,
+    parse_traceparent,
+    span,
+    trace_id_of,
+)
+
+
+def capture():
+    exporter = InMemorySpanExporter()
+    tracing.set_exporter(exporter)
+    return exporter
+
+
+def finished(exporter):
+    tracing.flush()
+    tracing.set_exporter(None)
+    return {s.name: s for s in exporter.spans}
+
+
+def test_context_follows_tasks_and_threads():
+    exporter = capture()
+
+    async def child():
+        with span("child.task"):
+            await asyncio.sleep(0)
+
+    def in_thread():
+        with span("child.thread"):
+            pass
+
+    async def main():
+        with span("root", {"job.id": "j1"}) as root:
+            await asyncio.create_task(child())
+            thread = threading.Thread(target=bind_context(in_thread))
+            thread.start()
+            thread.join()
+        return root
+
+    root = asyncio.run(main())
+    spans = finished(exporter)
+
+    assert spans["root"].parent_span_id is None
+    assert spans["root"].attributes["job.id"] == "j1"
+    for name in ("child.task", "child.thread"):
+        assert spans[name].trace_id == root.trace_id
+        assert spans[name].parent_span_id == root.span_id
+
+
+def test_stored_traceparent_continues_trace_and_links_caller():
+    exporter = capture()
+    with span("upload") as upload:
+        stored = upload.traceparent
+    assert parse_traceparent(stored) == (upload.trace_id, upload.span_id)
+    assert trace_id_of(stored) == upload.trace_id
+    assert parse_traceparent("00-abc-def-01") is None
+
+    with span("request") as request:
+        with span("export", parent=stored):
+            pass
+    spans = finished(exporter)
+
+    assert spans["export"].trace_id == upload.trace_id
+    assert spans["export"].parent_span_id == upload.span_id
+    assert spans["export"].links == [(request.trace_id, request.span_id)]
+
+
+def test_model_calls_are_spans_with_token_counts(page_json, stub_client):
+    exporter = capture()
+    client = stub_client({"gpt-4.1-mini": page_json("[ILLEGIBLE]", 0.9), "gpt-4.1": page_json("Ann", 0.9)}, [])
+    policy = CascadePolicy(models=["gpt-4.1-mini", "gpt-4.1"])
+    with span("page.process"):
+        asyncio.run(run_cascade(client, build_page_messages("aGVsbG8=", 3), 3, policy, CascadeStats()))
+    tracing.flush()
+    tracing.set_exporter(None)
+
+    calls = [s for s in exporter.spans if s.name == "model.call"]
+    assert [c.attributes["model"] for c in calls] == ["gpt-4.1-mini", "gpt-4.1"]
+    for call in calls:
+        assert call.attributes["page.number"] == 3
+        assert call.attributes["tokens.input"] == 1000
+        assert call.duration_ms > 0
+
+
+def test_file_exporter_writes_otlp_json(tmp_path):
+    path = tmp_path / "traces.jsonl"
+    tracing.set_exporter(FileSpanExporter(str(path)))
+    try:
+        with span("job.process", {"job.id": "j1", "page.number": 2}):
+            raise RuntimeError("boom")
+    except RuntimeError:
+        pass
+    tracing.flush()
+    tracing.set_exporter(None)
+
+    request = json.loads(path.read_text().splitlines()[0])
+    resource_spans = request["resourceSpans"][0]
+    assert {"key": "service.name", "value": {"stringValue": "doctranscribe"}} in resource_spans["resource"]["attributes"]
+    (exported,) = resource_spans["scopeSpans"][0]["spans"]
+    assert exported["name"] == "job.process"
+    assert len(exported["traceId"]) == 32 and len(exported["spanId"]) == 16
+    assert {"key": "page.number", "value": {"intValue": "2"}} in exported["attributes"]
+    assert exported["status"]["code"] == tracing.STATUS_ERROR
+    assert exported["events"][0]["name"] == "exception"
+
+
+def test_middleware_continues_incoming_trace():
+    exporter = capture()
+    app = FastAPI()
+    app.add_middleware(TracingMiddleware)
+
+    @app.get("/items/{item_id}")
+    async def item(item_id: str):
+        return {"traceparent": tracing.current_traceparent()}
+
+    incoming = "00-0af7651916cd43dd8448eb211c80319c-b7ad6b7169203331-01"
+    response = TestClient(app).get("/items/1", headers={"traceparent": incoming})
+    spans = finished(exporter)
+
+    server = spans["GET /items/{item_id}"]
+    assert server.trace_id == "0af7651916cd43dd8448eb211c80319c"
+    assert server.parent_span_id == "b7ad6b7169203331"
+    assert server.attributes["http.response.status_code"] == 200
+    assert response.headers["traceparent"] == server.traceparent
+    assert response.json()["traceparent"] == server.traceparent
@@ -0,0 +1,112 @@
+import asyncio
+from datetime import datetime, timedelta
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy.pool import StaticPool
+from sqlmodel import Session, SQLModel, create_engine
+
+from app.database import get_async_session
+from app.models import Document, ExtractionJob, ModelCall, User
+from app.routers import handwriting
+from app.services.cascade import CascadePolicy, CascadeStats, estimate_cost
+from app.services.pdf_service import build_page_messages, run_cascade
+from app.services.usage import job_usage, record_model_calls, usage_rollup
+
+
+def make_engine():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    SQLModel.metadata.create_all(engine)
+    return engine
+
+
+def add_job(session, user):
+    document = Document(filename="f.pdf", file_size=1, user_id=user.id)
+    session.add(document)
+    session.flush()
+    job = ExtractionJob(document_id=document.id)
+    session.add(job)
+    session.flush()
+    return document, job
+
+
+def test_cascade_records_each_call_with_page_timings(page_json, stub_client):
+    stats = CascadeStats()
+    client = stub_client({"gpt-4.1-mini": page_json("[ILLEGIBLE]", 0.9), "gpt-4.1": page_json("Ann", 0.9)}, [])
+    policy = CascadePolicy(models=["gpt-4.1-mini", "gpt-4.1"])
+
+    stats.begin_page(queue_ms=5.0, render_ms=40.0)
+    stats.record_encode(3.0)
+    asyncio.run(run_cascade(client, build_page_messages("aGVsbG8=", 2), 2, policy, stats))
+
+    first, second = stats.take_calls()
+    assert stats.calls == []
+    assert (first["model"], second["model"]) == ("gpt-4.1-mini", "gpt-4.1")
+    assert first["page_number"] == second["page_number"] == 2
+    assert (first["queue_ms"], first["render_ms"], first["encode_ms"]) == (5.0, 40.0, 3.0)
+    # Page-level time is only counted once
+    assert (second["queue_ms"], second["render_ms"], second["encode_ms"]) == (0.0, 0.0, 0.0)
+    for call in (first, second):
+        assert (call["input_tokens"], call["cached_tokens"], call["output_tokens"]) == (1000, 200, 100)
+        assert call["network_ms"] > 0 and call["parse_ms"] > 0
+        assert call["latency_ms"] >= call["network_ms"]
+        assert call["error"] is None
+    assert second["cost_usd"] == estimate_cost("gpt-4.1", 1000, 200, 100)
+
+
+def test_rollups_by_job_user_and_day():
+    engine = make_engine()
+    with Session(engine) as session:
+        ann, bob = User(email="ann@example.com", name="Ann", password="x"), User(email="bob@example.com", name="Bob", password="x")
+        session.add_all([ann, bob])
+        session.flush()
+        ann_doc, ann_job = add_job(session, ann)
+        bob_doc, bob_job = add_job(session, bob)
+        call = {"page_number": 1, "model": "gpt-4.1", "input_tokens": 1000, "cached_tokens": 0,
+                "output_tokens": 100, "cost_usd": 0.5, "network_ms": 100.0}
+        record_model_calls(session, [call, {**call, "page_number": 2, "error": "timeout"}], ann_job.id, ann_doc.id, ann.id)
+        record_model_calls(session, [call], bob_job.id, bob_doc.id, bob.id)
+        session.add(ModelCall(job_id=bob_job.id, user_id=bob.id, page_number=1, model="gpt-4.1", cost_usd=0.25,
+                              created_at=datetime.utcnow() - timedelta(days=3)))
+        session.commit()
+
+        by_user = {row["user"]: row for row in usage_rollup(session, "user")}
+        assert by_user[str(ann.id)]["calls"] == 2
+        assert by_user[str(ann.id)]["errors"] == 1
+        assert by_user[str(ann.id)]["input_tokens"] == 2000
+        assert by_user[str(ann.id)]["network_ms"] == 200.0
+        assert by_user[str(bob.id)]["cost_usd"] == 0.75
+
+        by_day = usage_rollup(session, "day")
+        assert len(by_day) == 2
+        assert sum(row["calls"] for row in by_day) == 4
+
+        recent = usage_rollup(session, "job", since=datetime.utcnow() - timedelta(days=1))
+        assert {row["job"]: row["calls"] for row in recent} == {str(ann_job.id): 2, str(bob_job.id): 1}
+
+        report = job_usage(session, ann_job.id)
+        assert report["totals"]["calls"] == 2
+        assert [p["page"] for p in report["pages"]] == [1, 2]
+        assert report["pages"][1]["calls"][0]["error"] == "timeout"
+
+
+def test_usage_endpoints(db):
+    with Session(db.engine) as session:
+        user = User(email="ann@example.com", name="Ann", password="x")
+        session.add(user)
+        session.flush()
+        document, job = add_job(session, user)
+        record_model_calls(session, [{"page_number": 1, "model": "gpt-4.1-mini", "input_tokens": 10}], job.id, document.id, user.id)
+        session.commit()
+        job_id = str(job.id)
+
+    app = FastAPI()
+    app.include_router(handwriting.router)
+    app.dependency_overrides[get_async_session] = db.async_session
+    client = TestClient(app)
+
+    rows = client.get("/handwriting/usage", params={"group_by": "model"}).json()
+    assert rows[0]["model"] == "gpt-4.1-mini" and rows[0]["input_tokens"] == 10
+    assert client.get("/handwriting/usage", params={"group_by": "planet"}).status_code == 400
+    assert client.get(f"/handwriting/jobs/{job_id}/usage").json()["totals"]["calls"] == 1
+    assert client.get("/handwriting/jobs/00000000-0000-0000-0000-000000000000/usage").status_code == 404
@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+"""
+Report model token usage, cost and latency from the recorded model calls.
+
+Examples:
+  python usage_report.py                            # per day
+  python usage_report.py --group-by user --days 30  # per user, last 30 days
+  python usage_report.py --job-id <uuid>            # one job, page by page
+  python usage_report.py --group-by model --json
+"""
+import argparse
+import json
+import sys
+from datetime import datetime, timedelta
+from uuid import UUID
+
+from sqlmodel import Session
+
+from app.database import create_db_and_tables, engine
+from app.services.usage import GROUP_BY, job_usage, usage_rollup
+
+COLUMNS = ["calls", "errors", "input_tokens", "cached_tokens", "cache_hit_rate", "output_tokens", "cost_usd",
+           "queue_ms", "render_ms", "encode_ms", "network_ms", "parse_ms", "latency_ms"]
+
+
+def print_table(rows, key) -> None:
+    """Print rollup rows as an aligned text table."""
+    headers = [key] + COLUMNS
+    lines = [[str(row.get(name, "")) for name in headers] for row in rows]
+    widths = [max(len(h), *(len(line[i]) for line in lines)) if lines else len(h) for i, h in enumerate(headers)]
+    print("  ".join(h.ljust(w) for h, w in zip(headers, widths)))
+    for line in lines:
+        print("  ".join(value.ljust(w) for value, w in zip(line, widths)))
+
+
+def main() -> int:
+    """Main entry point for the report."""
+    parser = argparse.ArgumentParser(description="Report model token usage, cost and latency")
+    parser.add_argument("--group-by", choices=list(GROUP_BY), default="day", help="Grouping key (default: day)")
+    parser.add_argument("--job-id", type=UUID, help="Show one job, page by page")
+    parser.add_argument("--user-id", type=UUID, help="Only calls for this user")
+    parser.add_argument("--days", type=int, help="Only the last N days")
+    parser.add_argument("--json", action="store_true", help="Print JSON instead of a table")
+    args = parser.parse_args()
+
+    create_db_and_tables()
+    with Session(engine) as session:
+        if args.job_id:
+            report = job_usage(session, args.job_id)
+            if args.json:
+                print(json.dumps(report, indent=2))
+                return 0
+            if report["totals"]:
+                print_table([report["totals"]], "job")
+            for page in report["pages"]:
+                print(f"\nPage {page['page']}")
+                print_table(page["calls"], "model")
+            return 0
+
+        since = datetime.utcnow() - timedelta(days=args.days) if args.days else None
+        rows = usage_rollup(session, args.group_by, user_id=args.user_id, since=since)
+
+    if args.json:
+        print(json.dumps(rows, indent=2))
+    else:
+        print_table(rows, args.group_by)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())